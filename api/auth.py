@@ -1,38 +1,33 @@
 """Authentication endpoint for generating tokens."""
 
 from http.server import BaseHTTPRequestHandler
-import os
-import json
+import hmac
 import logging
 import time
+import uuid
 import jwt
 from datetime import datetime, timedelta
 from urllib.parse import urlparse, parse_qs
 
+from src.python_ai_bot import codec
+from src.python_ai_bot.body import BodyError, read_request_body
+from src.python_ai_bot.compression import CompressionError, UnsupportedEncodingError, compress_for_client, decompress
+from src.python_ai_bot.revocation import get_revocation_list, max_token_lifetime
+from src.python_ai_bot.settings import get_settings
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class Handler(BaseHTTPRequestHandler):
+    # Persistent connections; every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    
     def add_cors_headers(self):
         """Add CORS headers to the response."""
-        # Get allowed origins from env, default to '*' for development
-        allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
-        origin = self.headers.get("Origin", "")
-        
-        # If specific origins are set, check if the request origin is allowed
-        if allowed_origins != "*" and origin:
-            allowed_origin_list = allowed_origins.split(",")
-            if origin in allowed_origin_list:
-                self.send_header("Access-Control-Allow-Origin", origin)
-            else:
-                self.send_header("Access-Control-Allow-Origin", allowed_origin_list[0])
-        else:
-            # In development or if all origins are allowed
-            self.send_header("Access-Control-Allow-Origin", "*")
-            
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "X-API-Key, Content-Type, Authorization")
+        # Header values are precomputed when the settings snapshot is built
+        for name, value in get_settings().cors_headers(self.headers.get("Origin", "")):
+            self.send_header(name, value)
     
     def log_request_info(self):
         """Log information about the request."""
@@ -42,7 +37,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def check_api_key(self):
         """Check if the request has a valid API key."""
-        api_key = os.environ.get("API_SECRET_KEY")
+        api_key = get_settings().api_secret_key
         if not api_key:
             logger.warning("API_SECRET_KEY not set in environment")
             return True  # Allow if key is not set (for testing)
@@ -53,12 +48,12 @@ class Handler(BaseHTTPRequestHandler):
             logger.warning("No API key provided in request headers")
             return False
         
-        # Simple direct comparison for testing
-        return provided_key == api_key
+        return hmac.compare_digest(provided_key.encode(), api_key.encode())
     
     def generate_token(self, user_id, expires_in=3600):
-        """Generate a JWT token for the given user_id."""
-        jwt_secret = os.environ.get("JWT_SECRET")
+        """Generate a JWT token for the given user_id, living at most REVOCATION_MAX_TOKEN_LIFETIME."""
+        expires_in = min(expires_in, max_token_lifetime())
+        jwt_secret = get_settings().jwt_secret
         if not jwt_secret:
             logger.warning("JWT_SECRET not set in environment")
             # Return a dummy token for testing
@@ -76,7 +71,9 @@ class Handler(BaseHTTPRequestHandler):
             "sub": user_id,
             "iat": int(time.time()),
             "exp": int(time.time()) + expires_in,
-            "iss": "python-ai-bot"
+            "iss": "python-ai-bot",
+            # Identifies the token so it can be revoked before it expires
+            "jti": uuid.uuid4().hex
         }
         
         # Sign the token with the secret
@@ -88,17 +85,60 @@ class Handler(BaseHTTPRequestHandler):
             "expires_in": expires_in
         }
 
-    def send_error_response(self, status_code, message):
-        """Send an error response to the client."""
+    def revoke_token(self, body):
+        """Revoke a token, given as {"token": ...} or as its {"jti": ..., "exp": ...} claims."""
+        token = body.get("token")
+        if token:
+            jwt_secret = get_settings().jwt_secret
+            if not jwt_secret:
+                self.send_error_response(400, "Bad request. JWT_SECRET is not set.")
+                return
+            try:
+                # An expired token may still be revoked; it is simply already dead
+                claims = jwt.decode(token, jwt_secret, algorithms=["HS256"], options={"verify_exp": False})
+            except jwt.InvalidTokenError as e:
+                self.send_error_response(400, f"Bad request. Invalid token: {str(e)}")
+                return
+        else:
+            claims = body
+        
+        jti = claims.get("jti")
+        expires_at = claims.get("exp")
+        if not jti or not isinstance(expires_at, (int, float)):
+            self.send_error_response(400, "Bad request. jti and exp are required.")
+            return
+        
+        if expires_at > time.time():
+            get_revocation_list().revoke(str(jti), expires_at)
+        self.send_json_response(200, {"jti": jti, "revoked": True})
+    
+    def send_json_response(self, status_code, payload):
+        """Send a response body, compressed when the client accepts it.
+        
+        The body is JSON, or MessagePack when the Accept header asks for it.
+        """
+        content_type = codec.negotiate_content_type(self.headers.get("Accept", ""))
+        body, encoding = compress_for_client(
+            codec.encode(payload, content_type), self.headers.get("Accept-Encoding", "")
+        )
         self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
         self.add_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps({"error": message}).encode())
+        self.wfile.write(body)
+    
+    def send_error_response(self, status_code, message):
+        """Send an error response to the client."""
+        self.send_json_response(status_code, {"error": message})
     
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS preflight."""
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.add_cors_headers()
         self.end_headers()
     
@@ -141,11 +181,7 @@ class Handler(BaseHTTPRequestHandler):
         token_data = self.generate_token(user_id)
         
         # Send response
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.add_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(token_data).encode())
+        self.send_json_response(200, token_data)
     
     def do_POST(self):
         """Handle POST requests for token generation."""
@@ -162,12 +198,28 @@ class Handler(BaseHTTPRequestHandler):
             return
         
         # Read request body
-        content_length = int(self.headers.get('Content-Length', 0))
-        request_body = self.rfile.read(content_length).decode('utf-8')
+        try:
+            request_body = read_request_body(self)
+        except BodyError as e:
+            self.send_error_response(e.status_code, str(e))
+            return
+        try:
+            request_body = decompress(request_body, self.headers.get('Content-Encoding', ''))
+        except UnsupportedEncodingError as e:
+            self.send_error_response(415, str(e))
+            return
+        except CompressionError as e:
+            self.send_error_response(400, f"Bad request. {str(e)}")
+            return
         
         try:
-            # Parse JSON body
-            body = json.loads(request_body)
+            # Parse JSON (or MessagePack) body
+            body = codec.decode(request_body, self.headers.get('Content-Type', ''))
+            
+            # Handle token revocation
+            if urlparse(self.path).path.endswith("/revoke"):
+                self.revoke_token(body)
+                return
             
             # Check if user_id is provided
             user_id = body.get("user_id", "")
@@ -182,13 +234,9 @@ class Handler(BaseHTTPRequestHandler):
             token_data = self.generate_token(user_id, expires_in)
             
             # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.add_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps(token_data).encode())
+            self.send_json_response(200, token_data)
             
-        except json.JSONDecodeError:
+        except codec.DecodeError:
             self.send_error_response(400, "Bad request. Invalid JSON.")
         except Exception as e:
             logger.error(f"Error generating token: {str(e)}")
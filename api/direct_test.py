@@ -6,30 +6,22 @@ import json
 import requests
 import logging
 
+from src.python_ai_bot.prompts import get_prompt_registry
+from src.python_ai_bot.settings import get_settings
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class Handler(BaseHTTPRequestHandler):
+    # Persistent connections; every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    
     def add_cors_headers(self):
         """Add CORS headers to the response."""
-        # Get allowed origins from env, default to '*' for development
-        allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
-        origin = self.headers.get("Origin", "")
-        
-        # If specific origins are set, check if the request origin is allowed
-        if allowed_origins != "*" and origin:
-            allowed_origin_list = allowed_origins.split(",")
-            if origin in allowed_origin_list:
-                self.send_header("Access-Control-Allow-Origin", origin)
-            else:
-                self.send_header("Access-Control-Allow-Origin", allowed_origin_list[0])
-        else:
-            # In development or if all origins are allowed
-            self.send_header("Access-Control-Allow-Origin", "*")
-            
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "X-API-Key, Content-Type, Authorization")
+        # Header values are precomputed when the settings snapshot is built
+        for name, value in get_settings().cors_headers(self.headers.get("Origin", "")):
+            self.send_header(name, value)
     
     def log_request_info(self):
         """Log information about the request."""
@@ -39,7 +31,7 @@ class Handler(BaseHTTPRequestHandler):
     
     def check_authentication(self):
         """Check if the request is authenticated."""
-        api_key = os.environ.get("API_SECRET_KEY")
+        api_key = get_settings().api_secret_key
         if not api_key:
             logger.warning("API_SECRET_KEY not set in environment")
             return True  # Allow if key is not set (for testing)
@@ -53,9 +45,20 @@ class Handler(BaseHTTPRequestHandler):
         # Simple direct comparison for testing
         return provided_key == api_key
     
+    def send_json(self, status_code, payload):
+        """Send a JSON response with its Content-Length, so the connection can be reused."""
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.add_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS preflight."""
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.add_cors_headers()
         self.end_headers()
     
@@ -66,20 +69,10 @@ class Handler(BaseHTTPRequestHandler):
         
         # Check authentication
         if not self.check_authentication():
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.add_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "Unauthorized. Invalid API key."}).encode())
+            self.send_json(401, {"error": "Unauthorized. Invalid API key."})
             return
         
-        # Add headers
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.add_cors_headers()
-        self.end_headers()
-        
-        api_key = os.environ.get("OPENAI_API_KEY")
+        api_key = get_settings().openai_api_key
         
         # Default response with environment info
         response = {
@@ -103,10 +96,9 @@ class Handler(BaseHTTPRequestHandler):
                     
                     payload = {
                         "model": "gpt-3.5-turbo",
-                        "messages": [
-                            {"role": "system", "content": "You are a helpful assistant."},
-                            {"role": "user", "content": "Hello! Give me a one-sentence response."}
-                        ],
+                        "messages": get_prompt_registry().get().render(
+                            "Hello! Give me a one-sentence response."
+                        ),
                         "max_tokens": 50
                     }
                     
@@ -126,4 +118,4 @@ class Handler(BaseHTTPRequestHandler):
                 response["openai_test"] = "Error"
                 response["openai_error"] = str(e)
         
-        self.wfile.write(json.dumps(response).encode()) 
\ No newline at end of file
+        self.send_json(200, response)
\ No newline at end of file
@@ -1,15 +1,56 @@
 """Main handler for API requests."""
 
 from http.server import BaseHTTPRequestHandler
+import hmac
 import os
-import json
 import logging
-import requests
 import time
 import jwt
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 from urllib.parse import urlparse, parse_qs
 
+from src.python_ai_bot import codec
+from src.python_ai_bot.body import BodyError, read_request_body
+from src.python_ai_bot.cache import get_response_cache, make_cache_key
+from src.python_ai_bot.compression import CompressionError, UnsupportedEncodingError, compress_for_client, decompress
+from src.python_ai_bot.deadline import (
+    TIMEOUT_HEADER,
+    ClientDisconnected,
+    DeadlineExceeded,
+    RequestAborted,
+    check_deadline,
+    deadline_scope,
+    parse_timeout,
+    upstream_timeout,
+    watch_disconnect,
+)
+from src.python_ai_bot.degradation import (
+    UpstreamUnavailableError,
+    cache_headers,
+    get_degradation_policy,
+    set_cache_status,
+)
+from src.python_ai_bot.jobs import JobQueueFull, JobStoreUnavailable, get_job_queue, job_view
+from src.python_ai_bot.middleware import verified_tenant
+from src.python_ai_bot.pool import get_http_client, upstream_base_url
+from src.python_ai_bot.profiling import (
+    ADMIN_KEY_HEADER,
+    PROFILE_FILE_HEADER,
+    PROFILE_HEADER,
+    PROFILE_QUERY,
+    get_profiler,
+    is_admin,
+    profile_request,
+    requested_format,
+)
+from src.python_ai_bot.prompts import get_prompt_registry
+from src.python_ai_bot.revocation import is_token_revoked
+from src.python_ai_bot.screening import get_screener
+from src.python_ai_bot.settings import get_settings
+from src.python_ai_bot.usage import get_usage_meter
+from src.python_ai_bot.warmup import readiness, start_warm_up
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,26 +59,56 @@ logger = logging.getLogger(__name__)
 env_vars = {k: v for k, v in os.environ.items() if not k.lower().__contains__('key') and not k.lower().__contains__('secret')}
 logger.info(f"Environment variables: {env_vars}")
 
+# Compile prompt templates once per instance, not per request
+prompt_registry = get_prompt_registry()
+
+# Seconds to wait for OpenAI before counting the call as failed; a shorter client deadline wins
+OPENAI_TIMEOUT = 30
+
+# Warm up while the instance initializes, before its first request arrives
+start_warm_up()
+
+# Starts sampling the process at once when PROFILE_CONTINUOUS is set
+get_profiler()
+
 class Handler(BaseHTTPRequestHandler):
+    # Persistent connections; every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    
+    def parse_request(self):
+        """Parse the request line and headers, then start profiling if an admin asked for it."""
+        if not super().parse_request():
+            return False
+        flag = self.headers.get(PROFILE_HEADER, "") or self.parse_query_parameters().get(PROFILE_QUERY, "")
+        fmt = requested_format(flag) if isinstance(flag, str) and flag else None
+        if fmt is not None and is_admin(self.headers.get(ADMIN_KEY_HEADER, "")):
+            self.profile_scope = ExitStack()
+            label = f"{self.command} {urlparse(self.path).path}"
+            self.profile = self.profile_scope.enter_context(profile_request(label, fmt))
+        return True
+
+    def handle_one_request(self):
+        """Handle one request, writing out its profile once the response has been sent."""
+        try:
+            super().handle_one_request()
+        finally:
+            profile_scope = getattr(self, "profile_scope", None)
+            if profile_scope is not None:
+                self.profile_scope = self.profile = None
+                profile_scope.close()
+
+    def end_headers(self):
+        """Name the profile file in profiled responses, then end the headers."""
+        profile = getattr(self, "profile", None)
+        if profile is not None:
+            self.send_header(PROFILE_FILE_HEADER, profile.filename)
+        super().end_headers()
+
     def add_cors_headers(self):
         """Add CORS headers to the response."""
-        # Get allowed origins from env, default to '*' for development
-        allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
-        origin = self.headers.get("Origin", "")
-        
-        # If specific origins are set, check if the request origin is allowed
-        if allowed_origins != "*" and origin:
-            allowed_origin_list = allowed_origins.split(",")
-            if origin in allowed_origin_list:
-                self.send_header("Access-Control-Allow-Origin", origin)
-            else:
-                self.send_header("Access-Control-Allow-Origin", allowed_origin_list[0])
-        else:
-            # In development or if all origins are allowed
-            self.send_header("Access-Control-Allow-Origin", "*")
-            
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "X-API-Key, Content-Type, Authorization")
+        # Header values are precomputed when the settings snapshot is built
+        for name, value in get_settings().cors_headers(self.headers.get("Origin", "")):
+            self.send_header(name, value)
     
     def log_request_info(self):
         """Log information about the request."""
@@ -51,10 +122,13 @@ class Handler(BaseHTTPRequestHandler):
         auth_header = self.headers.get("Authorization", "")
         
         # Check for API key authentication
-        api_key = os.environ.get("API_SECRET_KEY")
+        settings = get_settings()
+        api_key = settings.api_secret_key
         provided_key = self.headers.get("X-API-Key", "")
         
-        if api_key and provided_key and provided_key == api_key:
+        if api_key and provided_key and hmac.compare_digest(provided_key.encode(), api_key.encode()):
+            return True
+        if settings.tenant_for_key(provided_key):
             return True
         
         # Check for JWT authentication
@@ -62,8 +136,8 @@ class Handler(BaseHTTPRequestHandler):
             token = auth_header[7:]  # Remove "Bearer " prefix
             return self.verify_token(token)
         
-        # If API_SECRET_KEY is not set, allow access (for testing)
-        if not api_key:
+        # If no API key is configured, allow access (for testing)
+        if not api_key and not settings.api_key_tenants:
             logger.warning("API_SECRET_KEY not set in environment")
             return True
             
@@ -71,7 +145,7 @@ class Handler(BaseHTTPRequestHandler):
     
     def verify_token(self, token):
         """Verify a JWT token."""
-        jwt_secret = os.environ.get("JWT_SECRET")
+        jwt_secret = get_settings().jwt_secret
         if not jwt_secret:
             logger.warning("JWT_SECRET not set in environment")
             return False
@@ -81,11 +155,31 @@ class Handler(BaseHTTPRequestHandler):
             # Check if token is expired
             if "exp" in payload and payload["exp"] < time.time():
                 return False
+            if is_token_revoked(payload):
+                logger.warning("Rejected revoked token")
+                return False
+            self.jwt_payload = payload
             return True
         except Exception as e:
             logger.error(f"Error verifying token: {str(e)}")
             return False
     
+    def get_tenant(self):
+        """Identify the tenant that token usage is billed to."""
+        # Only verified credentials name a tenant, so callers cannot bill or read as another
+        payload = getattr(self, "jwt_payload", None)
+        tenant = verified_tenant(get_settings(), self.headers.get("X-API-Key", ""), payload)
+        if tenant:
+            return tenant
+        return self.client_address[0] if hasattr(self, "client_address") else "anonymous"
+    
+    def check_quota(self):
+        """Check the tenant's token quota, sending a 429 response if it is used up."""
+        is_allowed, message = get_usage_meter().check_quota(self.get_tenant())
+        if not is_allowed:
+            self.send_error_response(429, message)
+        return is_allowed
+    
     def validate_input(self, prompt, max_length=1000, min_length=1):
         """Validate input prompt."""
         if not prompt:
@@ -96,6 +190,11 @@ class Handler(BaseHTTPRequestHandler):
             
         if len(prompt) > max_length:
             return False, f"Prompt must be at most {max_length} characters"
+        
+        match = get_screener().scan(prompt)
+        if match is not None:
+            # Name the rule only; the matched text may be PII
+            return False, f"Prompt blocked by screening rule: {match.rule}"
             
         return True, "Valid prompt"
     
@@ -111,17 +210,36 @@ class Handler(BaseHTTPRequestHandler):
             query_params[key] = value[0] if len(value) == 1 else value
         return query_params
 
-    def send_error_response(self, status_code, message):
-        """Send an error response to the client."""
+    def send_json_response(self, status_code, payload, headers=()):
+        """Send a response body, compressed when the client accepts it.
+        
+        The body is JSON, or MessagePack when the Accept header asks for it.
+        Extra headers are given as (name, value) pairs.
+        """
+        content_type = codec.negotiate_content_type(self.headers.get("Accept", ""))
+        body, encoding = compress_for_client(
+            codec.encode(payload, content_type), self.headers.get("Accept-Encoding", "")
+        )
         self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
         self.add_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps({"error": message}).encode())
+        self.wfile.write(body)
+    
+    def send_error_response(self, status_code, message):
+        """Send an error response to the client."""
+        self.send_json_response(status_code, {"error": message})
     
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS preflight."""
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.add_cors_headers()
         self.end_headers()
     
@@ -140,11 +258,14 @@ class Handler(BaseHTTPRequestHandler):
 
         # Handle health check
         if path == "/health":
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.add_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "healthy"}).encode())
+            self.send_json_response(200, {"status": "healthy"})
+            return
+
+        # Handle readiness probe
+        if path == "/ready":
+            start_warm_up()
+            report = readiness()
+            self.send_json_response(200 if report["ready"] else 503, report)
             return
             
         # Check authentication for other endpoints
@@ -152,9 +273,30 @@ class Handler(BaseHTTPRequestHandler):
             self.send_error_response(401, "Unauthorized")
             return
             
+        # Handle /usage endpoint
+        if path == "/usage":
+            self.send_json_response(200, get_usage_meter().usage(self.get_tenant()))
+            return
+            
         # Handle /generate-debug endpoint
         if path == "/generate-debug":
-            self._handle_generate_debug()
+            if self.check_quota():
+                self._handle_generate_debug()
+            return
+        
+        # Handle /admin/profiling endpoint
+        if path == "/admin/profiling":
+            self._handle_profiling()
+            return
+        
+        # Handle /jobs/{job_id} endpoint
+        if path.startswith("/jobs/"):
+            job = get_job_queue().get(path[len("/jobs/"):])
+            # Other tenants' jobs are indistinguishable from missing ones
+            if job is None or job["tenant"] != self.get_tenant():
+                self.send_error_response(404, "Job not found")
+            else:
+                self.send_json_response(200, job_view(job))
             return
             
         # Handle unknown endpoints
@@ -165,26 +307,38 @@ class Handler(BaseHTTPRequestHandler):
         query_params = self.parse_query_parameters()
         prompt = query_params.get("prompt", "")
         use_mock_fallback = query_params.get("use_mock_fallback", "true").lower() == "true"
+        template = query_params.get("template")
         
         # Validate prompt
         is_valid, message = self.validate_input(prompt)
         if not is_valid:
             self.send_error_response(400, message)
             return
+        if template is not None and template not in prompt_registry:
+            self.send_error_response(400, f"Unknown prompt template: {template}")
+            return
+        try:
+            timeout = parse_timeout(self.headers.get(TIMEOUT_HEADER))
+        except ValueError as e:
+            self.send_error_response(400, str(e))
+            return
             
         # Generate text
         try:
             if use_mock_fallback:
                 text = f"This is a mock response for: {prompt}"
             else:
-                text = self._generate_text_with_openai(prompt)
+                with deadline_scope(timeout) as deadline, watch_disconnect(self.connection, deadline):
+                    text = self._generate_text_with_openai(prompt, template)
                 
             # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.add_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps({"text": text}).encode())
+            self.send_json_response(200, {"text": text})
+        except DeadlineExceeded as e:
+            self.send_error_response(504, str(e))
+        except ClientDisconnected as e:
+            # Nobody is left to read a response
+            logger.info(f"Abandoned generation: {str(e)}")
+            self.close_connection = True
         except Exception as e:
             logger.error(f"Error generating text: {str(e)}")
             self.send_error_response(500, f"Error: {str(e)}")
@@ -209,80 +363,234 @@ class Handler(BaseHTTPRequestHandler):
             
         # Handle /generate and /api/generate endpoints
         if path == "/generate" or path == "/api/generate":
-            self._handle_generate_post()
+            if self.check_quota():
+                self._handle_generate_post()
+            return
+        
+        # Handle /jobs endpoint
+        if path == "/jobs":
+            if self.check_quota():
+                self._handle_job_post()
+            return
+        
+        # Handle /admin/profiling endpoint
+        if path == "/admin/profiling":
+            self._handle_profiling()
             return
             
         # Handle unknown endpoints
         self.send_error_response(404, "Not found")
     
+    def _handle_profiling(self):
+        """Report the continuous profiler on GET, switch it on or off with {"enabled": bool} on POST."""
+        if not is_admin(self.headers.get(ADMIN_KEY_HEADER, "")):
+            self.send_error_response(403, "Admin key required")
+            return
+        profiler = get_profiler()
+        if self.command == "POST":
+            post_data = self._read_body()
+            if post_data is None:
+                return
+            try:
+                enabled = codec.decode(post_data, self.headers.get('Content-Type', ''))["enabled"]
+            except (codec.DecodeError, KeyError, TypeError):
+                self.send_error_response(400, 'Expected a JSON body like {"enabled": true}')
+                return
+            if not isinstance(enabled, bool):
+                self.send_error_response(400, "enabled must be true or false")
+                return
+            if enabled:
+                profiler.start()
+            else:
+                profiler.stop()
+        self.send_json_response(200, profiler.status())
+    
+    def _read_body(self):
+        """Read and decompress the request body, sending an error response and returning None on failure."""
+        try:
+            post_data = read_request_body(self)
+        except BodyError as e:
+            self.send_error_response(e.status_code, str(e))
+            return None
+        try:
+            return decompress(post_data, self.headers.get('Content-Encoding', ''))
+        except UnsupportedEncodingError as e:
+            self.send_error_response(415, str(e))
+        except CompressionError as e:
+            self.send_error_response(400, str(e))
+        return None
+    
     def _handle_generate_post(self):
         """Handle /generate POST endpoint."""
-        # Read request body
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
+        post_data = self._read_body()
+        if post_data is None:
+            return
         
         try:
-            request_json = json.loads(post_data.decode('utf-8'))
+            request_json = codec.decode(post_data, self.headers.get('Content-Type', ''))
             prompt = request_json.get("prompt", "")
             use_mock_fallback = request_json.get("use_mock_fallback", True)
+            template = request_json.get("template")
             
             # Validate prompt
             is_valid, message = self.validate_input(prompt)
             if not is_valid:
                 self.send_error_response(400, message)
                 return
+            if template is not None and template not in prompt_registry:
+                self.send_error_response(400, f"Unknown prompt template: {template}")
+                return
+            try:
+                timeout = parse_timeout(self.headers.get(TIMEOUT_HEADER), request_json.get("timeout_ms"))
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
                 
             # Generate text
+            set_cache_status(None)
             try:
                 if use_mock_fallback:
                     text = f"This is a mock response for: {prompt}"
                 else:
-                    text = self._generate_text_with_openai(prompt)
+                    # The body has been read, so the watcher can tell a closed connection apart
+                    with deadline_scope(timeout) as deadline, watch_disconnect(self.connection, deadline):
+                        text = self._generate_text_with_openai(prompt, template)
                     
                 # Send response
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.add_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps({"text": text}).encode())
+                self.send_json_response(200, {"text": text}, headers=cache_headers())
+            except UpstreamUnavailableError as e:
+                # Fail fast while OpenAI is degraded rather than queue behind it
+                self.send_error_response(503, str(e))
+            except DeadlineExceeded as e:
+                self.send_error_response(504, str(e))
+            except ClientDisconnected as e:
+                # Nobody is left to read a response
+                logger.info(f"Abandoned generation: {str(e)}")
+                self.close_connection = True
             except Exception as e:
                 logger.error(f"Error generating text: {str(e)}")
                 self.send_error_response(500, f"Error: {str(e)}")
                 
-        except json.JSONDecodeError:
+        except codec.DecodeError:
             self.send_error_response(400, "Invalid JSON")
     
-    def _generate_text_with_openai(self, prompt):
-        """Generate text using OpenAI API."""
-        api_key = os.environ.get("OPENAI_API_KEY")
+    def _handle_job_post(self):
+        """Handle /jobs POST endpoint: queue a generation and answer with its job ID at once."""
+        post_data = self._read_body()
+        if post_data is None:
+            return
+        try:
+            request_json = codec.decode(post_data, self.headers.get('Content-Type', ''))
+        except codec.DecodeError:
+            self.send_error_response(400, "Invalid JSON")
+            return
+        
+        prompt = request_json.get("prompt", "")
+        template = request_json.get("template")
+        is_valid, message = self.validate_input(prompt)
+        if not is_valid:
+            self.send_error_response(400, message)
+            return
+        if template is not None and template not in prompt_registry:
+            self.send_error_response(400, f"Unknown prompt template: {template}")
+            return
+        
+        params = {
+            "prompt": prompt,
+            "model": request_json.get("model", "gpt-3.5-turbo"),
+            "max_tokens": request_json.get("max_tokens", 150),
+            "use_mock_fallback": request_json.get("use_mock_fallback", True),
+            "template": template,
+        }
+        try:
+            job = get_job_queue().submit(params, tenant=self.get_tenant(), webhook_url=request_json.get("webhook_url"))
+        except ValueError as e:
+            self.send_error_response(400, str(e))
+            return
+        except (JobQueueFull, JobStoreUnavailable) as e:
+            self.send_error_response(503, str(e))
+            return
+        self.send_json_response(202, job_view(job), headers=[("Location", f"/jobs/{job['id']}")])
+    
+    def _generate_text_with_openai(self, prompt, template=None):
+        """Generate text using OpenAI API, from the response cache when possible."""
+        api_key = get_settings().openai_api_key
         if not api_key:
             raise Exception("OpenAI API key not set")
-            
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
         
         payload = {
             "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
+            "messages": prompt_registry.get(template).render(prompt),
             "max_tokens": 150
         }
         
+        # The cache lives on disk, so it is still warm after a cold start
+        cache = get_response_cache()
+        if cache is None:
+            return self._call_openai(api_key, payload)
+        
+        cache_key = make_cache_key(payload["model"], payload["messages"], payload["max_tokens"])
+        text, status = get_degradation_policy().serve(
+            cache, cache_key, lambda: self._call_openai(api_key, payload)
+        )
+        set_cache_status(status)
+        return text
+    
+    def _call_openai(self, api_key, payload):
+        """Stream a chat completion and record the token usage.
+        
+        Streaming lets the call stop between chunks once the request's
+        deadline passes or its client disconnects; closing the stream stops
+        OpenAI generating, and billing, the rest of the completion.
+        
+        Raises:
+            RequestAborted: If the request's deadline passed or its client disconnected.
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        body = dict(payload, stream=True, stream_options={"include_usage": True})
+        
         try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
+            # The shared pool reuses connections opened by earlier calls and by warm-up
+            with get_http_client().stream(
+                "POST",
+                f"{upstream_base_url()}/chat/completions",
                 headers=headers,
-                json=payload
-            )
+                content=codec.dumps(body),
+                timeout=upstream_timeout(OPENAI_TIMEOUT)
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+                
+                parts = []
+                usage = {}
+                for line in response.iter_lines():
+                    check_deadline()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = codec.loads(data)
+                    for choice in chunk.get("choices") or ():
+                        parts.append((choice.get("delta") or {}).get("content") or "")
+                    # The last chunk carries the usage of the whole completion
+                    usage = chunk.get("usage") or usage
             
-            if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
-            else:
-                raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+            get_usage_meter().record(
+                self.get_tenant(),
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                cached_prompt_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+            )
+            return "".join(parts)
+        except RequestAborted:
+            raise
         except Exception as e:
+            # A read that timed out on the deadline is the deadline's doing, not OpenAI's
+            check_deadline()
             logger.error(f"Error calling OpenAI API: {str(e)}")
-            raise Exception(f"Failed to generate text: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Failed to generate text: {str(e)}")
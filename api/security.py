@@ -1,14 +1,20 @@
 """Security module for API authentication and rate limiting."""
 
-import os
-import time
-import json
+import hmac
 import logging
+import uuid
 import jwt
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 from datetime import datetime, timedelta
 
+from src.python_ai_bot import codec
+from src.python_ai_bot.compression import compress_for_client
+from src.python_ai_bot.ratelimit import make_rate_limiter
+from src.python_ai_bot.revocation import is_token_revoked, max_token_lifetime
+from src.python_ai_bot.screening import get_screener
+from src.python_ai_bot.settings import get_settings
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,47 +22,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Simple in-memory rate limiter
-class RateLimiter:
-    """Rate limiter for API requests."""
-    
-    def __init__(self, limit=10, window=60):
-        """Initialize rate limiter.
-        
-        Args:
-            limit (int): Maximum number of requests allowed in the window.
-            window (int): Time window in seconds.
-        """
-        self.limit = limit
-        self.window = window
-        self.records = {}  # {client_ip: [(timestamp1), (timestamp2), ...]}
-    
-    def is_rate_limited(self, client_ip):
-        """Check if a client is rate limited.
-        
-        Args:
-            client_ip (str): Client IP address.
-            
-        Returns:
-            bool: True if rate limited, False otherwise.
-        """
-        current_time = time.time()
-        
-        if client_ip not in self.records:
-            self.records[client_ip] = []
-        
-        # Remove old timestamps
-        self.records[client_ip] = [t for t in self.records[client_ip] 
-                                if current_time - t < self.window]
-        
-        # Check if limit reached
-        if len(self.records[client_ip]) >= self.limit:
-            return True
-        
-        # Add new timestamp
-        self.records[client_ip].append(current_time)
-        return False
-
 # JWT Authentication
 class JWTAuth:
     """JWT Authentication for API requests."""
@@ -68,7 +33,7 @@ class JWTAuth:
             secret_key (str, optional): Secret key for JWT. Defaults to None,
                 in which case it will be read from JWT_SECRET environment variable.
         """
-        self.secret_key = secret_key or os.environ.get("JWT_SECRET")
+        self.secret_key = secret_key or get_settings().jwt_secret
         
         if not self.secret_key:
             logger.warning("No JWT secret key provided. JWT auth will fail.")
@@ -78,18 +43,21 @@ class JWTAuth:
         
         Args:
             user_id (str): User ID to encode in the token.
-            expires_in (int, optional): Expiration time in seconds. Defaults to 3600 (1 hour).
+            expires_in (int, optional): Expiration time in seconds, at most
+                REVOCATION_MAX_TOKEN_LIFETIME. Defaults to 3600 (1 hour).
             
         Returns:
             str: JWT token or None if secret key is missing.
         """
         if not self.secret_key:
             return None
+        expires_in = min(expires_in, max_token_lifetime())
         
         payload = {
             'user_id': user_id,
             'exp': datetime.utcnow() + timedelta(seconds=expires_in),
-            'iat': datetime.utcnow()
+            'iat': datetime.utcnow(),
+            'jti': uuid.uuid4().hex
         }
         
         return jwt.encode(payload, self.secret_key, algorithm='HS256')
@@ -108,6 +76,9 @@ class JWTAuth:
         
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+            if is_token_revoked(payload):
+                logger.warning("Token revoked")
+                return None
             return payload
         except jwt.ExpiredSignatureError:
             logger.warning("Token expired")
@@ -127,7 +98,7 @@ class APIKeyAuth:
             api_key (str, optional): API key for authentication. Defaults to None,
                 in which case it will be read from API_SECRET_KEY environment variable.
         """
-        self.api_key = api_key or os.environ.get("API_SECRET_KEY")
+        self.api_key = api_key or get_settings().api_secret_key
         
         if not self.api_key:
             logger.warning("No API key provided. API key auth will fail.")
@@ -141,10 +112,11 @@ class APIKeyAuth:
         Returns:
             bool: True if key is valid, False otherwise.
         """
-        if not self.api_key:
+        if not self.api_key or not provided_key:
             return False
         
-        return provided_key == self.api_key
+        # Constant-time comparison so the key cannot be guessed from response timing
+        return hmac.compare_digest(provided_key.encode(), self.api_key.encode())
 
 # Input validation
 def validate_input(prompt, max_length=1000, min_length=1):
@@ -164,8 +136,11 @@ def validate_input(prompt, max_length=1000, min_length=1):
     if len(prompt) > max_length:
         return False, f"Prompt too long (max {max_length} characters)"
     
-    # Add more validations as needed
-    # Example: Check for harmful content, etc.
+    # Blocklisted terms, PII and prompt-injection signatures. The matched text
+    # is not echoed back, since it may be the very PII being rejected
+    match = get_screener().scan(prompt)
+    if match is not None:
+        return False, f"Prompt blocked by screening rule: {match.rule}"
     
     return True, None
 
@@ -175,7 +150,8 @@ class SecureHandlerMixin:
     
     def __init__(self):
         """Initialize security components."""
-        self.rate_limiter = RateLimiter()
+        # Shared by every worker process when SHARED_STATE_DIR is set
+        self.rate_limiter = make_rate_limiter()
         self.jwt_auth = JWTAuth()
         self.api_key_auth = APIKeyAuth()
     
@@ -186,18 +162,35 @@ class SecureHandlerMixin:
             status_code (int): HTTP status code.
             message (str): Error message.
         """
+        self.send_json_response(status_code, {"error": message})
+    
+    def send_json_response(self, status_code, payload):
+        """Send response body, compressed when the client accepts it.
+        
+        The body is JSON, or MessagePack when the Accept header asks for it.
+        
+        Args:
+            status_code (int): HTTP status code.
+            payload (dict): Serializable response body.
+        """
+        content_type = codec.negotiate_content_type(self.headers.get('Accept', ''))
+        body, encoding = compress_for_client(
+            codec.encode(payload, content_type), self.headers.get('Accept-Encoding', '')
+        )
         self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
         self.add_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps({"error": message}).encode())
+        self.wfile.write(body)
     
     def add_cors_headers(self):
         """Add CORS headers to response."""
-        allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
-        self.send_header('Access-Control-Allow-Origin', allowed_origins)
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-API-Key')
+        for name, value in get_settings().cors_headers(self.headers.get('Origin', '')):
+            self.send_header(name, value)
     
     def log_request_info(self):
         """Log request information."""
@@ -245,7 +238,7 @@ class SecureHandlerMixin:
             return True, None, 200
         
         # If both methods fail
-        allowed_path_prefixes = ['/api/test', '/health']
+        allowed_path_prefixes = ['/api/test', '/health', '/ready']
         if any(self.path.startswith(prefix) for prefix in allowed_path_prefixes):
             # Public endpoints don't require authentication
             return True, None, 200
@@ -0,0 +1,89 @@
+"""Benchmark peak memory while rejecting a flood of oversized request bodies.
+
+Each simulated request claims a large body that is produced on demand, so
+the only allocations measured are the reader's own. The "read all" rows are
+the previous behavior of calling rfile.read(Content-Length) before validation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_body_flood
+"""
+
+import io
+import time
+import tracemalloc
+
+from src.python_ai_bot.body import BodyError, read_body
+
+MAX_BODY_SIZE = 64 * 1024
+
+
+class FloodStream(io.RawIOBase):
+    """Unbuffered stream that produces `size` bytes without storing them."""
+
+    def __init__(self, size, chunked=False):
+        self.remaining = size
+        self.chunked = chunked
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.pending:
+            if self.remaining <= 0:
+                return 0
+            piece = min(self.remaining, 64 * 1024)
+            self.remaining -= piece
+            self.pending = b"x" * piece
+            if self.chunked:
+                self.pending = b"%x\r\n" % piece + self.pending + b"\r\n"
+        count = min(len(buffer), len(self.pending))
+        buffer[:count] = self.pending[:count]
+        self.pending = self.pending[count:]
+        return count
+
+
+def read_all(rfile, headers):
+    return rfile.read(int(headers.get("Content-Length", 0)))
+
+
+def bounded(rfile, headers):
+    return read_body(rfile, headers, max_size=MAX_BODY_SIZE)
+
+
+def run(reader, body_size, requests, chunked):
+    headers = {"Transfer-Encoding": "chunked"} if chunked else {"Content-Length": str(body_size)}
+    tracemalloc.start()
+    start = time.perf_counter()
+    rejected = 0
+    for _ in range(requests):
+        rfile = io.BufferedReader(FloodStream(body_size, chunked=chunked))
+        try:
+            body = reader(rfile, headers)
+            # The old handler rejected the prompt only after decoding the whole body
+            rejected += len(body) > MAX_BODY_SIZE
+        except BodyError:
+            rejected += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, requests / elapsed, rejected
+
+
+def main(body_size=32 * 1024 * 1024, requests=20):
+    """Run the oversized-body flood benchmark."""
+    print(f"{requests} requests of {body_size // (1024 * 1024)} MiB each, cap {MAX_BODY_SIZE // 1024} KiB")
+    print(f"{'reader':<26} {'peak MiB':>9} {'req/s':>10} {'rejected':>9}")
+    cases = [
+        ("read all (Content-Length)", read_all, False),
+        ("bounded (Content-Length)", bounded, False),
+        ("bounded (chunked)", bounded, True),
+    ]
+    for name, reader, chunked in cases:
+        peak, rate, rejected = run(reader, body_size, requests, chunked)
+        print(f"{name:<26} {peak / (1024 * 1024):>9.2f} {rate:>10.0f} {rejected:>9}")
+
+
+if __name__ == "__main__":
+    main()
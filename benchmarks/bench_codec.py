@@ -0,0 +1,63 @@
+"""Benchmark encode/decode throughput of the available serializers.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_codec
+"""
+
+import json
+import random
+import time
+
+from src.python_ai_bot import codec
+
+
+def make_batch(count=200):
+    rng = random.Random(7)
+    return {
+        "requests": [
+            {
+                "id": f"req-{index}",
+                "prompt": " ".join(rng.choice(["alpha", "beta", "gamma", "delta"]) for _ in range(40)),
+                "max_tokens": rng.randint(16, 512),
+                "temperature": rng.random(),
+                "use_mock_fallback": False,
+            }
+            for index in range(count)
+        ]
+    }
+
+
+def candidates():
+    yield "json (stdlib)", lambda obj: json.dumps(obj).encode(), json.loads
+    if codec.orjson is not None:
+        yield "orjson", codec.orjson.dumps, codec.orjson.loads
+    if codec.msgspec is not None:
+        yield "msgspec json", codec.msgspec.json.encode, codec.msgspec.json.decode
+        yield "msgspec msgpack", codec.msgspec.msgpack.encode, codec.msgspec.msgpack.decode
+    if codec.msgpack is not None:
+        yield "msgpack", codec.msgpack.packb, codec.msgpack.unpackb
+
+
+def throughput(function, argument, size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(argument)
+    elapsed = time.perf_counter() - start
+    return size * repeat / elapsed / 1e6
+
+
+def main(repeat=300):
+    """Run the codec benchmark."""
+    batch = make_batch()
+    print(f"JSON backend in use: {codec.JSON_BACKEND}, MessagePack backend: {codec.MSGPACK_BACKEND}")
+    print(f"{'serializer':<16} {'bytes':>8} {'encode MB/s':>12} {'decode MB/s':>12}")
+    for name, encode, decode in candidates():
+        data = encode(batch)
+        encode_rate = throughput(encode, batch, len(data), repeat)
+        decode_rate = throughput(decode, data, len(data), repeat)
+        print(f"{name:<16} {len(data):>8} {encode_rate:>12.1f} {decode_rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
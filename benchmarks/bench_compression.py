@@ -0,0 +1,69 @@
+"""Benchmark bytes on the wire and CPU cost of response compression.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_compression
+"""
+
+import json
+import random
+import time
+
+from src.python_ai_bot.compression import SUPPORTED_ENCODINGS, StreamCompressor, compress
+
+WORDS = (
+    "the model response token request user assistant answer question context data "
+    "python server latency cache stream prompt result value error system network "
+    "because which would could should there their about after before while"
+).split()
+
+
+def make_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_payloads():
+    rng = random.Random(42)
+    batch = {"results": [{"id": f"req-{index}", "text": make_text(rng, 120)} for index in range(50)]}
+    long_completion = {"text": make_text(rng, 3000)}
+    return {
+        "batch (50 x 120 words)": json.dumps(batch).encode(),
+        "long completion (3000 words)": json.dumps(long_completion).encode(),
+    }
+
+
+def time_per_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench_payload(name, data, repeat=200):
+    print(f"\n{name}: {len(data)} bytes uncompressed")
+    print(f"{'encoding':<10} {'mode':<8} {'bytes':>8} {'ratio':>7} {'us/resp':>9}")
+    for encoding in SUPPORTED_ENCODINGS:
+        compressed = compress(data, encoding)
+        cost = time_per_call(lambda: compress(data, encoding), repeat)
+        print(f"{encoding:<10} {'whole':<8} {len(compressed):>8} {len(data) / len(compressed):>7.2f} {cost:>9.1f}")
+
+        # Streamed in ~token-sized chunks, flushed after every chunk
+        chunks = [data[index:index + 24] for index in range(0, len(data), 24)]
+
+        def stream():
+            compressor = StreamCompressor(encoding)
+            return sum(len(compressor.compress(chunk)) for chunk in chunks) + len(compressor.finish())
+
+        streamed = stream()
+        cost = time_per_call(stream, max(repeat // 10, 5))
+        print(f"{encoding:<10} {'stream':<8} {streamed:>8} {len(data) / streamed:>7.2f} {cost:>9.1f}")
+
+
+def main():
+    """Run the compression benchmark."""
+    for name, data in make_payloads().items():
+        bench_payload(name, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark the BaseHTTPRequestHandler stack on each kind of server.
+
+Each row serves the index handler from a server in its own process and
+drives GET /health from several client processes for a fixed duration:
+
+- TCPServer, HTTP/1.0: how simple_server.py used to serve, one connection at a time
+- ThreadingHTTPServer, HTTP/1.0: a thread and a connection per request
+- PooledHTTPServer, new connection per request
+- PooledHTTPServer, keep-alive connections
+
+The "with slow" column repeats the run while one more client keeps a
+request open on a route that sleeps like a slow OpenAI call; a server that
+serves one connection at a time stalls behind it.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_keepalive [seconds]
+"""
+
+import http.client
+import logging
+import multiprocessing
+import socket
+import socketserver
+import sys
+import time
+from http.server import ThreadingHTTPServer
+
+from api.index import Handler as IndexHandler
+from src.python_ai_bot.httpserver import PooledHTTPServer
+
+SLOW_SECONDS = 0.5
+
+
+class BenchHandler(IndexHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(SLOW_SECONDS)
+            self.path = "/health"
+        super().do_GET()
+
+
+class HTTP10Handler(BenchHandler):
+    protocol_version = "HTTP/1.0"
+
+
+class BenchTCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+SERVERS = {
+    "tcp": (BenchTCPServer, HTTP10Handler),
+    "threading": (ThreadingHTTPServer, HTTP10Handler),
+    "pooled": (PooledHTTPServer, BenchHandler),
+}
+
+
+def serve(kind, port, ready):
+    logging.disable(logging.CRITICAL)
+    server_class, handler_class = SERVERS[kind]
+    server = server_class(("127.0.0.1", port), handler_class)
+    ready.set()
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def hit(port, path, duration, keep_alive):
+    """Send requests until duration has passed and return how many succeeded."""
+    done = 0
+    connection = None
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            done += response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = None
+            continue
+        if not keep_alive or response.will_close:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    return done
+
+
+def run(kind, clients, duration, keep_alive, slow):
+    port = free_port()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(kind, port, ready), daemon=True)
+    server.start()
+    try:
+        ready.wait(30)
+        hit(port, "/health", 0.2, keep_alive)
+        jobs = [(port, "/health", duration, keep_alive)] * clients
+        if slow:
+            jobs.append((port, "/slow", duration, keep_alive))
+        with multiprocessing.Pool(len(jobs)) as pool:
+            counts = pool.starmap(hit, jobs)
+        return sum(counts[:clients]) / duration
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main(duration=5.0):
+    """Run the server comparison benchmark."""
+    clients = 4
+    print(f"{clients} client processes, {duration:.0f}s per cell, slow route sleeps {SLOW_SECONDS}s")
+    print(f"{'server':<42} {'req/s':>8} {'with slow':>10}")
+    rows = (
+        ("TCPServer, HTTP/1.0", "tcp", False),
+        ("ThreadingHTTPServer, HTTP/1.0", "threading", False),
+        ("PooledHTTPServer, new connection each", "pooled", False),
+        ("PooledHTTPServer, keep-alive", "pooled", True),
+    )
+    for name, kind, keep_alive in rows:
+        rate = run(kind, clients, duration, keep_alive, slow=False)
+        slowed = run(kind, clients, duration, keep_alive, slow=True)
+        print(f"{name:<42} {rate:>8.0f} {slowed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 5.0)
@@ -0,0 +1,95 @@
+"""Benchmark how throughput scales with the number of pre-forked workers.
+
+Each row starts start_server.py under the supervisor with the given number
+of workers, sharing one listen socket or each binding its own with
+SO_REUSEPORT, and drives GET /health from several client processes, each over
+fresh connections, for a fixed duration. On a machine with several cores the
+requests per second should grow with the worker count until the clients or
+cores run out.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_prefork
+"""
+
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def hit(port, path, duration):
+    """Send requests until duration has passed and return how many succeeded."""
+    done = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            done += response.status == 200
+        except OSError:
+            pass
+        finally:
+            connection.close()
+    return done
+
+
+def wait_until_serving(port, path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if hit(port, path, 0.01):
+            return
+        time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run(stack, workers, clients, duration, reuse_port=False):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "start_server.py", "--stack", stack, "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(port)] + (["--reuse-port"] if reuse_port else []),
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_serving(port, "/health")
+        # The first worker answering does not mean the others have finished importing
+        time.sleep(3)
+        with multiprocessing.Pool(clients) as pool:
+            counts = pool.starmap(hit, [(port, "/health", duration)] * clients)
+        return sum(counts) / duration
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main(duration=5.0):
+    """Run the worker scaling benchmark."""
+    cpus = os.cpu_count() or 1
+    clients = max(4, cpus * 2)
+    worker_counts = sorted({1, 2, cpus})
+    print(f"{cpus} CPUs, {clients} client processes, {duration:.0f}s per row")
+    print(f"{'stack':<8} {'workers':>7} {'socket':>10} {'req/s':>10}")
+    for stack in ("handler", "fastapi"):
+        for workers in worker_counts:
+            for reuse_port in (False, True) if workers > 1 else (False,):
+                rate = run(stack, workers, clients, duration, reuse_port=reuse_port)
+                mode = "reuseport" if reuse_port else "shared"
+                print(f"{stack:<8} {workers:>7} {mode:>10} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Benchmark what profiling costs when it is off and when it is on.
+
+Runs a CPU-bound request workload, screening a prompt and encoding the
+response, for a fixed duration with:
+
+- no profiler at all
+- the continuous profiler sampling every thread at PROFILE_INTERVAL rates
+- a request profile sampling at the default per-request rate
+
+and reports throughput and the slowdown against the first row. A stopped
+continuous profiler has no thread, so "off" costs nothing in the process; the
+last lines time what every unprofiled request still pays in ProfileMiddleware,
+which only looks for X-Profile when ADMIN_API_KEY is set, against a whole
+GET /health through the FastAPI app, the cheapest request it serves.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_profiling [seconds]
+"""
+
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.api import app
+from src.python_ai_bot.middleware import ProfileMiddleware
+from src.python_ai_bot.profiling import DEFAULT_REQUEST_INTERVAL, ContinuousProfiler, profile_request
+from src.python_ai_bot.screening import Screener
+from src.python_ai_bot.settings import load_settings, set_settings
+
+PROMPT = "Summarize the quarterly report for the board and list the three largest risks. " * 12
+
+
+def workload(screener):
+    screener.scan(PROMPT)
+    return codec.dumps({"text": PROMPT, "usage": {"prompt_tokens": 240, "completion_tokens": 100}})
+
+
+def throughput(duration):
+    screener = Screener()
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        workload(screener)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return runs / elapsed
+
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/health",
+    "raw_path": b"/health",
+    "root_path": "",
+    "query_string": b"",
+    "server": ("127.0.0.1", 8000),
+    "client": ("127.0.0.1", 50000),
+    "headers": [
+        (b"host", b"api.example.com"),
+        (b"accept", b"application/json"),
+        (b"accept-encoding", b"gzip, br"),
+        (b"x-api-key", b"secret"),
+        (b"user-agent", b"bench"),
+    ],
+}
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+def per_request(target, requests):
+    """Microseconds per call of an ASGI app on SCOPE."""
+    async def run():
+        start = time.perf_counter()
+        for _ in range(requests):
+            await target(dict(SCOPE), receive, send)
+        return time.perf_counter() - start
+
+    return asyncio.run(run()) / requests * 1e6
+
+
+def middleware_cost(environ, requests=20000):
+    """Microseconds ProfileMiddleware adds to an unprofiled request, and those of a whole request."""
+    set_settings(load_settings(dict(environ, API_SECRET_KEY="secret")))
+
+    async def bare(scope, receive, send):
+        pass
+
+    added = per_request(ProfileMiddleware(bare), requests) - per_request(bare, requests)
+    per_request(app, requests // 10)
+    return added, per_request(app, requests // 10)
+
+
+def main(duration=3.0):
+    """Run the profiling overhead benchmark."""
+    logging.disable(logging.CRITICAL)
+    print(f"{duration:.0f}s per row")
+    print(f"{'mode':<36} {'req/s':>10} {'overhead':>9}")
+    throughput(duration / 3)
+    baseline = throughput(duration)
+    print(f"{'off':<36} {baseline:>10.0f} {'':>9}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for interval in (0.05, 0.01):
+            profiler = ContinuousProfiler(interval=interval, flush_interval=duration / 2, directory=directory)
+            profiler.start()
+            try:
+                rate = throughput(duration)
+            finally:
+                profiler.stop()
+            label = f"continuous, every {interval * 1000:.0f}ms"
+            print(f"{label:<36} {rate:>10.0f} {1 - rate / baseline:>8.1%}")
+
+        with profile_request("bench", "collapsed", directory=directory):
+            rate = throughput(duration)
+        label = f"request profile, every {DEFAULT_REQUEST_INTERVAL * 1000:.0f}ms"
+        print(f"{label:<36} {rate:>10.0f} {1 - rate / baseline:>8.1%}")
+
+    print("ProfileMiddleware on an unprofiled GET /health:")
+    for label, environ in (("without ADMIN_API_KEY", {}), ("with ADMIN_API_KEY", {"ADMIN_API_KEY": "admin"})):
+        added, whole = middleware_cost(environ)
+        print(f"  {label:<34} {added:>6.2f}us of {whole:.0f}us ({added / whole:.2%})")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0)
@@ -0,0 +1,80 @@
+"""Benchmark prompt screening throughput in MB/s.
+
+Scans synthetic English-like prompts that pass every check (the worst case,
+since nothing stops the scan early) with the built-in rules alone, and with
+blocklists of 1k and 10k terms. Each blocklist is also timed against the
+naive loop of `term in text` checks and against a single compiled regular
+expression alternating over all the terms.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_screening [kilobytes]
+"""
+
+import random
+import re
+import sys
+import time
+
+from src.python_ai_bot.screening import AhoCorasick, Screener
+
+WORDS = (
+    "the of and to in is you that it for was on are with as his they be at one have this from or had by "
+    "word but what some we can out other were all there when up use your how said an each she which do "
+    "their time if will way about many then them write would like so these her long make thing see him "
+    "two has look more day could go come did number sound no most people my over know water than call"
+).split()
+
+
+def make_text(size, rng):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def make_terms(count, rng):
+    # Made-up words, so none of them occur in the text
+    letters = "bcdfghjklmnpqrstvwxz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(5, 10))) for _ in range(count)]
+
+
+def throughput(scan, text, seconds=1.0):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        scan(text)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return len(text) * runs / elapsed / 1e6
+
+
+def report(label, scan, text):
+    print(f"  {label:<24} {throughput(scan, text):8.2f} MB/s")
+
+
+def main(kilobytes=100):
+    """Run the screening throughput benchmark."""
+    rng = random.Random(0)
+    text = make_text(kilobytes * 1000, rng)
+    print(f"{kilobytes} KB prompt")
+    report("rules", Screener().scan, text)
+
+    for count in (1_000, 10_000):
+        terms = make_terms(count, rng)
+        start = time.perf_counter()
+        automaton = AhoCorasick(terms)
+        print(f"{count:,} terms  automaton built in {(time.perf_counter() - start) * 1000:.0f} ms")
+        report("aho-corasick", automaton.find, text)
+        report("rules + aho-corasick", Screener(terms).scan, text)
+        alternation = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\b")
+        report("regex alternation", lambda t: alternation.search(t.lower()), text)
+        report("naive `in`", lambda t: any(term in t.lower() for term in terms), text)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,68 @@
+"""Benchmark an agent turn with several tool calls, one after another and in parallel.
+
+Each simulated tool waits a fixed latency, as a tool calling a remote API
+would. Half of them block a thread and half are coroutines. The sequential
+time is the sum of the latencies; ToolRegistry.run should come close to the
+largest one.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_tools [latency_ms]
+"""
+
+import asyncio
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from src.python_ai_bot.ai.tools import ToolRegistry
+
+
+def make_registry(latency):
+    registry = ToolRegistry(max_workers=16)
+
+    def blocking_tool(n):
+        time.sleep(latency)
+        return n
+
+    async def async_tool(n):
+        await asyncio.sleep(latency)
+        return n
+
+    registry.register(blocking_tool)
+    registry.register(async_tool)
+    return registry
+
+
+def make_calls(count):
+    return [
+        SimpleNamespace(
+            id=f"call_{i}",
+            function=SimpleNamespace(name="blocking_tool" if i % 2 else "async_tool", arguments=json.dumps({"n": i})),
+        )
+        for i in range(count)
+    ]
+
+
+def main(latency_ms=200):
+    """Run the tool execution benchmark."""
+    latency = latency_ms / 1000
+    registry = make_registry(latency)
+    print(f"tool latency {latency_ms} ms")
+    for count in (1, 5, 10):
+        calls = make_calls(count)
+        start = time.perf_counter()
+        for call in calls:
+            registry.run([call])
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        registry.run(calls)
+        parallel = time.perf_counter() - start
+        print(f"  {count:>2} calls  sequential {sequential * 1000:7.1f} ms  parallel {parallel * 1000:7.1f} ms"
+              f"  speedup {sequential / parallel:4.1f}x")
+    registry.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,117 @@
+"""Benchmark prompt throughput over HTTP and over the /ws WebSocket.
+
+Starts the FastAPI server without an OpenAI key, so every prompt gets the
+mock response and the numbers measure what each message costs the transport:
+connection setup, authentication, routing and validation. Rows send the same
+number of prompts:
+
+- HTTP with a new connection per POST /generate, as one-shot clients do
+- HTTP over one keep-alive connection
+- one WebSocket, one prompt at a time
+- one WebSocket with several prompts in flight
+
+Run from the repository root:
+
+    python -m benchmarks.bench_websocket [messages]
+"""
+
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from websockets.sync.client import connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "bench-key"
+HEADERS = {"Content-Type": "application/json", "X-API-Key": API_KEY}
+BODY = json.dumps({"prompt": "Tell me a short joke"})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    env = dict(os.environ, API_SECRET_KEY=API_KEY, RATE_LIMIT_REQUESTS="1000000000", OPENAI_API_KEY="")
+    server = subprocess.Popen(
+        [sys.executable, "start_server.py", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def post(connection):
+    connection.request("POST", "/generate", body=BODY, headers=HEADERS)
+    response = connection.getresponse()
+    response.read()
+    assert response.status == 200, response.status
+
+
+def http_new_connections(port, messages):
+    for _ in range(messages):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        post(connection)
+        connection.close()
+
+
+def http_keep_alive(port, messages):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    for _ in range(messages):
+        post(connection)
+    connection.close()
+
+
+def websocket(port, messages, in_flight=1):
+    with connect(f"ws://127.0.0.1:{port}/ws", additional_headers={"X-API-Key": API_KEY}) as ws:
+        sent = done = 0
+        while done < messages:
+            while sent < messages and sent - done < in_flight:
+                ws.send(json.dumps({"id": sent, "prompt": "Tell me a short joke"}))
+                sent += 1
+            frame = json.loads(ws.recv())
+            assert frame["type"] != "error", frame
+            done += frame["type"] == "done"
+
+
+def main(messages=500):
+    """Run the transport throughput benchmark."""
+    port = free_port()
+    server = start_server(port)
+    rows = [
+        ("HTTP, new connection each", lambda: http_new_connections(port, messages)),
+        ("HTTP, keep-alive", lambda: http_keep_alive(port, messages)),
+        ("WebSocket, 1 in flight", lambda: websocket(port, messages)),
+        ("WebSocket, 8 in flight", lambda: websocket(port, messages, in_flight=8)),
+    ]
+    try:
+        # Warm up imports, caches and the thread pool
+        http_keep_alive(port, 20)
+        websocket(port, 20)
+        print(f"{messages} prompts per row")
+        for name, run in rows:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<27} {messages / elapsed:8.0f} msg/s  {elapsed / messages * 1000:6.2f} ms/msg")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -121,6 +121,9 @@ def run_server(port=8000):
     print(f"Test the API with: curl -H 'X-API-Key: {os.environ.get('API_SECRET_KEY')}' http://localhost:{port}/api/test")
     print(f"Get a JWT token with: curl -H 'X-API-Key: {os.environ.get('API_SECRET_KEY')}' http://localhost:{port}/api/auth?user_id=test_user")
     print(f"Test text generation: curl -H 'X-API-Key: {os.environ.get('API_SECRET_KEY')}' http://localhost:{port}/generate-debug?prompt=Hello")
+    print(f"Reload settings with: kill -HUP {os.getpid()}")
+    from src.python_ai_bot.settings import enable_hot_reload
+    enable_hot_reload()
     httpd.serve_forever()
 
 if __name__ == "__main__":
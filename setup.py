@@ -9,6 +9,11 @@ setup(
     package_dir={"": "src"},
     install_requires=[
         "openai>=1.18.0",
+        "fastapi>=0.110.0",
+        "uvicorn>=0.28.0",
+        "httpx>=0.23.0",
+        "PyJWT>=2.8.0",
+        "numpy>=1.21",
     ],
     python_requires=">=3.6",
     author="Your Name",
@@ -1,10 +1,7 @@
 """Simple direct HTTP server for testing our API."""
 
 import os
-import json
-import http.server
-import socketserver
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse
 
 # Load environment variables
 def load_env():
@@ -20,64 +17,36 @@ def load_env():
 # Import directly from our API files
 from api.direct_test import Handler as DirectTestHandler
 from api.index import Handler as IndexHandler
+from src.python_ai_bot.httpserver import PooledHTTPServer, server_options
+from src.python_ai_bot.settings import enable_hot_reload
 
-class SimpleHandler(http.server.BaseHTTPRequestHandler):
-    """Simple handler that routes requests to the appropriate handler."""
+class SimpleHandler(IndexHandler):
+    """Index handler that also serves the direct test endpoint.
     
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        if path == "/api/test":
-            # Use DirectTestHandler
-            handler = DirectTestHandler(self.request, self.client_address, self.server)
-            handler.do_GET()
-        elif path.startswith("/generate-debug"):
-            # Use IndexHandler
-            handler = IndexHandler(self.request, self.client_address, self.server)
-            handler.do_GET()
-        else:
-            # Default response
-            self.send_response(404)
-            self.send_header("Content-type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            response = {"error": f"Path not found: {path}"}
-            self.wfile.write(json.dumps(response).encode())
+    Routing happens inside one handler, on the request it has already parsed,
+    so keep-alive connections stay in sync.
+    """
     
-    def do_POST(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        if path == "/generate":
-            # Use IndexHandler
-            handler = IndexHandler(self.request, self.client_address, self.server)
-            handler.do_POST()
+    def do_GET(self):
+        if urlparse(self.path).path == "/api/test":
+            DirectTestHandler.do_GET(self)
         else:
-            # Default response
-            self.send_response(404)
-            self.send_header("Content-type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            response = {"error": f"Path not found: {path}"}
-            self.wfile.write(json.dumps(response).encode())
+            super().do_GET()
     
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "X-API-Key, Content-Type, Authorization")
-        self.end_headers()
+    def send_json(self, status_code, payload):
+        self.send_json_response(status_code, payload)
 
 def run_server(port=8000):
     """Run the test server."""
     # Make sure port is not in use
     try:
         server_address = ('', port)
-        httpd = socketserver.TCPServer(server_address, SimpleHandler)
+        # Keep-alive connections served from a bounded thread pool, so one slow call blocks nobody else
+        httpd = PooledHTTPServer(server_address, SimpleHandler, **server_options())
         print(f"Starting simple server on port {port}...")
         print(f"Test the API with: curl -H 'X-API-Key: {os.environ.get('API_SECRET_KEY')}' http://localhost:{port}/api/test")
         print(f"Test text generation: curl -H 'X-API-Key: {os.environ.get('API_SECRET_KEY')}' http://localhost:{port}/generate-debug?prompt=Hello")
+        enable_hot_reload()
         httpd.serve_forever()
     except OSError as e:
         if e.errno == 48:  # Address already in use
@@ -1,24 +1,78 @@
 """OpenAI client module for text generation."""
 
+import array
+import base64
 import logging
-import os
+import sys
+import tempfile
 import time
 from openai import OpenAI
 
+from src.python_ai_bot import codec
+from src.python_ai_bot.cache import make_cache_key
+from src.python_ai_bot.deadline import RequestAborted, check_deadline, get_deadline
+from src.python_ai_bot.degradation import CACHE_HIT, CACHE_MISS, set_cache_status
+from src.python_ai_bot.prompts import get_prompt_registry
+from src.python_ai_bot.settings import get_settings
+from src.python_ai_bot.streaming import emit_token, get_token_sink
+
 logger = logging.getLogger(__name__)
 
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+class BatchError(Exception):
+    """Raised when a Batch API job cannot be submitted or does not complete."""
+
+
+class EmbeddingError(Exception):
+    """Raised when texts cannot be embedded."""
+
+
+def decode_embedding(data):
+    """Decode a base64 embedding, as returned by the API, to a float32 array.
+
+    Args:
+        data (str): Base64 of the little-endian float32 vector.
+
+    Returns:
+        array.array: The vector, with typecode "f".
+    """
+    vector = array.array("f")
+    vector.frombytes(base64.b64decode(data))
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector
+
 
 class OpenAIClient:
     """Client for interacting with OpenAI API."""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, usage_meter=None, cache=None, base_url=None, degradation=None, http_client=None):
         """Initialize the OpenAI client.
         
         Args:
             api_key (str, optional): OpenAI API key. Defaults to None, in which case
                 it will be read from the OPENAI_API_KEY environment variable.
+            usage_meter (UsageMeter, optional): Meter that records the token usage
+                of every completion. Defaults to None.
+            cache (ResponseCache, optional): Cache consulted by generate_text before
+                calling the API. Defaults to None.
+            base_url (str, optional): API base URL. Defaults to None, in which case
+                the SDK default (or OPENAI_BASE_URL) is used.
+            degradation (DegradationPolicy, optional): Policy that serves stale cached
+                completions while upstream is degraded. Only used with a cache. Defaults to None.
+            http_client (httpx.Client, optional): Client whose connection pool is used for
+                API calls. Defaults to None, in which case the SDK builds its own.
         """
-        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.api_key = api_key or get_settings().openai_api_key
+        self.usage_meter = usage_meter
+        self.cache = cache
+        self.base_url = base_url
+        self.degradation = degradation
+        self.http_client = http_client
         self.client = None
         
         if not self.api_key:
@@ -27,18 +81,70 @@ class OpenAIClient:
         
         # Simple initialization without any extra parameters
         try:
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=self.http_client)
             logger.info("OpenAI client initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing OpenAI client: {str(e)}")
     
-    def generate_text(self, prompt, model="gpt-3.5-turbo", max_tokens=100):
+    def generate_text(self, prompt, model="gpt-3.5-turbo", max_tokens=100, tenant=None, template=None):
         """Generate text using OpenAI's API.
         
         Args:
             prompt (str): The text prompt to generate from.
             model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
             max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+            template (str, optional): Prompt template name or name@version. Defaults to None,
+                in which case the default template is used.
+            
+        Returns:
+            str: The generated text or error message.
+        """
+        try:
+            messages = get_prompt_registry().get(template).render(prompt)
+        except KeyError as e:
+            return f"Error: {e.args[0]}"
+        
+        set_cache_status(None)
+        if self.cache is None:
+            return self.generate_chat(messages, model=model, max_tokens=max_tokens, tenant=tenant)
+        
+        cache_key = make_cache_key(model, messages, max_tokens)
+        if self.degradation is None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                set_cache_status(CACHE_HIT)
+                return cached
+            text = self.generate_chat(messages, model=model, max_tokens=max_tokens, tenant=tenant)
+            if not text.startswith("Error:"):
+                self.cache.set(cache_key, text)
+            set_cache_status(CACHE_MISS)
+            return text
+        
+        def fetch():
+            text = self.generate_chat(messages, model=model, max_tokens=max_tokens, tenant=tenant)
+            if text.startswith("Error:"):
+                # An abandoned request is not an upstream failure
+                check_deadline()
+                raise RuntimeError(text)
+            return text
+        
+        try:
+            text, status = self.degradation.serve(self.cache, cache_key, fetch)
+        except Exception as e:
+            message = str(e)
+            return message if message.startswith("Error:") else f"Error: {message}"
+        set_cache_status(status)
+        return text
+    
+    def generate_chat(self, messages, model="gpt-3.5-turbo", max_tokens=100, tenant=None):
+        """Generate the next assistant message for a conversation.
+        
+        Args:
+            messages (list): Chat messages as dicts with "role" and "content" keys.
+            model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
             
         Returns:
             str: The generated text or error message.
@@ -47,28 +153,388 @@ class OpenAIClient:
         if not self.client and self.api_key:
             logger.info("Attempting to initialize client on demand")
             try:
-                self.client = OpenAI(api_key=self.api_key)
+                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=self.http_client)
             except Exception as e:
                 logger.error(f"Error initializing client on demand: {str(e)}")
             
         if not self.client:
             return "Error: OpenAI client not initialized properly"
         
+        deadline = get_deadline()
+        if deadline is not None or get_token_sink() is not None:
+            return self._stream_chat(messages, model, max_tokens, tenant, deadline)
+        
         try:
             logger.info(f"Generating text with model {model}")
             
             # Simple approach without retries
             response = self.client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 max_tokens=max_tokens
             )
+            self._record_usage(response, tenant)
             
             return response.choices[0].message.content.strip()
             
         except Exception as e:
             logger.error(f"Error generating text: {str(e)}")
-            return f"Error: {str(e)}" 
\ No newline at end of file
+            return f"Error: {str(e)}"
+    
+    def _stream_chat(self, messages, model, max_tokens, tenant, deadline):
+        """Generate a completion as a stream, stopping as soon as the request is abandoned.
+        
+        The time left on the deadline is the upstream timeout, without retries.
+        Closing the stream when the client disconnects or the deadline passes
+        stops OpenAI generating, and billing, the rest of the completion.
+        Each piece of text is also passed to the request's token sink.
+        """
+        try:
+            client = self.client
+            if deadline is not None:
+                deadline.check()
+                client = client.with_options(max_retries=0)
+                remaining = deadline.remaining()
+                if remaining is not None:
+                    client = client.with_options(timeout=remaining)
+            
+            logger.info(f"Streaming text with model {model}")
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=True,
+                extra_body={"stream_options": {"include_usage": True}},
+            )
+            parts = []
+            usage = None
+            with stream:
+                for chunk in stream:
+                    if deadline is not None:
+                        deadline.check()
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        emit_token(chunk.choices[0].delta.content)
+                    usage = getattr(chunk, "usage", None) or usage
+            self._record_usage(None, tenant, usage=usage)
+            return "".join(parts).strip()
+        except RequestAborted as e:
+            logger.warning(f"Stopped generating text: {str(e)}")
+            return f"Error: {str(e)}"
+        except Exception as e:
+            logger.error(f"Error generating text: {str(e)}")
+            return f"Error: {str(e)}"
+    
+    def generate_with_tools(self, messages, tools, model="gpt-3.5-turbo", max_tokens=100, tenant=None, max_rounds=5):
+        """Generate a reply, running the tools the model calls along the way.
+
+        Each round sends the conversation with the tool definitions. When the
+        model answers with tool calls, they run concurrently and their results
+        are appended for the next round; when it answers with text, that is
+        the reply.
+
+        Args:
+            messages (list): Chat messages as dicts with "role" and "content" keys.
+            tools (ToolRegistry): Tools the model may call.
+            model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
+            max_tokens (int, optional): Maximum number of tokens per completion. Defaults to 100.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+            max_rounds (int, optional): Completions allowed before giving up. Defaults to 5.
+
+        Returns:
+            str: The generated text or error message.
+        """
+        if not self.client:
+            return "Error: OpenAI client not initialized properly"
+
+        messages = list(messages)
+        try:
+            for _ in range(max_rounds):
+                check_deadline()
+                client = self.client
+                deadline = get_deadline()
+                if deadline is not None and deadline.remaining() is not None:
+                    client = client.with_options(max_retries=0, timeout=deadline.remaining())
+
+                logger.info(f"Generating text with {len(tools)} tools and model {model}")
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    tools=tools.schemas(),
+                )
+                self._record_usage(response, tenant)
+                message = response.choices[0].message
+                if not message.tool_calls:
+                    return (message.content or "").strip()
+
+                messages.append({
+                    "role": "assistant",
+                    "content": message.content,
+                    "tool_calls": [
+                        {
+                            "id": call.id,
+                            "type": "function",
+                            "function": {"name": call.function.name, "arguments": call.function.arguments},
+                        }
+                        for call in message.tool_calls
+                    ],
+                })
+                logger.info(f"Running {len(message.tool_calls)} tool calls")
+                messages.extend(tools.run(message.tool_calls))
+        except RequestAborted as e:
+            logger.warning(f"Stopped generating text: {str(e)}")
+            return f"Error: {str(e)}"
+        except Exception as e:
+            logger.error(f"Error generating text: {str(e)}")
+            return f"Error: {str(e)}"
+        return f"Error: No reply after {max_rounds} rounds of tool calls"
+
+    def _record_usage(self, response, tenant, usage=None):
+        """Record the usage block of a completion with the usage meter."""
+        usage = usage or getattr(response, "usage", None)
+        if not self.usage_meter or not usage:
+            return
+        if isinstance(usage, dict):
+            # The final chunk of a stream carries usage as an untyped extra field
+            self.usage_meter.record(
+                tenant or "anonymous",
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                cached_prompt_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+            )
+            return
+        # Older SDK versions keep prompt_tokens_details as an untyped extra field
+        details = getattr(usage, "prompt_tokens_details", None) or {}
+        if isinstance(details, dict):
+            cached_tokens = details.get("cached_tokens", 0)
+        else:
+            cached_tokens = getattr(details, "cached_tokens", 0)
+        self.usage_meter.record(
+            tenant or "anonymous",
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_prompt_tokens=cached_tokens or 0,
+        )
+    
+    def embed(self, texts, model=DEFAULT_EMBEDDING_MODEL, dimensions=None, tenant=None):
+        """Embed texts with one API call.
+        
+        Vectors are requested base64-encoded and decoded straight into float32
+        arrays, which skips parsing thousands of floats from JSON per text.
+        
+        Args:
+            texts (list): Texts to embed.
+            model (str, optional): The embedding model. Defaults to "text-embedding-3-small".
+            dimensions (int, optional): Length to shorten the vectors to. Defaults to None
+                (the model's full length).
+            tenant (str or list, optional): Tenant the token usage is billed to, or one
+                tenant per text, in which case the tokens are split in proportion to the
+                length of each text. Defaults to None.
+            
+        Returns:
+            list: One array.array("f") per text, in order.
+            
+        Raises:
+            EmbeddingError: If the client is not initialized or the call fails.
+        """
+        if not self.client:
+            raise EmbeddingError("OpenAI client not initialized properly")
+        if not texts:
+            return []
+        
+        options = {"dimensions": dimensions} if dimensions else {}
+        try:
+            logger.info(f"Embedding {len(texts)} texts with model {model}")
+            response = self.client.embeddings.create(
+                model=model,
+                input=list(texts),
+                encoding_format="base64",
+                **options,
+            )
+        except Exception as e:
+            raise EmbeddingError(f"Error embedding texts: {str(e)}")
+        
+        vectors = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = decode_embedding(item.embedding)
+        self._record_embedding_usage(response, texts, tenant)
+        return vectors
+    
+    def _record_embedding_usage(self, response, texts, tenant):
+        """Record the prompt tokens of an embeddings call, split between tenants."""
+        usage = getattr(response, "usage", None)
+        if not self.usage_meter or not usage:
+            return
+        tenants = tenant if isinstance(tenant, (list, tuple)) else [tenant] * len(texts)
+        shares = {}
+        for text, owner in zip(texts, tenants):
+            shares[owner or "anonymous"] = shares.get(owner or "anonymous", 0) + len(text) + 1
+        total = sum(shares.values())
+        remaining = usage.prompt_tokens
+        for i, (owner, share) in enumerate(shares.items()):
+            tokens = remaining if i == len(shares) - 1 else round(usage.prompt_tokens * share / total)
+            remaining -= tokens
+            self.usage_meter.record(owner, prompt_tokens=tokens, completion_tokens=0)
+    
+    def write_batch_file(self, items, f, model="gpt-3.5-turbo", max_tokens=100, template=None):
+        """Write Batch API request lines for a stream of prompts.
+        
+        Args:
+            items (iterable): (custom_id, prompt) pairs.
+            f (file): Binary file the JSONL request lines are written to.
+            model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
+            template (str, optional): Prompt template name or name@version. Defaults to None.
+            
+        Returns:
+            int: Number of requests written.
+        """
+        prompt_template = get_prompt_registry().get(template)
+        count = 0
+        for custom_id, prompt in items:
+            f.write(codec.dumps({
+                "custom_id": str(custom_id),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {"model": model, "messages": prompt_template.render(prompt), "max_tokens": max_tokens},
+            }))
+            f.write(b"\n")
+            count += 1
+        return count
+    
+    def submit_batch(self, items, model="gpt-3.5-turbo", max_tokens=100, template=None, metadata=None):
+        """Upload a request file and start a Batch API job.
+        
+        The request file is spooled to a temporary file, so large inputs are
+        never held in memory.
+        
+        Args:
+            items (iterable): (custom_id, prompt) pairs.
+            model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
+            template (str, optional): Prompt template name or name@version. Defaults to None.
+            metadata (dict, optional): Metadata attached to the batch. Defaults to None.
+            
+        Returns:
+            str: The batch id.
+            
+        Raises:
+            BatchError: If the client is not initialized, there are no items or the upload fails.
+        """
+        if not self.client:
+            raise BatchError("OpenAI client not initialized properly")
+        
+        with tempfile.TemporaryFile() as f:
+            count = self.write_batch_file(items, f, model=model, max_tokens=max_tokens, template=template)
+            if not count:
+                raise BatchError("No requests to submit")
+            f.seek(0)
+            try:
+                input_file = self.client.files.create(file=("batch_requests.jsonl", f), purpose="batch")
+                batch = self.client.batches.create(
+                    input_file_id=input_file.id,
+                    endpoint=BATCH_ENDPOINT,
+                    completion_window="24h",
+                    metadata=metadata,
+                )
+            except Exception as e:
+                raise BatchError(f"Error submitting batch: {str(e)}")
+        
+        logger.info(f"Submitted batch {batch.id} with {count} requests")
+        return batch.id
+    
+    def wait_for_batch(self, batch_id, poll_interval=5.0, max_poll_interval=60.0, timeout=None, sleep=time.sleep):
+        """Poll a batch with exponential backoff until it finishes.
+        
+        Args:
+            batch_id (str): The batch id.
+            poll_interval (float, optional): Seconds before the first poll. Defaults to 5.0.
+            max_poll_interval (float, optional): Longest wait between polls. Defaults to 60.0.
+            timeout (float, optional): Seconds to wait in total. Defaults to None (no limit).
+            sleep (callable, optional): Sleep function. Defaults to time.sleep.
+            
+        Returns:
+            Batch: The finished batch.
+            
+        Raises:
+            BatchError: If the batch does not complete successfully or in time.
+        """
+        started = time.monotonic()
+        interval = poll_interval
+        while True:
+            try:
+                batch = self.client.batches.retrieve(batch_id)
+            except Exception as e:
+                # Transient polling errors are retried like an unfinished batch
+                logger.warning(f"Error polling batch {batch_id}: {str(e)}")
+                batch = None
+            
+            if batch is not None and batch.status in BATCH_TERMINAL_STATUSES:
+                if batch.status != "completed":
+                    raise BatchError(f"Batch {batch_id} {batch.status}")
+                return batch
+            
+            if timeout is not None and time.monotonic() - started + interval > timeout:
+                raise BatchError(f"Timed out waiting for batch {batch_id}")
+            sleep(interval)
+            interval = min(interval * 2, max_poll_interval)
+    
+    def iter_batch_results(self, batch, tenant=None):
+        """Stream the results of a finished batch.
+        
+        Output and error files are parsed line by line as they download,
+        and the token usage of every completion is recorded.
+        
+        Args:
+            batch (Batch): A completed batch, as returned by wait_for_batch.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+            
+        Yields:
+            tuple: (custom_id, text), where text is an "Error: ..." string for failed requests.
+        """
+        for file_id in (batch.output_file_id, getattr(batch, "error_file_id", None)):
+            if not file_id:
+                continue
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield self._parse_batch_line(codec.loads(line), tenant)
+    
+    def run_batch(self, items, model="gpt-3.5-turbo", max_tokens=100, template=None, tenant=None, **wait_options):
+        """Submit prompts as a Batch API job, wait for it and stream the results.
+        
+        Args:
+            items (iterable): (custom_id, prompt) pairs.
+            model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
+            template (str, optional): Prompt template name or name@version. Defaults to None.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+            **wait_options: Passed on to wait_for_batch.
+            
+        Yields:
+            tuple: (custom_id, text) for every request, in completion order.
+        """
+        batch_id = self.submit_batch(items, model=model, max_tokens=max_tokens, template=template)
+        batch = self.wait_for_batch(batch_id, **wait_options)
+        yield from self.iter_batch_results(batch, tenant=tenant)
+    
+    def _parse_batch_line(self, result, tenant):
+        """Turn one Batch API result line into (custom_id, text)."""
+        custom_id = result.get("custom_id")
+        response = result.get("response") or {}
+        body = response.get("body") or {}
+        error = result.get("error") or body.get("error")
+        if error or response.get("status_code") != 200:
+            message = error.get("message") if isinstance(error, dict) else error
+            return custom_id, f"Error: {message or 'status ' + str(response.get('status_code'))}"
+        
+        usage = body.get("usage") or {}
+        if self.usage_meter and usage:
+            self.usage_meter.record(
+                tenant or "anonymous",
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                cached_prompt_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+            )
+        return custom_id, body["choices"][0]["message"]["content"].strip()
@@ -0,0 +1,293 @@
+"""Tool registry and parallel tool execution for function-calling models.
+
+Python functions are registered with the JSON schema of their arguments,
+and their schemas are sent with chat completions. When the model asks for
+several tools in one turn, the calls run concurrently: coroutine functions
+together on an event loop, blocking functions on a thread pool. An agent
+turn with five tool calls then takes as long as the slowest one rather than
+the sum of all five.
+
+Each tool has a timeout, bounded by the request deadline, and may cache its
+results for a number of seconds, keyed by its arguments.
+"""
+
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.python_ai_bot.cache import ResponseCache
+from src.python_ai_bot.deadline import upstream_timeout
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_TIMEOUT = 10.0
+
+
+class ToolError(Exception):
+    """Raised when a tool call cannot be run or does not finish."""
+
+
+def make_tool_cache_key(name, arguments):
+    """Build the cache key for a tool call.
+
+    Args:
+        name (str): Tool name.
+        arguments (dict): Decoded arguments.
+
+    Returns:
+        str: Hex digest identifying the call.
+    """
+    payload = json.dumps([name, arguments], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Tool:
+    """A Python function the model can call."""
+
+    def __init__(self, name, function, description="", parameters=None, timeout=DEFAULT_TOOL_TIMEOUT, cache_ttl=0):
+        """Initialize the tool.
+
+        Args:
+            name (str): Name the model calls the tool by.
+            function (callable): Function or coroutine function, called with the
+                arguments as keyword arguments.
+            description (str, optional): What the tool does, for the model. Defaults to "".
+            parameters (dict, optional): JSON schema of the arguments. Defaults to None
+                (no arguments).
+            timeout (float, optional): Seconds a call may take. Defaults to 10.
+            cache_ttl (float, optional): Seconds results are cached for, 0 to not
+                cache them. Defaults to 0.
+        """
+        self.name = name
+        self.function = function
+        self.description = description
+        self.parameters = parameters or {"type": "object", "properties": {}}
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.is_async = asyncio.iscoroutinefunction(function)
+
+    def schema(self):
+        """Get the tool definition sent to the chat completions API."""
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+    def parse_arguments(self, arguments):
+        """Decode and check the arguments of a call.
+
+        Args:
+            arguments (str or dict): Arguments as sent by the model, a JSON object.
+
+        Returns:
+            dict: The arguments.
+
+        Raises:
+            ToolError: If they are not a JSON object or a required argument is missing.
+        """
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments.strip() else {}
+            except ValueError as e:
+                raise ToolError(f"Invalid arguments for tool {self.name}: {str(e)}")
+        if not isinstance(arguments, dict):
+            raise ToolError(f"Arguments for tool {self.name} must be a JSON object")
+        missing = [key for key in self.parameters.get("required", ()) if key not in arguments]
+        if missing:
+            raise ToolError(f"Missing arguments for tool {self.name}: {', '.join(missing)}")
+        return arguments
+
+
+def format_result(result):
+    """Turn a tool's return value into message content: strings as they are, anything else as JSON."""
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, default=str)
+
+
+def _call_parts(call):
+    """Get the id, tool name and arguments of an SDK tool call object or its dict form."""
+    if isinstance(call, dict):
+        function = call.get("function") or {}
+        return call.get("id"), function.get("name"), function.get("arguments")
+    return call.id, call.function.name, call.function.arguments
+
+
+class ToolRegistry:
+    """Tools available to the model, and the executor that runs their calls."""
+
+    def __init__(self, max_workers=8, cache=None):
+        """Initialize the registry.
+
+        Args:
+            max_workers (int, optional): Threads running blocking tools. Defaults to 8.
+            cache (ResponseCache, optional): Cache of tool results. Defaults to None, in
+                which case an in-memory cache is used.
+        """
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else ResponseCache(memory_entries=1024)
+        self._tools = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def register(self, function=None, *, name=None, description=None, parameters=None,
+                 timeout=DEFAULT_TOOL_TIMEOUT, cache_ttl=0):
+        """Register a function as a tool, directly or as a decorator.
+
+        Args:
+            function (callable, optional): Function or coroutine function. Defaults to None,
+                in which case a decorator is returned.
+            name (str, optional): Tool name. Defaults to None (the function's name).
+            description (str, optional): What the tool does. Defaults to None (the first
+                line of the function's docstring).
+            parameters (dict, optional): JSON schema of the arguments. Defaults to None.
+            timeout (float, optional): Seconds a call may take. Defaults to 10.
+            cache_ttl (float, optional): Seconds results are cached for. Defaults to 0.
+
+        Returns:
+            The function, unchanged, or a decorator registering one.
+        """
+        if function is None:
+            return functools.partial(
+                self.register, name=name, description=description, parameters=parameters,
+                timeout=timeout, cache_ttl=cache_ttl,
+            )
+        if description is None:
+            description = ((function.__doc__ or "").strip().splitlines() or [""])[0]
+        tool = Tool(name or function.__name__, function, description, parameters, timeout, cache_ttl)
+        self._tools[tool.name] = tool
+        return function
+
+    def get(self, name):
+        """Get a tool by name, or None."""
+        return self._tools.get(name)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __len__(self):
+        return len(self._tools)
+
+    def schemas(self):
+        """Get the definitions of every tool, for the tools parameter of a chat completion."""
+        return [tool.schema() for tool in self._tools.values()]
+
+    async def call(self, name, arguments):
+        """Run one tool call, from the cache when possible.
+
+        Args:
+            name (str): Tool name.
+            arguments (str or dict): Arguments as sent by the model.
+
+        Returns:
+            str: The result, as message content.
+
+        Raises:
+            ToolError: If the tool is unknown, the arguments are invalid, or the call
+                fails or times out.
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ToolError(f"Unknown tool: {name}")
+        arguments = tool.parse_arguments(arguments)
+        cache_key = make_tool_cache_key(name, arguments) if tool.cache_ttl > 0 else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        timeout = upstream_timeout(tool.timeout)
+        try:
+            if tool.is_async:
+                pending = tool.function(**arguments)
+            else:
+                # Threads do not inherit context variables, so pass the deadline along
+                context = contextvars.copy_context()
+                pending = asyncio.get_running_loop().run_in_executor(
+                    self._executor, functools.partial(context.run, tool.function, **arguments)
+                )
+            result = format_result(await asyncio.wait_for(pending, timeout))
+        except asyncio.TimeoutError:
+            # A blocking tool cannot be interrupted; its thread finishes in the background
+            raise ToolError(f"Tool {name} timed out after {timeout:g}s")
+        except ToolError:
+            raise
+        except Exception as e:
+            raise ToolError(f"Tool {name} failed: {str(e)}")
+
+        if cache_key is not None:
+            self.cache.set(cache_key, result, ttl=tool.cache_ttl)
+        return result
+
+    async def execute(self, tool_calls):
+        """Run the tool calls of one assistant turn concurrently.
+
+        Failures are reported to the model as "Error: ..." content rather than
+        raised, so it can retry or answer without the tool. Identical calls in
+        the same turn run once.
+
+        Args:
+            tool_calls (list): Tool calls from the assistant message, as SDK objects or dicts.
+
+        Returns:
+            list: One "tool" message per call, in order.
+        """
+        runs = {}
+        calls = []
+        for call in tool_calls:
+            call_id, name, arguments = _call_parts(call)
+            key = (name, arguments if isinstance(arguments, str) else json.dumps(arguments, sort_keys=True))
+            if key not in runs:
+                runs[key] = asyncio.ensure_future(self._call_safely(name, arguments))
+            calls.append((call_id, runs[key]))
+        await asyncio.gather(*runs.values())
+        return [{"role": "tool", "tool_call_id": call_id, "content": run.result()} for call_id, run in calls]
+
+    async def _call_safely(self, name, arguments):
+        try:
+            return await self.call(name, arguments)
+        except ToolError as e:
+            logger.warning(f"Error calling tool: {str(e)}")
+            return f"Error: {str(e)}"
+
+    def run(self, tool_calls):
+        """Run tool calls from synchronous code, such as a request handler thread.
+
+        Args:
+            tool_calls (list): Tool calls from the assistant message.
+
+        Returns:
+            list: One "tool" message per call, in order.
+        """
+        return asyncio.run(self.execute(tool_calls))
+
+    def close(self):
+        """Stop the thread pool, without waiting for abandoned calls."""
+        self._executor.shutdown(wait=False)
+
+
+_tool_registry = None
+_tool_registry_lock = threading.Lock()
+
+
+def get_tool_registry():
+    """Get the process-wide tool registry, configured from environment variables.
+
+    Returns:
+        ToolRegistry: The shared registry.
+    """
+    global _tool_registry
+    if _tool_registry is None:
+        with _tool_registry_lock:
+            if _tool_registry is None:
+                cache = ResponseCache(memory_entries=int(os.environ.get("TOOL_CACHE_ENTRIES", "1024")))
+                _tool_registry = ToolRegistry(
+                    max_workers=int(os.environ.get("TOOL_MAX_WORKERS", "8")),
+                    cache=cache,
+                )
+    return _tool_registry
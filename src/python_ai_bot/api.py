@@ -1,12 +1,42 @@
 """API server module for the project."""
 
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Optional
 
+from src.python_ai_bot import codec
+from src.python_ai_bot.ai.openai_client import DEFAULT_EMBEDDING_MODEL, EmbeddingError
+from src.python_ai_bot.deadline import (
+    TIMEOUT_HEADER,
+    ClientDisconnected,
+    DeadlineExceeded,
+    deadline_scope,
+    parse_timeout,
+)
+from src.python_ai_bot.degradation import cache_headers, get_cache_status, set_cache_status
+from src.python_ai_bot.embeddings import ENCODING_BINARY, ENCODINGS, encode_vector, get_embedding_batcher, vector_bytes
+from src.python_ai_bot.jobs import JobQueueFull, JobStoreUnavailable, get_job_queue, job_view
 from src.python_ai_bot.main import main
+from src.python_ai_bot.middleware import (
+    CodecMiddleware,
+    CompressionMiddleware,
+    EarlyRejectMiddleware,
+    ProfileMiddleware,
+    verified_tenant,
+)
+from src.python_ai_bot.profiling import ADMIN_KEY_HEADER, enable_profiling_signal, get_profiler, is_admin, run_in_threadpool
+from src.python_ai_bot.prompts import get_prompt_registry
+from src.python_ai_bot.retrieval import build_prompt, get_retriever
+from src.python_ai_bot.screening import get_screener
+from src.python_ai_bot.sessions import get_session_manager
+from src.python_ai_bot.settings import enable_hot_reload, get_settings
+from src.python_ai_bot.usage import get_usage_meter
+from src.python_ai_bot.warmup import readiness, start_warm_up
+from src.python_ai_bot.ws import ChatConnection, connection_options
 
 # Configure logging
 logging.basicConfig(
@@ -15,11 +45,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class CodecJSONResponse(JSONResponse):
+    """JSON response rendered through the shared codec layer."""
+    
+    def render(self, content) -> bytes:
+        return codec.dumps(content)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Python AI Bot API",
     description="API for generating text using OpenAI",
     version="0.1.0",
+    default_response_class=CodecJSONResponse,
 )
 
 # Add CORS middleware to allow cross-origin requests
@@ -31,6 +69,18 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Offer MessagePack to callers that ask for it
+app.add_middleware(CodecMiddleware)
+
+# Compress large responses and accept compressed request bodies
+app.add_middleware(CompressionMiddleware)
+
+# Profile single requests for admins, including compression and encoding
+app.add_middleware(ProfileMiddleware)
+
+# Rate limit, authenticate and size-check requests from their headers, before anything reads the body
+app.add_middleware(EarlyRejectMiddleware)
+
 
 class PromptRequest(BaseModel):
     """Request model for the text generation endpoint."""
@@ -39,6 +89,8 @@ class PromptRequest(BaseModel):
     max_tokens: Optional[int] = 100
     model: Optional[str] = "gpt-3.5-turbo"
     use_mock_fallback: Optional[bool] = True
+    template: Optional[str] = None
+    timeout_ms: Optional[int] = None
 
 
 class TextResponse(BaseModel):
@@ -47,6 +99,218 @@ class TextResponse(BaseModel):
     text: str
 
 
+class EmbedRequest(BaseModel):
+    """Request model for the embeddings endpoint."""
+    
+    text: str
+    model: Optional[str] = DEFAULT_EMBEDDING_MODEL
+    dimensions: Optional[int] = None
+    encoding: Optional[str] = "float"
+
+
+class JobRequest(BaseModel):
+    """Request model for the jobs endpoint."""
+    
+    prompt: str
+    max_tokens: Optional[int] = 100
+    model: Optional[str] = "gpt-3.5-turbo"
+    use_mock_fallback: Optional[bool] = True
+    template: Optional[str] = None
+    webhook_url: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    """Response model for the jobs endpoints."""
+    
+    job_id: str
+    status: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    text: Optional[str] = None
+    error: Optional[str] = None
+    webhook: Optional[Dict[str, Any]] = None
+
+
+def get_tenant(request: Request) -> str:
+    """Resolve the tenant a request is billed to.
+    
+    Uses the verified JWT subject, then the tenant of the API key, then the client address.
+    """
+    payload = getattr(request.state, "jwt_payload", None)
+    tenant = verified_tenant(get_settings(), request.headers.get("X-API-Key", ""), payload)
+    if tenant:
+        return tenant
+    return request.client.host if request.client else "anonymous"
+
+
+def enforce_quota(tenant: str = Depends(get_tenant)) -> str:
+    """Reject requests from tenants that have used up their token quota."""
+    is_allowed, message = get_usage_meter().check_quota(tenant)
+    if not is_allowed:
+        raise HTTPException(status_code=429, detail=message)
+    return tenant
+
+
+class DocumentRequest(BaseModel):
+    """Request model for adding a document to the retrieval index."""
+    
+    id: str
+    text: str
+
+
+class DocumentResponse(BaseModel):
+    """Response model for an indexed document."""
+    
+    id: str
+    chunks: int
+
+
+class AskRequest(BaseModel):
+    """Request model for answering a question from indexed documents."""
+    
+    question: str
+    k: Optional[int] = 4
+    max_tokens: Optional[int] = 300
+    model: Optional[str] = "gpt-3.5-turbo"
+    use_mock_fallback: Optional[bool] = True
+    timeout_ms: Optional[int] = None
+
+
+class Source(BaseModel):
+    """A retrieved chunk an answer was grounded in."""
+    
+    document: str
+    position: int
+    score: float
+
+
+class AskResponse(BaseModel):
+    """Response model for the question answering endpoint."""
+    
+    text: str
+    sources: List[Source]
+
+
+class SessionRequest(BaseModel):
+    """Request model for creating a conversation session."""
+    
+    system: Optional[str] = None
+
+
+class SessionResponse(BaseModel):
+    """Response model for a created conversation session."""
+    
+    session_id: str
+
+
+class SessionMessageRequest(BaseModel):
+    """Request model for sending a message to a session."""
+    
+    content: str
+    max_tokens: Optional[int] = 100
+    model: Optional[str] = "gpt-3.5-turbo"
+    timeout_ms: Optional[int] = None
+
+
+class SessionMessageResponse(BaseModel):
+    """Response model for a session reply."""
+    
+    session_id: str
+    text: str
+
+
+class ProfilingRequest(BaseModel):
+    """Request model for switching the continuous profiler."""
+    
+    enabled: bool
+
+
+def require_admin(request: Request) -> None:
+    """Reject requests without the ADMIN_API_KEY in the X-Admin-Key header."""
+    if not is_admin(request.headers.get(ADMIN_KEY_HEADER, "")):
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+
+def check_template(template: Optional[str]) -> None:
+    """Reject requests naming a prompt template that is not registered."""
+    if template is not None and template not in get_prompt_registry():
+        raise HTTPException(status_code=400, detail=f"Unknown prompt template: {template}")
+
+
+def screen_prompt(prompt: str) -> None:
+    """Reject prompts that fail local screening, naming the rule but not the matched text."""
+    match = get_screener().scan(prompt)
+    if match is not None:
+        logger.warning(f"Prompt blocked by screening rule {match.rule}")
+        raise HTTPException(status_code=400, detail=f"Prompt blocked by screening rule: {match.rule}")
+
+
+def request_timeout(http_request: Request, timeout_ms: Optional[int] = None) -> Optional[float]:
+    """Read the client's deadline from the X-Request-Timeout header or a timeout_ms field."""
+    try:
+        return parse_timeout(http_request.headers.get(TIMEOUT_HEADER), timeout_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def generate_within_deadline(http_request: Request, timeout: Optional[float], generate=None, **kwargs) -> str:
+    """Run generate(**kwargs), main() by default, in a worker thread under the client's deadline.
+    
+    The upstream call is abandoned, and its stream closed, when the deadline
+    passes or the client disconnects.
+    
+    Raises:
+        DeadlineExceeded: If the deadline passed first.
+        ClientDisconnected: If the client went away first.
+    """
+    with deadline_scope(timeout) as deadline:
+        def run():
+            # The worker thread has its own copy of the context, so hand the cache status back
+            return (generate or main)(**kwargs), get_cache_status()
+
+        task = asyncio.ensure_future(run_in_threadpool(run))
+        while not task.done():
+            await asyncio.wait({task}, timeout=0.1)
+            if not task.done() and await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling upstream work")
+                deadline.cancel()
+        result, status = await task
+    set_cache_status(status)
+    return result
+
+
+def set_cache_headers(response: Response):
+    """Tell the client whether the completion came from the cache, and whether it was stale."""
+    for name, value in cache_headers():
+        response.headers[name] = value
+
+
+@app.on_event("startup")
+async def compile_prompt_templates():
+    """Load and compile the prompt templates once, before the first request."""
+    registry = get_prompt_registry()
+    logger.info(f"Prompt templates: {', '.join(registry.names())}")
+
+
+@app.on_event("startup")
+async def load_settings_snapshot():
+    """Load the settings snapshot and reload it on SIGHUP or settings file changes."""
+    enable_hot_reload()
+
+
+@app.on_event("startup")
+async def start_profiling():
+    """Start continuous profiling if PROFILE_CONTINUOUS is set, and toggle it on SIGUSR2."""
+    enable_profiling_signal()
+
+
+@app.on_event("startup")
+async def begin_warm_up():
+    """Warm up in the background so /health answers while /ready waits for it."""
+    start_warm_up()
+
+
 @app.get("/")
 async def root():
     """Root endpoint for the API."""
@@ -54,24 +318,47 @@ async def root():
 
 
 @app.post("/generate", response_model=TextResponse)
-async def generate_text(request: PromptRequest):
+async def generate_text(
+    request: PromptRequest,
+    response: Response,
+    http_request: Request,
+    tenant: str = Depends(enforce_quota),
+):
     """Generate text using OpenAI's API.
     
+    The client may bound the call with an X-Request-Timeout header (seconds)
+    or a timeout_ms field; past it the request fails with 504.
+    
     Args:
         request: The request containing the prompt and generation parameters.
         
     Returns:
         A response containing the generated text.
     """
+    check_template(request.template)
+    screen_prompt(request.prompt)
+    timeout = request_timeout(http_request, request.timeout_ms)
     try:
         logger.info(f"Received prompt: {request.prompt}")
-        result = main(
+        result = await generate_within_deadline(
+            http_request,
+            timeout,
             prompt=request.prompt,
             model=request.model,
             max_tokens=request.max_tokens,
-            use_mock_fallback=request.use_mock_fallback
+            use_mock_fallback=request.use_mock_fallback,
+            tenant=tenant,
+            template=request.template,
         )
+        set_cache_headers(response)
         return TextResponse(text=result)
+    except DeadlineExceeded as e:
+        logger.warning(f"Error generating text: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected as e:
+        # Nobody is listening; the status only shows up in access logs
+        logger.info(f"Abandoned generation: {str(e)}")
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating text: {str(e)}")
         raise HTTPException(
@@ -82,10 +369,14 @@ async def generate_text(request: PromptRequest):
 
 @app.get("/generate-debug", response_model=TextResponse)
 async def generate_text_debug(
+    response: Response,
+    http_request: Request,
     prompt: str = Query(..., description="The text prompt to generate from"),
     max_tokens: int = Query(100, description="Maximum number of tokens to generate"),
     model: str = Query("gpt-3.5-turbo", description="The model to use"),
-    use_mock_fallback: bool = Query(True, description="Whether to use mock responses if OpenAI fails")
+    use_mock_fallback: bool = Query(True, description="Whether to use mock responses if OpenAI fails"),
+    template: Optional[str] = Query(None, description="Prompt template name or name@version"),
+    tenant: str = Depends(enforce_quota),
 ):
     """Debug endpoint for generating text using OpenAI's API (GET method for easier testing).
     
@@ -94,19 +385,35 @@ async def generate_text_debug(
         max_tokens: Maximum number of tokens to generate.
         model: The model to use.
         use_mock_fallback: Whether to use mock responses if OpenAI fails.
+        template: Prompt template name or name@version.
         
     Returns:
         A response containing the generated text.
     """
+    check_template(template)
+    screen_prompt(prompt)
+    timeout = request_timeout(http_request)
     try:
         logger.info(f"Received debug prompt: {prompt}")
-        result = main(
+        result = await generate_within_deadline(
+            http_request,
+            timeout,
             prompt=prompt,
             model=model,
             max_tokens=max_tokens,
-            use_mock_fallback=use_mock_fallback
+            use_mock_fallback=use_mock_fallback,
+            tenant=tenant,
+            template=template,
         )
+        set_cache_headers(response)
         return TextResponse(text=result)
+    except DeadlineExceeded as e:
+        logger.warning(f"Error generating text: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected as e:
+        # Nobody is listening; the status only shows up in access logs
+        logger.info(f"Abandoned generation: {str(e)}")
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating text: {str(e)}")
         raise HTTPException(
@@ -115,12 +422,292 @@ async def generate_text_debug(
         )
 
 
+@app.post("/embed")
+async def embed_text(request: EmbedRequest, tenant: str = Depends(enforce_quota)):
+    """Embed a text, batched with concurrent requests into one upstream call.
+    
+    Args:
+        request: The text, model and how to encode the float32 vector: "float"
+            for a list of numbers, "base64" for base64 of the little-endian
+            bytes, or "binary" for the bytes as an application/octet-stream body.
+        
+    Returns:
+        The embedding, its model and its length.
+    """
+    if request.encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding: {request.encoding}")
+    if not request.text:
+        raise HTTPException(status_code=400, detail="Text must not be empty")
+    try:
+        vector = await run_in_threadpool(
+            get_embedding_batcher().embed,
+            request.text,
+            model=request.model,
+            dimensions=request.dimensions,
+            tenant=tenant,
+        )
+    except EmbeddingError as e:
+        logger.error(f"Error embedding text: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    if request.encoding == ENCODING_BINARY:
+        return Response(
+            content=vector_bytes(vector),
+            media_type="application/octet-stream",
+            headers={"X-Embedding-Dimensions": str(len(vector))},
+        )
+    return {
+        "embedding": encode_vector(vector, request.encoding),
+        "model": request.model,
+        "dimensions": len(vector),
+    }
+
+
+@app.post("/documents", response_model=DocumentResponse)
+async def add_document(request: DocumentRequest, tenant: str = Depends(enforce_quota)):
+    """Chunk, embed and index a document for /ask.
+    
+    Args:
+        request: The document id and text.
+        
+    Returns:
+        The document id and the number of chunks indexed.
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text must not be empty")
+    try:
+        chunks = await run_in_threadpool(get_retriever().ingest, request.id, request.text, tenant=tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except EmbeddingError as e:
+        logger.error(f"Error indexing document {request.id}: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+    return DocumentResponse(id=request.id, chunks=chunks)
+
+
+@app.post("/ask", response_model=AskResponse)
+async def ask(
+    request: AskRequest,
+    response: Response,
+    http_request: Request,
+    tenant: str = Depends(enforce_quota),
+):
+    """Answer a question from the indexed documents.
+    
+    The chunks most similar to the question are put into the prompt, ahead of
+    the question, and sent with the "ask" template.
+    
+    Args:
+        request: The question and generation parameters.
+        
+    Returns:
+        The answer and the chunks it was grounded in.
+    """
+    screen_prompt(request.question)
+    timeout = request_timeout(http_request, request.timeout_ms)
+    try:
+        chunks = await run_in_threadpool(get_retriever().retrieve, request.question, k=request.k, tenant=tenant)
+    except EmbeddingError as e:
+        logger.error(f"Error retrieving context: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    try:
+        logger.info(f"Answering question with {len(chunks)} chunks of context")
+        result = await generate_within_deadline(
+            http_request,
+            timeout,
+            prompt=build_prompt(request.question, chunks),
+            model=request.model,
+            max_tokens=request.max_tokens,
+            use_mock_fallback=request.use_mock_fallback,
+            tenant=tenant,
+            template="ask",
+        )
+        set_cache_headers(response)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected as e:
+        logger.info(f"Abandoned generation: {str(e)}")
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating text: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating text: {str(e)}")
+    sources = [Source(document=c["document"], position=c["position"], score=c["score"]) for c in chunks]
+    return AskResponse(text=result, sources=sources)
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: JobRequest, response: Response, tenant: str = Depends(enforce_quota)):
+    """Queue a generation and return its job ID at once.
+    
+    Poll GET /jobs/{job_id} for the result, or pass a webhook_url to have the
+    finished job posted to it.
+    
+    Args:
+        request: The prompt, generation parameters and optional webhook URL.
+        
+    Returns:
+        The queued job.
+    """
+    check_template(request.template)
+    screen_prompt(request.prompt)
+    params = {
+        "prompt": request.prompt,
+        "model": request.model,
+        "max_tokens": request.max_tokens,
+        "use_mock_fallback": request.use_mock_fallback,
+        "template": request.template,
+    }
+    try:
+        job = await run_in_threadpool(get_job_queue().submit, params, tenant=tenant, webhook_url=request.webhook_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (JobQueueFull, JobStoreUnavailable) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    response.headers["Location"] = f"/jobs/{job['id']}"
+    return job_view(job)
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, tenant: str = Depends(get_tenant)):
+    """Get a job's status, and its result once it has finished."""
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    # Other tenants' jobs are indistinguishable from missing ones
+    if job is None or job["tenant"] != tenant:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    """Generate text for many prompts over one authenticated connection.
+    
+    The handshake has already been rate limited and authenticated, so each
+    prompt frame only pays for validation. Prompts run concurrently, tagged
+    with the id the client gave them, and stream their tokens back; see
+    src/python_ai_bot/ws.py for the frame format.
+    """
+    tenant = get_tenant(websocket)
+
+    def prepare(frame):
+        try:
+            request = PromptRequest(**frame)
+        except (TypeError, ValidationError):
+            raise HTTPException(status_code=400, detail="Invalid prompt frame")
+        check_template(request.template)
+        screen_prompt(request.prompt)
+        enforce_quota(tenant)
+        try:
+            timeout = parse_timeout(None, request.timeout_ms)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        kwargs = {
+            "prompt": request.prompt,
+            "model": request.model,
+            "max_tokens": request.max_tokens,
+            "use_mock_fallback": request.use_mock_fallback,
+            "tenant": tenant,
+            "template": request.template,
+        }
+        return kwargs, timeout
+
+    await websocket.accept()
+    logger.info(f"WebSocket connected for tenant {tenant}")
+    await ChatConnection(websocket, prepare, **connection_options()).serve()
+
+
+@app.post("/sessions", response_model=SessionResponse)
+async def create_session(request: SessionRequest, tenant: str = Depends(get_tenant)):
+    """Create a conversation session whose history is kept server-side, owned by the caller's tenant."""
+    session = await run_in_threadpool(get_session_manager().create, system=request.system, tenant=tenant)
+    return SessionResponse(session_id=session.id)
+
+
+@app.post("/sessions/{session_id}/messages", response_model=SessionMessageResponse)
+async def send_session_message(
+    session_id: str,
+    request: SessionMessageRequest,
+    http_request: Request,
+    tenant: str = Depends(enforce_quota),
+):
+    """Send a message to a session and return the reply.
+    
+    Only a sliding window of recent turns plus a rolling summary of older
+    turns is sent upstream, so clients never resend the conversation. Like
+    /generate, the call is bounded by X-Request-Timeout or timeout_ms.
+    
+    Args:
+        session_id: The session to continue.
+        request: The message and generation parameters.
+        
+    Returns:
+        A response containing the reply.
+    """
+    screen_prompt(request.content)
+    timeout = request_timeout(http_request, request.timeout_ms)
+    manager = get_session_manager()
+    session = await run_in_threadpool(manager.get, session_id, tenant=tenant)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    logger.info(f"Received message for session {session_id}")
+    try:
+        text = await generate_within_deadline(
+            http_request,
+            timeout,
+            generate=manager.send,
+            session=session,
+            content=request.content,
+            model=request.model,
+            max_tokens=request.max_tokens,
+            tenant=tenant,
+        )
+    except DeadlineExceeded as e:
+        logger.warning(f"Error generating session reply: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected as e:
+        # Nobody is listening; the status only shows up in access logs
+        logger.info(f"Abandoned session reply: {str(e)}")
+        raise HTTPException(status_code=499, detail=str(e))
+    if text.startswith("Error:"):
+        logger.error(f"Error generating session reply: {text}")
+        raise HTTPException(status_code=500, detail=f"Error generating text: {text}")
+    return SessionMessageResponse(session_id=session_id, text=text)
+
+
+@app.get("/usage")
+async def usage(tenant: str = Depends(get_tenant)):
+    """Report the caller's token usage and quotas for the current day and month."""
+    return get_usage_meter().usage(tenant)
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+async def profiling_status():
+    """Report whether continuous profiling is on and the latest profiles it wrote."""
+    return get_profiler().status()
+
+
+@app.post("/admin/profiling", dependencies=[Depends(require_admin)])
+async def set_profiling(request: ProfilingRequest):
+    """Switch continuous profiling on or off; stopping it writes out the last profile."""
+    profiler = get_profiler()
+    await run_in_threadpool(profiler.start if request.enabled else profiler.stop)
+    return profiler.status()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for the API."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until warm-up has finished, with pool, cache and circuit state."""
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("src.python_ai_bot.api:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
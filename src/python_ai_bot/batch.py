@@ -0,0 +1,331 @@
+"""Offline bulk generation from a JSONL or CSV file of prompts.
+
+Records are read as a stream, generated by a bounded pool of workers and
+appended to a JSONL results file as they finish. The results file doubles as
+the checkpoint: rerunning the same command skips every record that already
+has a result, so an interrupted run picks up where it stopped.
+
+Run from the repository root:
+
+    python -m src.python_ai_bot.batch prompts.jsonl results.jsonl --concurrency 16
+
+Each input record needs a "prompt" and may set "id", "template", "model" and
+"max_tokens"; records without an "id" are numbered from 1 in file order.
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.python_ai_bot import codec
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "csv")
+
+
+def detect_format(path):
+    """Guess the input format from a file name.
+
+    Args:
+        path (str): Input file path.
+
+    Returns:
+        str: "csv" for .csv files, otherwise "jsonl".
+    """
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def iter_records(path, input_format=None):
+    """Stream records from a JSONL or CSV file without loading it into memory.
+
+    Args:
+        path (str): Input file path.
+        input_format (str, optional): "jsonl" or "csv". Defaults to None (from the file name).
+
+    Yields:
+        tuple: (record_id, record), where record is None for a line that is not valid JSON.
+    """
+    input_format = input_format or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if input_format == "csv":
+            for index, row in enumerate(csv.DictReader(f), 1):
+                yield str(row.get("id") or index), row
+            return
+
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            index += 1
+            try:
+                record = codec.loads(line)
+            except codec.DecodeError:
+                yield str(index), None
+                continue
+            if not isinstance(record, dict):
+                record = {"prompt": str(record)}
+            yield str(record.get("id") or index), record
+
+
+def count_records(path, input_format=None):
+    """Count the records in an input file with a streaming pass.
+
+    Args:
+        path (str): Input file path.
+        input_format (str, optional): "jsonl" or "csv". Defaults to None (from the file name).
+
+    Returns:
+        int: Number of records.
+    """
+    if (input_format or detect_format(path)) == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            return sum(1 for _ in csv.DictReader(f))
+    count = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                count += 1
+    return count
+
+
+def load_completed(output_path):
+    """Read the ids that already have a result and repair a torn last line.
+
+    A run killed mid-write can leave a partial line at the end of the file;
+    it is truncated so the next result starts on a fresh line.
+
+    Args:
+        output_path (str): Results file path.
+
+    Returns:
+        set: Ids of records that were generated successfully.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    valid_size = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_size += len(line)
+            try:
+                result = codec.loads(line)
+            except codec.DecodeError:
+                continue
+            if "text" in result:
+                completed.add(str(result["id"]))
+
+    if valid_size < os.path.getsize(output_path):
+        logger.warning(f"Truncating partial result at the end of {output_path}")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_size)
+    return completed
+
+
+class Progress:
+    """Live throughput and ETA reporting."""
+
+    def __init__(self, total=None, stream=sys.stderr, interval=1.0, clock=time.monotonic):
+        """Initialize the progress reporter.
+
+        Args:
+            total (int, optional): Records left to generate. Defaults to None (unknown).
+            stream (file, optional): Where progress lines are written. Defaults to sys.stderr.
+            interval (float, optional): Seconds between progress lines. Defaults to 1.0.
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.clock = clock
+        self.start = clock()
+        self.last_report = self.start
+        self.done = 0
+        self.errors = 0
+
+    def update(self, error=False):
+        """Count one finished record and report if the interval has passed."""
+        self.done += 1
+        self.errors += error
+        if self.clock() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self, final=False):
+        """Write a progress line."""
+        now = self.clock()
+        self.last_report = now
+        elapsed = max(now - self.start, 1e-9)
+        rate = self.done / elapsed
+        line = f"{self.done}"
+        if self.total is not None:
+            line += f"/{self.total}"
+        line += f" done, {self.errors} errors, {rate:.1f} records/s"
+        if self.total is not None and not final and rate > 0:
+            line += f", ETA {format_duration((self.total - self.done) / rate)}"
+        if final:
+            line += f", {format_duration(elapsed)} elapsed"
+        if self.stream is not None:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def format_duration(seconds):
+    """Format seconds as H:MM:SS."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+async def run_batch(records, output_path, generate, concurrency=8, completed=None, progress=None):
+    """Generate results for a stream of records with a bounded worker pool.
+
+    Args:
+        records (iterable): (record_id, record) pairs, consumed lazily.
+        output_path (str): JSONL results file, appended to.
+        generate (callable): Blocking function returning the text for a record.
+            It runs in a thread pool and signals failure by raising.
+        concurrency (int, optional): Maximum generations in flight. Defaults to 8.
+        completed (set, optional): Ids to skip. Defaults to None.
+        progress (Progress, optional): Progress reporter. Defaults to None.
+
+    Returns:
+        dict: Counts of generated, failed and skipped records.
+    """
+    loop = asyncio.get_running_loop()
+    completed = completed or set()
+    # A small queue keeps the reader just ahead of the workers, not the whole file in memory
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    summary = {"generated": 0, "failed": 0, "skipped": 0}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, open(output_path, "a", encoding="utf-8") as out:
+
+        def write_result(result):
+            out.write(codec.dumps(result).decode("utf-8") + "\n")
+            out.flush()
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                record_id, record = item
+                try:
+                    if record is None:
+                        raise ValueError("Invalid JSON record")
+                    if not record.get("prompt"):
+                        raise ValueError("Record has no prompt")
+                    text = await loop.run_in_executor(executor, generate, record)
+                    write_result({"id": record_id, "text": text})
+                    summary["generated"] += 1
+                    failed = False
+                except Exception as e:
+                    write_result({"id": record_id, "error": str(e)})
+                    summary["failed"] += 1
+                    failed = True
+                if progress is not None:
+                    progress.update(error=failed)
+
+        workers = [loop.create_task(worker()) for _ in range(concurrency)]
+        try:
+            for record_id, record in records:
+                if record_id in completed:
+                    summary["skipped"] += 1
+                    continue
+                await queue.put((record_id, record))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    if progress is not None:
+        progress.report(final=True)
+    return summary
+
+
+def make_generator(model, max_tokens, tenant):
+    """Build the generate function used by the CLI.
+
+    Args:
+        model (str): Default model.
+        max_tokens (int): Default completion token limit.
+        tenant (str): Tenant the token usage is billed to.
+
+    Returns:
+        callable: Function taking a record and returning the generated text.
+    """
+    from src.python_ai_bot.ai.openai_client import OpenAIClient
+    from src.python_ai_bot.cache import get_response_cache
+    from src.python_ai_bot.settings import get_settings
+    from src.python_ai_bot.usage import get_usage_meter
+
+    client = OpenAIClient(
+        api_key=get_settings().openai_api_key, usage_meter=get_usage_meter(), cache=get_response_cache()
+    )
+
+    def generate(record):
+        text = client.generate_text(
+            record["prompt"],
+            model=record.get("model") or model,
+            max_tokens=int(record.get("max_tokens") or max_tokens),
+            tenant=tenant,
+            template=record.get("template") or None,
+        )
+        if text.startswith("Error:"):
+            raise RuntimeError(text)
+        return text
+
+    return generate
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate completions for a JSONL or CSV file of prompts.")
+    parser.add_argument("input", help="JSONL or CSV file of prompts")
+    parser.add_argument("output", help="JSONL results file; existing results are kept and skipped")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: from the file extension)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Generations in flight (default: 8)")
+    parser.add_argument("--model", default="gpt-3.5-turbo", help="Default model (default: gpt-3.5-turbo)")
+    parser.add_argument("--max-tokens", type=int, default=100, help="Default max tokens (default: 100)")
+    parser.add_argument("--tenant", default="batch", help="Tenant billed for the usage (default: batch)")
+    parser.add_argument("--restart", action="store_true", help="Discard existing results instead of resuming")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the batch command line interface."""
+    args = parse_args(argv)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+
+    completed = load_completed(args.output)
+    total = count_records(args.input, args.format)
+    if completed:
+        print(f"Resuming: {len(completed)} of {total} records already done", file=sys.stderr)
+    progress = Progress(total=max(total - len(completed), 0))
+
+    records = iter_records(args.input, args.format)
+    generate = make_generator(args.model, args.max_tokens, args.tenant)
+    try:
+        summary = asyncio.run(
+            run_batch(records, args.output, generate, concurrency=args.concurrency, completed=completed, progress=progress)
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    print(
+        f"Generated {summary['generated']}, failed {summary['failed']}, skipped {summary['skipped']}",
+        file=sys.stderr,
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
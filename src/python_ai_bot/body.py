@@ -0,0 +1,208 @@
+"""Bounded, streaming request-body reading for the BaseHTTPRequestHandler servers.
+
+Bodies are read in small chunks up to a hard cap instead of trusting
+Content-Length with a single read, so an oversized body is rejected from its
+header, or as soon as the cap is crossed, without being buffered first. Each
+socket read is bounded by a timeout and the whole body by a deadline, which
+stops slow-loris clients from holding a worker.
+"""
+
+import logging
+import socket
+import time
+
+from src.python_ai_bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 16 * 1024
+
+# Longest chunk-size or trailer line accepted in a chunked body
+MAX_LINE_LENGTH = 4096
+
+
+class BodyError(ValueError):
+    """Raised when a request body cannot be read.
+
+    Attributes:
+        status_code (int): HTTP status code to answer with.
+    """
+
+    status_code = 400
+
+
+class BodyTooLargeError(BodyError):
+    """Raised when a request body is larger than allowed."""
+
+    status_code = 413
+
+
+class BodyTimeoutError(BodyError):
+    """Raised when a client sends its body too slowly."""
+
+    status_code = 408
+
+
+class _Reader:
+    """Reads from a file object in bounded pieces against a deadline."""
+
+    def __init__(self, rfile, max_size, deadline):
+        self.rfile = rfile
+        self.max_size = max_size
+        self.deadline = deadline
+        self.size = 0
+        # read1 returns after a single socket read, so a trickling client
+        # cannot keep one call blocked past the deadline
+        self._read = getattr(rfile, "read1", rfile.read)
+
+    def _check_deadline(self):
+        if time.monotonic() > self.deadline:
+            raise BodyTimeoutError("Timed out reading request body")
+
+    def read(self, length, chunks):
+        """Read exactly length bytes into chunks."""
+        while length > 0:
+            self._check_deadline()
+            data = self._read(min(length, READ_CHUNK_SIZE))
+            if not data:
+                raise BodyError("Request body ended early")
+            self.size += len(data)
+            if self.size > self.max_size:
+                raise BodyTooLargeError(f"Request body too large (max {self.max_size} bytes)")
+            chunks.append(data)
+            length -= len(data)
+
+    def readline(self):
+        """Read one CRLF-terminated line, without the line ending."""
+        self._check_deadline()
+        line = self.rfile.readline(MAX_LINE_LENGTH + 1)
+        if len(line) > MAX_LINE_LENGTH:
+            raise BodyError("Chunked encoding line too long")
+        if not line.endswith(b"\n"):
+            raise BodyError("Request body ended early")
+        return line.rstrip(b"\r\n")
+
+
+def _read_chunked(reader):
+    chunks = []
+    while True:
+        size_line = reader.readline().split(b";", 1)[0].strip()
+        try:
+            size = int(size_line, 16)
+        except ValueError:
+            raise BodyError("Invalid chunk size")
+        if size < 0:
+            raise BodyError("Invalid chunk size")
+        if size == 0:
+            break
+        if reader.size + size > reader.max_size:
+            raise BodyTooLargeError(f"Request body too large (max {reader.max_size} bytes)")
+        reader.read(size, chunks)
+        if reader.readline():
+            raise BodyError("Missing CRLF after chunk")
+
+    # Skip trailer fields up to the blank line that ends the body
+    while reader.readline():
+        pass
+    return b"".join(chunks)
+
+
+def read_body(rfile, headers, max_size, timeout=None, connection=None):
+    """Read a request body with a size cap and a deadline.
+
+    Args:
+        rfile: Buffered file object the body is read from.
+        headers: Request headers, as found on BaseHTTPRequestHandler.headers.
+        max_size (int): Largest body accepted, in bytes.
+        timeout (float, optional): Seconds allowed for the whole body. Defaults to None (no limit).
+        connection (socket.socket, optional): Socket behind rfile, whose timeout
+            bounds each read while the body is read. Defaults to None.
+
+    Returns:
+        bytes: The request body.
+
+    Raises:
+        BodyTooLargeError: If the body is larger than max_size.
+        BodyTimeoutError: If the body is not received within timeout.
+        BodyError: If the framing headers or the chunked encoding are invalid.
+    """
+    transfer_encoding = headers.get("Transfer-Encoding", "").strip().lower()
+    content_length = headers.get("Content-Length")
+    chunked = transfer_encoding.endswith("chunked")
+
+    if transfer_encoding and not chunked:
+        raise BodyError(f"Unsupported transfer encoding: {transfer_encoding}")
+    if chunked and content_length is not None:
+        # Conflicting framing is how requests get smuggled past proxies
+        raise BodyError("Both Transfer-Encoding and Content-Length are set")
+
+    length = 0
+    if not chunked and content_length is not None:
+        try:
+            length = int(content_length)
+        except ValueError:
+            raise BodyError("Invalid Content-Length")
+        if length < 0:
+            raise BodyError("Invalid Content-Length")
+        if length > max_size:
+            raise BodyTooLargeError(f"Request body too large (max {max_size} bytes)")
+        if length == 0:
+            return b""
+    elif not chunked:
+        return b""
+
+    deadline = time.monotonic() + timeout if timeout else float("inf")
+    reader = _Reader(rfile, max_size, deadline)
+    previous_timeout = None
+    if connection is not None and timeout:
+        previous_timeout = connection.gettimeout()
+        connection.settimeout(timeout)
+    try:
+        if chunked:
+            return _read_chunked(reader)
+        chunks = []
+        reader.read(length, chunks)
+        return b"".join(chunks)
+    except socket.timeout:
+        raise BodyTimeoutError("Timed out reading request body")
+    finally:
+        if connection is not None and timeout:
+            connection.settimeout(previous_timeout)
+
+
+def read_request_body(handler, max_size=None, timeout=None):
+    """Read the body of the request a BaseHTTPRequestHandler is serving.
+
+    On failure the connection is marked for closing, since whatever part of
+    the body was not read is still on the socket. On success the handler is
+    marked with request_body_read, so the connection can be kept alive.
+
+    Args:
+        handler (BaseHTTPRequestHandler): The handler.
+        max_size (int, optional): Largest body accepted. Defaults to None (MAX_BODY_SIZE).
+        timeout (float, optional): Seconds allowed for the whole body.
+            Defaults to None (BODY_READ_TIMEOUT).
+
+    Returns:
+        bytes: The request body.
+
+    Raises:
+        BodyError: If the body is too large, too slow or malformed.
+    """
+    settings = get_settings()
+    connection = getattr(handler, "connection", None)
+    try:
+        body = read_body(
+            handler.rfile,
+            handler.headers,
+            max_size=max_size if max_size is not None else settings.max_body_size,
+            timeout=timeout if timeout is not None else settings.body_read_timeout,
+            connection=connection if isinstance(connection, socket.socket) else None,
+        )
+    except BodyError as e:
+        handler.close_connection = True
+        logger.warning(f"Rejected request body: {str(e)}")
+        raise
+    # Keep-alive servers close connections whose body was left unread
+    handler.request_body_read = True
+    return body
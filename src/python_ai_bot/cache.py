@@ -0,0 +1,358 @@
+"""Response cache with an in-memory LRU tier in front of a SQLite tier on disk.
+
+The disk tier lives in a configurable directory (/tmp by default, which is
+writable on Vercel) so cached completions survive cold starts and restarts.
+SQLite runs in WAL mode, so several local worker processes can read the
+cache while one of them writes. When the workers share memory (see
+shared.py), small entries are also kept in a shared table between the two
+tiers, so a completion cached by one worker is a memory hit for the others.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.shared import get_shared_table
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = namedtuple("CacheEntry", ["value", "created_at", "expires_at"])
+
+# created_at, expires_at; followed by the UTF-8 value
+SHARED_ENTRY = struct.Struct("<dd")
+
+
+def make_cache_key(model, messages, max_tokens):
+    """Build the cache key for a chat completion request.
+
+    Args:
+        model (str): Model name.
+        messages (list): Chat messages sent upstream.
+        max_tokens (int): Completion token limit.
+
+    Returns:
+        str: Hex digest identifying the request.
+    """
+    payload = codec.dumps({"model": model, "messages": messages, "max_tokens": max_tokens})
+    return hashlib.sha256(payload).hexdigest()
+
+
+class SQLiteCacheStore:
+    """SQLite store holding cached responses by key."""
+
+    def __init__(self, path):
+        """Initialize the store.
+
+        Args:
+            path (str): Path to the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL, size INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+
+    def get(self, key):
+        """Look up an entry with a single primary-key read.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            CacheEntry: The entry, expired or not, or None if there is none.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def set(self, key, entry):
+        """Insert or replace an entry.
+
+        Args:
+            key (str): Cache key.
+            entry (CacheEntry): Entry to store.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, expires_at, size) VALUES (?, ?, ?, ?, ?)",
+                (key, entry.value, entry.created_at, entry.expires_at, len(key) + len(entry.value.encode())),
+            )
+
+    def compact(self, expired_before, max_bytes):
+        """Drop expired entries, then the oldest ones until the store fits in max_bytes.
+
+        Args:
+            expired_before (float): Entries that expired before this time are removed.
+            max_bytes (int): Size budget for keys and values, 0 for unlimited.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (expired_before,)).rowcount
+            if max_bytes:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER "
+                    "(ORDER BY created_at DESC, key) AS running FROM responses) WHERE running > ?)",
+                    (max_bytes,),
+                ).rowcount
+        if removed:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return removed
+
+    def stats(self):
+        """Count the stored entries and their size.
+
+        Returns:
+            tuple: (entries, bytes).
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def _later(first, second):
+    """Get whichever of two entries, either of which may be None, expires last."""
+    if first is None or (second is not None and second.expires_at > first.expires_at):
+        return second
+    return first
+
+
+class ResponseCache:
+    """Two-tier cache of completions keyed by request."""
+
+    def __init__(self, store=None, ttl=3600, max_bytes=64 * 1024 * 1024, memory_entries=256,
+                 compact_every=100, stale_ttl=0, shared=None, clock=time.time):
+        """Initialize the cache.
+
+        Args:
+            store (SQLiteCacheStore, optional): Disk tier. Defaults to None, in which
+                case only the in-memory tier is used.
+            ttl (float, optional): Seconds an entry stays fresh. Defaults to 3600.
+            max_bytes (int, optional): Size budget of the disk tier, 0 for unlimited.
+                Defaults to 64 MiB.
+            memory_entries (int, optional): Entries kept in the in-memory tier. Defaults to 256.
+            compact_every (int, optional): Writes between disk compactions. Defaults to 100.
+            stale_ttl (float, optional): Seconds expired entries are kept for serving
+                stale while upstream is degraded. Defaults to 0.
+            shared (SharedTable, optional): Table shared with other worker processes,
+                holding entries small enough to fit its slots. Defaults to None.
+            clock (callable, optional): Time source returning epoch seconds. Defaults to time.time.
+        """
+        self.store = store
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.compact_every = compact_every
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        if store is not None:
+            self.compact()
+
+    def get_entry(self, key):
+        """Look up an entry in memory, then in shared memory, then on disk.
+
+        A fresh entry is returned from the first tier that has one. When none
+        does, the entry that expired last is returned, so stale values can
+        still be served.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            CacheEntry: The entry, which may have expired, or None if there is none.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                if entry.expires_at > now:
+                    return entry
+        # Another process may have refreshed the entry after this one's copy expired
+        latest = entry
+
+        if self.shared is not None:
+            raw = self.shared.get(key)
+            if raw is not None:
+                created_at, expires_at = SHARED_ENTRY.unpack_from(raw)
+                entry = CacheEntry(raw[SHARED_ENTRY.size:].decode("utf-8"), created_at, expires_at)
+                if entry.expires_at > now:
+                    self._remember(key, entry)
+                    return entry
+                latest = _later(latest, entry)
+
+        if self.store is not None:
+            try:
+                entry = self.store.get(key)
+            except sqlite3.Error as e:
+                logger.error(f"Error reading response cache: {str(e)}")
+                entry = None
+            if entry is not None:
+                latest = _later(latest, entry)
+
+        if latest is not None:
+            self._remember(key, latest)
+        return latest
+
+    def get(self, key):
+        """Get a fresh cached value.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            str: The cached value, or None if it is missing or expired.
+        """
+        entry = self.get_entry(key)
+        if entry is None or entry.expires_at <= self.clock():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.value
+
+    def set(self, key, value, ttl=None):
+        """Store a value in both tiers.
+
+        Args:
+            key (str): Cache key.
+            value (str): Value to cache.
+            ttl (float, optional): Seconds the value stays fresh. Defaults to None (the cache TTL).
+        """
+        now = self.clock()
+        entry = CacheEntry(value, now, now + (self.ttl if ttl is None else ttl))
+        self._remember(key, entry)
+        if self.shared is not None:
+            # Values too large for a slot are skipped and found on disk instead
+            self.shared.set(
+                key,
+                SHARED_ENTRY.pack(entry.created_at, entry.expires_at) + value.encode("utf-8"),
+                ttl=entry.expires_at - now + self.stale_ttl,
+            )
+        if self.store is None:
+            return
+        try:
+            self.store.set(key, entry)
+        except sqlite3.Error as e:
+            logger.error(f"Error writing response cache: {str(e)}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.compact_every == 0
+        if due:
+            self.compact()
+
+    def compact(self):
+        """Drop entries past their stale window and trim the disk tier to its size budget.
+
+        Returns:
+            int: Number of entries removed from disk.
+        """
+        if self.store is None:
+            return 0
+        try:
+            removed = self.store.compact(self.clock() - self.stale_ttl, self.max_bytes)
+        except sqlite3.Error as e:
+            logger.error(f"Error compacting response cache: {str(e)}")
+            return 0
+        if removed:
+            logger.info(f"Removed {removed} entries from the response cache")
+        return removed
+
+    def stats(self):
+        """Report the size and hit counts of both tiers.
+
+        Returns:
+            dict: Memory and disk entry counts, disk bytes, hits and misses.
+        """
+        with self._lock:
+            stats = {"memory_entries": len(self._memory), "disk_entries": 0, "disk_bytes": 0}
+        if self.store is not None:
+            try:
+                stats["disk_entries"], stats["disk_bytes"] = self.store.stats()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading response cache stats: {str(e)}")
+        stats.update(hits=self.hits, misses=self.misses)
+        return stats
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def close(self):
+        """Close the disk tier."""
+        if self.store is not None:
+            self.store.close()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Get the process-wide response cache, configured from environment variables.
+
+    Returns:
+        ResponseCache: The shared cache, or None if RESPONSE_CACHE_TTL is 0.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                ttl = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+                if ttl <= 0:
+                    return None
+                cache_dir = os.environ.get("RESPONSE_CACHE_DIR", tempfile.gettempdir())
+                db_path = os.path.join(cache_dir, "python_ai_bot_cache.db")
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    store = SQLiteCacheStore(db_path)
+                except (OSError, sqlite3.Error) as e:
+                    logger.error(f"Error opening response cache at {db_path}: {str(e)}")
+                    store = None
+                _response_cache = ResponseCache(
+                    store=store,
+                    ttl=ttl,
+                    max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                    memory_entries=int(os.environ.get("RESPONSE_CACHE_MEMORY_ENTRIES", "256")),
+                    stale_ttl=float(os.environ.get("RESPONSE_CACHE_STALE_TTL", "86400")),
+                    shared=get_shared_table(
+                        "responses",
+                        slots=int(os.environ.get("SHARED_CACHE_SLOTS", "4096")),
+                        slot_size=int(os.environ.get("SHARED_CACHE_SLOT_SIZE", "2048")),
+                    ),
+                )
+                atexit.register(_response_cache.close)
+    return _response_cache
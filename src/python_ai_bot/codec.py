@@ -0,0 +1,187 @@
+"""Shared serialization layer for request and response bodies.
+
+JSON goes through orjson or msgspec when installed and the standard library
+otherwise. MessagePack is offered to callers that ask for it when msgspec or
+msgpack is installed.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+class DecodeError(ValueError):
+    """Raised when a body cannot be decoded."""
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def dumps(obj):
+        """Serialize an object to JSON bytes."""
+        return orjson.dumps(obj)
+
+    def _loads(data):
+        return orjson.loads(data)
+
+    _JSON_ERRORS = (orjson.JSONDecodeError,)
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+    _json_encoder = msgspec.json.Encoder()
+    _json_decoder = msgspec.json.Decoder()
+
+    def dumps(obj):
+        """Serialize an object to JSON bytes."""
+        return _json_encoder.encode(obj)
+
+    def _loads(data):
+        return _json_decoder.decode(data)
+
+    _JSON_ERRORS = (msgspec.DecodeError,)
+else:
+    JSON_BACKEND = "json"
+
+    def dumps(obj):
+        """Serialize an object to JSON bytes."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def _loads(data):
+        return json.loads(data)
+
+    _JSON_ERRORS = (ValueError,)
+
+
+def loads(data):
+    """Deserialize JSON bytes or text.
+
+    Args:
+        data (bytes or str): JSON document.
+
+    Returns:
+        The decoded object.
+
+    Raises:
+        DecodeError: If the document is not valid JSON.
+    """
+    try:
+        return _loads(data)
+    except _JSON_ERRORS + (UnicodeDecodeError,) as e:
+        raise DecodeError(f"Invalid JSON: {str(e)}")
+
+
+if msgspec is not None:
+    MSGPACK_BACKEND = "msgspec"
+    _msgpack_encoder = msgspec.msgpack.Encoder()
+    _msgpack_decoder = msgspec.msgpack.Decoder()
+    _msgpack_dumps = _msgpack_encoder.encode
+    _msgpack_loads = _msgpack_decoder.decode
+    _MSGPACK_ERRORS = (msgspec.DecodeError,)
+elif msgpack is not None:
+    MSGPACK_BACKEND = "msgpack"
+
+    def _msgpack_dumps(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def _msgpack_loads(data):
+        return msgpack.unpackb(data, raw=False)
+
+    _MSGPACK_ERRORS = (ValueError, msgpack.exceptions.ExtraData, msgpack.exceptions.UnpackException)
+else:
+    MSGPACK_BACKEND = None
+
+
+def msgpack_available():
+    """Check whether MessagePack can be offered.
+
+    Returns:
+        bool: True when msgspec or msgpack is installed.
+    """
+    return MSGPACK_BACKEND is not None
+
+
+def is_msgpack(content_type):
+    """Check whether a Content-Type or Accept value names MessagePack.
+
+    Args:
+        content_type (str): Header value.
+
+    Returns:
+        bool: True for any of the MessagePack media types.
+    """
+    content_type = (content_type or "").lower()
+    return any(media_type in content_type for media_type in _MSGPACK_TYPES)
+
+
+def negotiate_content_type(accept):
+    """Pick the response media type for an Accept header.
+
+    MessagePack is only chosen when the client names it explicitly; browsers
+    and generic clients keep getting JSON.
+
+    Args:
+        accept (str): Value of the Accept request header.
+
+    Returns:
+        str: JSON_TYPE or MSGPACK_TYPE.
+    """
+    if msgpack_available() and is_msgpack(accept):
+        return MSGPACK_TYPE
+    return JSON_TYPE
+
+
+def encode(obj, content_type=JSON_TYPE):
+    """Serialize an object for the given media type.
+
+    Args:
+        obj: Object to serialize.
+        content_type (str, optional): JSON_TYPE or MSGPACK_TYPE. Defaults to JSON_TYPE.
+
+    Returns:
+        bytes: The encoded body.
+    """
+    if content_type == MSGPACK_TYPE:
+        return _msgpack_dumps(obj)
+    return dumps(obj)
+
+
+def decode(data, content_type=JSON_TYPE):
+    """Deserialize a request body according to its Content-Type.
+
+    Args:
+        data (bytes): Request body.
+        content_type (str, optional): Value of the Content-Type header. Defaults to JSON_TYPE.
+
+    Returns:
+        The decoded object.
+
+    Raises:
+        DecodeError: If the body is invalid or the media type is unavailable.
+    """
+    if not is_msgpack(content_type):
+        return loads(data)
+    if not msgpack_available():
+        raise DecodeError("MessagePack is not supported by this server")
+    try:
+        return _msgpack_loads(data)
+    except _MSGPACK_ERRORS as e:
+        raise DecodeError(f"Invalid MessagePack: {str(e)}")
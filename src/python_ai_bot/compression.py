@@ -0,0 +1,230 @@
+"""HTTP content-encoding negotiation, compression and request decoding."""
+
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Responses smaller than this are sent uncompressed; the framing overhead outweighs the gain
+MINIMUM_SIZE = 1024
+
+# Upper bound on the size of a decompressed request body
+MAX_DECOMPRESSED_SIZE = 1024 * 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Server preference among encodings the client accepts equally
+SUPPORTED_ENCODINGS = tuple(
+    encoding
+    for encoding, available in (("zstd", zstandard), ("br", brotli), ("gzip", True))
+    if available
+)
+
+_DECODE_CHUNK = 16 * 1024
+
+
+class CompressionError(ValueError):
+    """Raised when a request body cannot be decompressed."""
+
+
+class UnsupportedEncodingError(CompressionError):
+    """Raised when a request body uses a content encoding we cannot decode."""
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick the response encoding for an Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): Value of the Accept-Encoding request header.
+
+    Returns:
+        str: The chosen encoding, or None to send the response uncompressed.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type):
+    """Check whether a content type benefits from compression.
+
+    Args:
+        content_type (str): Value of the Content-Type header.
+
+    Returns:
+        bool: True for JSON and text payloads.
+    """
+    content_type = (content_type or "").lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding):
+    """Compress a complete payload.
+
+    Args:
+        data (bytes): Payload to compress.
+        encoding (str): One of SUPPORTED_ENCODINGS.
+
+    Returns:
+        bytes: The compressed payload.
+    """
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_for_client(data, accept_encoding, minimum_size=MINIMUM_SIZE):
+    """Compress a response body if the client accepts it and it is large enough.
+
+    Args:
+        data (bytes): Response body.
+        accept_encoding (str): Value of the Accept-Encoding request header.
+        minimum_size (int, optional): Smallest body worth compressing. Defaults to MINIMUM_SIZE.
+
+    Returns:
+        tuple: (body, encoding), where encoding is None if the body was left as is.
+    """
+    if len(data) < minimum_size:
+        return data, None
+    encoding = negotiate_encoding(accept_encoding)
+    if not encoding:
+        return data, None
+    return compress(data, encoding), encoding
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed responses.
+
+    Every chunk is flushed so the client can decode it as soon as it arrives.
+    """
+
+    def __init__(self, encoding):
+        """Initialize the compressor.
+
+        Args:
+            encoding (str): One of SUPPORTED_ENCODINGS.
+        """
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk):
+        """Compress and flush one chunk.
+
+        Args:
+            chunk (bytes): Next piece of the response.
+
+        Returns:
+            bytes: Compressed data decodable up to the end of this chunk.
+        """
+        if self.encoding == "gzip":
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        """Terminate the compressed stream.
+
+        Returns:
+            bytes: The trailing compressed data.
+        """
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def decompress(data, encoding, max_size=MAX_DECOMPRESSED_SIZE):
+    """Decode a request body according to its Content-Encoding.
+
+    Output is produced incrementally and aborted once it exceeds max_size, so a
+    small compressed body cannot expand into an unbounded allocation.
+
+    Args:
+        data (bytes): Request body as received.
+        encoding (str): Value of the Content-Encoding header, empty for none.
+        max_size (int, optional): Maximum decoded size. Defaults to MAX_DECOMPRESSED_SIZE.
+
+    Returns:
+        bytes: The decoded body.
+
+    Raises:
+        UnsupportedEncodingError: If the encoding is not supported.
+        CompressionError: If the body is corrupt or decodes to more than max_size bytes.
+    """
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("", "identity"):
+        return data
+
+    output = bytearray()
+    try:
+        if encoding in ("gzip", "x-gzip", "deflate"):
+            # wbits 47 accepts both gzip and zlib framing
+            decompressor = zlib.decompressobj(47)
+            output += decompressor.decompress(data, max_size + 1)
+            if decompressor.unconsumed_tail:
+                raise CompressionError("Decompressed body too large")
+        elif encoding == "br" and brotli:
+            decompressor = brotli.Decompressor()
+            for start in range(0, len(data), _DECODE_CHUNK):
+                output += decompressor.process(data[start:start + _DECODE_CHUNK])
+                if len(output) > max_size:
+                    break
+        elif encoding == "zstd" and zstandard:
+            reader = zstandard.ZstdDecompressor().stream_reader(data)
+            while len(output) <= max_size:
+                chunk = reader.read(_DECODE_CHUNK)
+                if not chunk:
+                    break
+                output += chunk
+        else:
+            raise UnsupportedEncodingError(f"Unsupported content encoding: {encoding}")
+    except (zlib.error, getattr(brotli, "error", zlib.error), getattr(zstandard, "ZstdError", zlib.error)) as e:
+        raise CompressionError(f"Invalid {encoding} body: {str(e)}")
+
+    if len(output) > max_size:
+        raise CompressionError("Decompressed body too large")
+    return bytes(output)
@@ -0,0 +1,217 @@
+"""Client deadlines and cancellation for upstream calls.
+
+A request may say how long its client will wait, with an X-Request-Timeout
+header (seconds) or a timeout_ms body field. The resulting Deadline is kept
+in a contextvar for the rest of the request, so code that calls OpenAI can
+use what is left of it as the upstream timeout and stop reading, which
+stops generating billed tokens, once the deadline passes or the client
+disconnects.
+"""
+
+import contextvars
+import logging
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Longest deadline a client may ask for, in seconds
+MAX_TIMEOUT = 300.0
+
+
+class RequestAborted(Exception):
+    """Raised when a request should stop working on its response."""
+
+
+class DeadlineExceeded(RequestAborted):
+    """Raised once a request's deadline has passed."""
+
+
+class ClientDisconnected(RequestAborted):
+    """Raised once the client of a request has gone away."""
+
+
+class Deadline:
+    """Time budget and cancellation flag of one request."""
+
+    def __init__(self, timeout=None, clock=time.monotonic):
+        """Initialize the deadline.
+
+        Args:
+            timeout (float, optional): Seconds the client will wait. Defaults to None (no limit).
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.clock = clock
+        self.expires_at = None if timeout is None else clock() + timeout
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        """Get the seconds left, or None without a time limit."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self):
+        """Check whether the time limit has passed."""
+        return self.expires_at is not None and self.clock() >= self.expires_at
+
+    def cancel(self):
+        """Mark the request as abandoned by its client. Safe to call from any thread."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        """Whether the client has gone away."""
+        return self._cancelled.is_set()
+
+    def check(self):
+        """Raise if the request should stop.
+
+        Raises:
+            ClientDisconnected: If the client has gone away.
+            DeadlineExceeded: If the deadline has passed.
+        """
+        if self.cancelled:
+            raise ClientDisconnected("Client disconnected")
+        if self.expired():
+            raise DeadlineExceeded("Request deadline exceeded")
+
+    def timeout(self, default):
+        """Get the timeout for an upstream call.
+
+        Args:
+            default (float): Timeout to use without a time limit, or if it is shorter.
+
+        Returns:
+            float: The smaller of default and the time left.
+
+        Raises:
+            RequestAborted: If the request should already stop.
+        """
+        self.check()
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+def get_deadline():
+    """Get the current request's deadline.
+
+    Returns:
+        Deadline: The deadline, or None outside a deadline scope.
+    """
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_scope(timeout=None):
+    """Run a block under a new deadline.
+
+    Args:
+        timeout (float, optional): Seconds the client will wait. Defaults to None (no limit).
+
+    Yields:
+        Deadline: The deadline, which can be cancelled from other threads.
+    """
+    deadline = Deadline(timeout)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def check_deadline():
+    """Raise if the current request should stop; a no-op outside a deadline scope."""
+    deadline = get_deadline()
+    if deadline is not None:
+        deadline.check()
+
+
+def upstream_timeout(default):
+    """Get the timeout for an upstream call made for the current request.
+
+    Args:
+        default (float): Timeout without a deadline, or if it is shorter.
+
+    Returns:
+        float: The timeout in seconds.
+    """
+    deadline = get_deadline()
+    return default if deadline is None else deadline.timeout(default)
+
+
+def parse_timeout(header=None, timeout_ms=None):
+    """Read a client deadline from the X-Request-Timeout header or a timeout_ms field.
+
+    The body field wins when both are given. Values above MAX_TIMEOUT are capped.
+
+    Args:
+        header (str, optional): X-Request-Timeout value in seconds. Defaults to None.
+        timeout_ms (int, optional): timeout_ms value in milliseconds. Defaults to None.
+
+    Returns:
+        float: Seconds, or None if the client did not set a deadline.
+
+    Raises:
+        ValueError: If the value is not a positive number.
+    """
+    if timeout_ms is not None:
+        if isinstance(timeout_ms, bool) or not isinstance(timeout_ms, (int, float)):
+            raise ValueError("timeout_ms must be a number")
+        seconds = timeout_ms / 1000.0
+    elif header:
+        try:
+            seconds = float(header)
+        except ValueError:
+            raise ValueError(f"{TIMEOUT_HEADER} must be a number of seconds")
+    else:
+        return None
+    if not seconds > 0:
+        raise ValueError("Request timeout must be positive")
+    return min(seconds, MAX_TIMEOUT)
+
+
+@contextmanager
+def watch_disconnect(sock, deadline, interval=0.1):
+    """Cancel a deadline if the client closes its connection.
+
+    For handlers that call upstream on the request thread: a watcher thread
+    polls the socket, and a readable socket with nothing to read means the
+    client has closed it. The request body must already have been read.
+
+    Args:
+        sock (socket.socket): Client connection.
+        deadline (Deadline): Deadline to cancel.
+        interval (float, optional): Seconds between polls. Defaults to 0.1.
+    """
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            try:
+                readable, _, _ = select.select([sock], [], [], interval)
+                if not readable:
+                    continue
+                if sock.recv(1, socket.MSG_PEEK) == b"":
+                    logger.info("Client disconnected, cancelling upstream work")
+                    deadline.cancel()
+                # Anything else is a pipelined request; it is not ours to read
+                return
+            except (OSError, ValueError, TypeError, AttributeError):
+                # Closed, or not a real socket (as under some serverless runtimes)
+                return
+
+    watcher = threading.Thread(target=watch, name="disconnect-watch", daemon=True)
+    watcher.start()
+    try:
+        yield deadline
+    finally:
+        done.set()
@@ -0,0 +1,269 @@
+"""Stale-while-revalidate degradation driven by upstream health.
+
+Completions are timed and their outcome recorded in a rolling window. While
+upstream latency is over its SLO or its error rate over a threshold, requests
+are answered from the most recent cached completion, even an expired one, and
+the entry is refreshed in the background; requests with nothing cached fail
+fast instead of queuing behind a struggling upstream.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.python_ai_bot.deadline import RequestAborted
+
+logger = logging.getLogger(__name__)
+
+# Values of the X-Cache response header
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_STALE = "STALE"
+
+STALE_WARNING = '110 - "Response is Stale"'
+
+_cache_status = contextvars.ContextVar("cache_status", default=None)
+
+
+def get_cache_status():
+    """Get how the last completion in this context was served.
+
+    Returns:
+        str: CACHE_HIT, CACHE_MISS, CACHE_STALE, or None if no cache was involved.
+    """
+    return _cache_status.get()
+
+
+def set_cache_status(status):
+    """Record how the current completion was served.
+
+    Args:
+        status (str): CACHE_HIT, CACHE_MISS, CACHE_STALE or None.
+    """
+    _cache_status.set(status)
+
+
+def cache_headers(status=None):
+    """Build the response headers describing how a completion was served.
+
+    Args:
+        status (str, optional): Cache status. Defaults to None (the current context's).
+
+    Returns:
+        list: (name, value) header pairs, empty if no cache was involved.
+    """
+    status = status or get_cache_status()
+    if status is None:
+        return []
+    headers = [("X-Cache", status)]
+    if status == CACHE_STALE:
+        headers.append(("Warning", STALE_WARNING))
+    return headers
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised instead of calling upstream while it is degraded and nothing is cached."""
+
+
+class UpstreamHealth:
+    """Rolling window of upstream call latencies and outcomes."""
+
+    def __init__(self, latency_slo=10.0, error_threshold=0.5, window=60.0, min_samples=5, clock=time.monotonic):
+        """Initialize the health tracker.
+
+        Args:
+            latency_slo (float, optional): Median latency in seconds above which upstream
+                counts as degraded. Defaults to 10.0.
+            error_threshold (float, optional): Error rate above which upstream counts as
+                degraded. Defaults to 0.5.
+            window (float, optional): Seconds of history considered. Defaults to 60.0.
+            min_samples (int, optional): Calls needed in the window before judging. Defaults to 5.
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.latency_slo = latency_slo
+        self.error_threshold = error_threshold
+        self.window = window
+        self.min_samples = min_samples
+        self.clock = clock
+        self._samples = deque()  # (timestamp, latency, ok)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        """Record one upstream call.
+
+        Args:
+            latency (float): Seconds the call took.
+            ok (bool): Whether it succeeded.
+        """
+        with self._lock:
+            self._samples.append((self.clock(), latency, ok))
+            self._expire()
+
+    def _expire(self):
+        cutoff = self.clock() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def is_degraded(self):
+        """Check whether upstream is currently degraded.
+
+        Once samples age out of the window the verdict resets, so traffic
+        probes upstream again after an incident.
+
+        Returns:
+            bool: True if latency or errors are over their thresholds.
+        """
+        with self._lock:
+            self._expire()
+            if len(self._samples) < self.min_samples:
+                return False
+            errors = sum(1 for _, _, ok in self._samples if not ok)
+            latencies = sorted(latency for _, latency, _ in self._samples)
+        if errors / len(latencies) > self.error_threshold:
+            return True
+        return latencies[len(latencies) // 2] > self.latency_slo
+
+    def stats(self):
+        """Summarize the current window.
+
+        Returns:
+            dict: Circuit state ("open" while degraded, else "closed"), sample
+            count, error rate and median latency.
+        """
+        with self._lock:
+            self._expire()
+            samples = list(self._samples)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        latencies = sorted(latency for _, latency, _ in samples)
+        return {
+            "circuit": "open" if self.is_degraded() else "closed",
+            "samples": len(samples),
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "median_latency": latencies[len(latencies) // 2] if latencies else None,
+        }
+
+
+class DegradationPolicy:
+    """Decide between the cache, upstream and failing fast for each completion."""
+
+    def __init__(self, health=None, stale_ttl=86400.0, refresh_workers=2, clock=time.time):
+        """Initialize the policy.
+
+        Args:
+            health (UpstreamHealth, optional): Health tracker. Defaults to None (a new one).
+            stale_ttl (float, optional): Seconds past expiry an entry may still be served
+                while upstream is degraded or failing. Defaults to 86400.0.
+            refresh_workers (int, optional): Threads refreshing stale entries. Defaults to 2.
+            clock (callable, optional): Time source returning epoch seconds, matching the
+                cache's. Defaults to time.time.
+        """
+        self.health = health or UpstreamHealth()
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def serve(self, cache, key, fetch):
+        """Get a completion from the cache or upstream.
+
+        Args:
+            cache (ResponseCache): Response cache.
+            key (str): Cache key of the request.
+            fetch (callable): Calls upstream and returns the text, raising on failure.
+
+        Returns:
+            tuple: (text, status), where status is CACHE_HIT, CACHE_MISS or CACHE_STALE.
+
+        Raises:
+            UpstreamUnavailableError: If upstream is degraded and nothing usable is cached.
+            Exception: Whatever fetch raised, if nothing usable is cached.
+        """
+        entry = cache.get_entry(key)
+        now = self.clock()
+        if entry is not None and entry.expires_at > now:
+            cache.hits += 1
+            return entry.value, CACHE_HIT
+        stale = entry is not None and now - entry.expires_at <= self.stale_ttl
+
+        if self.health.is_degraded():
+            if stale:
+                self.refresh(cache, key, fetch)
+                return entry.value, CACHE_STALE
+            raise UpstreamUnavailableError("Upstream is degraded and no cached response is available")
+
+        cache.misses += 1
+        try:
+            text = self.call(fetch)
+        except Exception as e:
+            if stale:
+                logger.warning(f"Serving stale response after upstream error: {str(e)}")
+                return entry.value, CACHE_STALE
+            raise
+        cache.set(key, text)
+        return text, CACHE_MISS
+
+    def call(self, fetch):
+        """Call upstream, recording its latency and outcome.
+
+        Calls cut short by the client's deadline or disconnect are not recorded,
+        so impatient clients cannot trip the circuit.
+        """
+        start = time.monotonic()
+        try:
+            text = fetch()
+        except RequestAborted:
+            raise
+        except Exception:
+            self.health.record(time.monotonic() - start, ok=False)
+            raise
+        self.health.record(time.monotonic() - start, ok=True)
+        return text
+
+    def refresh(self, cache, key, fetch):
+        """Refresh a cache entry in the background, at most once at a time per key."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                cache.set(key, self.call(fetch))
+            except Exception as e:
+                logger.warning(f"Background refresh failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+
+
+_degradation_policy = None
+_degradation_policy_lock = threading.Lock()
+
+
+def get_degradation_policy():
+    """Get the process-wide degradation policy, configured from environment variables.
+
+    Returns:
+        DegradationPolicy: The shared policy.
+    """
+    global _degradation_policy
+    if _degradation_policy is None:
+        with _degradation_policy_lock:
+            if _degradation_policy is None:
+                health = UpstreamHealth(
+                    latency_slo=float(os.environ.get("UPSTREAM_LATENCY_SLO", "10")),
+                    error_threshold=float(os.environ.get("UPSTREAM_ERROR_THRESHOLD", "0.5")),
+                    window=float(os.environ.get("UPSTREAM_HEALTH_WINDOW", "60")),
+                )
+                _degradation_policy = DegradationPolicy(
+                    health=health,
+                    stale_ttl=float(os.environ.get("RESPONSE_CACHE_STALE_TTL", "86400")),
+                )
+    return _degradation_policy
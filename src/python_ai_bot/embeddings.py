@@ -0,0 +1,190 @@
+"""Micro-batching of embedding requests.
+
+Embedding one text per upstream call spends a request of the rate limit on
+a few tokens. The batcher holds each text for a short window, or until the
+batch is full, so concurrent requests for the same model and dimensions
+share one upstream call; the first caller of a batch waits out the window
+and makes the call, and every caller gets its own vector back.
+"""
+
+import array
+import base64
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from src.python_ai_bot.ai.openai_client import DEFAULT_EMBEDDING_MODEL, EmbeddingError, OpenAIClient
+from src.python_ai_bot.deadline import check_deadline, upstream_timeout
+from src.python_ai_bot.pool import get_http_client
+from src.python_ai_bot.usage import get_usage_meter
+
+logger = logging.getLogger(__name__)
+
+# Ways /embed can return a vector
+ENCODING_FLOAT = "float"
+ENCODING_BASE64 = "base64"
+ENCODING_BINARY = "binary"
+ENCODINGS = (ENCODING_FLOAT, ENCODING_BASE64, ENCODING_BINARY)
+
+
+def vector_bytes(vector):
+    """Get a float32 vector as little-endian bytes."""
+    if sys.byteorder == "big":
+        vector = array.array("f", vector)
+        vector.byteswap()
+    return vector.tobytes()
+
+
+def encode_vector(vector, encoding=ENCODING_FLOAT):
+    """Encode a float32 vector for a response body.
+
+    Args:
+        vector (array.array): Vector with typecode "f".
+        encoding (str, optional): "float" for a list of numbers, "base64" for base64 of
+            the little-endian float32 bytes, or "binary" for the bytes themselves.
+            Defaults to "float".
+
+    Returns:
+        list, str or bytes: The encoded vector.
+
+    Raises:
+        ValueError: If the encoding is unknown.
+    """
+    if encoding == ENCODING_FLOAT:
+        return vector.tolist()
+    if encoding == ENCODING_BASE64:
+        return base64.b64encode(vector_bytes(vector)).decode("ascii")
+    if encoding == ENCODING_BINARY:
+        return vector_bytes(vector)
+    raise ValueError(f"Unknown encoding: {encoding}")
+
+
+class _Batch:
+    """Texts waiting for one upstream call."""
+
+    def __init__(self):
+        self.texts = []
+        self.tenants = []
+        self.futures = []
+        self.full = threading.Event()
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embedding requests into shared upstream calls."""
+
+    def __init__(self, embed, max_batch_size=64, max_wait=0.005, timeout=30.0):
+        """Initialize the batcher.
+
+        Args:
+            embed (callable): Called as embed(texts, model=..., dimensions=..., tenant=...)
+                with a list of tenants, returning one vector per text.
+            max_batch_size (int, optional): Texts per upstream call. Defaults to 64.
+            max_wait (float, optional): Seconds the first text of a batch waits for
+                others. Defaults to 0.005.
+            timeout (float, optional): Seconds a caller waits for its vector, unless its
+                request deadline is shorter. Defaults to 30.0.
+        """
+        self.embed_batch = embed
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._open = {}  # (model, dimensions) -> batch still accepting texts
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, text, model=DEFAULT_EMBEDDING_MODEL, dimensions=None, tenant=None):
+        """Embed one text as part of a batch.
+
+        Args:
+            text (str): Text to embed.
+            model (str, optional): The embedding model. Defaults to "text-embedding-3-small".
+            dimensions (int, optional): Length to shorten the vector to. Defaults to None.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+
+        Returns:
+            array.array: The float32 vector.
+
+        Raises:
+            EmbeddingError: If the upstream call failed or did not finish in time.
+            RequestAborted: If the request's deadline passed while waiting.
+        """
+        key = (model, dimensions)
+        future = Future()
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            batch.texts.append(text)
+            batch.tenants.append(tenant)
+            batch.futures.append(future)
+            if len(batch.texts) >= self.max_batch_size:
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            # Close the window early if the batch fills up
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            self._run(batch, model, dimensions)
+
+        try:
+            return future.result(timeout=upstream_timeout(self.timeout))
+        except TimeoutError:
+            check_deadline()
+            raise EmbeddingError("Timed out waiting for the embedding batch")
+
+    def _run(self, batch, model, dimensions):
+        """Make one upstream call for a batch and hand each caller its vector."""
+        # Identical texts in a batch are embedded once
+        unique = list(dict.fromkeys(batch.texts))
+        tenants = [batch.tenants[batch.texts.index(text)] for text in unique]
+        with self._lock:
+            self.calls += 1
+            self.texts += len(batch.texts)
+        try:
+            vectors = self.embed_batch(unique, model=model, dimensions=dimensions, tenant=tenants)
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(unique)} texts: {str(e)}")
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        by_text = dict(zip(unique, vectors))
+        for text, future in zip(batch.texts, batch.futures):
+            future.set_result(by_text[text])
+
+    def stats(self):
+        """Get the number of upstream calls and texts, and the mean batch size."""
+        return {
+            "calls": self.calls,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.calls if self.calls else 0.0,
+        }
+
+
+_embedding_batcher = None
+_embedding_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher():
+    """Get the process-wide embedding batcher, configured from environment variables.
+
+    Returns:
+        EmbeddingBatcher: The shared batcher.
+    """
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        with _embedding_batcher_lock:
+            if _embedding_batcher is None:
+                client = OpenAIClient(usage_meter=get_usage_meter(), http_client=get_http_client())
+                _embedding_batcher = EmbeddingBatcher(
+                    client.embed,
+                    max_batch_size=int(os.environ.get("EMBED_BATCH_MAX_SIZE", "64")),
+                    max_wait=float(os.environ.get("EMBED_BATCH_MAX_WAIT_MS", "5")) / 1000.0,
+                )
+    return _embedding_batcher
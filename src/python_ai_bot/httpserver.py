@@ -0,0 +1,269 @@
+"""HTTP/1.1 keep-alive server with a bounded thread pool for the BaseHTTPRequestHandler stack.
+
+socketserver gives each connection a thread of its own (ThreadingMixIn) or
+serves connections one at a time (TCPServer). With persistent connections the
+first wastes a thread on every idle client and the second lets one slow
+OpenAI call block everyone. PooledHTTPServer instead serves requests, not
+connections, from a fixed pool of threads:
+
+- an accepted connection is handed to the pool, which serves one request on it
+- if the client keeps the connection open, the connection is parked in a
+  selector watched by a single poller thread, which hands it back to the pool
+  when the next request arrives
+- a parked connection that stays idle for idle_timeout is closed, and a request
+  that takes more than request_timeout to arrive is answered with nothing and
+  closed
+
+One handler instance lives as long as its connection, so pipelined requests
+already buffered are served without a trip through the poller. Attributes a
+request sets on the handler are cleared before the next one, so nothing such
+as a verified JWT leaks into a later request.
+"""
+
+import collections
+import logging
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_MAX_CONNECTIONS = 1024
+DEFAULT_IDLE_TIMEOUT = 5.0
+DEFAULT_REQUEST_TIMEOUT = 30.0
+
+_SERVICE_UNAVAILABLE = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+def server_options():
+    """Read the server limits from HTTP_MAX_WORKERS, HTTP_MAX_CONNECTIONS,
+    HTTP_IDLE_TIMEOUT and HTTP_REQUEST_TIMEOUT.
+
+    Returns:
+        dict: Keyword arguments for PooledHTTPServer.
+    """
+    return {
+        "max_workers": int(os.environ.get("HTTP_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+        "max_connections": int(os.environ.get("HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        "idle_timeout": float(os.environ.get("HTTP_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)),
+        "request_timeout": float(os.environ.get("HTTP_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)),
+    }
+
+
+def has_body(headers):
+    """Check whether request headers announce a body."""
+    length = headers.get("Content-Length")
+    return bool(headers.get("Transfer-Encoding")) or (length is not None and length.strip() != "0")
+
+
+class _Connection:
+    """A client connection and the handler serving its requests."""
+
+    __slots__ = ("sock", "handler", "state")
+
+    def __init__(self, sock, handler, state):
+        self.sock = sock
+        self.handler = handler
+        # The handler's attributes after setup, restored before each request
+        self.state = state
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server serving keep-alive connections from a bounded thread pool.
+
+    Handlers should set protocol_version = "HTTP/1.1" and send Content-Length
+    on every response; with HTTP/1.0 handlers every connection is closed after
+    one request, as before.
+
+    Attributes:
+        requests (int): Requests served so far, counting each new connection on accept.
+        connections (int): Connections currently open, busy or idle.
+    """
+
+    def __init__(self, server_address, handler_class, bind_and_activate=True, max_workers=DEFAULT_MAX_WORKERS,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Initialize the server.
+
+        Args:
+            server_address (tuple): (host, port) to bind to.
+            handler_class (type): BaseHTTPRequestHandler subclass serving requests.
+            bind_and_activate (bool, optional): Bind and listen at once. Defaults to True.
+            max_workers (int, optional): Threads serving requests. Defaults to DEFAULT_MAX_WORKERS.
+            max_connections (int, optional): Open connections, busy or idle, before new
+                ones are answered with 503. Defaults to DEFAULT_MAX_CONNECTIONS.
+            idle_timeout (float, optional): Seconds a connection may wait between requests.
+                Defaults to DEFAULT_IDLE_TIMEOUT.
+            request_timeout (float, optional): Seconds each socket read of a request may
+                block. Defaults to DEFAULT_REQUEST_TIMEOUT.
+        """
+        super().__init__(server_address, handler_class, bind_and_activate=bind_and_activate)
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._closing = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http-worker")
+        self._selector = selectors.DefaultSelector()
+        self._parked = []
+        self._idle = collections.OrderedDict()  # connection -> time it was parked
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._poller = threading.Thread(target=self._poll_idle, name="http-keepalive", daemon=True)
+        self._poller.start()
+
+    def process_request(self, request, client_address):
+        """Hand a new connection to the pool, or turn it away when there are too many."""
+        with self._lock:
+            full = self.connections >= self.max_connections
+            if not full:
+                self.connections += 1
+                # Counted on accept, so a serve loop checking it never accepts past a limit
+                self.requests += 1
+        if full:
+            logger.warning(f"Refusing connection from {client_address[0]}: {self.max_connections} open")
+            try:
+                request.sendall(_SERVICE_UNAVAILABLE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._executor.submit(self._open, request, client_address)
+
+    def _open(self, sock, client_address):
+        """Set up a handler for a new connection and serve its first request."""
+        try:
+            handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+            handler.request = sock
+            handler.client_address = client_address
+            handler.server = self
+            handler.setup()
+            sock.settimeout(self.request_timeout)
+            # Handlers write headers and body separately; on a kept-alive connection Nagle's
+            # algorithm would hold the body back until the client's delayed ACK
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception:
+            self.handle_error(sock, client_address)
+            self._release(sock)
+            return
+        self._serve(_Connection(sock, handler, dict(handler.__dict__)), first=True)
+
+    def _serve(self, connection, first=False):
+        """Serve requests on a connection until it goes idle or closes."""
+        handler = connection.handler
+        try:
+            while True:
+                handler.__dict__.clear()
+                handler.__dict__.update(connection.state)
+                handler.close_connection = True
+                handler.request_body_read = False
+                handler.handle_one_request()
+                if not first and getattr(handler, "raw_requestline", b""):
+                    with self._lock:
+                        self.requests += 1
+                first = False
+                headers = getattr(handler, "headers", None)
+                if headers is not None and has_body(headers) and not handler.request_body_read:
+                    # The unread body is still on the socket, in front of the next request
+                    handler.close_connection = True
+                if handler.close_connection or self._closing:
+                    break
+                if not self._buffered(connection):
+                    self._park(connection)
+                    return
+        except ConnectionError:
+            pass
+        except Exception:
+            self.handle_error(connection.sock, handler.client_address)
+        self._close(connection)
+
+    def _buffered(self, connection):
+        """Check, without blocking, whether the next request has already arrived."""
+        try:
+            connection.sock.settimeout(0)
+            return bool(connection.handler.rfile.peek(1))
+        finally:
+            connection.sock.settimeout(self.request_timeout)
+
+    def _park(self, connection):
+        """Queue an idle connection for the poller to watch."""
+        with self._lock:
+            self._parked.append(connection)
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_write.send(b"\0")
+        except OSError:
+            pass
+
+    def _poll_idle(self):
+        """Watch idle connections, handing them to the pool when a request arrives."""
+        while not self._closing:
+            timeout = None
+            if self._idle:
+                oldest = next(iter(self._idle.values()))
+                timeout = max(0.0, oldest + self.idle_timeout - time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        while self._wakeup_read.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._selector.unregister(key.fileobj)
+                del self._idle[key.data]
+                self._executor.submit(self._serve, key.data)
+
+            with self._lock:
+                parked, self._parked = self._parked, []
+            now = time.monotonic()
+            for connection in parked:
+                self._selector.register(connection.sock, selectors.EVENT_READ, connection)
+                self._idle[connection] = now
+
+            # Connections are parked in time order, so the expired ones are at the front
+            while self._idle:
+                connection, parked_at = next(iter(self._idle.items()))
+                if now - parked_at < self.idle_timeout:
+                    break
+                del self._idle[connection]
+                self._selector.unregister(connection.sock)
+                self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.handler.finish()
+        except Exception:
+            pass
+        self._release(connection.sock)
+
+    def _release(self, sock):
+        self.shutdown_request(sock)
+        with self._lock:
+            self.connections -= 1
+
+    def server_close(self):
+        """Stop listening, wait for requests in progress and close idle connections."""
+        super().server_close()
+        self._closing = True
+        self._wakeup()
+        self._poller.join()
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            parked, self._parked = self._parked, []
+        for connection in list(self._idle) + parked:
+            self._close(connection)
+        self._idle.clear()
+        self._selector.close()
+        self._wakeup_read.close()
+        self._wakeup_write.close()
@@ -0,0 +1,591 @@
+"""Asynchronous generation jobs with a bounded worker pool and webhook callbacks.
+
+Long generations outlast serverless time limits and hold client connections
+open. A job is queued and its ID returned at once; a fixed number of worker
+threads run queued jobs, results are kept for a TTL so clients can poll for
+them, and a webhook is called when a job finishes, with retries.
+
+Webhook URLs must resolve to public addresses; they are checked when the job
+is queued and again before every call, and calls go through their own client
+that does not follow redirects, so a webhook cannot be pointed at services
+inside the deployment.
+
+Jobs are kept in process memory, or in Redis when JOBS_REDIS_URL is set. With
+Redis, any process may run the workers: serverless handlers can set
+JOBS_WORKERS=0 to only enqueue, with workers started elsewhere by
+
+    python -m src.python_ai_bot.jobs
+
+Process memory only works for a single long-lived process. Serverless
+instances are frozen once they respond, and pre-forked workers cannot see
+each other's jobs, so there jobs are refused until JOBS_REDIS_URL is set.
+
+Queued and running records expire too, so a job whose worker died does not
+stay "running" forever; past its timeout it is reported as failed.
+"""
+
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import httpx
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.deadline import deadline_scope
+from src.python_ai_bot.main import main as generate
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Webhook responses not worth retrying: the receiver rejected the call itself, or
+# redirected it, which is never followed
+_PERMANENT_WEBHOOK_STATUSES = (frozenset(range(300, 500)) - {408, 425, 429}) - {304}
+
+WEBHOOK_TIMEOUT = 10.0
+
+WEBHOOK_SIGNATURE_HEADER = "X-Webhook-Signature"
+# Extra seconds past job_timeout before a running job counts as abandoned
+ABANDON_GRACE = 60.0
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobStoreUnavailable(Exception):
+    """Raised when a job is submitted but there is no store that would keep it."""
+
+
+def memory_store_problem(environ=None):
+    """Explain why jobs kept in process memory would be lost here.
+
+    Args:
+        environ (dict, optional): Variables to read. Defaults to None (os.environ).
+
+    Returns:
+        str: The reason, or None if one long-lived process serves every request.
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get("VERCEL") or environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        return "serverless instances are frozen once they respond, so queued jobs would never run"
+    if int(environ.get("PREFORK_WORKERS") or 0) > 1:
+        return "each worker process would only see the jobs it queued itself"
+    return None
+
+
+def sign_payload(secret, body):
+    """Sign a webhook body, so receivers can check it came from this service.
+
+    Args:
+        secret (str): Shared webhook secret.
+        body (bytes): Request body.
+
+    Returns:
+        str: "sha256=" followed by the hex HMAC-SHA256 of the body.
+    """
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def check_webhook_url(url, resolve=socket.getaddrinfo):
+    """Reject webhook URLs that are not absolute http(s) URLs of public hosts.
+
+    Every address the host resolves to must be globally routable: loopback,
+    private, link-local (cloud metadata at 169.254.169.254 among them) and
+    other reserved addresses are refused.
+
+    Args:
+        url (str): The webhook URL.
+        resolve (callable, optional): Resolver with the signature of socket.getaddrinfo.
+            Defaults to socket.getaddrinfo.
+
+    Raises:
+        ValueError: If the URL is not usable.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("webhook_url must be an absolute http or https URL")
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = resolve(parsed.hostname, port, 0, socket.SOCK_STREAM)
+    except (ValueError, UnicodeError, OSError):
+        raise ValueError(f"webhook_url host cannot be resolved: {parsed.hostname}")
+    if not infos:
+        raise ValueError(f"webhook_url host cannot be resolved: {parsed.hostname}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError("webhook_url must point to a public address")
+
+
+def make_webhook_client(max_connections=2, timeout=WEBHOOK_TIMEOUT):
+    """Build the HTTP client webhooks are called with.
+
+    Kept apart from the upstream pool, so slow receivers cannot hold OpenAI
+    connections, and never following redirects, so a public URL cannot send
+    the call on to an internal one.
+
+    Args:
+        max_connections (int, optional): Connections open at once. Defaults to 2.
+        timeout (float, optional): Request timeout in seconds. Defaults to WEBHOOK_TIMEOUT.
+
+    Returns:
+        httpx.Client: The client.
+    """
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.Client(limits=limits, timeout=timeout, follow_redirects=False)
+
+
+def job_view(job):
+    """Get the fields of a job shown to its owner.
+
+    Args:
+        job (dict): The job.
+
+    Returns:
+        dict: Its ID, status, timestamps, result or error and webhook outcome.
+    """
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "text": job["text"],
+        "error": job["error"],
+        "webhook": job["webhook"],
+    }
+
+
+class InMemoryJobStore:
+    """Job records and queue kept in process memory."""
+
+    def __init__(self, clock=time.time):
+        """Initialize the store.
+
+        Args:
+            clock (callable, optional): Time source returning epoch seconds. Defaults to time.time.
+        """
+        self.clock = clock
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, job_id):
+        """Get an encoded job, or None if it does not exist or has expired."""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._jobs[job_id]
+                return None
+            return data
+
+    def put(self, job_id, data, ttl=None):
+        """Store an encoded job, kept for ttl seconds, or until overwritten if ttl is None."""
+        now = self.clock()
+        with self._lock:
+            self._jobs[job_id] = (data, None if ttl is None else now + ttl)
+            self._writes += 1
+            if self._writes % 100 == 0:
+                expired = [key for key, (_, expires_at) in self._jobs.items() if expires_at is not None and expires_at <= now]
+                for key in expired:
+                    del self._jobs[key]
+
+    def push(self, job_id):
+        """Add a job to the queue."""
+        self._queue.put(job_id)
+
+    def pop(self, timeout):
+        """Take the next queued job ID, waiting up to timeout seconds, or None."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def pending(self):
+        """Get the number of queued jobs."""
+        return self._queue.qsize()
+
+
+class UnavailableJobStore:
+    """Stand-in store that refuses new jobs, for deployments where memory would lose them."""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def get(self, job_id):
+        """No job is ever stored."""
+        return None
+
+    def put(self, job_id, data, ttl=None):
+        """Refuse to store a job."""
+        raise JobStoreUnavailable(f"Background jobs need JOBS_REDIS_URL here: {self.reason}")
+
+    def push(self, job_id):
+        """Refuse to queue a job."""
+        self.put(job_id, None)
+
+    def pop(self, timeout):
+        """Nothing is ever queued."""
+        time.sleep(timeout)
+        return None
+
+    def pending(self):
+        """Nothing is ever queued."""
+        return 0
+
+
+class RedisJobStore:
+    """Job records and queue kept in Redis, shared by every process using the same URL."""
+
+    def __init__(self, url, prefix="jobs:"):
+        """Initialize the store.
+
+        Args:
+            url (str): Redis connection URL.
+            prefix (str, optional): Key prefix. Defaults to "jobs:".
+        """
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.queue_key = prefix + "queue"
+
+    def get(self, job_id):
+        """Get an encoded job, or None if it does not exist or has expired."""
+        return self.redis.get(self.prefix + job_id)
+
+    def put(self, job_id, data, ttl=None):
+        """Store an encoded job, kept for ttl seconds, or until overwritten if ttl is None."""
+        self.redis.set(self.prefix + job_id, data, ex=None if ttl is None else max(1, int(ttl)))
+
+    def push(self, job_id):
+        """Add a job to the queue."""
+        self.redis.lpush(self.queue_key, job_id)
+
+    def pop(self, timeout):
+        """Take the next queued job ID, waiting up to timeout seconds, or None."""
+        item = self.redis.brpop(self.queue_key, timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        return item[1].decode() if isinstance(item[1], bytes) else item[1]
+
+    def pending(self):
+        """Get the number of queued jobs."""
+        return self.redis.llen(self.queue_key)
+
+
+class JobQueue:
+    """Queue of generation jobs, run by a bounded pool of worker threads."""
+
+    def __init__(self, store, run=generate, workers=4, max_pending=1000, result_ttl=3600, job_timeout=300,
+                 pending_ttl=86400, webhook_attempts=5, webhook_backoff=1.0, webhook_secret=None, http_client=None,
+                 resolve=socket.getaddrinfo, clock=time.time, sleep=time.sleep):
+        """Initialize the queue.
+
+        Args:
+            store (InMemoryJobStore or RedisJobStore): Where jobs and the queue are kept.
+            run (callable, optional): Called with a job's request fields and tenant, returns
+                the generated text. Defaults to main.main.
+            workers (int, optional): Worker threads run by this process, 0 to only enqueue.
+                Defaults to 4.
+            max_pending (int, optional): Queued jobs allowed before submissions are refused.
+                Defaults to 1000.
+            result_ttl (float, optional): Seconds a finished job is kept. Defaults to 3600.
+            job_timeout (float, optional): Seconds a job may run. Defaults to 300.
+            pending_ttl (float, optional): Seconds a queued job is kept waiting for a
+                worker. Defaults to 86400.
+            webhook_attempts (int, optional): Webhook calls made before giving up. Defaults to 5.
+            webhook_backoff (float, optional): Seconds before the first retry, doubling after
+                each one. Defaults to 1.
+            webhook_secret (str, optional): Secret webhook bodies are signed with. Defaults to None.
+            http_client (httpx.Client, optional): Client for webhook calls. Defaults to None
+                (one built by make_webhook_client on first use).
+            resolve (callable, optional): Resolver webhook hosts are checked with. Defaults
+                to socket.getaddrinfo.
+            clock (callable, optional): Time source returning epoch seconds. Defaults to time.time.
+            sleep (callable, optional): Waits between webhook attempts. Defaults to time.sleep.
+        """
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.job_timeout = job_timeout
+        self.pending_ttl = pending_ttl
+        self.webhook_attempts = webhook_attempts
+        self.webhook_backoff = webhook_backoff
+        self.webhook_secret = webhook_secret
+        self.http_client = http_client
+        self.resolve = resolve
+        self.clock = clock
+        self.sleep = sleep
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._deliveries = ThreadPoolExecutor(max_workers=2, thread_name_prefix="webhook")
+
+    def submit(self, request, tenant=None, webhook_url=None):
+        """Queue a generation job.
+
+        Args:
+            request (dict): Keyword arguments for run, e.g. prompt, model and max_tokens.
+            tenant (str, optional): Tenant the job belongs to. Defaults to None.
+            webhook_url (str, optional): URL called with the job when it finishes. Defaults to None.
+
+        Returns:
+            dict: The queued job.
+
+        Raises:
+            ValueError: If the webhook URL is not an http(s) URL of a public host.
+            JobQueueFull: If max_pending jobs are already queued.
+            JobStoreUnavailable: If jobs cannot be kept in this deployment.
+        """
+        if webhook_url:
+            check_webhook_url(webhook_url, self.resolve)
+        if self.store.pending() >= self.max_pending:
+            raise JobQueueFull("Too many queued jobs, try again later")
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": JOB_QUEUED,
+            "tenant": tenant,
+            "request": request,
+            "webhook_url": webhook_url,
+            "created_at": self.clock(),
+            "started_at": None,
+            "finished_at": None,
+            "text": None,
+            "error": None,
+            "webhook": None,
+        }
+        self._save(job, ttl=self.pending_ttl)
+        self.store.push(job["id"])
+        self.start()
+        return job
+
+    def get(self, job_id):
+        """Get a job, or None if it does not exist or has expired.
+
+        A job still running well past job_timeout lost its worker, and is
+        reported as failed.
+        """
+        data = self.store.get(job_id)
+        if data is None:
+            return None
+        job = codec.loads(data)
+        if job["status"] == JOB_RUNNING and self.clock() > job["started_at"] + self.job_timeout + ABANDON_GRACE:
+            job["status"] = JOB_FAILED
+            job["error"] = "Job was abandoned by its worker"
+            job["finished_at"] = job["started_at"] + self.job_timeout
+        return job
+
+    def start(self):
+        """Start this process's worker threads, if they are not running yet."""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.workers} job workers")
+
+    def stop(self, timeout=5.0):
+        """Stop the worker threads after their current jobs."""
+        self._stop.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        self._deliveries.shutdown(wait=False)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                self.work_once(timeout=1.0)
+            except Exception as e:
+                # A store outage must not kill the worker
+                logger.error(f"Error running job: {str(e)}")
+                self._stop.wait(1.0)
+
+    def work_once(self, timeout=1.0):
+        """Run the next queued job, waiting up to timeout seconds for one.
+
+        Returns:
+            dict: The finished job, or None if none was queued.
+        """
+        job_id = self.store.pop(timeout)
+        if job_id is None:
+            return None
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        job["status"] = JOB_RUNNING
+        job["started_at"] = self.clock()
+        self._save(job, ttl=self.job_timeout + ABANDON_GRACE + self.result_ttl)
+        try:
+            with deadline_scope(self.job_timeout):
+                text = self.run(**job["request"], tenant=job["tenant"])
+            job["status"] = JOB_SUCCEEDED
+            job["text"] = text
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            job["status"] = JOB_FAILED
+            job["error"] = str(e)
+        job["finished_at"] = self.clock()
+        if job["webhook_url"]:
+            job["webhook"] = {"status": "pending", "attempts": 0}
+        self._save(job, ttl=self.result_ttl)
+        logger.info(f"Job {job_id} {job['status']} in {job['finished_at'] - job['started_at']:.2f}s")
+
+        if job["webhook_url"]:
+            self._deliveries.submit(self.deliver, job)
+        return job
+
+    def deliver(self, job):
+        """Call a finished job's webhook, retrying with exponential backoff.
+
+        The body is the job as JSON. When a webhook secret is set, it is signed
+        in the X-Webhook-Signature header. The host is checked again before each
+        call, as it may resolve elsewhere by now. The outcome is saved with the job.
+
+        Args:
+            job (dict): The finished job.
+
+        Returns:
+            bool: Whether the webhook accepted the call.
+        """
+        body = codec.dumps({key: value for key, value in job.items() if key != "webhook"})
+        headers = {"Content-Type": "application/json", "X-Job-ID": job["id"]}
+        if self.webhook_secret:
+            headers[WEBHOOK_SIGNATURE_HEADER] = sign_payload(self.webhook_secret, body)
+        client = self.webhook_client()
+
+        delay = self.webhook_backoff
+        delivered = False
+        attempts = 0
+        for attempts in range(1, self.webhook_attempts + 1):
+            try:
+                check_webhook_url(job["webhook_url"], self.resolve)
+            except ValueError as e:
+                logger.warning(f"Refused webhook for job {job['id']}: {str(e)}")
+                break
+            try:
+                response = client.post(job["webhook_url"], content=body, headers=headers, timeout=WEBHOOK_TIMEOUT)
+                if 200 <= response.status_code < 300:
+                    delivered = True
+                    break
+                logger.warning(f"Webhook for job {job['id']} answered {response.status_code}")
+                if response.status_code in _PERMANENT_WEBHOOK_STATUSES:
+                    break
+            except Exception as e:
+                logger.warning(f"Error calling webhook for job {job['id']}: {str(e)}")
+            if attempts < self.webhook_attempts:
+                self.sleep(delay)
+                delay *= 2
+
+        job["webhook"] = {"status": "delivered" if delivered else "failed", "attempts": attempts}
+        self._save(job, ttl=self.result_ttl)
+        return delivered
+
+    def webhook_client(self):
+        """Get the client webhooks are called with, building it on first use."""
+        with self._lock:
+            if self.http_client is None:
+                self.http_client = make_webhook_client()
+            return self.http_client
+
+    def _save(self, job, ttl=None):
+        self.store.put(job["id"], codec.dumps(job), ttl=ttl)
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Get the process-wide job queue, configured from environment variables.
+
+    Uses Redis when JOBS_REDIS_URL is set, otherwise process memory, unless
+    memory_store_problem() says jobs would be lost there, in which case new
+    jobs are refused.
+
+    Returns:
+        JobQueue: The shared queue.
+    """
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                redis_url = os.environ.get("JOBS_REDIS_URL")
+                problem = None if redis_url else memory_store_problem()
+                if redis_url:
+                    store = RedisJobStore(redis_url)
+                elif problem:
+                    logger.error(f"Background jobs are disabled without JOBS_REDIS_URL: {problem}")
+                    store = UnavailableJobStore(problem)
+                else:
+                    store = InMemoryJobStore()
+                _job_queue = JobQueue(
+                    store,
+                    workers=0 if problem else int(os.environ.get("JOBS_WORKERS", "4")),
+                    max_pending=int(os.environ.get("JOBS_MAX_PENDING", "1000")),
+                    result_ttl=float(os.environ.get("JOBS_RESULT_TTL", "3600")),
+                    job_timeout=float(os.environ.get("JOBS_TIMEOUT", "300")),
+                    pending_ttl=float(os.environ.get("JOBS_PENDING_TTL", "86400")),
+                    webhook_attempts=int(os.environ.get("JOBS_WEBHOOK_ATTEMPTS", "5")),
+                    webhook_secret=os.environ.get("JOBS_WEBHOOK_SECRET") or None,
+                )
+    return _job_queue
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run generation job workers against the configured job store.")
+    parser.add_argument("--workers", type=int, help="Worker threads (default: JOBS_WORKERS, or 4)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run job workers in the foreground until interrupted."""
+    args = parse_args(argv)
+    if not os.environ.get("JOBS_REDIS_URL"):
+        print("JOBS_REDIS_URL is not set; workers in their own process need a shared store", file=sys.stderr)
+        return 1
+    jobs = get_job_queue()
+    if args.workers is not None:
+        jobs.workers = args.workers
+    if jobs.workers <= 0:
+        jobs.workers = 4
+    jobs.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        jobs.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,6 @@
 """Main module for the project."""
 
 import logging
-import os
 
 # Configure logging
 logging.basicConfig(
@@ -11,9 +10,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 from src.python_ai_bot.ai.openai_client import OpenAIClient
+from src.python_ai_bot.cache import get_response_cache
+from src.python_ai_bot.deadline import check_deadline
+from src.python_ai_bot.degradation import get_degradation_policy
+from src.python_ai_bot.pool import get_http_client
+from src.python_ai_bot.settings import get_settings
+from src.python_ai_bot.usage import get_usage_meter
 
 
-def main(prompt="Tell me a short joke", model="gpt-3.5-turbo", max_tokens=100, use_mock_fallback=True):
+def main(prompt="Tell me a short joke", model="gpt-3.5-turbo", max_tokens=100, use_mock_fallback=True, tenant=None, template=None):
     """Run the main function of the project.
     
     Args:
@@ -21,19 +26,35 @@ def main(prompt="Tell me a short joke", model="gpt-3.5-turbo", max_tokens=100, u
         model (str, optional): Model to use. Defaults to "gpt-3.5-turbo".
         max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
         use_mock_fallback (bool, optional): Whether to use mock responses if OpenAI fails. Defaults to True.
+        tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+        template (str, optional): Prompt template name. Defaults to None (the default template).
         
     Returns:
         str: Generated text from OpenAI.
+        
+    Raises:
+        RequestAborted: If generation failed because the request's deadline passed
+            or its client disconnected.
     """
     logger.info("Running main function")
     
     # Initialize OpenAI client
-    api_key = os.environ.get("OPENAI_API_KEY")
-    client = OpenAIClient(api_key=api_key)
+    api_key = get_settings().openai_api_key
+    client = OpenAIClient(
+        api_key=api_key,
+        usage_meter=get_usage_meter(),
+        cache=get_response_cache(),
+        degradation=get_degradation_policy(),
+        http_client=get_http_client(),
+    )
     
     # Generate text
     logger.info(f"Generating text with prompt: {prompt}, model: {model}, max_tokens: {max_tokens}")
-    response = client.generate_text(prompt, model=model, max_tokens=max_tokens)
+    response = client.generate_text(prompt, model=model, max_tokens=max_tokens, tenant=tenant, template=template)
+    
+    # A request that ran out of time or lost its client gets no mock response
+    if response.startswith("Error:"):
+        check_deadline()
     
     # If there's an error with OpenAI API, provide a mock response for demonstration
     if response.startswith("Error:") and use_mock_fallback:
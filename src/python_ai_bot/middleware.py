@@ -0,0 +1,553 @@
+"""Pure ASGI middleware for the FastAPI app."""
+
+import hmac
+import logging
+import sys
+from urllib.parse import parse_qs
+
+import jwt
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.compression import (
+    MINIMUM_SIZE,
+    CompressionError,
+    StreamCompressor,
+    UnsupportedEncodingError,
+    compress,
+    decompress,
+    is_compressible,
+    negotiate_encoding,
+)
+from src.python_ai_bot.profiling import PROFILE_QUERY, is_admin, profile_request, requested_format
+from src.python_ai_bot.ratelimit import make_rate_limiter
+from src.python_ai_bot.revocation import is_token_revoked
+from src.python_ai_bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Paths that are served without authentication or rate limiting
+EXEMPT_PATHS = ("/", "/health", "/ready", "/docs", "/redoc", "/openapi.json")
+
+
+def get_header(scope, name):
+    """Get a request header from an ASGI scope.
+
+    Args:
+        scope (dict): ASGI connection scope.
+        name (bytes): Lower-case header name.
+
+    Returns:
+        str: The header value, or "" if it is missing.
+    """
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def authenticate(settings, api_key, authorization):
+    """Check an API key or bearer token against the settings.
+
+    Args:
+        settings (Settings): Current settings.
+        api_key (bytes): X-API-Key header value, or b"".
+        authorization (bytes): Authorization header value, or b"".
+
+    Returns:
+        tuple: (authenticated, jwt_payload), where jwt_payload is None unless a token was verified.
+    """
+    expected_key = settings.api_secret_key
+    if expected_key and api_key and hmac.compare_digest(api_key, expected_key.encode()):
+        return True, None
+    if settings.tenant_for_key(api_key.decode("latin-1")):
+        return True, None
+
+    if authorization.startswith(b"Bearer ") and settings.jwt_secret:
+        try:
+            payload = jwt.decode(authorization[7:].decode("latin-1"), settings.jwt_secret, algorithms=["HS256"])
+            if is_token_revoked(payload):
+                return False, None
+            return True, payload
+        except jwt.InvalidTokenError:
+            return False, None
+
+    # Without any API key configured the API is open, as in the serverless handlers
+    return not expected_key and not settings.api_key_tenants, None
+
+
+def verified_tenant(settings, api_key, jwt_payload):
+    """Identify a tenant from credentials that have been verified.
+
+    Args:
+        settings (Settings): Current settings.
+        api_key (str): X-API-Key header value, or "".
+        jwt_payload (dict): Payload of the verified JWT, or None.
+
+    Returns:
+        str: The JWT subject (sub, or user_id as in JWTAuth tokens), else the tenant of an
+            API_KEY_TENANTS key, else None.
+    """
+    if jwt_payload:
+        subject = jwt_payload.get("sub") or jwt_payload.get("user_id")
+        if subject:
+            return str(subject)
+    return settings.tenant_for_key(api_key)
+
+
+async def send_json(send, status_code, payload, headers=()):
+    """Send a complete JSON response through an ASGI send callable.
+
+    Args:
+        send (callable): ASGI send callable.
+        status_code (int): HTTP status code.
+        payload (dict): JSON-serializable body.
+        headers (iterable, optional): Extra (name, value) byte pairs. Defaults to ().
+    """
+    body = codec.dumps(payload)
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_body(receive):
+    """Read a complete request body from an ASGI receive callable.
+
+    Args:
+        receive (callable): ASGI receive callable.
+
+    Returns:
+        bytes: The request body.
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def replace_body(scope, receive, body, drop_headers=(), extra_headers=()):
+    """Build a scope and receive callable that deliver a replacement body.
+
+    Args:
+        scope (dict): Original ASGI scope.
+        receive (callable): Original ASGI receive callable, used after the body is delivered.
+        body (bytes): Replacement request body.
+        drop_headers (iterable, optional): Lower-case header names to remove. Defaults to ().
+        extra_headers (iterable, optional): (name, value) byte pairs to add. Defaults to ().
+
+    Returns:
+        tuple: (scope, receive)
+    """
+    dropped = set(drop_headers) | {b"content-length"}
+    headers = [(key, value) for key, value in scope["headers"] if key not in dropped]
+    headers.extend(extra_headers)
+    headers.append((b"content-length", str(len(body)).encode()))
+
+    delivered = False
+
+    async def replaced_receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return dict(scope, headers=headers), replaced_receive
+
+
+class CompressionMiddleware:
+    """Decode compressed request bodies and compress responses.
+
+    Complete responses of at least minimum_size bytes are compressed in one go;
+    streamed responses are compressed chunk by chunk and flushed after each one.
+    """
+
+    def __init__(self, app, minimum_size=MINIMUM_SIZE):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            minimum_size (int, optional): Smallest response body worth compressing.
+                Defaults to MINIMUM_SIZE.
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_encoding = get_header(scope, b"content-encoding")
+        if content_encoding and content_encoding.lower() != "identity":
+            try:
+                scope, receive = await self._decode_request(scope, receive, content_encoding)
+            except UnsupportedEncodingError as e:
+                await send_json(send, 415, {"detail": str(e)})
+                return
+            except CompressionError as e:
+                await send_json(send, 400, {"detail": str(e)})
+                return
+
+        encoding = negotiate_encoding(get_header(scope, b"accept-encoding"))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+    async def _decode_request(self, scope, receive, content_encoding):
+        """Read and decode the whole request body, returning a new scope and receive."""
+        body = decompress(await read_body(receive), content_encoding)
+        return replace_body(scope, receive, body, drop_headers=(b"content-encoding",))
+
+
+class _CompressingSend:
+    """ASGI send wrapper that compresses the response body."""
+
+    def __init__(self, send, encoding, minimum_size):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = message.get("headers", [])
+            content_type = ""
+            for key, value in headers:
+                if key.lower() == b"content-type":
+                    content_type = value.decode("latin-1")
+                elif key.lower() == b"content-encoding":
+                    self.passthrough = True
+            if not is_compressible(content_type):
+                self.passthrough = True
+            if self.passthrough:
+                await self.send(message)
+            else:
+                # Hold the start message until we know whether the body is streamed
+                self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            headers = [
+                (key, value)
+                for key, value in start_message.get("headers", [])
+                if key.lower() not in (b"content-length", b"vary")
+            ]
+            headers.append((b"content-encoding", self.encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            if more_body:
+                self.compressor = StreamCompressor(self.encoding)
+                body = self.compressor.compress(body)
+            else:
+                body = compress(body, self.encoding)
+                headers.append((b"content-length", str(len(body)).encode()))
+            await self.send(dict(start_message, headers=headers))
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.compressor is None:
+            await self.send(message)
+            return
+        body = self.compressor.compress(body)
+        if not more_body:
+            body += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+class CodecMiddleware:
+    """Accept and return MessagePack bodies for callers that ask for them.
+
+    MessagePack request bodies are transcoded to JSON before routing, so
+    pydantic validation is unchanged; complete JSON responses are transcoded
+    to MessagePack when the Accept header names it.
+    """
+
+    def __init__(self, app):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if codec.is_msgpack(get_header(scope, b"content-type")):
+            if not codec.msgpack_available():
+                await send_json(send, 415, {"detail": "MessagePack is not supported by this server"})
+                return
+            try:
+                payload = codec.decode(await read_body(receive), codec.MSGPACK_TYPE)
+            except codec.DecodeError as e:
+                await send_json(send, 400, {"detail": str(e)})
+                return
+            scope, receive = replace_body(
+                scope,
+                receive,
+                codec.dumps(payload),
+                drop_headers=(b"content-type",),
+                extra_headers=((b"content-type", codec.JSON_TYPE.encode()),),
+            )
+
+        if codec.negotiate_content_type(get_header(scope, b"accept")) == codec.MSGPACK_TYPE:
+            send = _MsgpackSend(send)
+        await self.app(scope, receive, send)
+
+
+class _MsgpackSend:
+    """ASGI send wrapper that transcodes complete JSON responses to MessagePack."""
+
+    def __init__(self, send):
+        self.send = send
+        self.start_message = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            content_type = b""
+            for key, value in message.get("headers", []):
+                if key.lower() == b"content-type":
+                    content_type = value.lower()
+            if content_type.startswith(codec.JSON_TYPE.encode()):
+                self.start_message = message
+            else:
+                await self.send(message)
+            return
+
+        if self.start_message is None or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        start_message, self.start_message = self.start_message, None
+        if message.get("more_body", False):
+            # Streamed JSON is passed through untouched
+            await self.send(start_message)
+            await self.send(message)
+            return
+
+        body = codec.encode(codec.loads(message.get("body", b"")), codec.MSGPACK_TYPE)
+        headers = [
+            (key, value)
+            for key, value in start_message.get("headers", [])
+            if key.lower() not in (b"content-type", b"content-length")
+        ]
+        headers.append((b"content-type", codec.MSGPACK_TYPE.encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await self.send(dict(start_message, headers=headers))
+        await self.send({"type": "http.response.body", "body": body})
+
+
+class ProfileMiddleware:
+    """Profile single requests that an admin asks for with X-Profile or a profile query parameter.
+
+    The request is sampled on the event loop only while its own coroutines run,
+    and in the worker threads it hands work to through profiling.run_in_threadpool.
+    The response names the written profile in an X-Profile-File header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Without an admin key nobody may profile, so skip looking at the request
+        if scope["type"] != "http" or not get_settings().admin_api_key:
+            await self.app(scope, receive, send)
+            return
+
+        # Built in C, so unprofiled requests pay less than for a loop over the headers
+        headers = dict(scope["headers"])
+        flag = headers.get(b"x-profile", b"").decode("latin-1")
+        query_string = scope.get("query_string", b"")
+        if not flag and PROFILE_QUERY.encode() in query_string:
+            flag = parse_qs(query_string.decode("latin-1")).get(PROFILE_QUERY, [""])[-1]
+        fmt = requested_format(flag) if flag else None
+        if fmt is None or not is_admin(headers.get(b"x-admin-key", b"").decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        with profile_request(f"{scope['method']} {scope['path']}", fmt, marker=sys._getframe()) as profile:
+            async def profiled_send(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-file", profile.filename.encode()))
+                    message = dict(message, headers=headers)
+                await send(message)
+
+            await self.app(scope, receive, profiled_send)
+
+
+class EarlyRejectMiddleware:
+    """Reject rate-limited, oversized and unauthenticated requests from their headers.
+
+    Added outermost, so abusive traffic is turned away before the body is read,
+    decompressed or validated and before any route handler runs. WebSocket
+    handshakes are rate limited and authenticated the same way, once per
+    connection. Verified JWT claims are passed on to routes as
+    request.state.jwt_payload.
+    """
+
+    def __init__(self, app, rate_limiter=None, exempt_paths=EXEMPT_PATHS):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            rate_limiter (RateLimiter, optional): Per-client limiter. Defaults to None,
+                in which case one is built from the current settings.
+            exempt_paths (iterable, optional): Paths that skip all checks. Defaults to EXEMPT_PATHS.
+        """
+        self.app = app
+        if rate_limiter is None:
+            settings = get_settings()
+            rate_limiter = make_rate_limiter(limit=settings.rate_limit_requests, window=settings.rate_limit_window)
+        self.rate_limiter = rate_limiter
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await self._handshake(scope, receive, send)
+            return
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "anonymous"
+        if self.rate_limiter.is_rate_limited(client_ip):
+            retry_after = str(self.rate_limiter.retry_after(client_ip)).encode()
+            await send_json(send, 429, {"detail": "Rate limit exceeded"}, ((b"retry-after", retry_after),))
+            return
+
+        api_key = authorization = content_length = b""
+        for key, value in scope["headers"]:
+            if key == b"x-api-key":
+                api_key = value
+            elif key == b"authorization":
+                authorization = value
+            elif key == b"content-length":
+                content_length = value
+
+        settings = get_settings()
+        if content_length:
+            try:
+                size = int(content_length)
+            except ValueError:
+                await send_json(send, 400, {"detail": "Invalid Content-Length"})
+                return
+            if size > settings.max_body_size:
+                await send_json(send, 413, {"detail": f"Request body too large (max {settings.max_body_size} bytes)"})
+                return
+
+        authenticated, jwt_payload = authenticate(settings, api_key, authorization)
+        if not authenticated:
+            await send_json(send, 401, {"detail": "Unauthorized"}, ((b"www-authenticate", b"Bearer"),))
+            return
+        if jwt_payload is not None:
+            scope = dict(scope, state=dict(scope.get("state") or {}, jwt_payload=jwt_payload))
+
+        if not content_length:
+            # Streamed bodies have no length up front, so count them as they arrive
+            limit = _BodyLimit(receive, send, settings.max_body_size)
+            try:
+                await self.app(scope, limit.receive, limit.send)
+            except Exception:
+                # The 413 has been sent; whatever the app raised on the cut-off body is moot
+                if not limit.rejected:
+                    raise
+            return
+        await self.app(scope, receive, send)
+
+    async def _handshake(self, scope, receive, send):
+        """Rate limit and authenticate a WebSocket handshake once, for the whole connection.
+
+        Browsers cannot set headers on a WebSocket, so a JWT may also come as a
+        token query parameter. A refused handshake is closed with 1008 before it
+        is accepted, which the client sees as a 403.
+        """
+        client = scope.get("client")
+        client_ip = client[0] if client else "anonymous"
+        if self.rate_limiter.is_rate_limited(client_ip):
+            await send({"type": "websocket.close", "code": 1008, "reason": "Rate limit exceeded"})
+            return
+
+        api_key = authorization = b""
+        for key, value in scope["headers"]:
+            if key == b"x-api-key":
+                api_key = value
+            elif key == b"authorization":
+                authorization = value
+        if not authorization:
+            token = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+            if token:
+                authorization = b"Bearer " + token[-1].encode("latin-1")
+
+        authenticated, jwt_payload = authenticate(get_settings(), api_key, authorization)
+        if not authenticated:
+            await send({"type": "websocket.close", "code": 1008, "reason": "Unauthorized"})
+            return
+        if jwt_payload is not None:
+            scope = dict(scope, state=dict(scope.get("state") or {}, jwt_payload=jwt_payload))
+        await self.app(scope, receive, send)
+
+
+class _BodyLimit:
+    """Receive and send wrappers that cut a streamed request body off at max_size with a 413."""
+
+    def __init__(self, receive, send, max_size):
+        self._receive = receive
+        self._send = send
+        self.max_size = max_size
+        self.received = 0
+        self.rejected = False
+        self.response_started = False
+
+    async def receive(self):
+        if self.rejected:
+            return {"type": "http.disconnect"}
+        message = await self._receive()
+        if message["type"] == "http.request":
+            self.received += len(message.get("body", b""))
+            if self.received > self.max_size:
+                self.rejected = True
+                if not self.response_started:
+                    self.response_started = True
+                    await send_json(self._send, 413, {"detail": f"Request body too large (max {self.max_size} bytes)"})
+                # The app sees a disconnect and stops reading
+                return {"type": "http.disconnect"}
+        return message
+
+    async def send(self, message):
+        if self.rejected:
+            return
+        if message["type"] == "http.response.start":
+            self.response_started = True
+        await self._send(message)
@@ -0,0 +1,90 @@
+"""Shared HTTP connection pool for upstream calls.
+
+Every OpenAI request in the process goes through one httpx client, so
+connections opened by an earlier request (or by startup warm-up) are reused
+instead of paying DNS and TLS again.
+"""
+
+import logging
+import os
+import threading
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+def upstream_base_url():
+    """Get the OpenAI API base URL, honouring OPENAI_BASE_URL like the SDK does.
+
+    Returns:
+        str: Base URL without a trailing slash.
+    """
+    return (os.environ.get("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
+
+def make_http_client(max_connections=20, max_keepalive=10, keepalive_expiry=60.0, timeout=30.0):
+    """Build an HTTP client with a bounded keep-alive pool.
+
+    Args:
+        max_connections (int, optional): Connections open at once. Defaults to 20.
+        max_keepalive (int, optional): Idle connections kept for reuse. Defaults to 10.
+        keepalive_expiry (float, optional): Seconds an idle connection is kept. Defaults to 60.0.
+        timeout (float, optional): Default request timeout; the OpenAI SDK sets its own
+            per request. Defaults to 30.0.
+
+    Returns:
+        httpx.Client: The client.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return httpx.Client(transport=httpx.HTTPTransport(limits=limits), timeout=timeout, follow_redirects=True)
+
+
+def pool_stats(client):
+    """Count the idle and active connections of a client's pool.
+
+    Args:
+        client (httpx.Client): Client built by make_http_client.
+
+    Returns:
+        dict: "idle" and "active" connection counts.
+    """
+    # httpx does not expose its httpcore pool; read it defensively
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    idle = active = 0
+    for connection in list(getattr(pool, "connections", ())):
+        if connection.is_closed():
+            continue
+        if connection.is_idle():
+            idle += 1
+        else:
+            active += 1
+    return {"idle": idle, "active": active}
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Get the process-wide HTTP client, configured from environment variables.
+
+    Returns:
+        httpx.Client: The shared client.
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = make_http_client(
+                    max_connections=int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS", "20")),
+                    max_keepalive=int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE", "10")),
+                    keepalive_expiry=float(os.environ.get("HTTP_POOL_KEEPALIVE_EXPIRY", "60")),
+                )
+    return _http_client
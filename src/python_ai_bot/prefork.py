@@ -0,0 +1,379 @@
+"""Pre-fork process supervisor for running either server stack on every core.
+
+The master process binds the listen socket once and forks worker processes
+that accept from it, or, with reuse_port, each worker binds its own socket
+with SO_REUSEPORT and the kernel spreads connections between them. The
+master never imports the application, so every worker it forks loads the
+current code and settings.
+
+The master restarts workers that crash (backing off if they crash at
+startup), replaces workers that exit after serving max_requests, replaces
+workers one at a time on SIGHUP, waiting for each new worker to be
+listening before stopping an old one, drains every worker on SIGTERM
+or SIGINT, and passes SIGUSR2, which toggles continuous profiling, on to
+every worker.
+"""
+
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import time
+
+from src.python_ai_bot.httpserver import PooledHTTPServer, server_options
+
+logger = logging.getLogger(__name__)
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def default_workers():
+    """Get the default number of workers: one per CPU available to the process."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def bind_socket(host, port, reuse_port=False, backlog=2048):
+    """Create a listening TCP socket.
+
+    Args:
+        host (str): Address to bind to.
+        port (int): Port to bind to.
+        reuse_port (bool, optional): Set SO_REUSEPORT so several processes can bind
+            the same port. Defaults to False.
+        backlog (int, optional): Listen backlog. Defaults to 2048.
+
+    Returns:
+        socket.socket: The listening socket.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerHTTPServer(PooledHTTPServer):
+    """Keep-alive HTTP server that accepts from an already bound, shared socket."""
+
+    def __init__(self, sock, handler_class, **options):
+        """Initialize the server.
+
+        Args:
+            sock (socket.socket): Listening socket, possibly shared with other workers.
+            handler_class (type): BaseHTTPRequestHandler subclass serving requests.
+            **options: PooledHTTPServer limits, such as max_workers and idle_timeout.
+        """
+        super().__init__(sock.getsockname()[:2], handler_class, bind_and_activate=False, **options)
+        self.socket.close()
+        self.socket = sock
+        # Workers sharing a socket all wake up for each connection; the losers'
+        # accept() raises BlockingIOError, which handle_request ignores
+        self.socket.setblocking(False)
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+
+    def get_request(self):
+        conn, address = self.socket.accept()
+        conn.setblocking(True)
+        return conn, address
+
+
+def serve_handler(sock, max_requests, notify, handler_class=None):
+    """Worker target for the BaseHTTPRequestHandler stack.
+
+    Args:
+        sock (socket.socket): Listening socket.
+        max_requests (int): Requests served before exiting, 0 for no limit.
+        notify (callable): Called once the worker is accepting connections.
+        handler_class (type, optional): Request handler. Defaults to None (api.index.Handler).
+    """
+    from src.python_ai_bot.profiling import enable_profiling_signal
+
+    if handler_class is None:
+        from api.index import Handler as handler_class
+
+    stopping = []
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+
+    enable_profiling_signal()
+
+    server = WorkerHTTPServer(sock, handler_class, **server_options())
+    server.timeout = 0.5
+    notify()
+    try:
+        while not stopping and not (max_requests and server.requests >= max_requests):
+            server.handle_request()
+    finally:
+        # Waits for in-flight requests to finish
+        server.server_close()
+
+
+def serve_fastapi(sock, max_requests, notify, app="src.python_ai_bot.api:app"):
+    """Worker target for the FastAPI stack, served by uvicorn.
+
+    Args:
+        sock (socket.socket): Listening socket.
+        max_requests (int): Requests served before exiting, 0 for no limit.
+        notify (callable): Called once the app has started up and is accepting connections.
+        app (str, optional): Import string of the ASGI app. Defaults to "src.python_ai_bot.api:app".
+    """
+    import uvicorn
+
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if not self.should_exit:
+                notify()
+
+    config = uvicorn.Config(
+        app,
+        limit_max_requests=max_requests or None,
+        timeout_graceful_shutdown=30,
+        log_level="info",
+    )
+    Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Pre-fork master that keeps a fixed number of workers serving."""
+
+    def __init__(self, target, host="0.0.0.0", port=8000, workers=None, reuse_port=False,
+                 max_requests=0, max_requests_jitter=0, graceful_timeout=30.0, ready_timeout=30.0):
+        """Initialize the supervisor.
+
+        Args:
+            target (callable): Worker entry point, called in the child as
+                target(sock, max_requests, notify).
+            host (str, optional): Address to bind to. Defaults to "0.0.0.0".
+            port (int, optional): Port to bind to. Defaults to 8000.
+            workers (int, optional): Worker processes. Defaults to None (one per CPU).
+            reuse_port (bool, optional): Give each worker its own SO_REUSEPORT socket
+                instead of sharing the master's. Defaults to False.
+            max_requests (int, optional): Requests a worker serves before it is
+                replaced, 0 for no limit. Defaults to 0.
+            max_requests_jitter (int, optional): Random extra requests per worker, so
+                workers are not all replaced at once. Defaults to 0.
+            graceful_timeout (float, optional): Seconds a stopping worker may take to
+                drain before it is killed. Defaults to 30.0.
+            ready_timeout (float, optional): Seconds a reload waits for a new worker to
+                start listening. Defaults to 30.0.
+        """
+        if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("SO_REUSEPORT is not supported on this platform")
+        if reuse_port and port == 0:
+            raise ValueError("reuse_port needs a fixed port")
+        self.target = target
+        self.host = host
+        self.port = port
+        self.num_workers = workers or default_workers()
+        self.reuse_port = reuse_port
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.socket = None
+        self.workers = {}  # pid -> read end of the worker's ready pipe
+        self.retiring = {}  # pid -> time it was asked to stop
+        self._signals = []
+        self._crashes = 0
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT."""
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The pre-fork supervisor needs os.fork")
+        if not self.reuse_port:
+            self.socket = bind_socket(self.host, self.port)
+            self.port = self.socket.getsockname()[1]
+
+        wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        signal.set_wakeup_fd(wakeup_write)
+        for signum in STOP_SIGNALS + (signal.SIGHUP, signal.SIGCHLD, signal.SIGUSR2):
+            signal.signal(signum, lambda signum, frame: self._signals.append(signum))
+
+        # Tells workers they are one of several, e.g. so jobs are not kept in process memory
+        os.environ["PREFORK_WORKERS"] = str(self.num_workers)
+        logger.info(f"Supervisor {os.getpid()} listening on {self.host}:{self.port} with {self.num_workers} workers")
+        for _ in range(self.num_workers):
+            self.spawn()
+        try:
+            while True:
+                select.select([wakeup_read], [], [], 1.0)
+                try:
+                    os.read(wakeup_read, 4096)
+                except BlockingIOError:
+                    pass
+                signals, self._signals[:] = list(self._signals), []
+                if any(signum in STOP_SIGNALS for signum in signals):
+                    break
+                self.reap()
+                if signal.SIGHUP in signals:
+                    self.reload()
+                if signal.SIGUSR2 in signals:
+                    self.forward(signal.SIGUSR2)
+                self.kill_overdue()
+        finally:
+            self.stop()
+            signal.set_wakeup_fd(-1)
+            os.close(wakeup_read)
+            os.close(wakeup_write)
+            if self.socket is not None:
+                self.socket.close()
+
+    def spawn(self):
+        """Fork a worker.
+
+        Returns:
+            int: The worker's pid.
+        """
+        ready_read, ready_write = os.pipe()
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            code = 1
+            try:
+                signal.set_wakeup_fd(-1)
+                for signum in STOP_SIGNALS + (signal.SIGHUP, signal.SIGCHLD):
+                    signal.signal(signum, signal.SIG_DFL)
+                # Ignored rather than fatal until the worker installs its profiling toggle
+                signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+                sock = self.socket or bind_socket(self.host, self.port, reuse_port=True)
+
+                def notify():
+                    os.write(ready_write, b"1")
+                    os.close(ready_write)
+
+                self.target(sock, max_requests, notify)
+                code = 0
+            except Exception:
+                logger.exception("Worker failed")
+            finally:
+                os._exit(code)
+
+        os.close(ready_write)
+        self.workers[pid] = ready_read
+        return pid
+
+    def wait_ready(self, pid):
+        """Wait until a worker reports it is accepting connections.
+
+        Returns:
+            bool: True if it did within ready_timeout.
+        """
+        ready_read = self.workers.get(pid)
+        deadline = time.monotonic() + self.ready_timeout
+        while ready_read is not None and time.monotonic() < deadline:
+            readable, _, _ = select.select([ready_read], [], [], 0.1)
+            if readable:
+                return os.read(ready_read, 1) == b"1"
+            self.reap()
+            ready_read = self.workers.get(pid)
+        return False
+
+    def reap(self):
+        """Collect exited workers and replace the ones that should still be running."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            ready_read = self.workers.pop(pid, None)
+            if ready_read is None:
+                continue
+            os.close(ready_read)
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            if any(signum in STOP_SIGNALS for signum in self._signals):
+                # Ctrl+C reaches the workers too; do not replace them while stopping
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            if code == 0:
+                logger.info(f"Worker {pid} exited after its request limit, replacing it")
+                self._crashes = 0
+            else:
+                self._crashes += 1
+                logger.error(f"Worker {pid} died with status {code}, restarting it")
+                # Back off when workers die at startup so a broken deploy does not spin
+                time.sleep(min(0.1 * 2 ** min(self._crashes, 6), 5.0))
+            self.spawn()
+
+    def reload(self):
+        """Replace every worker, one at a time, without refusing connections."""
+        old_workers = [pid for pid in self.workers if pid not in self.retiring]
+        logger.info(f"Reloading {len(old_workers)} workers")
+        for old_pid in old_workers:
+            if old_pid not in self.workers:
+                # Already exited and replaced by a worker running the new code
+                continue
+            new_pid = self.spawn()
+            if not self.wait_ready(new_pid):
+                logger.error(f"Worker {new_pid} did not start, keeping the remaining workers")
+                return
+            self.retire(old_pid if old_pid in self.workers else new_pid)
+
+    def forward(self, signum):
+        """Send a signal to every worker that is not being retired."""
+        for pid in list(self.workers):
+            if pid not in self.retiring:
+                try:
+                    os.kill(pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def retire(self, pid):
+        """Ask a worker to finish its in-flight requests and exit."""
+        if pid not in self.workers:
+            return
+        self.retiring[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def kill_overdue(self):
+        """Kill workers that have not drained within graceful_timeout."""
+        now = time.monotonic()
+        for pid, since in list(self.retiring.items()):
+            if now - since > self.graceful_timeout:
+                logger.warning(f"Worker {pid} did not stop in time, killing it")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def stop(self):
+        """Drain and stop every worker."""
+        for pid in list(self.workers):
+            if pid not in self.retiring:
+                self.retire(pid)
+        while self.workers:
+            self.kill_overdue()
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.05)
+                continue
+            ready_read = self.workers.pop(pid, None)
+            if ready_read is not None:
+                os.close(ready_read)
+            self.retiring.pop(pid, None)
+        logger.info("All workers stopped")
@@ -0,0 +1,483 @@
+"""Sampling profiler for single requests and for the whole process.
+
+Both modes sample thread stacks from a background thread with
+sys._current_frames(), so profiled code runs unmodified:
+
+- one request is profiled when an admin sends it with an X-Profile header or
+  a profile query parameter and the X-Admin-Key header. Only the threads
+  serving that request are sampled, at PROFILE_REQUEST_INTERVAL, and the
+  result is written to PROFILE_DIR when the request finishes.
+- the continuous profiler samples every thread at the lower
+  PROFILE_INTERVAL rate and writes what it has collected every
+  PROFILE_FLUSH_INTERVAL seconds. It is toggled at runtime through the
+  /admin/profiling endpoint or SIGUSR2; while it is off no sampling thread
+  exists, so the cost is nothing.
+
+Profiles are written as collapsed stacks ("a;b;c count" lines, which
+flamegraph.pl and speedscope read) or as speedscope JSON.
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.python_ai_bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY = "profile"
+ADMIN_KEY_HEADER = "X-Admin-Key"
+PROFILE_FILE_HEADER = "X-Profile-File"
+
+FORMAT_COLLAPSED = "collapsed"
+FORMAT_SPEEDSCOPE = "speedscope"
+FORMATS = (FORMAT_COLLAPSED, FORMAT_SPEEDSCOPE)
+EXTENSIONS = {FORMAT_COLLAPSED: ".collapsed", FORMAT_SPEEDSCOPE: ".speedscope.json"}
+
+DEFAULT_REQUEST_INTERVAL = 0.001
+DEFAULT_INTERVAL = 0.05
+DEFAULT_FLUSH_INTERVAL = 60.0
+
+# Idents of sampling threads, which never appear in a profile
+_sampler_threads = set()
+
+# The request profile of the current context, followed into worker threads
+_active_profile = ContextVar("active_profile", default=None)
+
+
+def profile_dir():
+    """Get the directory profiles are written to, from PROFILE_DIR."""
+    return os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "python_ai_bot_profiles")
+
+
+def requested_format(flag):
+    """Get the output format an X-Profile header or profile query value asks for.
+
+    Args:
+        flag (str): The header or query value, "" if absent.
+
+    Returns:
+        str: FORMAT_COLLAPSED or FORMAT_SPEEDSCOPE, or None if profiling was not asked for.
+    """
+    flag = flag.strip().lower()
+    if flag in FORMATS:
+        return flag
+    if flag in ("1", "true", "yes"):
+        return FORMAT_COLLAPSED
+    return None
+
+
+def is_admin(admin_key, settings=None):
+    """Check an X-Admin-Key value against ADMIN_API_KEY; always False when it is unset."""
+    expected = (settings or get_settings()).admin_api_key
+    return bool(expected and admin_key) and hmac.compare_digest(admin_key.encode(), expected.encode())
+
+
+def frame_name(code):
+    """Name a code object the way flame graphs show it: function (file:line)."""
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Background thread counting the stacks of some or all threads."""
+
+    def __init__(self, interval, all_threads=True):
+        """Initialize a stopped sampler.
+
+        Args:
+            interval (float): Seconds between samples.
+            all_threads (bool, optional): Sample every thread, rather than only
+                attached ones. Defaults to True.
+        """
+        self.interval = interval
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._threads = {}  # ident -> (frame the stack must contain or None, attach count)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def attach(self, ident=None, marker=None):
+        """Sample a thread from now on.
+
+        Args:
+            ident (int, optional): Thread ident. Defaults to None (the current thread).
+            marker (frame, optional): Only count stacks running through this frame,
+                for event loop threads that serve other requests too. Defaults to None.
+        """
+        ident = threading.get_ident() if ident is None else ident
+        previous, count = self._threads.get(ident, (marker, 0))
+        self._threads[ident] = (previous if count else marker, count + 1)
+
+    def detach(self, ident=None):
+        """Stop sampling a thread, once every attach() of it has been undone."""
+        ident = threading.get_ident() if ident is None else ident
+        marker, count = self._threads.pop(ident, (None, 1))
+        if count > 1:
+            self._threads[ident] = (marker, count - 1)
+
+    def sample(self):
+        """Record the stacks of the sampled threads once."""
+        threads = None if self.all_threads else dict(self._threads)
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident in _sampler_threads:
+                continue
+            marker = None
+            if threads is not None:
+                if ident not in threads:
+                    continue
+                marker = threads[ident][0]
+            stack = []
+            found = marker is None
+            while frame is not None:
+                stack.append(frame.f_code)
+                if frame is marker:
+                    found = True
+                frame = frame.f_back
+            if found and stack:
+                stack.reverse()
+                stacks.append(tuple(stack))
+        with self._lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def take(self):
+        """Return the stacks counted so far and start counting afresh."""
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+        return stacks
+
+    def start(self):
+        """Start sampling in a daemon thread."""
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampling thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        ident = threading.get_ident()
+        _sampler_threads.add(ident)
+        try:
+            while not self._stop.wait(self.interval):
+                self.sample()
+        finally:
+            _sampler_threads.discard(ident)
+
+
+def collapsed(stacks):
+    """Render counted stacks as collapsed-stack text, one "a;b;c count" line per stack."""
+    names = {}
+    lines = []
+    for stack, count in stacks.items():
+        parts = []
+        for code in stack:
+            if code not in names:
+                names[code] = frame_name(code).replace(";", ":")
+            parts.append(names[code])
+        lines.append(f"{';'.join(parts)} {count}")
+    return "\n".join(sorted(lines)) + "\n"
+
+
+def speedscope(stacks, name, interval):
+    """Render counted stacks as a speedscope sampled profile.
+
+    Args:
+        stacks (Counter): Counts keyed by tuples of code objects, outermost first.
+        name (str): Profile name shown by speedscope.
+        interval (float): Seconds each sample stands for.
+
+    Returns:
+        dict: The speedscope document.
+    """
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, count in stacks.items():
+        sample = []
+        for code in stack:
+            if code not in index:
+                index[code] = len(frames)
+                frames.append({
+                    "name": getattr(code, "co_qualname", code.co_name),
+                    "file": code.co_filename,
+                    "line": code.co_firstlineno,
+                })
+            sample.append(index[code])
+        samples.append(sample)
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "python_ai_bot.profiling",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def write_profile(path, stacks, fmt, name, interval):
+    """Write counted stacks to a file in the given format, through a temporary file."""
+    if fmt == FORMAT_SPEEDSCOPE:
+        content = json.dumps(speedscope(stacks, name, interval))
+    else:
+        content = collapsed(stacks)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "w") as f:
+        f.write(content)
+    os.replace(partial, path)
+
+
+def profile_path(label, fmt, directory=None):
+    """Build a unique profile file path from a label such as "GET /generate"."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-") or "request"
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    filename = f"{stamp}-{slug[:60]}-{uuid.uuid4().hex[:8]}{EXTENSIONS[fmt]}"
+    return os.path.join(directory or profile_dir(), filename)
+
+
+class RequestProfile:
+    """Profile of one request, written to path when it finishes."""
+
+    def __init__(self, label, fmt, interval=None, directory=None):
+        """Initialize the profile.
+
+        Args:
+            label (str): What is being profiled, e.g. "GET /generate".
+            fmt (str): FORMAT_COLLAPSED or FORMAT_SPEEDSCOPE.
+            interval (float, optional): Seconds between samples. Defaults to None
+                (PROFILE_REQUEST_INTERVAL).
+            directory (str, optional): Where to write the profile. Defaults to None (profile_dir()).
+        """
+        if interval is None:
+            interval = float(os.environ.get("PROFILE_REQUEST_INTERVAL", DEFAULT_REQUEST_INTERVAL))
+        self.label = label
+        self.format = fmt
+        self.path = profile_path(label, fmt, directory)
+        self.sampler = Sampler(interval, all_threads=False)
+
+    @property
+    def filename(self):
+        """str: Name of the profile file, as reported in the X-Profile-File header."""
+        return os.path.basename(self.path)
+
+    @contextmanager
+    def attached(self, marker=None):
+        """Sample the current thread while the block runs."""
+        self.sampler.attach(marker=marker)
+        try:
+            yield
+        finally:
+            self.sampler.detach()
+
+
+@contextmanager
+def profile_request(label, fmt, marker=None, interval=None, directory=None):
+    """Profile the current thread, and the worker threads it hands work to, until the block exits.
+
+    Args:
+        label (str): What is being profiled, e.g. "GET /generate".
+        fmt (str): FORMAT_COLLAPSED or FORMAT_SPEEDSCOPE.
+        marker (frame, optional): On an event loop thread, the frame every sampled
+            stack must pass through. Defaults to None.
+        interval (float, optional): Seconds between samples. Defaults to None
+            (PROFILE_REQUEST_INTERVAL).
+        directory (str, optional): Where to write the profile. Defaults to None (profile_dir()).
+
+    Yields:
+        RequestProfile: The profile; its path is known before the request finishes.
+    """
+    profile = RequestProfile(label, fmt, interval=interval, directory=directory)
+    token = _active_profile.set(profile)
+    profile.sampler.start()
+    try:
+        with profile.attached(marker):
+            yield profile
+    finally:
+        profile.sampler.stop()
+        _active_profile.reset(token)
+        try:
+            write_profile(profile.path, profile.sampler.take(), fmt, label, profile.sampler.interval)
+            logger.info(f"Wrote profile of {label} to {profile.path}")
+        except OSError as e:
+            logger.error(f"Could not write profile of {label}: {str(e)}")
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """Run a function in the threadpool, sampling its thread if the request is being profiled."""
+    from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+
+    profile = _active_profile.get()
+    if profile is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+
+    def attached():
+        with profile.attached():
+            return func(*args, **kwargs)
+
+    return await _run_in_threadpool(attached)
+
+
+class ContinuousProfiler:
+    """Low-rate sampler of the whole process that can be switched on and off at runtime."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 directory=None, fmt=FORMAT_COLLAPSED):
+        """Initialize a stopped profiler.
+
+        Args:
+            interval (float, optional): Seconds between samples. Defaults to DEFAULT_INTERVAL.
+            flush_interval (float, optional): Seconds between profile files. Defaults to DEFAULT_FLUSH_INTERVAL.
+            directory (str, optional): Where to write profiles. Defaults to None (profile_dir()).
+            fmt (str, optional): FORMAT_COLLAPSED or FORMAT_SPEEDSCOPE. Defaults to FORMAT_COLLAPSED.
+        """
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.directory = directory
+        self.format = fmt
+        self.files = []
+        self._sampler = None
+        self._flusher = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """bool: True while sampling."""
+        return self._sampler is not None
+
+    def start(self):
+        """Start sampling, unless already started."""
+        with self._lock:
+            if self._sampler is not None:
+                return
+            self._sampler = Sampler(self.interval)
+            self._sampler.start()
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._flush_periodically, name="profiler-flush", daemon=True)
+            self._flusher.start()
+        logger.info(f"Continuous profiling started, sampling every {self.interval}s")
+
+    def stop(self):
+        """Stop sampling and write out what was collected since the last flush."""
+        with self._lock:
+            if self._sampler is None:
+                return
+            self._stop.set()
+            self._flusher.join()
+            self._sampler.stop()
+            self._flush(self._sampler)
+            self._sampler = self._flusher = None
+        logger.info("Continuous profiling stopped")
+
+    def toggle(self):
+        """Start sampling if stopped, stop it if started.
+
+        Returns:
+            bool: Whether sampling is now on.
+        """
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+        return self.enabled
+
+    def status(self):
+        """Describe the profiler for the admin endpoint."""
+        sampler = self._sampler
+        return {
+            "enabled": sampler is not None,
+            "interval": self.interval,
+            "flush_interval": self.flush_interval,
+            "directory": self.directory or profile_dir(),
+            "samples": sampler.samples if sampler else 0,
+            "files": [os.path.basename(path) for path in self.files[-10:]],
+        }
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush(self._sampler)
+
+    def _flush(self, sampler):
+        stacks = sampler.take()
+        if not stacks:
+            return
+        path = profile_path(f"continuous-{os.getpid()}", self.format, self.directory)
+        try:
+            write_profile(path, stacks, self.format, f"process {os.getpid()}", self.interval)
+        except OSError as e:
+            logger.error(f"Could not write continuous profile: {str(e)}")
+            return
+        self.files.append(path)
+        del self.files[:-100]
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Get the process-wide continuous profiler, configured from environment variables.
+
+    It is started at once when PROFILE_CONTINUOUS is set.
+
+    Returns:
+        ContinuousProfiler: The shared profiler.
+    """
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                profiler = ContinuousProfiler(
+                    interval=float(os.environ.get("PROFILE_INTERVAL", DEFAULT_INTERVAL)),
+                    flush_interval=float(os.environ.get("PROFILE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)),
+                    fmt=requested_format(os.environ.get("PROFILE_FORMAT", "")) or FORMAT_COLLAPSED,
+                )
+                if os.environ.get("PROFILE_CONTINUOUS", "").lower() in ("1", "true", "yes"):
+                    profiler.start()
+                _profiler = profiler
+    return _profiler
+
+
+def enable_profiling_signal():
+    """Toggle the continuous profiler on SIGUSR2.
+
+    The signal handler is only installed when called from the main thread.
+    """
+    if not hasattr(signal, "SIGUSR2") or threading.current_thread() is not threading.main_thread():
+        return
+    profiler = get_profiler()
+    # Toggling joins threads, which a signal handler must not wait on
+    signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(target=profiler.toggle, daemon=True).start())
+    logger.info("Continuous profiling toggles on SIGUSR2")
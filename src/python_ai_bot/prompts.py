@@ -0,0 +1,227 @@
+"""Registry of named, versioned prompt templates."""
+
+import json
+import logging
+import os
+import string
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = "default"
+
+BUILTIN_TEMPLATES = [
+    {
+        "name": DEFAULT_TEMPLATE,
+        "version": 1,
+        "system": "You are a helpful assistant.",
+        "user": "{prompt}",
+    },
+    {
+        "name": "ask",
+        "version": 1,
+        "system": (
+            "You are a helpful assistant. Answer the question using only the numbered context "
+            "passages, citing them like [1]. If the context does not contain the answer, say so."
+        ),
+        "user": "{prompt}",
+    },
+]
+
+
+class PromptTemplate:
+    """A prompt template compiled once into a fixed system message and user parts.
+
+    The system message is built once and shared by every request that uses the
+    template, so the start of each upstream request is byte-identical and the
+    upstream's automatic prefix caching keeps hitting.
+    """
+
+    def __init__(self, name, version, system, user="{prompt}"):
+        """Initialize and compile the template.
+
+        Args:
+            name (str): Template name used to select it per request.
+            version (int): Template version; the highest version is used by default.
+            system (str): System prompt, the stable cacheable prefix.
+            user (str, optional): User message template with {field} placeholders, and
+                literal braces doubled as in str.format. Defaults to "{prompt}".
+
+        Raises:
+            ValueError: If the user template has unmatched braces.
+        """
+        self.name = name
+        self.version = int(version)
+        self.system = system
+        self.system_message = {"role": "system", "content": system}
+        self._parts = []
+        try:
+            parsed = list(string.Formatter().parse(user))
+        except ValueError as e:
+            raise ValueError(f"Prompt template {self.key}: {str(e)}; write literal braces as {{{{ and }}}}")
+        for literal, field, _, _ in parsed:
+            if literal:
+                self._parts.append((literal, None))
+            if field is not None:
+                self._parts.append((None, field))
+        self.fields = frozenset(field for literal, field in self._parts if field is not None)
+
+    @property
+    def key(self):
+        """str: Name and version, e.g. "default@1"."""
+        return f"{self.name}@{self.version}"
+
+    def render_user(self, prompt, **fields):
+        """Render the user message content.
+
+        Args:
+            prompt (str): The user prompt.
+            **fields: Values for any other placeholders in the template.
+
+        Returns:
+            str: The rendered user message.
+        """
+        fields["prompt"] = prompt
+        return "".join(literal if field is None else str(fields[field]) for literal, field in self._parts)
+
+    def render(self, prompt, **fields):
+        """Render the chat messages for a prompt.
+
+        Args:
+            prompt (str): The user prompt.
+            **fields: Values for any other placeholders in the template.
+
+        Returns:
+            list: System and user messages.
+        """
+        return [self.system_message, {"role": "user", "content": self.render_user(prompt, **fields)}]
+
+
+class PromptRegistry:
+    """Named prompt templates, selected per request by name or name@version."""
+
+    def __init__(self, templates=None):
+        """Initialize the registry.
+
+        Args:
+            templates (list, optional): Template definitions as dicts with name, version,
+                system and user keys. Defaults to None.
+        """
+        self._templates = {}
+        self._latest = {}
+        for definition in templates or []:
+            self.register(PromptTemplate(**definition))
+
+    @staticmethod
+    def check(template):
+        """Check that a template can be rendered from a request, which only supplies the prompt.
+
+        Args:
+            template (PromptTemplate): Template to check.
+
+        Raises:
+            ValueError: If the template has placeholders other than {prompt}, or none.
+        """
+        if template.fields != {"prompt"}:
+            others = ", ".join("{" + field + "}" for field in sorted(template.fields - {"prompt"}))
+            problem = f"uses {others}" if others else "has no {prompt} placeholder"
+            raise ValueError(
+                f"Prompt template {template.key} {problem}; {{prompt}} must be its only placeholder, "
+                "and literal braces are written as {{ and }}"
+            )
+
+    def register(self, template):
+        """Register a compiled template.
+
+        Args:
+            template (PromptTemplate): Template to register.
+
+        Raises:
+            ValueError: If the template has placeholders other than {prompt}, or none.
+        """
+        self.check(template)
+        self._templates[template.key] = template
+        latest = self._latest.get(template.name)
+        if latest is None or template.version >= latest.version:
+            self._latest[template.name] = template
+
+    def load_file(self, path):
+        """Register the templates defined in a JSON file.
+
+        Either every template in the file is registered, or none is.
+
+        Args:
+            path (str): Path to a JSON list of template definitions.
+
+        Raises:
+            ValueError: If the file is not valid JSON, or a template is invalid.
+        """
+        with open(path) as f:
+            definitions = json.load(f)
+        templates = [PromptTemplate(**definition) for definition in definitions]
+        for template in templates:
+            self.check(template)
+        for template in templates:
+            self.register(template)
+        logger.info(f"Loaded {len(definitions)} prompt templates from {path}")
+
+    def get(self, name=None):
+        """Get a template by name (latest version) or by name@version.
+
+        Args:
+            name (str, optional): Template name. Defaults to DEFAULT_TEMPLATE.
+
+        Returns:
+            PromptTemplate: The template.
+
+        Raises:
+            KeyError: If no such template is registered.
+        """
+        name = name or DEFAULT_TEMPLATE
+        template = self._templates.get(name) if "@" in name else self._latest.get(name)
+        if template is None:
+            raise KeyError(f"Unknown prompt template: {name}")
+        return template
+
+    def __contains__(self, name):
+        try:
+            self.get(name)
+        except KeyError:
+            return False
+        return True
+
+    def names(self):
+        """List the registered template keys.
+
+        Returns:
+            list: Sorted name@version keys.
+        """
+        return sorted(self._templates)
+
+
+_prompt_registry = None
+_prompt_registry_lock = threading.Lock()
+
+
+def get_prompt_registry():
+    """Get the process-wide template registry, compiled on first use.
+
+    Built-in templates are registered first, then any from the JSON file
+    named by PROMPT_TEMPLATES_PATH.
+
+    Returns:
+        PromptRegistry: The shared registry.
+    """
+    global _prompt_registry
+    if _prompt_registry is None:
+        with _prompt_registry_lock:
+            if _prompt_registry is None:
+                registry = PromptRegistry(BUILTIN_TEMPLATES)
+                templates_path = os.environ.get("PROMPT_TEMPLATES_PATH")
+                if templates_path:
+                    try:
+                        registry.load_file(templates_path)
+                    except (OSError, ValueError, TypeError) as e:
+                        logger.error(f"Error loading prompt templates from {templates_path}: {str(e)}")
+                _prompt_registry = registry
+    return _prompt_registry
@@ -0,0 +1,194 @@
+"""Sliding-window rate limiting shared by the serverless handlers and the FastAPI app."""
+
+import math
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from src.python_ai_bot.shared import get_shared_table
+
+# window start, requests in the current window, requests in the previous one
+WINDOW_STATE = struct.Struct("<dII")
+
+
+class RateLimiter:
+    """Rate limiter for API requests.
+
+    Each client keeps at most `limit` timestamps, so a flood from one address
+    costs constant memory, and idle clients are pruned once per window.
+    """
+
+    def __init__(self, limit=10, window=60, clock=time.monotonic):
+        """Initialize rate limiter.
+
+        Args:
+            limit (int): Maximum number of requests allowed in the window.
+            window (int): Time window in seconds.
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.records = {}  # {client_ip: deque([timestamp1, timestamp2, ...])}
+        self._lock = threading.Lock()
+        self._next_prune = clock() + window
+
+    def is_rate_limited(self, client_ip):
+        """Check if a client is rate limited, counting the request if it is not.
+
+        Args:
+            client_ip (str): Client IP address.
+
+        Returns:
+            bool: True if rate limited, False otherwise.
+        """
+        current_time = self.clock()
+        with self._lock:
+            if current_time >= self._next_prune:
+                self._prune(current_time)
+
+            timestamps = self.records.get(client_ip)
+            if timestamps is None:
+                timestamps = self.records[client_ip] = deque()
+
+            # Remove old timestamps
+            while timestamps and current_time - timestamps[0] >= self.window:
+                timestamps.popleft()
+
+            # Check if limit reached
+            if len(timestamps) >= self.limit:
+                return True
+
+            # Add new timestamp
+            timestamps.append(current_time)
+            return False
+
+    def retry_after(self, client_ip):
+        """Get the number of seconds until a client may send another request.
+
+        Args:
+            client_ip (str): Client IP address.
+
+        Returns:
+            int: Whole seconds to wait, 0 if the client is not limited.
+        """
+        with self._lock:
+            timestamps = self.records.get(client_ip)
+            if not timestamps or len(timestamps) < self.limit:
+                return 0
+            return max(1, int(timestamps[0] + self.window - self.clock() + 0.999))
+
+    def _prune(self, current_time):
+        """Drop clients whose newest request is outside the window."""
+        stale = [
+            client_ip
+            for client_ip, timestamps in self.records.items()
+            if not timestamps or current_time - timestamps[-1] >= self.window
+        ]
+        for client_ip in stale:
+            del self.records[client_ip]
+        self._next_prune = current_time + self.window
+
+
+class SharedRateLimiter:
+    """Rate limiter whose counters live in a table shared by every worker process.
+
+    Each client is a fixed-size sliding-window counter: the requests in the
+    current fixed window plus the previous window's, weighted by how much of
+    it still overlaps the sliding window. That approximates the exact log
+    kept by RateLimiter in constant space per client.
+    """
+
+    def __init__(self, table, limit=10, window=60, clock=time.time):
+        """Initialize rate limiter.
+
+        Args:
+            table (SharedTable): Table holding the counters.
+            limit (int): Maximum number of requests allowed in the window.
+            window (int): Time window in seconds.
+            clock (callable, optional): Time source returning epoch seconds, shared by
+                every process. Defaults to time.time.
+        """
+        self.table = table
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+
+    def _roll(self, raw, now):
+        """Advance a client's counter to the window containing now."""
+        window_start = now - now % self.window
+        if raw is None:
+            return window_start, 0, 0
+        start, current, previous = WINDOW_STATE.unpack(raw)
+        if now < start + self.window:
+            return start, current, previous
+        if now < start + 2 * self.window:
+            return window_start, 0, current
+        return window_start, 0, 0
+
+    def _estimate(self, start, current, previous, now):
+        return previous * (1 - (now - start) / self.window) + current
+
+    def is_rate_limited(self, client_ip):
+        """Check if a client is rate limited, counting the request if it is not.
+
+        Args:
+            client_ip (str): Client IP address.
+
+        Returns:
+            bool: True if rate limited, False otherwise.
+        """
+        now = self.clock()
+        limited = []
+
+        def count(raw):
+            start, current, previous = self._roll(raw, now)
+            if self._estimate(start, current, previous, now) >= self.limit:
+                limited.append(True)
+            else:
+                current += 1
+            return WINDOW_STATE.pack(start, current, previous)
+
+        self.table.update(client_ip, count, ttl=2 * self.window)
+        return bool(limited)
+
+    def retry_after(self, client_ip):
+        """Get the number of seconds until a client may send another request.
+
+        Args:
+            client_ip (str): Client IP address.
+
+        Returns:
+            int: Whole seconds to wait, 0 if the client is not limited.
+        """
+        now = self.clock()
+        start, current, previous = self._roll(self.table.get(client_ip), now)
+        if self._estimate(start, current, previous, now) < self.limit:
+            return 0
+        if current < self.limit:
+            # Wait for enough of the previous window to slide out
+            ready_at = start + self.window * (1 - (self.limit - current) / previous)
+        else:
+            # Wait for this window to become the previous one and partly slide out
+            ready_at = start + self.window * (2 - self.limit / current)
+        return max(1, math.ceil(ready_at - now))
+
+
+def make_rate_limiter(limit=10, window=60):
+    """Build a rate limiter, shared by every worker process when SHARED_STATE_DIR is set.
+
+    Args:
+        limit (int): Maximum number of requests allowed in the window.
+        window (int): Time window in seconds.
+
+    Returns:
+        SharedRateLimiter: A shared limiter, or a per-process RateLimiter without shared state.
+    """
+    table = get_shared_table(
+        "ratelimit", slots=int(os.environ.get("SHARED_RATE_LIMIT_SLOTS", "16384")), slot_size=64
+    )
+    if table is None:
+        return RateLimiter(limit=limit, window=window)
+    return SharedRateLimiter(table, limit=limit, window=window)
@@ -0,0 +1,592 @@
+"""Local vector index for grounding answers in our own documents.
+
+Documents are split into overlapping chunks, embedded, and appended to a
+float32 matrix on disk that is searched through np.memmap, so the index is
+paged in by the OS rather than loaded, and appends never rewrite what is
+already there. Rows are normalized when added, which makes cosine
+similarity a single matrix-vector product.
+
+Exact search reads every row. For millions of chunks an inverted file
+(IVF) index can be trained: rows are assigned to their nearest of nlist
+centroids, and a query only scores the rows of its nprobe nearest lists.
+Rows appended after training are assigned as they arrive, without
+retraining.
+
+Several processes may open the same directory. Appends take a lock file,
+so one writer at a time picks the next row ids, and every process catches
+up with rows the others appended before it searches. Each chunk belongs to
+the tenant that added it, and a tenant's searches only score its own rows.
+"""
+
+import atexit
+import fcntl
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from src.python_ai_bot.ai.openai_client import DEFAULT_EMBEDDING_MODEL, OpenAIClient
+from src.python_ai_bot.embeddings import get_embedding_batcher
+from src.python_ai_bot.pool import get_http_client
+from src.python_ai_bot.usage import get_usage_meter
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+ASSIGNMENTS_FILE = "assignments.i32"
+CENTROIDS_FILE = "centroids.npy"
+CHUNKS_DB = "chunks.db"
+LOCK_FILE = "index.lock"
+
+# Rows scored per matrix product when assigning rows to IVF lists
+ASSIGN_BLOCK = 16384
+
+
+def chunk_text(text, chunk_size=1000, overlap=200):
+    """Split text into overlapping chunks on word boundaries.
+
+    Args:
+        text (str): Document text.
+        chunk_size (int, optional): Target characters per chunk. Defaults to 1000.
+        overlap (int, optional): Characters repeated from the end of the previous chunk,
+            so a passage cut at a boundary is whole in one of them. Defaults to 200.
+
+    Returns:
+        list: The chunks, in order.
+    """
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = start
+        length = 0
+        while end < len(words) and (end == start or length + len(words[end]) + 1 <= chunk_size):
+            length += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back over up to overlap characters of words, always moving forward
+        back = end
+        carried = 0
+        while back > start + 1 and carried + len(words[back - 1]) + 1 <= overlap:
+            back -= 1
+            carried += len(words[back]) + 1
+        start = back
+    return chunks
+
+
+def normalize(vectors):
+    """Scale rows to unit length, leaving all-zero rows as they are.
+
+    Args:
+        vectors (array-like): One vector or a matrix of row vectors.
+
+    Returns:
+        numpy.ndarray: float32 copy with unit-length rows.
+    """
+    vectors = np.array(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """Get the indices of the k highest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    best = np.argpartition(-scores, k)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def train_centroids(sample, nlist, iterations=10, seed=0):
+    """Cluster unit vectors with spherical k-means.
+
+    Args:
+        sample (numpy.ndarray): Unit-length training rows.
+        nlist (int): Number of centroids.
+        iterations (int, optional): Rounds of assignment and update. Defaults to 10.
+        seed (int, optional): Seed for the initial centroids. Defaults to 0.
+
+    Returns:
+        numpy.ndarray: (nlist, dimensions) unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        # Re-seed empty lists from random rows so every list stays in use
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign_lists(rows, centroids):
+    """Get the nearest centroid of each row.
+
+    Args:
+        rows (numpy.ndarray): Unit-length rows.
+        centroids (numpy.ndarray): Unit-length centroids.
+
+    Returns:
+        numpy.ndarray: int32 list number per row.
+    """
+    labels = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), ASSIGN_BLOCK):
+        block = np.asarray(rows[start:start + ASSIGN_BLOCK], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+class VectorIndex:
+    """Chunks and their unit-length embeddings, stored in a directory."""
+
+    def __init__(self, directory, dimensions=None, nprobe=8):
+        """Open the index, creating it if needed.
+
+        Args:
+            directory (str): Directory holding the vector file and the chunk database.
+            dimensions (int, optional): Length of the vectors. Defaults to None, in
+                which case it is taken from the index or the first vectors added.
+            nprobe (int, optional): IVF lists scored per query once an IVF index has
+                been trained. Defaults to 8.
+
+        Raises:
+            ValueError: If the index holds vectors of a different length.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+        self._conn = sqlite3.connect(os.path.join(directory, CHUNKS_DB), timeout=5.0, check_same_thread=False)
+        self._matrix = None
+        self.centroids = None
+        self._lists = None
+        with self._exclusive():
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS chunks ("
+                    "id INTEGER PRIMARY KEY, document TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, "
+                    "tenant TEXT)"
+                )
+                columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+                if "tenant" not in columns:
+                    # Chunks indexed before tenants were recorded belong to none of them
+                    self._conn.execute("ALTER TABLE chunks ADD COLUMN tenant TEXT")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_tenant ON chunks (tenant, id)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            stored = self._stored_dimensions()
+            if stored and dimensions and stored != dimensions:
+                raise ValueError(f"Index in {directory} holds {stored}-dimensional vectors, not {dimensions}")
+            self.dimensions = stored or dimensions
+            self.count = self._stored_count()
+            if self.dimensions:
+                self._recover()
+                self._load_ivf(repair=True)
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the lock of this index in every process, so one writer at a time appends."""
+        with self._lock:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN)
+
+    def _stored_dimensions(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dimensions'").fetchone()
+        return int(row[0]) if row else None
+
+    def _stored_count(self):
+        # Ids are the row numbers, so this is the row count without a table scan
+        return self._conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM chunks").fetchone()[0]
+
+    def _refresh(self):
+        """Catch up with rows, and an IVF index, that other processes have written."""
+        if self.dimensions is None:
+            self.dimensions = self._stored_dimensions()
+            if self.dimensions is None:
+                return
+        count = self._stored_count()
+        if count > self.count:
+            first, self.count = self.count, count
+            if self.centroids is not None:
+                labels = assign_lists(self.matrix()[first:], self.centroids)
+                lists = list(self._lists)
+                for label in np.unique(labels):
+                    lists[label] = np.concatenate([lists[label], np.flatnonzero(labels == label) + first])
+                self._lists = lists
+        if self.centroids is None:
+            self._load_ivf()
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    @property
+    def row_bytes(self):
+        return self.dimensions * 4
+
+    def _recover(self):
+        """Drop vectors written by an append whose chunks were never committed."""
+        path = self.vectors_path
+        rows = os.path.getsize(path) // self.row_bytes if os.path.exists(path) else 0
+        if rows > self.count:
+            logger.warning(f"Dropping {rows - self.count} uncommitted vectors from {path}")
+            os.truncate(path, self.count * self.row_bytes)
+        elif rows < self.count:
+            logger.warning(f"Dropping {self.count - rows} chunks without vectors from {self.directory}")
+            with self._conn:
+                self._conn.execute("DELETE FROM chunks WHERE id >= ?", (rows,))
+            self.count = rows
+
+    def _load_ivf(self, repair=False):
+        """Load a trained IVF index, assigning rows added since it was last written.
+
+        Args:
+            repair (bool, optional): Rewrite the assignments to match the rows; only
+                while holding the index lock. Defaults to False.
+        """
+        path = os.path.join(self.directory, CENTROIDS_FILE)
+        if not os.path.exists(path):
+            return
+        self.centroids = np.load(path)
+        assignments_path = os.path.join(self.directory, ASSIGNMENTS_FILE)
+        stored = np.fromfile(assignments_path, dtype=np.int32)
+        labels = stored[:self.count]
+        if len(labels) < self.count:
+            missing = assign_lists(self.matrix()[len(labels):], self.centroids)
+            labels = np.concatenate([labels, missing])
+        if repair and len(stored) != self.count:
+            # Keep the file aligned with the rows, so later appends land in place
+            labels.tofile(assignments_path)
+        self._lists = self._build_lists(labels)
+
+    def _build_lists(self, labels):
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        return [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def matrix(self):
+        """Get the vectors as a read-only memory-mapped (count, dimensions) matrix."""
+        matrix = self._matrix
+        if matrix is None or len(matrix) != self.count:
+            if not self.count:
+                return np.empty((0, self.dimensions or 0), dtype=np.float32)
+            matrix = self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dimensions)
+            )
+        return matrix
+
+    def has_document(self, document, tenant=None):
+        """Check whether any chunks of a document are indexed.
+
+        Args:
+            document (str): Document id.
+            tenant (str, optional): Tenant the document belongs to. Defaults to None
+                (documents indexed without a tenant).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM chunks WHERE document = ? AND tenant IS ? LIMIT 1", (document, tenant)
+            ).fetchone()
+        return row is not None
+
+    def add(self, vectors, texts, document, tenant=None):
+        """Append chunks and their vectors.
+
+        Args:
+            vectors (array-like): One vector per chunk.
+            texts (list): Chunk texts.
+            document (str): Document the chunks belong to.
+            tenant (str, optional): Tenant the document belongs to. Defaults to None.
+
+        Returns:
+            list: Ids of the new chunks.
+
+        Raises:
+            ValueError: If the vectors and texts do not match, or the vectors have the
+                wrong length.
+        """
+        rows = normalize(vectors)
+        if rows.ndim != 2 or len(rows) != len(texts):
+            raise ValueError("Expected one vector per chunk")
+        with self._exclusive():
+            self._refresh()
+            if self.dimensions is None:
+                self.dimensions = rows.shape[1]
+                with self._conn:
+                    self._conn.execute("INSERT INTO meta VALUES ('dimensions', ?)", (str(self.dimensions),))
+            if rows.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {rows.shape[1]}")
+            # A writer that died mid-append may have left vectors without chunks
+            self._recover()
+
+            first = self.count
+            # Vectors first: chunks without vectors are dropped on open, and so are
+            # vectors without chunks, so a crash between the two loses only this append
+            with open(self.vectors_path, "ab") as f:
+                f.write(rows.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            ids = list(range(first, first + len(rows)))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO chunks (id, document, position, text, tenant) VALUES (?, ?, ?, ?, ?)",
+                    [(i, document, position, text, tenant) for position, (i, text) in enumerate(zip(ids, texts))],
+                )
+            self.count += len(rows)
+
+            if self.centroids is not None:
+                labels = assign_lists(rows, self.centroids)
+                with open(os.path.join(self.directory, ASSIGNMENTS_FILE), "ab") as f:
+                    f.write(labels.tobytes())
+                lists = list(self._lists)
+                for label in np.unique(labels):
+                    lists[label] = np.concatenate([lists[label], np.flatnonzero(labels == label) + first])
+                self._lists = lists
+        return ids
+
+    def train_ivf(self, nlist, sample_size=None, iterations=10):
+        """Build an IVF index over the current rows.
+
+        Args:
+            nlist (int): Number of lists; around the square root of the row count
+                is a good start.
+            sample_size (int, optional): Rows the centroids are trained on. Defaults
+                to None (64 per list).
+            iterations (int, optional): k-means iterations. Defaults to 10.
+
+        Raises:
+            ValueError: If there are fewer rows than lists.
+        """
+        with self._exclusive():
+            self._refresh()
+            matrix = self.matrix()
+            if len(matrix) < nlist:
+                raise ValueError(f"Need at least {nlist} vectors to train {nlist} lists")
+            sample_size = min(len(matrix), sample_size or 64 * nlist)
+            rng = np.random.default_rng(0)
+            sample = np.asarray(matrix[np.sort(rng.choice(len(matrix), sample_size, replace=False))])
+            centroids = train_centroids(sample, nlist, iterations=iterations)
+            labels = assign_lists(matrix, centroids)
+            np.save(os.path.join(self.directory, CENTROIDS_FILE), centroids)
+            labels.tofile(os.path.join(self.directory, ASSIGNMENTS_FILE))
+            self.centroids = centroids
+            self._lists = self._build_lists(labels)
+        logger.info(f"Trained an IVF index with {nlist} lists over {len(labels)} vectors")
+
+    def search(self, query, k=5, nprobe=None, exact=False, tenant=None):
+        """Find the chunks most similar to a query vector.
+
+        Args:
+            query (array-like): Query vector.
+            k (int, optional): Number of results. Defaults to 5.
+            nprobe (int, optional): IVF lists to score. Defaults to None (self.nprobe).
+            exact (bool, optional): Score every row even if an IVF index is trained.
+                Defaults to False.
+            tenant (str, optional): Only score the chunks of this tenant. Defaults to
+                None (every chunk).
+
+        Returns:
+            list: (chunk id, cosine similarity) pairs, most similar first.
+        """
+        with self._lock:
+            self._refresh()
+            matrix = self.matrix()
+            centroids, lists = self.centroids, self._lists
+            owned = None if tenant is None else self._tenant_rows(tenant, len(matrix))
+        if not len(matrix):
+            return []
+        query = normalize(query)
+        if exact or centroids is None:
+            if owned is None:
+                scores = matrix @ query
+                best = top_k(scores, k)
+                return [(int(i), float(scores[i])) for i in best]
+            candidates = owned
+        else:
+            probes = top_k(centroids @ query, nprobe or self.nprobe)
+            candidates = np.sort(np.concatenate([lists[p] for p in probes]))
+            candidates = candidates[candidates < len(matrix)]
+            if owned is not None:
+                candidates = np.intersect1d(candidates, owned, assume_unique=True)
+        if not len(candidates):
+            return []
+        scores = matrix[candidates] @ query
+        best = top_k(scores, k)
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    def _tenant_rows(self, tenant, count):
+        """Get the sorted ids of a tenant's first count rows."""
+        rows = self._conn.execute("SELECT id FROM chunks WHERE tenant = ? AND id < ? ORDER BY id", (tenant, count))
+        return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    def chunks(self, ids):
+        """Get chunks by id.
+
+        Args:
+            ids (list): Chunk ids.
+
+        Returns:
+            dict: id -> {"document", "position", "text"}.
+        """
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, document, position, text FROM chunks WHERE id IN ({placeholders})", list(ids)
+            ).fetchall()
+        return {row[0]: {"document": row[1], "position": row[2], "text": row[3]} for row in rows}
+
+    def close(self):
+        """Close the chunk database and the lock file."""
+        with self._lock:
+            self._matrix = None
+            self._conn.close()
+            os.close(self._lock_fd)
+
+
+class Retriever:
+    """Ingests documents into a vector index and finds context for questions."""
+
+    def __init__(self, index, client, model=DEFAULT_EMBEDDING_MODEL, dimensions=None, batcher=None,
+                 chunk_size=1000, overlap=200, ivf_lists=0):
+        """Initialize the retriever.
+
+        Args:
+            index (VectorIndex): Index the chunks are stored in.
+            client (OpenAIClient): Client used to embed document chunks.
+            model (str, optional): Embedding model. Defaults to "text-embedding-3-small".
+            dimensions (int, optional): Length to shorten vectors to. Defaults to None.
+            batcher (EmbeddingBatcher, optional): Batcher used to embed questions, so
+                concurrent questions share upstream calls. Defaults to None (the client).
+            chunk_size (int, optional): Target characters per chunk. Defaults to 1000.
+            overlap (int, optional): Characters shared by consecutive chunks. Defaults to 200.
+            ivf_lists (int, optional): Train an IVF index with this many lists once the
+                index holds 64 vectors per list, 0 to always search exactly. Defaults to 0.
+        """
+        self.index = index
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.batcher = batcher
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.ivf_lists = ivf_lists
+
+    def ingest(self, document, text, tenant=None, batch_size=64):
+        """Chunk, embed and index a document.
+
+        Args:
+            document (str): Document id.
+            text (str): Document text.
+            tenant (str, optional): Tenant the document belongs to, and who the embedding
+                tokens are billed to. Defaults to None.
+            batch_size (int, optional): Chunks per embeddings call. Defaults to 64.
+
+        Returns:
+            int: Number of chunks indexed.
+
+        Raises:
+            ValueError: If the tenant already indexed the document.
+            EmbeddingError: If the chunks cannot be embedded.
+        """
+        if self.index.has_document(document, tenant=tenant):
+            raise ValueError(f"Document {document} is already indexed")
+        chunks = chunk_text(text, self.chunk_size, self.overlap)
+        vectors = []
+        for start in range(0, len(chunks), batch_size):
+            vectors.extend(self.client.embed(
+                chunks[start:start + batch_size], model=self.model, dimensions=self.dimensions, tenant=tenant
+            ))
+        if chunks:
+            self.index.add(vectors, chunks, document, tenant=tenant)
+        if self.ivf_lists and self.index.centroids is None and self.index.count >= 64 * self.ivf_lists:
+            self.index.train_ivf(self.ivf_lists)
+        logger.info(f"Indexed {len(chunks)} chunks of document {document}")
+        return len(chunks)
+
+    def retrieve(self, question, k=4, tenant=None):
+        """Find the chunks most relevant to a question.
+
+        Args:
+            question (str): The question.
+            k (int, optional): Number of chunks. Defaults to 4.
+            tenant (str, optional): Tenant whose documents are searched, and who the
+                embedding tokens are billed to. Defaults to None (every document).
+
+        Returns:
+            list: Chunks as dicts with id, document, position, text and score, best first.
+
+        Raises:
+            EmbeddingError: If the question cannot be embedded.
+        """
+        if self.batcher is not None:
+            query = self.batcher.embed(question, model=self.model, dimensions=self.dimensions, tenant=tenant)
+        else:
+            query = self.client.embed([question], model=self.model, dimensions=self.dimensions, tenant=tenant)[0]
+        hits = self.index.search(np.frombuffer(query, dtype=np.float32), k=k, tenant=tenant)
+        chunks = self.index.chunks([i for i, _ in hits])
+        return [dict(chunks[i], id=i, score=score) for i, score in hits if i in chunks]
+
+
+def build_prompt(question, chunks):
+    """Put retrieved chunks in front of a question.
+
+    Args:
+        question (str): The question.
+        chunks (list): Chunks from Retriever.retrieve.
+
+    Returns:
+        str: Prompt with numbered context passages followed by the question.
+    """
+    context = "\n\n".join(f"[{n}] ({chunk['document']}) {chunk['text']}" for n, chunk in enumerate(chunks, 1))
+    return f"Context:\n{context}\n\nQuestion: {question}"
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    """Get the process-wide retriever, configured from environment variables.
+
+    Returns:
+        Retriever: The shared retriever.
+    """
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                dimensions = int(os.environ.get("RETRIEVAL_DIMENSIONS", "512")) or None
+                index = VectorIndex(
+                    os.environ.get("RETRIEVAL_DIR", os.path.join(tempfile.gettempdir(), "python_ai_bot_index")),
+                    dimensions=dimensions,
+                    nprobe=int(os.environ.get("RETRIEVAL_IVF_PROBES", "8")),
+                )
+                _retriever = Retriever(
+                    index,
+                    OpenAIClient(usage_meter=get_usage_meter(), http_client=get_http_client()),
+                    model=os.environ.get("RETRIEVAL_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+                    dimensions=dimensions,
+                    batcher=get_embedding_batcher(),
+                    chunk_size=int(os.environ.get("RETRIEVAL_CHUNK_SIZE", "1000")),
+                    overlap=int(os.environ.get("RETRIEVAL_CHUNK_OVERLAP", "200")),
+                    ivf_lists=int(os.environ.get("RETRIEVAL_IVF_LISTS", "0")),
+                )
+                atexit.register(index.close)
+    return _retriever
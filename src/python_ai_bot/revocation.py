@@ -0,0 +1,318 @@
+"""Revocation of issued JWTs before they expire.
+
+Every issued token carries a jti claim. Revoking a token records its jti
+durably, in SQLite or in Redis when REVOCATION_REDIS_URL is set, until the
+token would have expired anyway. Looking every verified token up in the store
+would add a round trip to every request, so each process also keeps the
+revoked jtis in a Bloom filter:
+
+- a jti that is not in the filter has certainly not been revoked, which is
+  the answer for nearly every request, and costs a few hashes
+- only a filter hit, a revoked token or a rare false positive, asks the store
+
+The filter is refreshed incrementally: the store keeps revocations in order,
+and each refresh, at most every REVOCATION_REFRESH_INTERVAL seconds, adds just
+the ones after the last seen. Revocations made in the same process apply at
+once; those made elsewhere apply within the refresh interval.
+
+Neither store grows without bound: SQLite drops revocations of expired
+tokens, and the Redis stream is trimmed to REVOCATION_MAX_TOKEN_LIFETIME,
+which also caps the lifetime of issued tokens, so no entry is trimmed while
+its token is still valid.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_REFRESH_INTERVAL = 5.0
+DEFAULT_MAX_TOKEN_LIFETIME = 7 * 86400
+
+
+def max_token_lifetime():
+    """Get the longest lifetime, in seconds, of a token that may be issued."""
+    return int(os.environ.get("REVOCATION_MAX_TOKEN_LIFETIME", DEFAULT_MAX_TOKEN_LIFETIME))
+
+
+class BloomFilter:
+    """Fixed-size set of strings with no false negatives and a bounded false-positive rate."""
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        """Initialize an empty filter.
+
+        Args:
+            capacity (int): Items the filter is sized for.
+            error_rate (float, optional): False-positive rate at capacity. Defaults to DEFAULT_ERROR_RATE.
+        """
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add a string to the filter."""
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class SQLiteRevocationStore:
+    """Revoked jtis in a SQLite file, shared by every process on the host that opens it."""
+
+    def __init__(self, path, clock=time.time):
+        """Initialize the store, creating its table if needed.
+
+        Args:
+            path (str): Database file, or ":memory:".
+            clock (callable, optional): Time source returning epoch seconds. Defaults to time.time.
+        """
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS revocations ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, jti TEXT UNIQUE NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def add(self, jti, expires_at):
+        """Record a revoked jti until expires_at, dropping records whose tokens have expired."""
+        now = self.clock()
+        with self._lock:
+            self._db.execute("DELETE FROM revocations WHERE expires_at <= ?", (now,))
+            self._db.execute(
+                "INSERT OR IGNORE INTO revocations (jti, expires_at) VALUES (?, ?)", (jti, expires_at)
+            )
+
+    def contains(self, jti):
+        """Check whether a jti has been revoked and its token has not expired yet."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM revocations WHERE jti = ? AND expires_at > ?", (jti, self.clock())
+            ).fetchone()
+        return row is not None
+
+    def changes(self, cursor=None):
+        """Get the jtis revoked after cursor.
+
+        Args:
+            cursor (optional): Cursor returned by an earlier call. Defaults to None (all of them).
+
+        Returns:
+            tuple: (list of jtis, cursor to pass next time)
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, jti FROM revocations WHERE seq > ? ORDER BY seq", (cursor or 0,)
+            ).fetchall()
+        if not rows:
+            return [], cursor
+        return [jti for _, jti in rows], rows[-1][0]
+
+
+class RedisRevocationStore:
+    """Revoked jtis in Redis, shared by every instance using the same URL.
+
+    Each revocation is a key that expires with its token, plus an entry in a
+    stream that instances read from their last seen ID onwards. Stream entries
+    older than the longest token lifetime can only name expired tokens, and
+    are trimmed as new ones are added.
+    """
+
+    def __init__(self, url, prefix="revoked:", clock=time.time, max_lifetime=DEFAULT_MAX_TOKEN_LIFETIME):
+        """Initialize the store.
+
+        Args:
+            url (str): Redis connection URL.
+            prefix (str, optional): Key prefix. Defaults to "revoked:".
+            clock (callable, optional): Time source returning epoch seconds. Defaults to time.time.
+            max_lifetime (float, optional): Longest lifetime of an issued token, in seconds.
+                Defaults to DEFAULT_MAX_TOKEN_LIFETIME.
+        """
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.log_key = prefix + "log"
+        self.clock = clock
+        self.max_lifetime = max_lifetime
+
+    def add(self, jti, expires_at):
+        """Record a revoked jti until expires_at."""
+        now = self.clock()
+        ttl = int(math.ceil(expires_at - now))
+        if ttl <= 0:
+            return
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + "jti:" + jti, 1, ex=ttl)
+        # Stream IDs start with their time in milliseconds
+        pipe.xadd(self.log_key, {"jti": jti}, minid=int((now - self.max_lifetime) * 1000), approximate=True)
+        pipe.execute()
+
+    def contains(self, jti):
+        """Check whether a jti has been revoked and its token has not expired yet."""
+        return bool(self.redis.exists(self.prefix + "jti:" + jti))
+
+    def changes(self, cursor=None):
+        """Get the jtis revoked after cursor, as (list of jtis, cursor to pass next time)."""
+        entries = self.redis.xrange(self.log_key, min="(" + cursor if cursor else "-")
+        if not entries:
+            return [], cursor
+        jtis = [fields[b"jti"].decode() for _, fields in entries]
+        last_id = entries[-1][0]
+        return jtis, last_id.decode() if isinstance(last_id, bytes) else last_id
+
+
+class RevocationList:
+    """Bloom filter of revoked jtis in front of a durable revocation store."""
+
+    def __init__(self, store, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL, clock=time.monotonic):
+        """Initialize the list and load the revocations recorded so far.
+
+        Args:
+            store (SQLiteRevocationStore or RedisRevocationStore): Where revocations are kept.
+            capacity (int, optional): Revocations the filter is sized for; it doubles when
+                they are exceeded. Defaults to DEFAULT_CAPACITY.
+            error_rate (float, optional): Share of unrevoked tokens that fall through to the
+                store at capacity. Defaults to DEFAULT_ERROR_RATE.
+            refresh_interval (float, optional): Seconds between reads of new revocations.
+                Defaults to DEFAULT_REFRESH_INTERVAL.
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.store = store
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.filter = BloomFilter(capacity, error_rate)
+        self.store_lookups = 0
+        self._cursor = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Add revocations recorded since the last refresh to the filter."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            jtis, cursor = self.store.changes(self._cursor)
+        except Exception as e:
+            logger.warning(f"Could not refresh revoked tokens: {str(e)}")
+            return
+        self._refreshed_at = self.clock()
+        for jti in jtis:
+            self.filter.add(jti)
+        self._cursor = cursor
+        if self.filter.count > self.filter.capacity:
+            # Past capacity the false-positive rate climbs, so rebuild, doubling the size
+            jtis, cursor = self.store.changes()
+            capacity = self.filter.capacity * 2
+            while capacity < len(jtis):
+                capacity *= 2
+            logger.info(f"Growing revocation filter to {capacity} entries")
+            grown = BloomFilter(capacity, self.error_rate)
+            for jti in jtis:
+                grown.add(jti)
+            self.filter, self._cursor = grown, cursor
+
+    def revoke(self, jti, expires_at):
+        """Revoke a token.
+
+        Args:
+            jti (str): The token's jti claim.
+            expires_at (float): The token's exp claim; the revocation is kept until then.
+        """
+        self.store.add(jti, expires_at)
+        with self._lock:
+            self.filter.add(jti)
+        logger.info(f"Revoked token {jti}")
+
+    def is_revoked(self, jti):
+        """Check whether a token has been revoked, asking the store only on a filter hit."""
+        if self._refreshed_at is None or self.clock() - self._refreshed_at >= self.refresh_interval:
+            # One caller refreshes; the rest carry on with the filter they have
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                finally:
+                    self._lock.release()
+        if jti not in self.filter:
+            return False
+        self.store_lookups += 1
+        try:
+            return self.store.contains(jti)
+        except Exception as e:
+            # Only tokens the filter flags get here, so failing closed locks out very few
+            logger.error(f"Could not check revoked token {jti}: {str(e)}")
+            return True
+
+
+_revocation_list = None
+_revocation_list_lock = threading.Lock()
+
+
+def get_revocation_list():
+    """Get the process-wide revocation list, configured from environment variables.
+
+    Uses Redis when REVOCATION_REDIS_URL is set, otherwise the SQLite file at
+    REVOCATION_DB_PATH.
+
+    Returns:
+        RevocationList: The shared list.
+    """
+    global _revocation_list
+    if _revocation_list is None:
+        with _revocation_list_lock:
+            if _revocation_list is None:
+                redis_url = os.environ.get("REVOCATION_REDIS_URL")
+                if redis_url:
+                    store = RedisRevocationStore(redis_url, max_lifetime=max_token_lifetime())
+                else:
+                    path = os.environ.get("REVOCATION_DB_PATH") or os.path.join(
+                        tempfile.gettempdir(), "python_ai_bot_revocations.db"
+                    )
+                    store = SQLiteRevocationStore(path)
+                _revocation_list = RevocationList(
+                    store,
+                    capacity=int(os.environ.get("REVOCATION_CAPACITY", DEFAULT_CAPACITY)),
+                    error_rate=float(os.environ.get("REVOCATION_ERROR_RATE", DEFAULT_ERROR_RATE)),
+                    refresh_interval=float(os.environ.get("REVOCATION_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL)),
+                )
+    return _revocation_list
+
+
+def is_token_revoked(payload):
+    """Check whether a verified JWT payload belongs to a revoked token.
+
+    Tokens issued before jti claims were added cannot be revoked and are
+    accepted until they expire.
+    """
+    jti = payload.get("jti")
+    return jti is not None and get_revocation_list().is_revoked(str(jti))
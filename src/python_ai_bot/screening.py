@@ -0,0 +1,342 @@
+"""Local screening of prompts before they are sent upstream.
+
+Blocked or junk prompts are rejected here, in microseconds, instead of
+costing a round trip and tokens at OpenAI. Two kinds of checks run:
+
+- A blocklist of terms, compiled once into an Aho-Corasick automaton, so a
+  prompt is scanned in a single pass however many terms there are.
+- Compiled regular expressions for PII, prompt-injection signatures and
+  junk, each named so a rejection says which rule matched.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# What a screening check found: the rule's name, its category and the matched text
+Match = namedtuple("Match", ["rule", "category", "text"])
+
+_WORD = re.compile(r"\w+")
+
+
+class AhoCorasick:
+    """Multi-pattern matcher that finds any of many terms in one pass over a text."""
+
+    def __init__(self, patterns, whole_words=True):
+        """Build the automaton.
+
+        Args:
+            patterns (iterable): Terms to find, matched case-insensitively.
+            whole_words (bool, optional): Only match terms that are not part of a longer
+                word, so "ass" does not match "class". Defaults to True.
+        """
+        self.patterns = []
+        self.whole_words = whole_words
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        seen = set()
+        for pattern in patterns:
+            pattern = pattern.strip().lower()
+            if pattern and pattern not in seen:
+                seen.add(pattern)
+                self._insert(pattern, len(self.patterns))
+                self.patterns.append(pattern)
+        self._link()
+        # A whole-word match starts where the text has a word equal to the term's first
+        # word, so a prompt sharing no word with those is cleared by one set operation
+        # in C, and only prompts that do are walked through the automaton in Python
+        self._first_words = None
+        if whole_words and all(is_word_char(pattern, 0) for pattern in self.patterns):
+            self._first_words = {_WORD.match(pattern).group() for pattern in self.patterns}
+        # From the root, jump straight to the next place a term can start: any of
+        # their first characters, and with whole_words only at the start of a word
+        first = "".join(sorted(self._goto[0]))
+        start = ("(?<!\\w)" if whole_words else "") + f"[{re.escape(first)}]"
+        self._start = re.compile(start) if first else None
+
+    def _insert(self, pattern, index):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + (index,)
+
+    def _link(self):
+        """Set the failure links breadth first, merging the outputs of suffix states."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+                queue.append(next_state)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def find(self, text):
+        """Find the first term in a text.
+
+        Args:
+            text (str): Text to scan.
+
+        Returns:
+            str: The term that ends first, or None.
+        """
+        if self._start is None:
+            return None
+        text = text.lower()
+        if self._first_words is not None and self._first_words.isdisjoint(_WORD.findall(text)):
+            return None
+        goto, fail, out, start_search = self._goto, self._fail, self._out, self._start.search
+        length = len(text)
+        state = 0
+        end = 0
+        while end < length:
+            if not state:
+                found = start_search(text, end)
+                if found is None:
+                    return None
+                end = found.start()
+            char = text[end]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                pattern = self.patterns[index]
+                if not self.whole_words or (
+                    not is_word_char(text, end - len(pattern)) and not is_word_char(text, end + 1)
+                ):
+                    return pattern
+            end += 1
+        return None
+
+
+def is_word_char(text, i):
+    """Check whether text[i] exists and is a letter, digit or underscore, like \\w."""
+    return 0 <= i < len(text) and (text[i].isalnum() or text[i] == "_")
+
+
+def contains_any(*needles):
+    """Make a rule prefilter that passes texts containing any of the substrings."""
+
+    def prefilter(text):
+        return any(needle in text for needle in needles)
+
+    return prefilter
+
+
+def contains_match(pattern):
+    """Make a rule prefilter that passes texts a cheaper regular expression matches."""
+    return re.compile(pattern).search
+
+
+def has_run(length):
+    """Make a rule prefilter that passes texts that may repeat one character length times.
+
+    Any such run covers a whole aligned window of half its length, so only one
+    position per window is compared, and texts without runs are cleared in n/(length/2) steps.
+    """
+    step = length // 2
+
+    def prefilter(text):
+        for i in range(0, len(text) - step + 1, step):
+            if text[i] == text[i + step - 1] and text.count(text[i], i, i + step) == step:
+                return True
+        return False
+
+    return prefilter
+
+
+# Luhn doubles every second digit from the right, subtracting 9 from two-digit results
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+_SEPARATORS = str.maketrans("", "", " -")
+
+
+def luhn_valid(number):
+    """Check a card number's Luhn checksum, ignoring spaces and dashes."""
+    digits = number.translate(_SEPARATORS)
+    checksum = sum(map(int, digits[-1::-2])) + sum(_LUHN_DOUBLED[int(d)] for d in digits[-2::-2])
+    return checksum % 10 == 0
+
+
+def ssn_valid(ssn):
+    """Check that a NNN-NN-NNNN number is in a range the SSA issues."""
+    return ssn[:3] not in ("000", "666") and ssn[0] != "9" and ssn[4:6] != "00" and ssn[7:] != "0000"
+
+
+class Rule:
+    """A named regular expression, with optional checks before and after it runs."""
+
+    def __init__(self, name, category, pattern, validate=None, prefilter=None, word_start=False, flags=0):
+        """Compile the rule.
+
+        Rules are matched against the lowercased prompt, so patterns should be
+        lowercase. Patterns that begin with a literal or a character class are
+        found with the regular expression engine's fast prefix scan, so word
+        boundaries at the start are checked with word_start instead of \\b.
+
+        Args:
+            name (str): Rule name reported when it matches.
+            category (str): Kind of rule, e.g. "pii" or "injection".
+            pattern (str): Regular expression.
+            validate (callable, optional): Called with the matched text; the match only
+                counts if it returns True. Defaults to None.
+            prefilter (callable, optional): Called with the text; returning False skips
+                the regular expression. Defaults to None.
+            word_start (bool, optional): Only count matches that start a word. Defaults to False.
+            flags (int, optional): Regular expression flags. Defaults to 0.
+        """
+        self.name = name
+        self.category = category
+        self.regex = re.compile(pattern, flags)
+        self.validate = validate
+        self.prefilter = prefilter
+        self.word_start = word_start
+
+    def find(self, text):
+        """Get the first text the rule matches, or None."""
+        if self.prefilter is not None and not self.prefilter(text):
+            return None
+        pos = 0
+        while True:
+            found = self.regex.search(text, pos)
+            if found is None:
+                return None
+            if self.word_start and is_word_char(text, found.start() - 1):
+                pos = found.start() + 1
+            elif self.validate is None or self.validate(found.group()):
+                return found.group()
+            else:
+                pos = found.end()
+
+
+# Scanning must stay linear in the prompt length, so no pattern may scan forward from
+# every position: the email rule starts at the @, with a lookbehind for the local part,
+# and card numbers are only matched where a digit run begins
+DEFAULT_RULES = [
+    Rule("pii-email", "pii", r"@(?<=[a-z0-9._%+-]@)[a-z0-9-]+(?:\.[a-z0-9-]+)+\b", prefilter=contains_any("@")),
+    Rule("pii-ssn", "pii", r"\d{3}-\d{2}-\d{4}\b", validate=ssn_valid, prefilter=contains_any("-"), word_start=True),
+    Rule(
+        "pii-credit-card", "pii", r"(?<!\d)\d(?:[ -]?\d){12,18}\b",
+        validate=luhn_valid, prefilter=contains_match(r"\d(?:[ -]?\d){12}"), word_start=True,
+    ),
+    Rule(
+        "injection-ignore-instructions",
+        "injection",
+        r"(?:ignore|disregard|forget)\s+(?:all\s+|any\s+)?(?:of\s+)?(?:the\s+|your\s+)?"
+        r"(?:previous|prior|above|earlier|preceding|system)\s+(?:instructions|prompts?|rules|directions)\b",
+        prefilter=contains_any("ignore", "disregard", "forget"),
+        word_start=True,
+    ),
+    Rule(
+        "injection-reveal-system-prompt",
+        "injection",
+        r"(?:reveal|show|print|repeat|output|leak)\s+(?:me\s+)?(?:your|the)\s+"
+        r"(?:system|hidden|initial|original)\s+(?:prompt|instructions|message)\b",
+        prefilter=contains_any("prompt", "instructions", "message"),
+        word_start=True,
+    ),
+    Rule(
+        "injection-role-override",
+        "injection",
+        r"(?:you\s+are\s+now\s+(?:dan|in\s+developer\s+mode|jailbroken)|developer\s+mode\s+enabled)\b",
+        prefilter=contains_any("now", "developer"),
+        word_start=True,
+    ),
+    Rule("junk-repetition", "junk", r"(.)\1{49,}", prefilter=has_run(50), flags=re.DOTALL),
+]
+
+
+class Screener:
+    """Checks prompts against a blocklist and a set of rules."""
+
+    def __init__(self, blocklist=(), rules=None):
+        """Compile the screener.
+
+        Args:
+            blocklist (iterable, optional): Terms that may not appear in a prompt as
+                whole words. Defaults to ().
+            rules (list, optional): Rules to apply. Defaults to None (DEFAULT_RULES).
+        """
+        self.blocklist = AhoCorasick(blocklist)
+        self.rules = DEFAULT_RULES if rules is None else rules
+
+    def scan(self, text):
+        """Check a prompt.
+
+        Args:
+            text (str): The prompt.
+
+        Returns:
+            Match: The first check the prompt fails, or None if it passes.
+        """
+        text = text.lower()
+        if self.blocklist:
+            term = self.blocklist.find(text)
+            if term is not None:
+                return Match("blocklist", "blocklist", term)
+        for rule in self.rules:
+            found = rule.find(text)
+            if found is not None:
+                return Match(rule.name, rule.category, found)
+        return None
+
+
+def load_blocklist(path):
+    """Read blocklist terms from a file, one per line, skipping blank lines and # comments.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        list: The terms.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+_screener = None
+_screener_lock = threading.Lock()
+
+
+def get_screener():
+    """Get the process-wide screener, configured from environment variables.
+
+    Returns:
+        Screener: The shared screener.
+    """
+    global _screener
+    if _screener is None:
+        with _screener_lock:
+            if _screener is None:
+                blocklist = [term for term in os.environ.get("SCREENING_BLOCKLIST", "").split(",") if term.strip()]
+                path = os.environ.get("SCREENING_BLOCKLIST_PATH")
+                if path:
+                    try:
+                        blocklist.extend(load_blocklist(path))
+                    except OSError as e:
+                        logger.error(f"Error loading screening blocklist {path}: {str(e)}")
+                rules = DEFAULT_RULES
+                names = os.environ.get("SCREENING_RULES")
+                if names is not None:
+                    enabled = {name.strip() for name in names.split(",")}
+                    rules = [rule for rule in DEFAULT_RULES if rule.name in enabled or rule.category in enabled]
+                _screener = Screener(blocklist, rules)
+                logger.info(f"Screening prompts with {len(_screener.blocklist)} blocklist terms and {len(rules)} rules")
+    return _screener
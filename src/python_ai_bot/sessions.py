@@ -0,0 +1,369 @@
+"""Server-side conversation sessions with compacted history.
+
+Each session belongs to the tenant that created it. Messages to one session
+are handled one at a time, under a lock held from loading the history until
+the reply is saved, so concurrent messages cannot overwrite each other's turns.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from src.python_ai_bot.ai.openai_client import OpenAIClient
+from src.python_ai_bot.deadline import check_deadline
+from src.python_ai_bot.prompts import get_prompt_registry
+from src.python_ai_bot.usage import get_usage_meter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep names, facts, "
+    "decisions and open questions; drop pleasantries."
+)
+
+# History is stored with one-letter role codes to keep the encoded session small
+_ROLE_CODES = {"user": "u", "assistant": "a"}
+_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+def estimate_tokens(text):
+    """Estimate the token count of a text (roughly four characters per token).
+
+    Args:
+        text (str): Text to estimate.
+
+    Returns:
+        int: Estimated number of tokens, including per-message overhead.
+    """
+    return len(text) // 4 + 4
+
+
+class Session:
+    """A conversation: system prompt, rolling summary and recent turns."""
+
+    def __init__(self, session_id, system, summary="", turns=None, updated_at=None, tenant=None):
+        """Initialize a session.
+
+        Args:
+            session_id (str): Unique session ID.
+            system (str): System prompt.
+            summary (str, optional): Rolling summary of compacted turns. Defaults to "".
+            turns (list, optional): Recent (role, content) turns. Defaults to None.
+            updated_at (float, optional): Last update time. Defaults to now.
+            tenant (str, optional): Tenant that owns the session. Defaults to None.
+        """
+        self.id = session_id
+        self.system = system
+        self.summary = summary
+        self.turns = turns or []
+        self.updated_at = updated_at or time.time()
+        self.tenant = tenant
+
+    def encode(self):
+        """Encode the session in its compact storage format.
+
+        Returns:
+            str: Compact JSON document.
+        """
+        document = {
+            "s": self.system,
+            "m": self.summary,
+            "t": [[_ROLE_CODES[role], content] for role, content in self.turns],
+            "u": int(self.updated_at),
+        }
+        if self.tenant is not None:
+            document["o"] = self.tenant
+        return json.dumps(document, separators=(",", ":"), ensure_ascii=False)
+
+    @classmethod
+    def decode(cls, session_id, data):
+        """Decode a session from its compact storage format.
+
+        Args:
+            session_id (str): Session ID.
+            data (str or bytes): Compact JSON document.
+
+        Returns:
+            Session: The decoded session.
+        """
+        document = json.loads(data)
+        return cls(
+            session_id,
+            system=document["s"],
+            summary=document["m"],
+            turns=[(_ROLES[code], content) for code, content in document["t"]],
+            updated_at=document["u"],
+            tenant=document.get("o"),
+        )
+
+    def messages(self):
+        """Build the chat messages sent upstream for this session.
+
+        Returns:
+            list: System prompt, optional summary, then the recent turns.
+        """
+        messages = [{"role": "system", "content": self.system}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        messages.extend({"role": role, "content": content} for role, content in self.turns)
+        return messages
+
+
+class InMemorySessionStore:
+    """LRU session store kept in process memory."""
+
+    def __init__(self, max_sessions=1000):
+        """Initialize the store.
+
+        Args:
+            max_sessions (int, optional): Sessions kept before the least recently used
+                one is evicted. Defaults to 1000.
+        """
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # A session's lock lives as long as someone holds or waits for it
+        self._session_locks = weakref.WeakValueDictionary()
+
+    def get(self, session_id):
+        """Get the encoded session, or None if it does not exist."""
+        with self._lock:
+            data = self._sessions.get(session_id)
+            if data is not None:
+                self._sessions.move_to_end(session_id)
+            return data
+
+    def put(self, session_id, data):
+        """Store an encoded session."""
+        with self._lock:
+            self._sessions[session_id] = data
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        """Delete a session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def lock(self, session_id):
+        """Get the lock that serializes updates to a session."""
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.Lock()
+            return lock
+
+
+class RedisSessionStore:
+    """Session store backed by Redis, with a TTL refreshed on every write."""
+
+    def __init__(self, url, ttl=86400, prefix="session:", lock_timeout=120):
+        """Initialize the store.
+
+        Args:
+            url (str): Redis connection URL.
+            ttl (int, optional): Seconds an idle session is kept. Defaults to 86400.
+            prefix (str, optional): Key prefix. Defaults to "session:".
+            lock_timeout (float, optional): Seconds a session lock is held at most, and
+                waited for. Defaults to 120.
+        """
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def get(self, session_id):
+        """Get the encoded session, or None if it does not exist."""
+        return self.redis.get(self.prefix + session_id)
+
+    def put(self, session_id, data):
+        """Store an encoded session."""
+        self.redis.set(self.prefix + session_id, data, ex=self.ttl)
+
+    def delete(self, session_id):
+        """Delete a session."""
+        self.redis.delete(self.prefix + session_id)
+
+    def lock(self, session_id):
+        """Get the lock that serializes updates to a session, across every instance."""
+        return self.redis.lock(
+            self.prefix + "lock:" + session_id, timeout=self.lock_timeout, blocking_timeout=self.lock_timeout
+        )
+
+
+class SessionManager:
+    """Create sessions and run conversation turns within a token budget."""
+
+    def __init__(self, store, client, token_budget=1500, summary_tokens=150):
+        """Initialize the session manager.
+
+        Args:
+            store: Session store (InMemorySessionStore or RedisSessionStore).
+            client (OpenAIClient): Client used for replies and summaries.
+            token_budget (int, optional): Estimated tokens of history sent with each
+                message; older turns are folded into the summary. Defaults to 1500.
+            summary_tokens (int, optional): Maximum tokens of the rolling summary. Defaults to 150.
+        """
+        self.store = store
+        self.client = client
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+
+    def create(self, system=None, tenant=None):
+        """Create a new session.
+
+        Args:
+            system (str, optional): System prompt. Defaults to None, in which case the
+                system prompt of the default template is used.
+            tenant (str, optional): Tenant that owns the session. Defaults to None.
+
+        Returns:
+            Session: The new session.
+        """
+        session = Session(uuid.uuid4().hex, system=system or get_prompt_registry().get().system, tenant=tenant)
+        self.store.put(session.id, session.encode())
+        return session
+
+    def get(self, session_id, tenant=None):
+        """Load a session.
+
+        Args:
+            session_id (str): Session ID.
+            tenant (str, optional): Only return the session if this tenant owns it.
+                Defaults to None (any owner).
+
+        Returns:
+            Session: The session, or None if it does not exist.
+        """
+        data = self.store.get(session_id)
+        if data is None:
+            return None
+        session = Session.decode(session_id, data)
+        if tenant is not None and session.tenant != tenant:
+            return None
+        return session
+
+    def send(self, session, content, model="gpt-3.5-turbo", max_tokens=100, tenant=None):
+        """Add a user message to a session and generate the reply.
+
+        Args:
+            session (Session): Session to continue.
+            content (str): User message.
+            model (str, optional): The model to use. Defaults to "gpt-3.5-turbo".
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 100.
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+
+        Returns:
+            str: The generated reply or error message. Failed turns are not stored.
+
+        Raises:
+            RequestAborted: If the reply failed because the request's deadline passed
+                or its client disconnected.
+        """
+        with self.store.lock(session.id):
+            # Pick up turns another message added while this one waited for the lock
+            stored = self.get(session.id)
+            if stored is not None:
+                session.summary, session.turns = stored.summary, stored.turns
+            session.turns.append(("user", content))
+            reply = self.client.generate_chat(session.messages(), model=model, max_tokens=max_tokens, tenant=tenant)
+            if reply.startswith("Error:"):
+                check_deadline()
+                return reply
+
+            session.turns.append(("assistant", reply))
+            self.compact(session, model=model, tenant=tenant)
+            session.updated_at = time.time()
+            self.store.put(session.id, session.encode())
+        return reply
+
+    def compact(self, session, model="gpt-3.5-turbo", tenant=None):
+        """Fold the oldest turns into the summary until the history fits the token budget.
+
+        Args:
+            session (Session): Session to compact in place.
+            model (str, optional): Model used to summarize. Defaults to "gpt-3.5-turbo".
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+        """
+        evicted = []
+        used = estimate_tokens(session.summary) + sum(estimate_tokens(content) for _, content in session.turns)
+        # Always keep the latest exchange verbatim
+        while used > self.token_budget and len(session.turns) > 2:
+            role, content = session.turns.pop(0)
+            evicted.append((role, content))
+            used -= estimate_tokens(content)
+        # Start the window on a user turn so exchanges are never split
+        while evicted and len(session.turns) > 2 and session.turns[0][0] == "assistant":
+            evicted.append(session.turns.pop(0))
+
+        if evicted:
+            session.summary = self.summarize(session.summary, evicted, model=model, tenant=tenant)
+
+    def summarize(self, summary, turns, model="gpt-3.5-turbo", tenant=None):
+        """Merge turns into the rolling summary.
+
+        Falls back to a truncated transcript when the upstream call fails.
+
+        Args:
+            summary (str): Current summary.
+            turns (list): (role, content) turns to fold in.
+            model (str, optional): Model used to summarize. Defaults to "gpt-3.5-turbo".
+            tenant (str, optional): Tenant the token usage is billed to. Defaults to None.
+
+        Returns:
+            str: The new summary.
+        """
+        transcript = "\n".join(f"{role}: {content}" for role, content in turns)
+        if summary:
+            transcript = f"Earlier summary: {summary}\n{transcript}"
+
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": transcript},
+        ]
+        new_summary = self.client.generate_chat(messages, model=model, max_tokens=self.summary_tokens, tenant=tenant)
+        if new_summary.startswith("Error:"):
+            logger.warning("Could not summarize session history, keeping a truncated transcript")
+            new_summary = transcript[-self.summary_tokens * 4:]
+        return new_summary
+
+
+_session_manager = None
+_session_manager_lock = threading.Lock()
+
+
+def get_session_manager():
+    """Get the process-wide session manager, configured from environment variables.
+
+    Uses Redis when SESSION_REDIS_URL is set, otherwise an in-memory LRU store.
+
+    Returns:
+        SessionManager: The shared session manager.
+    """
+    global _session_manager
+    if _session_manager is None:
+        with _session_manager_lock:
+            if _session_manager is None:
+                redis_url = os.environ.get("SESSION_REDIS_URL")
+                if redis_url:
+                    store = RedisSessionStore(
+                        redis_url,
+                        ttl=int(os.environ.get("SESSION_TTL", "86400")),
+                        lock_timeout=float(os.environ.get("SESSION_LOCK_TIMEOUT", "120")),
+                    )
+                else:
+                    store = InMemorySessionStore(max_sessions=int(os.environ.get("SESSION_MAX", "1000")))
+                _session_manager = SessionManager(
+                    store,
+                    OpenAIClient(usage_meter=get_usage_meter()),
+                    token_budget=int(os.environ.get("SESSION_TOKEN_BUDGET", "1500")),
+                )
+    return _session_manager
@@ -0,0 +1,241 @@
+"""Immutable settings snapshot shared by all request handlers.
+
+Settings are parsed once from the environment, optionally overlaid with a
+KEY=VALUE file named by SETTINGS_FILE. Handlers read the current snapshot
+with get_settings(); a reload builds a new snapshot and swaps it in with a
+single assignment, so a request never sees a half-updated configuration.
+"""
+
+import hmac
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+CORS_ALLOW_METHODS = "GET, POST, OPTIONS"
+CORS_ALLOW_HEADERS = "X-API-Key, Content-Type, Authorization"
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Typed, immutable view of the configuration."""
+
+    openai_api_key: str = field(default=None, repr=False)
+    api_secret_key: str = field(default=None, repr=False)
+    jwt_secret: str = field(default=None, repr=False)
+    admin_api_key: str = field(default=None, repr=False)
+    api_key_tenants: tuple = field(default=(), repr=False)
+    allowed_origins: frozenset = frozenset()
+    default_origin: str = None
+    rate_limit_requests: int = 10
+    rate_limit_window: float = 60.0
+    max_body_size: int = 64 * 1024
+    body_read_timeout: float = 10.0
+    source: str = None
+    _cors_any: tuple = field(init=False, repr=False, compare=False)
+    _cors_default: tuple = field(init=False, repr=False, compare=False)
+    _cors_by_origin: dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        static = (
+            ("Access-Control-Allow-Methods", CORS_ALLOW_METHODS),
+            ("Access-Control-Allow-Headers", CORS_ALLOW_HEADERS),
+        )
+        object.__setattr__(self, "_cors_any", (("Access-Control-Allow-Origin", "*"),) + static)
+        # Disallowed origins get the first listed origin, which the browser will reject
+        default_origin = self.default_origin or "*"
+        object.__setattr__(self, "_cors_default", (("Access-Control-Allow-Origin", default_origin),) + static)
+        object.__setattr__(self, "_cors_by_origin", {
+            origin: (("Access-Control-Allow-Origin", origin),) + static for origin in self.allowed_origins
+        })
+
+    @property
+    def allow_all_origins(self):
+        """bool: True when ALLOWED_ORIGINS is unset or "*"."""
+        return not self.allowed_origins
+
+    def cors_headers(self, origin):
+        """Get the precomputed CORS headers for a request origin.
+
+        Args:
+            origin (str): Value of the request's Origin header, empty if absent.
+
+        Returns:
+            tuple: (name, value) header pairs.
+        """
+        if self.allow_all_origins or not origin:
+            return self._cors_any
+        return self._cors_by_origin.get(origin, self._cors_default)
+
+    def tenant_for_key(self, api_key):
+        """Get the tenant an API key from API_KEY_TENANTS belongs to.
+
+        Args:
+            api_key (str): X-API-Key header value, or "".
+
+        Returns:
+            str: The tenant, or None if the key is not a tenant's key.
+        """
+        if not api_key:
+            return None
+        tenant = None
+        for key, owner in self.api_key_tenants:
+            # Compare against every key, so the time taken does not tell which one matched
+            if hmac.compare_digest(api_key.encode(), key.encode()):
+                tenant = owner
+        return tenant
+
+
+def parse_settings_file(path):
+    """Parse a KEY=VALUE settings file, ignoring blank lines and comments.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        dict: The parsed values.
+    """
+    values = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                key, value = line.split("=", 1)
+                values[key.strip()] = value.strip()
+    return values
+
+
+def load_settings(environ=None, path=None):
+    """Build a settings snapshot.
+
+    Args:
+        environ (dict, optional): Variables to read. Defaults to None (os.environ).
+        path (str, optional): KEY=VALUE file whose values override environ.
+            Defaults to None, in which case SETTINGS_FILE from environ is used.
+
+    Returns:
+        Settings: The new snapshot.
+    """
+    values = dict(os.environ if environ is None else environ)
+    path = path or values.get("SETTINGS_FILE")
+    if path:
+        values.update(parse_settings_file(path))
+
+    api_key_tenants = []
+    for entry in values.get("API_KEY_TENANTS", "").split(","):
+        tenant, _, key = entry.strip().partition(":")
+        if tenant and key:
+            api_key_tenants.append((key, tenant))
+
+    origins = values.get("ALLOWED_ORIGINS", "*").strip()
+    origin_list = []
+    if origins != "*":
+        origin_list = [origin.strip() for origin in origins.split(",") if origin.strip()]
+
+    return Settings(
+        openai_api_key=values.get("OPENAI_API_KEY") or None,
+        api_secret_key=values.get("API_SECRET_KEY") or None,
+        jwt_secret=values.get("JWT_SECRET") or None,
+        admin_api_key=values.get("ADMIN_API_KEY") or None,
+        api_key_tenants=tuple(api_key_tenants),
+        allowed_origins=frozenset(origin_list),
+        default_origin=origin_list[0] if origin_list else None,
+        rate_limit_requests=int(values.get("RATE_LIMIT_REQUESTS", "10")),
+        rate_limit_window=float(values.get("RATE_LIMIT_WINDOW", "60")),
+        max_body_size=int(values.get("MAX_BODY_SIZE", str(64 * 1024))),
+        body_read_timeout=float(values.get("BODY_READ_TIMEOUT", "10")),
+        source=path,
+    )
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def get_settings():
+    """Get the current settings snapshot, loading it on first use.
+
+    Returns:
+        Settings: The current snapshot.
+    """
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                set_settings(load_settings())
+            settings = _settings
+    return settings
+
+
+def set_settings(settings):
+    """Replace the current settings snapshot.
+
+    Args:
+        settings (Settings): The new snapshot.
+    """
+    global _settings
+    _settings = settings
+
+
+def reload_settings():
+    """Reload settings from the environment and settings file.
+
+    The current snapshot is kept if the new one cannot be loaded.
+
+    Returns:
+        bool: True if the settings were reloaded.
+    """
+    try:
+        settings = load_settings()
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reloading settings: {str(e)}")
+        return False
+    set_settings(settings)
+    logger.info(f"Settings reloaded from {settings.source or 'environment'}")
+    return True
+
+
+def _watch_settings_file(path, interval):
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        if last_mtime is not None and mtime is not None and mtime != last_mtime:
+            reload_settings()
+        last_mtime = mtime if mtime is not None else last_mtime
+        time.sleep(interval)
+
+
+_hot_reload_enabled = False
+
+
+def enable_hot_reload(watch_interval=2.0):
+    """Reload settings on SIGHUP and whenever SETTINGS_FILE changes.
+
+    The signal handler is only installed when called from the main thread.
+
+    Args:
+        watch_interval (float, optional): Seconds between settings file checks. Defaults to 2.0.
+    """
+    global _hot_reload_enabled
+    if _hot_reload_enabled:
+        return
+    _hot_reload_enabled = True
+
+    if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_settings())
+        logger.info("Settings will reload on SIGHUP")
+
+    path = get_settings().source
+    if path:
+        watcher = threading.Thread(
+            target=_watch_settings_file, args=(path, watch_interval), name="settings-watcher", daemon=True
+        )
+        watcher.start()
+        logger.info(f"Watching {path} for settings changes")
@@ -0,0 +1,243 @@
+"""Hash table in a memory-mapped file, shared by the worker processes on one host.
+
+The table has a fixed number of fixed-size slots, so it never grows or
+reallocates. Keys hash to one of a number of stripes, each a contiguous run
+of slots guarded by an fcntl lock on its own byte of the file plus a thread
+lock, so processes and threads only contend when they touch the same stripe.
+When every slot a key may use is taken, the one closest to expiring is
+evicted, which makes the table suitable for counters and small hot values
+rather than anything that must not be lost.
+
+Set SHARED_STATE_DIR to enable the shared tables; the pre-fork supervisor
+sets it for its workers.
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PABTBL01"
+# magic, slots, slot size
+FILE_HEADER = struct.Struct("<8sII")
+# key digest, expires at (epoch seconds), value length
+SLOT_HEADER = struct.Struct("<16sdI")
+EMPTY_DIGEST = bytes(16)
+# Byte offset of stripe 0's lock; byte 0 guards initialization
+LOCK_BASE = 1
+
+
+class SharedTable:
+    """Fixed-size key-value table in an mmap'd file."""
+
+    def __init__(self, path, slots=4096, slot_size=256, stripes=64, probes=8, clock=time.time):
+        """Open the table, creating the file if needed.
+
+        Args:
+            path (str): Path of the backing file.
+            slots (int, optional): Number of slots. Defaults to 4096.
+            slot_size (int, optional): Bytes per slot, including a 28 byte header. Defaults to 256.
+            stripes (int, optional): Number of independently locked stripes. Defaults to 64.
+            probes (int, optional): Slots a key may occupy within its stripe. Defaults to 8.
+            clock (callable, optional): Time source returning epoch seconds, shared by
+                every process. Defaults to time.time.
+
+        Raises:
+            ValueError: If slot_size has no room for a value, or the file was created
+                with a different layout.
+        """
+        if slot_size <= SLOT_HEADER.size:
+            raise ValueError(f"slot_size must be larger than {SLOT_HEADER.size}")
+        self.stripes = max(1, min(stripes, slots))
+        self.slots_per_stripe = -(-slots // self.stripes)
+        self.slots = self.slots_per_stripe * self.stripes
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - SLOT_HEADER.size
+        self.probes = min(probes, self.slots_per_stripe)
+        self.clock = clock
+        self.path = path
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+
+        size = FILE_HEADER.size + self.slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+            try:
+                if os.fstat(self._fd).st_size == 0:
+                    os.ftruncate(self._fd, size)
+                    os.pwrite(self._fd, FILE_HEADER.pack(MAGIC, self.slots, slot_size), 0)
+                header = os.pread(self._fd, FILE_HEADER.size, 0)
+                if header != FILE_HEADER.pack(MAGIC, self.slots, slot_size):
+                    raise ValueError(f"{path} holds a table with a different layout")
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+            self._mmap = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    @staticmethod
+    def digest(key):
+        """Hash a key to the 16 bytes stored in its slot."""
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def _stripe(self, digest):
+        return int.from_bytes(digest[:8], "little") % self.stripes
+
+    def _probe(self, digest, stripe):
+        start = stripe * self.slots_per_stripe
+        home = int.from_bytes(digest[8:], "little") % self.slots_per_stripe
+        for i in range(self.probes):
+            yield FILE_HEADER.size + (start + (home + i) % self.slots_per_stripe) * self.slot_size
+
+    @contextmanager
+    def _locked(self, stripe):
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, LOCK_BASE + stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, LOCK_BASE + stripe)
+
+    def _lookup(self, digest, stripe, now):
+        """Find a key's slot, or the slot it should be written to.
+
+        Returns:
+            tuple: (offset of the live entry or None, offset to write to).
+        """
+        free = victim = None
+        victim_expires = float("inf")
+        for offset in self._probe(digest, stripe):
+            slot_digest, expires_at, _ = SLOT_HEADER.unpack_from(self._mmap, offset)
+            if slot_digest == digest:
+                return (offset if expires_at > now else None), offset
+            if slot_digest == EMPTY_DIGEST or expires_at <= now:
+                if free is None:
+                    free = offset
+            elif expires_at < victim_expires:
+                victim, victim_expires = offset, expires_at
+        return None, free if free is not None else victim
+
+    def _read(self, offset):
+        _, _, length = SLOT_HEADER.unpack_from(self._mmap, offset)
+        start = offset + SLOT_HEADER.size
+        return self._mmap[start:start + length]
+
+    def _write(self, offset, digest, value, expires_at):
+        SLOT_HEADER.pack_into(self._mmap, offset, digest, expires_at, len(value))
+        start = offset + SLOT_HEADER.size
+        self._mmap[start:start + len(value)] = value
+
+    def get(self, key):
+        """Get a live value.
+
+        Args:
+            key (str): Key.
+
+        Returns:
+            bytes: The value, or None if it is missing or expired.
+        """
+        digest = self.digest(key)
+        stripe = self._stripe(digest)
+        with self._locked(stripe):
+            offset, _ = self._lookup(digest, stripe, self.clock())
+            return None if offset is None else self._read(offset)
+
+    def set(self, key, value, ttl):
+        """Store a value, evicting the entry closest to expiry if the key's slots are full.
+
+        Args:
+            key (str): Key.
+            value (bytes): Value, at most max_value_size bytes.
+            ttl (float): Seconds the value lives.
+
+        Returns:
+            bool: False if the value is too large to store.
+        """
+        if len(value) > self.max_value_size:
+            return False
+        digest = self.digest(key)
+        stripe = self._stripe(digest)
+        now = self.clock()
+        with self._locked(stripe):
+            _, offset = self._lookup(digest, stripe, now)
+            self._write(offset, digest, value, now + ttl)
+        return True
+
+    def update(self, key, fn, ttl):
+        """Atomically replace a value with a function of the current one.
+
+        Args:
+            key (str): Key.
+            fn (callable): Called with the live value or None; returns the new value,
+                or None to leave the entry unchanged.
+            ttl (float): Seconds the new value lives.
+
+        Returns:
+            bytes: What fn returned.
+
+        Raises:
+            ValueError: If fn returns a value larger than max_value_size.
+        """
+        digest = self.digest(key)
+        stripe = self._stripe(digest)
+        now = self.clock()
+        with self._locked(stripe):
+            found, offset = self._lookup(digest, stripe, now)
+            value = fn(None if found is None else self._read(found))
+            if value is not None:
+                if len(value) > self.max_value_size:
+                    raise ValueError(f"Value of {len(value)} bytes does not fit in a slot")
+                self._write(offset, digest, value, now + ttl)
+            return value
+
+    def delete(self, key):
+        """Remove a key if it is present."""
+        digest = self.digest(key)
+        stripe = self._stripe(digest)
+        with self._locked(stripe):
+            offset, _ = self._lookup(digest, stripe, self.clock())
+            if offset is not None:
+                SLOT_HEADER.pack_into(self._mmap, offset, EMPTY_DIGEST, 0.0, 0)
+
+    def close(self):
+        """Unmap the table and close the file."""
+        self._mmap.close()
+        os.close(self._fd)
+
+
+_shared_tables = {}
+_shared_tables_lock = threading.Lock()
+
+
+def get_shared_table(name, slots, slot_size):
+    """Get a process-wide shared table stored in SHARED_STATE_DIR.
+
+    Args:
+        name (str): Table name, used as the file name.
+        slots (int): Number of slots.
+        slot_size (int): Bytes per slot.
+
+    Returns:
+        SharedTable: The table, or None if SHARED_STATE_DIR is not set or the
+        table cannot be opened.
+    """
+    directory = os.environ.get("SHARED_STATE_DIR")
+    if not directory:
+        return None
+    with _shared_tables_lock:
+        if name not in _shared_tables:
+            path = os.path.join(directory, f"{name}.table")
+            try:
+                _shared_tables[name] = SharedTable(path, slots=slots, slot_size=slot_size)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error opening shared table {path}: {str(e)}")
+                _shared_tables[name] = None
+        return _shared_tables[name]
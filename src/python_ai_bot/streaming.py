@@ -0,0 +1,41 @@
+"""Per-request token streaming.
+
+A caller that wants the tokens of a completion as they arrive, such as the
+WebSocket endpoint, opens a token_sink scope around the generation. Inside
+it, completions are streamed from OpenAI and every piece of text is passed
+to the sink, however many layers (cache, degradation policy, main) sit in
+between. Like the request deadline, the sink is a context variable, so it
+follows the request into the worker thread that runs the generation.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_token_sink = ContextVar("token_sink", default=None)
+
+
+def get_token_sink():
+    """Get the current request's token callback, or None."""
+    return _token_sink.get()
+
+
+@contextmanager
+def token_sink(callback):
+    """Pass the text of completions generated in this scope to a callback as it arrives.
+
+    Args:
+        callback (callable): Called with each piece of text. It runs on the thread
+            reading the completion, so a callback that blocks slows the read down.
+    """
+    token = _token_sink.set(callback)
+    try:
+        yield
+    finally:
+        _token_sink.reset(token)
+
+
+def emit_token(text):
+    """Pass a piece of text to the current request's sink, if it has one."""
+    sink = _token_sink.get()
+    if sink is not None and text:
+        sink(text)
@@ -0,0 +1,309 @@
+"""Token usage metering and quota enforcement."""
+
+import atexit
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Order of the counters kept for every (tenant, day) pair
+USAGE_FIELDS = ("requests", "prompt_tokens", "completion_tokens", "cached_prompt_tokens")
+_ZERO = (0,) * len(USAGE_FIELDS)
+
+
+def _add(left, right):
+    return tuple(a + b for a, b in zip(left, right))
+
+
+def _sub(left, right):
+    return tuple(a - b for a, b in zip(left, right))
+
+
+class SQLiteUsageStore:
+    """SQLite store holding per-tenant daily usage totals."""
+
+    def __init__(self, path):
+        """Initialize the store.
+
+        Args:
+            path (str): Path to the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        columns = ", ".join(f"{field} INTEGER NOT NULL DEFAULT 0" for field in USAGE_FIELDS)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS usage (tenant TEXT NOT NULL, day TEXT NOT NULL, "
+                f"{columns}, PRIMARY KEY (tenant, day))"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(usage)")}
+            for field in USAGE_FIELDS:
+                if field not in existing:
+                    self._conn.execute(f"ALTER TABLE usage ADD COLUMN {field} INTEGER NOT NULL DEFAULT 0")
+
+    def add(self, rows):
+        """Add usage deltas to the stored totals in a single transaction.
+
+        Args:
+            rows (list): Tuples of (tenant, day, *counters) in USAGE_FIELDS order.
+        """
+        fields = ", ".join(USAGE_FIELDS)
+        placeholders = ", ".join("?" for _ in range(len(USAGE_FIELDS) + 2))
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in USAGE_FIELDS)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO usage (tenant, day, {fields}) VALUES ({placeholders}) "
+                f"ON CONFLICT (tenant, day) DO UPDATE SET {updates}",
+                rows,
+            )
+
+    def load_since(self, first_day):
+        """Load stored totals for every tenant from first_day onwards.
+
+        Args:
+            first_day (str): ISO date (YYYY-MM-DD) to start from.
+
+        Returns:
+            dict: {tenant: {day: counters}}
+        """
+        fields = ", ".join(USAGE_FIELDS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT tenant, day, {fields} FROM usage WHERE day >= ?", (first_day,)
+            ).fetchall()
+        totals = {}
+        for row in rows:
+            totals.setdefault(row[0], {})[row[1]] = tuple(row[2:])
+        return totals
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class _Shard:
+    """Counters owned by a single thread.
+
+    Only the owning thread writes ``counts``; only the flusher writes ``flushed``.
+    Every write is a single dict assignment, so no lock is needed on the hot path.
+    """
+
+    def __init__(self):
+        self.counts = {}  # {tenant: {day: counters}}
+        self.flushed = {}  # {(tenant, day): counters already written to the store}
+
+
+class UsageMeter:
+    """Per-tenant token accounting with in-memory quotas and batched flushes."""
+
+    def __init__(self, store=None, flush_interval=5.0, daily_quota=0, monthly_quota=0, clock=time.time):
+        """Initialize the usage meter.
+
+        Args:
+            store (SQLiteUsageStore, optional): Durable store for flushed totals.
+                Defaults to None, in which case usage is only kept in memory.
+            flush_interval (float, optional): Seconds between background flushes. Defaults to 5.0.
+            daily_quota (int, optional): Daily token quota per tenant, 0 for unlimited. Defaults to 0.
+            monthly_quota (int, optional): Monthly token quota per tenant, 0 for unlimited. Defaults to 0.
+            clock (callable, optional): Time source returning epoch seconds. Defaults to time.time.
+        """
+        self.store = store
+        self.flush_interval = flush_interval
+        self.daily_quota = daily_quota
+        self.monthly_quota = monthly_quota
+        self.clock = clock
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+        self._snapshot = self._load_snapshot()
+
+    def _today(self):
+        return time.strftime("%Y-%m-%d", time.gmtime(self.clock()))
+
+    def _load_snapshot(self):
+        if not self.store:
+            return {}
+        try:
+            return self.store.load_since(self._today()[:7] + "-01")
+        except sqlite3.Error as e:
+            logger.error(f"Error loading usage totals: {str(e)}")
+            return {}
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, tenant, prompt_tokens=0, completion_tokens=0, cached_prompt_tokens=0):
+        """Record the token usage of one upstream call.
+
+        Args:
+            tenant (str): Tenant the usage is billed to.
+            prompt_tokens (int, optional): Prompt tokens from the upstream usage block. Defaults to 0.
+            completion_tokens (int, optional): Completion tokens from the upstream usage block. Defaults to 0.
+            cached_prompt_tokens (int, optional): Prompt tokens served from the upstream
+                prompt cache. Defaults to 0.
+        """
+        day = self._today()
+        days = self._shard().counts.setdefault(tenant, {})
+        delta = (1, prompt_tokens or 0, completion_tokens or 0, cached_prompt_tokens or 0)
+        days[day] = _add(days.get(day, _ZERO), delta)
+        self._ensure_flusher()
+
+    def _unflushed(self, tenant):
+        """Sum counters recorded since the last flush, per day."""
+        pending = {}
+        for shard in list(self._shards):
+            for day, values in list(shard.counts.get(tenant, {}).items()):
+                delta = _sub(values, shard.flushed.get((tenant, day), _ZERO))
+                pending[day] = _add(pending.get(day, _ZERO), delta)
+        return pending
+
+    def usage(self, tenant):
+        """Get the current daily and monthly usage of a tenant.
+
+        Args:
+            tenant (str): Tenant to report on.
+
+        Returns:
+            dict: Usage and quotas for the current day and month.
+        """
+        today = self._today()
+        days = dict(self._snapshot.get(tenant, {}))
+        for day, values in self._unflushed(tenant).items():
+            days[day] = _add(days.get(day, _ZERO), values)
+
+        month_total = _ZERO
+        for day, values in days.items():
+            if day[:7] == today[:7]:
+                month_total = _add(month_total, values)
+
+        return {
+            "tenant": tenant,
+            "day": dict(zip(USAGE_FIELDS, days.get(today, _ZERO)), period=today, quota=self.daily_quota),
+            "month": dict(zip(USAGE_FIELDS, month_total), period=today[:7], quota=self.monthly_quota),
+        }
+
+    def check_quota(self, tenant):
+        """Check a tenant's token usage against the configured quotas.
+
+        Args:
+            tenant (str): Tenant to check.
+
+        Returns:
+            tuple: (is_allowed, error_message)
+        """
+        if not self.daily_quota and not self.monthly_quota:
+            return True, None
+
+        usage = self.usage(tenant)
+        for period in ("day", "month"):
+            quota = usage[period]["quota"]
+            used = usage[period]["prompt_tokens"] + usage[period]["completion_tokens"]
+            if quota and used >= quota:
+                return False, f"Token quota exceeded for this {period} ({used}/{quota})"
+        return True, None
+
+    def flush(self):
+        """Write unflushed counters to the store and refresh the in-memory totals."""
+        if not self.store:
+            return
+        with self._flush_lock:
+            pending = {}
+            captured = []
+            for shard in list(self._shards):
+                for tenant, days in list(shard.counts.items()):
+                    for day, values in list(days.items()):
+                        key = (tenant, day)
+                        delta = _sub(values, shard.flushed.get(key, _ZERO))
+                        if any(delta):
+                            pending[key] = _add(pending.get(key, _ZERO), delta)
+                            captured.append((shard, key, values))
+            if not pending:
+                return
+
+            try:
+                self.store.add([key + values for key, values in pending.items()])
+                snapshot = self.store.load_since(self._today()[:7] + "-01")
+            except sqlite3.Error as e:
+                logger.error(f"Error flushing usage: {str(e)}")
+                return
+
+            for shard, key, values in captured:
+                shard.flushed[key] = values
+            self._snapshot = snapshot
+            self._prune(self._today()[:7])
+            logger.info(f"Flushed usage for {len(pending)} tenant-days")
+
+    def _prune(self, month):
+        """Drop fully flushed counters of past months; nothing records into them anymore."""
+        for shard in list(self._shards):
+            for tenant, days in list(shard.counts.items()):
+                for day, values in list(days.items()):
+                    if day[:7] < month and shard.flushed.get((tenant, day)) == values:
+                        del days[day]
+                        del shard.flushed[(tenant, day)]
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or not self.store:
+            return
+        with self._shards_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name="usage-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _run_flusher(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the background flusher and write any remaining usage."""
+        self._stop.set()
+        self.flush()
+
+
+_usage_meter = None
+_usage_meter_lock = threading.Lock()
+
+
+def get_usage_meter():
+    """Get the process-wide usage meter, configured from environment variables.
+
+    Returns:
+        UsageMeter: The shared usage meter.
+    """
+    global _usage_meter
+    if _usage_meter is None:
+        with _usage_meter_lock:
+            if _usage_meter is None:
+                db_path = os.environ.get(
+                    "USAGE_DB_PATH", os.path.join(tempfile.gettempdir(), "python_ai_bot_usage.db")
+                )
+                try:
+                    store = SQLiteUsageStore(db_path)
+                except sqlite3.Error as e:
+                    logger.error(f"Error opening usage store at {db_path}: {str(e)}")
+                    store = None
+                _usage_meter = UsageMeter(
+                    store=store,
+                    flush_interval=float(os.environ.get("USAGE_FLUSH_INTERVAL", "5")),
+                    daily_quota=int(os.environ.get("USAGE_DAILY_TOKEN_QUOTA", "0")),
+                    monthly_quota=int(os.environ.get("USAGE_MONTHLY_TOKEN_QUOTA", "0")),
+                )
+    return _usage_meter
@@ -0,0 +1,167 @@
+"""Startup warm-up and readiness reporting.
+
+Without warm-up, the first request to a fresh instance pays for opening the
+response cache and usage store, compiling the prompt templates and screening
+blocklist, loading the revoked-token filter, building the OpenAI SDK client
+and the DNS lookup and TLS handshake with OpenAI. warm_up() does that work
+ahead of traffic, and readiness() reports whether it has finished along with
+the connection pool, response cache and upstream circuit.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from openai import OpenAI
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.cache import get_response_cache
+from src.python_ai_bot.degradation import get_degradation_policy
+from src.python_ai_bot.pool import get_http_client, pool_stats, upstream_base_url
+from src.python_ai_bot.prompts import get_prompt_registry
+from src.python_ai_bot.revocation import get_revocation_list
+from src.python_ai_bot.screening import get_screener
+from src.python_ai_bot.settings import get_settings
+from src.python_ai_bot.usage import get_usage_meter
+
+logger = logging.getLogger(__name__)
+
+
+def preconnect(client, base_url, connections=2, timeout=5.0):
+    """Open keep-alive connections to upstream ahead of the first request.
+
+    Each worker holds its response open until all of them have one, so every
+    request gets its own connection rather than reusing the first. The
+    responses (a 401 without credentials) are discarded, leaving the
+    connections idle in the pool.
+
+    Args:
+        client (httpx.Client): Client whose pool is warmed.
+        base_url (str): Upstream API base URL.
+        connections (int, optional): Connections to open. Defaults to 2.
+        timeout (float, optional): Seconds allowed per connection. Defaults to 5.0.
+
+    Returns:
+        int: Number of connections opened.
+    """
+    barrier = threading.Barrier(connections)
+
+    def open_connection(_):
+        try:
+            with client.stream("GET", f"{base_url}/models", timeout=timeout) as response:
+                try:
+                    barrier.wait(timeout)
+                except threading.BrokenBarrierError:
+                    pass
+                # Reading to the end returns the connection to the pool instead of closing it
+                response.read()
+            return True
+        except httpx.HTTPError as e:
+            barrier.abort()
+            logger.warning(f"Warm-up connection to {base_url} failed: {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="warm-up") as executor:
+        return sum(executor.map(open_connection, range(connections)))
+
+
+def warm_up(http_client=None, base_url=None, connections=None, timeout=5.0):
+    """Prime the lazily built process-wide state and pre-open upstream connections.
+
+    Upstream connections are only opened when an OpenAI API key is configured.
+    A failing step is logged and skipped; warm-up never raises.
+
+    Args:
+        http_client (httpx.Client, optional): Client to warm. Defaults to None (the shared one).
+        base_url (str, optional): Upstream API base URL. Defaults to None (from OPENAI_BASE_URL).
+        connections (int, optional): Connections to open. Defaults to None (from WARMUP_CONNECTIONS, 2).
+        timeout (float, optional): Seconds allowed per connection. Defaults to 5.0.
+
+    Returns:
+        dict: Seconds spent on each step and the number of connections opened.
+    """
+    http_client = http_client or get_http_client()
+    base_url = base_url or upstream_base_url()
+    if connections is None:
+        connections = int(os.environ.get("WARMUP_CONNECTIONS", "2"))
+
+    def load_sdk():
+        OpenAI(api_key=get_settings().openai_api_key or "warm-up", base_url=base_url, http_client=http_client)
+
+    steps = [
+        ("settings", get_settings),
+        ("prompt_templates", get_prompt_registry),
+        ("screener", get_screener),
+        ("revocation_list", get_revocation_list),
+        ("codec", lambda: codec.loads(codec.dumps({"warm": True}))),
+        ("response_cache", get_response_cache),
+        ("usage_meter", get_usage_meter),
+        ("degradation_policy", get_degradation_policy),
+        ("openai_sdk", load_sdk),
+    ]
+    report = {"steps": {}, "connections": 0}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {str(e)}")
+        report["steps"][name] = round(time.perf_counter() - start, 4)
+
+    if connections > 0 and get_settings().openai_api_key:
+        start = time.perf_counter()
+        report["connections"] = preconnect(http_client, base_url, connections=connections, timeout=timeout)
+        report["steps"]["preconnect"] = round(time.perf_counter() - start, 4)
+    logger.info(f"Warm-up finished: {report}")
+    return report
+
+
+_ready = threading.Event()
+_warm_up_report = {}
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def _run_warm_up():
+    try:
+        _warm_up_report.update(warm_up())
+    finally:
+        _ready.set()
+
+
+def start_warm_up():
+    """Start warm-up in a background thread, once per process."""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_run_warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+
+
+def is_ready():
+    """Check whether warm-up has finished.
+
+    Returns:
+        bool: True once the instance is warm.
+    """
+    return _ready.is_set()
+
+
+def readiness():
+    """Describe whether the instance is warm, with pool, cache and circuit state.
+
+    Returns:
+        dict: "ready", the warm-up report, idle and active upstream connections,
+        response cache statistics and the upstream circuit state.
+    """
+    cache = get_response_cache()
+    return {
+        "ready": is_ready(),
+        "warm_up": dict(_warm_up_report),
+        "pool": pool_stats(get_http_client()),
+        "cache": cache.stats() if cache is not None else None,
+        "upstream": get_degradation_policy().health.stats(),
+    }
@@ -0,0 +1,202 @@
+"""Multiplexed, streaming generation over a WebSocket connection.
+
+The connection is authenticated once, at the handshake, and then carries any
+number of prompts. Each prompt frame has a client-chosen id; tokens, the
+final text and errors come back tagged with it, so several prompts can be in
+flight at once and their replies interleave.
+
+Client frames:
+
+    {"id": "1", "prompt": "...", "model": ..., "max_tokens": ..., "template": ..., "timeout_ms": ...}
+    {"id": "1", "type": "cancel"}
+
+Server frames:
+
+    {"id": "1", "type": "token", "text": "..."}
+    {"id": "1", "type": "done", "text": "..."}
+    {"id": "1", "type": "error", "status": 400, "detail": "..."}
+
+Backpressure is per connection. At most max_in_flight prompts run at once;
+past that the connection stops reading frames, so a client that keeps
+sending is held up by TCP flow control. Outgoing frames go through a bounded
+queue drained by a single writer, and a generation whose client reads too
+slowly blocks on that queue, which in turn stops it reading its upstream
+stream.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.deadline import ClientDisconnected, DeadlineExceeded, deadline_scope
+from src.python_ai_bot.main import main
+from src.python_ai_bot.streaming import token_sink
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_SEND_QUEUE = 64
+
+# How often a generation blocked on a full send queue checks for cancellation, in seconds
+_SEND_POLL_INTERVAL = 0.1
+
+
+class ChatConnection:
+    """One client's WebSocket session: reads prompt frames and streams their replies."""
+
+    def __init__(self, websocket, prepare, run=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, send_queue=DEFAULT_SEND_QUEUE):
+        """Initialize the connection.
+
+        Args:
+            websocket (WebSocket): The accepted WebSocket.
+            prepare (callable): Called with a prompt frame; returns (kwargs for run, timeout
+                in seconds or None), or raises HTTPException to refuse the prompt.
+            run (callable, optional): Blocking generation function. Defaults to None, in which
+                case main is used.
+            max_in_flight (int, optional): Prompts that may run at once. Defaults to DEFAULT_MAX_IN_FLIGHT.
+            send_queue (int, optional): Outgoing frames buffered before senders block.
+                Defaults to DEFAULT_SEND_QUEUE.
+        """
+        self.websocket = websocket
+        self.prepare = prepare
+        self.run = run if run is not None else main
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.outgoing = asyncio.Queue(maxsize=send_queue)
+        self.requests = {}
+        self.closed = False
+        self.loop = None
+
+    async def serve(self):
+        """Handle frames until the client disconnects, then abandon unfinished prompts."""
+        self.loop = asyncio.get_running_loop()
+        writer = asyncio.ensure_future(self._write())
+        try:
+            while not self.closed:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                await self._dispatch(message.get("text") or message.get("bytes") or "")
+        finally:
+            self.closed = True
+            unfinished = list(self.requests.values())
+            for deadline, task in unfinished:
+                deadline.cancel()
+                task.cancel()
+            await asyncio.gather(*(task for _, task in unfinished), return_exceptions=True)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+    async def _dispatch(self, data):
+        """Start or cancel a prompt. Waits for a free slot first, which pauses reading."""
+        try:
+            frame = codec.loads(data)
+        except codec.DecodeError:
+            await self._send({"id": None, "type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+            return
+        if not isinstance(frame, dict) or not isinstance(frame.get("id"), (str, int)):
+            await self._send({"id": None, "type": "error", "status": 400, "detail": "Frames need a string or integer id"})
+            return
+
+        request_id = frame["id"]
+        if frame.get("type") == "cancel":
+            entry = self.requests.get(request_id)
+            if entry is not None:
+                entry[0].cancel()
+            return
+        if request_id in self.requests:
+            await self._send(error_frame(request_id, 409, f"Request {request_id} is already in flight"))
+            return
+        try:
+            kwargs, timeout = self.prepare(frame)
+        except HTTPException as e:
+            await self._send(error_frame(request_id, e.status_code, e.detail))
+            return
+
+        await self.slots.acquire()
+        if self.closed:
+            self.slots.release()
+            return
+        with deadline_scope(timeout) as deadline:
+            # The task copies the context, deadline included
+            task = asyncio.ensure_future(self._generate(request_id, deadline, kwargs))
+        self.requests[request_id] = (deadline, task)
+
+    async def _generate(self, request_id, deadline, kwargs):
+        """Run one prompt in a worker thread, streaming its tokens, and send its outcome."""
+
+        def emit(text):
+            self._send_threadsafe({"id": request_id, "type": "token", "text": text}, deadline)
+
+        def run():
+            with token_sink(emit):
+                return self.run(**kwargs)
+
+        try:
+            text = await run_in_threadpool(run)
+            frame = {"id": request_id, "type": "done", "text": text}
+        except DeadlineExceeded as e:
+            frame = error_frame(request_id, 504, str(e))
+        except ClientDisconnected:
+            frame = error_frame(request_id, 499, "Request cancelled")
+        except Exception as e:
+            logger.error(f"Error generating text: {str(e)}")
+            frame = error_frame(request_id, 500, f"Error generating text: {str(e)}")
+        finally:
+            self.requests.pop(request_id, None)
+            self.slots.release()
+        await self._send(frame)
+
+    async def _send(self, frame):
+        """Queue a frame for the writer, waiting while the queue is full."""
+        if not self.closed:
+            await self.outgoing.put(frame)
+
+    def _send_threadsafe(self, frame, deadline):
+        """Queue a frame from a worker thread, blocking it while the queue is full.
+
+        Raises:
+            ClientDisconnected: If the prompt is cancelled or the connection closes while waiting.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._send(frame), self.loop)
+        while True:
+            try:
+                return future.result(timeout=_SEND_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if deadline.cancelled or self.closed:
+                    future.cancel()
+                    raise ClientDisconnected("Client disconnected")
+
+    async def _write(self):
+        """Send queued frames in order until the connection fails."""
+        while True:
+            frame = await self.outgoing.get()
+            try:
+                await self.websocket.send_text(codec.dumps(frame).decode())
+            except Exception as e:
+                logger.info(f"WebSocket send failed: {str(e)}")
+                self.closed = True
+                for deadline, _ in list(self.requests.values()):
+                    deadline.cancel()
+                return
+
+
+def connection_options():
+    """Read the per-connection limits from WS_MAX_IN_FLIGHT and WS_SEND_QUEUE.
+
+    Returns:
+        dict: max_in_flight and send_queue keyword arguments for ChatConnection.
+    """
+    return {
+        "max_in_flight": int(os.environ.get("WS_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)),
+        "send_queue": int(os.environ.get("WS_SEND_QUEUE", DEFAULT_SEND_QUEUE)),
+    }
+
+
+def error_frame(request_id, status, detail):
+    """Build the frame reporting a failed prompt, with an HTTP-style status."""
+    return {"id": request_id, "type": "error", "status": status, "detail": detail}
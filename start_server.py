@@ -4,6 +4,9 @@
 import uvicorn
 import os
 import argparse
+import logging
+import shutil
+import tempfile
 
 def main():
     """Start the API server."""
@@ -11,12 +14,22 @@ def main():
     parser.add_argument("--host", default="0.0.0.0", help="Host to bind the server to")
     parser.add_argument("--port", default=8000, type=int, help="Port to bind the server to")
     parser.add_argument("--reload", action="store_true", help="Enable auto-reload on code changes")
-    
+    parser.add_argument("--workers", type=int, help="Run this many worker processes under a supervisor (0 for one per CPU)")
+    parser.add_argument("--stack", choices=("fastapi", "handler"), default="fastapi",
+                        help="Serve the FastAPI app or the Vercel handler (default: fastapi)")
+    parser.add_argument("--reuse-port", action="store_true", help="Give each worker its own SO_REUSEPORT socket")
+    parser.add_argument("--max-requests", type=int, default=0, help="Replace a worker after this many requests")
+    parser.add_argument("--max-requests-jitter", type=int, default=0, help="Random extra requests per worker")
+
     args = parser.parse_args()
-    
+
+    if args.workers is not None or args.stack == "handler":
+        run_supervised(args)
+        return
+
     print(f"Starting Python AI Bot API server on {args.host}:{args.port}")
     print("API documentation will be available at http://localhost:8000/docs")
-    
+
     uvicorn.run(
         "src.python_ai_bot.api:app",
         host=args.host,
@@ -24,5 +37,32 @@ def main():
         reload=args.reload
     )
 
+def run_supervised(args):
+    """Run pre-forked workers; SIGHUP replaces them one at a time, SIGTERM drains them."""
+    # Imported here so the supervisor itself never loads the application
+    from src.python_ai_bot.prefork import Supervisor, serve_fastapi, serve_handler
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(process)d - %(levelname)s - %(message)s")
+    target = serve_handler if args.stack == "handler" else serve_fastapi
+    supervisor = Supervisor(
+        target,
+        host=args.host,
+        port=args.port,
+        workers=args.workers or None,
+        reuse_port=args.reuse_port,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+    )
+    # Workers share rate limit counters and hot cache entries through tables in this directory
+    shared_dir = None
+    if not os.environ.get("SHARED_STATE_DIR"):
+        shared_dir = os.environ["SHARED_STATE_DIR"] = tempfile.mkdtemp(prefix="python_ai_bot_shared_")
+    print(f"Starting Python AI Bot {args.stack} server on {args.host}:{args.port} (supervisor pid {os.getpid()})")
+    try:
+        supervisor.run()
+    finally:
+        if shared_dir:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
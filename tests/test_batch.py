@@ -0,0 +1,107 @@
+"""Tests for the batch generation command."""
+
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from src.python_ai_bot import batch
+from src.python_ai_bot.batch import Progress, count_records, iter_records, load_completed, run_batch
+
+
+class TestBatch(unittest.TestCase):
+    """Test case for streaming, concurrency and resuming."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmpdir.name, "prompts.jsonl")
+        self.output_path = os.path.join(self.tmpdir.name, "results.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_input(self, lines, path=None):
+        with open(path or self.input_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def read_output(self):
+        with open(self.output_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_iter_records(self):
+        """JSONL and CSV records are numbered in file order when they have no id."""
+        self.write_input(['{"prompt": "a"}', "", '{"id": "x", "prompt": "b"}', "not json"])
+        records = list(iter_records(self.input_path))
+        self.assertEqual(records, [("1", {"prompt": "a"}), ("x", {"id": "x", "prompt": "b"}), ("3", None)])
+        self.assertEqual(count_records(self.input_path), 3)
+
+        csv_path = os.path.join(self.tmpdir.name, "prompts.csv")
+        self.write_input(["prompt,max_tokens", '"hello, world",20', "bye,"], path=csv_path)
+        records = list(iter_records(csv_path))
+        self.assertEqual(records[0], ("1", {"prompt": "hello, world", "max_tokens": "20"}))
+        self.assertEqual(count_records(csv_path), 2)
+
+    def test_bounded_concurrency(self):
+        """No more than `concurrency` generations run at once."""
+        self.write_input([json.dumps({"prompt": f"p{index}"}) for index in range(20)])
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def generate(record):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return record["prompt"].upper()
+
+        summary = asyncio.run(run_batch(iter_records(self.input_path), self.output_path, generate, concurrency=3))
+        self.assertEqual(summary, {"generated": 20, "failed": 0, "skipped": 0})
+        self.assertLessEqual(state["peak"], 3)
+        results = {result["id"]: result["text"] for result in self.read_output()}
+        self.assertEqual(results["20"], "P19")
+
+    def test_resume(self):
+        """A rerun skips finished records, retries failures and repairs a torn line."""
+        self.write_input([json.dumps({"prompt": f"p{index}"}) for index in range(4)])
+        with open(self.output_path, "w") as f:
+            f.write('{"id": "1", "text": "done"}\n{"id": "2", "error": "boom"}\n{"id": "3", "te')
+        completed = load_completed(self.output_path)
+        self.assertEqual(completed, {"1"})
+
+        calls = []
+
+        def generate(record):
+            calls.append(record["prompt"])
+            if record["prompt"] == "p3":
+                raise RuntimeError("Error: upstream")
+            return "ok"
+
+        progress = Progress(total=3, stream=io.StringIO())
+        summary = asyncio.run(
+            run_batch(iter_records(self.input_path), self.output_path, generate, completed=completed, progress=progress)
+        )
+        self.assertEqual(summary, {"generated": 2, "failed": 1, "skipped": 1})
+        self.assertEqual(sorted(calls), ["p1", "p2", "p3"])
+        self.assertEqual(len(self.read_output()), 5)
+        self.assertIn("3/3 done, 1 errors", progress.stream.getvalue())
+
+    def test_cli(self):
+        """The command line runs a file end to end with an injected generator."""
+        self.write_input([json.dumps({"prompt": "hello"}), json.dumps({"prompt": ""})])
+        with patch.object(batch, "make_generator", return_value=lambda record: "hi"), \
+                patch("sys.stderr", new_callable=io.StringIO):
+            status = batch.main([self.input_path, self.output_path, "--concurrency", "2"])
+        self.assertEqual(status, 1)
+        results = sorted(self.read_output(), key=lambda result: result["id"])
+        self.assertEqual(results, [{"id": "1", "text": "hi"}, {"id": "2", "error": "Record has no prompt"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for the bounded request-body reader."""
+
+import http.client
+import io
+import socket
+import threading
+import unittest
+from http.server import HTTPServer
+
+from api.index import Handler as IndexHandler
+from src.python_ai_bot.body import BodyError, BodyTimeoutError, BodyTooLargeError, read_body
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+def buffered(data):
+    return io.BufferedReader(io.BytesIO(data))
+
+
+class TestReadBody(unittest.TestCase):
+    """Test case for read_body."""
+
+    def test_content_length(self):
+        """Bodies with a valid Content-Length are read in full."""
+        self.assertEqual(read_body(buffered(b"hello"), {"Content-Length": "5"}, max_size=10), b"hello")
+        self.assertEqual(read_body(buffered(b""), {}, max_size=10), b"")
+
+    def test_oversized_content_length_is_not_read(self):
+        """A Content-Length over the cap is rejected before anything is read."""
+        rfile = buffered(b"x" * 100)
+        with self.assertRaises(BodyTooLargeError):
+            read_body(rfile, {"Content-Length": str(10 ** 9)}, max_size=10)
+        self.assertEqual(rfile.tell(), 0)
+
+    def test_invalid_framing(self):
+        """Bad or conflicting framing headers and short bodies are rejected."""
+        for headers in (
+            {"Content-Length": "abc"},
+            {"Content-Length": "-1"},
+            {"Transfer-Encoding": "gzip"},
+            {"Transfer-Encoding": "chunked", "Content-Length": "5"},
+        ):
+            with self.assertRaises(BodyError):
+                read_body(buffered(b"hello"), headers, max_size=10)
+        with self.assertRaises(BodyError):
+            read_body(buffered(b"hel"), {"Content-Length": "5"}, max_size=10)
+
+    def test_chunked(self):
+        """Chunked bodies are reassembled, ignoring extensions and trailers."""
+        data = b"5;name=value\r\nhello\r\n6\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\n"
+        self.assertEqual(read_body(buffered(data), {"Transfer-Encoding": "chunked"}, max_size=100), b"hello world")
+
+    def test_chunked_limits(self):
+        """Chunked bodies are capped and malformed chunks rejected."""
+        data = b"5\r\nhello\r\n5\r\nworld\r\n0\r\n\r\n"
+        with self.assertRaises(BodyTooLargeError):
+            read_body(buffered(data), {"Transfer-Encoding": "chunked"}, max_size=8)
+        with self.assertRaises(BodyTooLargeError):
+            read_body(buffered(b"fffffff\r\n"), {"Transfer-Encoding": "chunked"}, max_size=8)
+        with self.assertRaises(BodyError):
+            read_body(buffered(b"zz\r\nhello\r\n"), {"Transfer-Encoding": "chunked"}, max_size=100)
+        with self.assertRaises(BodyError):
+            read_body(buffered(b"5\r\nhelloXX0\r\n\r\n"), {"Transfer-Encoding": "chunked"}, max_size=100)
+
+    def test_slow_client_times_out(self):
+        """A client that stops sending is cut off after the timeout."""
+        server, client = socket.socketpair()
+        try:
+            client.sendall(b"hel")
+            with self.assertRaises(BodyTimeoutError):
+                read_body(server.makefile("rb"), {"Content-Length": "5"}, max_size=10, timeout=0.2, connection=server)
+        finally:
+            server.close()
+            client.close()
+
+
+class TestHandlerBody(unittest.TestCase):
+    """Test case for body limits in the serverless handler."""
+
+    def setUp(self):
+        self.settings = get_settings()
+        set_settings(load_settings({"API_SECRET_KEY": "test-key", "MAX_BODY_SIZE": "1024"}))
+        self.server = HTTPServer(("127.0.0.1", 0), IndexHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        set_settings(self.settings)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_oversized_body_rejected_from_header(self):
+        """A huge Content-Length gets a 413 without the body being sent."""
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        connection.putrequest("POST", "/generate")
+        connection.putheader("X-API-Key", "test-key")
+        connection.putheader("Content-Type", "application/json")
+        connection.putheader("Content-Length", str(10 ** 9))
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(response.status, 413)
+        connection.close()
+
+    def test_chunked_request(self):
+        """Chunked request bodies are accepted."""
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        connection.request(
+            "POST",
+            "/generate",
+            body=iter([b'{"prompt": ', b'"hello"}']),
+            headers={"X-API-Key": "test-key", "Content-Type": "application/json"},
+            encode_chunked=True,
+        )
+        response = connection.getresponse()
+        self.assertEqual(response.status, 200)
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Tests for the response cache."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.python_ai_bot.ai.openai_client import OpenAIClient
+from src.python_ai_bot.cache import ResponseCache, SQLiteCacheStore, make_cache_key
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test case for the two-tier response cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+        self.clock = FakeClock()
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        self.tmpdir.cleanup()
+
+    def make_cache(self, **kwargs):
+        cache = ResponseCache(store=SQLiteCacheStore(self.path), clock=self.clock, **kwargs)
+        self.caches.append(cache)
+        return cache
+
+    def test_cache_key(self):
+        """Keys depend on every part of the request."""
+        messages = [{"role": "user", "content": "hi"}]
+        key = make_cache_key("gpt-3.5-turbo", messages, 100)
+        self.assertEqual(key, make_cache_key("gpt-3.5-turbo", [{"role": "user", "content": "hi"}], 100))
+        self.assertNotEqual(key, make_cache_key("gpt-3.5-turbo", messages, 50))
+        self.assertNotEqual(key, make_cache_key("gpt-4", messages, 100))
+
+    def test_survives_restart(self):
+        """A new process starts with the entries written by the previous one."""
+        self.make_cache().set("key", "cached text")
+        cache = self.make_cache()
+        self.assertEqual(cache.get("key"), "cached text")
+        self.assertEqual(cache.hits, 1)
+
+    def test_ttl(self):
+        """Entries expire after their TTL and are compacted away."""
+        cache = self.make_cache(ttl=60)
+        cache.set("key", "text")
+        self.clock.now += 59
+        self.assertEqual(cache.get("key"), "text")
+        self.clock.now += 2
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.compact(), 1)
+        self.assertIsNone(cache.store.get("key"))
+
+    def test_size_budget(self):
+        """Compaction keeps the newest entries that fit in max_bytes."""
+        cache = self.make_cache(max_bytes=300, compact_every=1000)
+        for index in range(10):
+            cache.set(f"key-{index}", "x" * 90)
+            self.clock.now += 1
+        cache.compact()
+        self.assertIsNone(cache.store.get("key-0"))
+        self.assertIsNotNone(cache.store.get("key-9"))
+        self.assertIsNotNone(cache.store.get("key-8"))
+
+    def test_expired_memory_copy(self):
+        """An expired copy in memory gives way to a newer entry another process wrote."""
+        mine, theirs = self.make_cache(ttl=60), self.make_cache(ttl=60)
+        mine.set("key", "old")
+        self.clock.now += 30
+        theirs.set("key", "new")
+        self.clock.now += 31
+        self.assertEqual(mine.get("key"), "new")
+        self.assertEqual(mine._memory["key"].value, "new")
+
+        # Once everything has expired, the latest entry is still there to serve stale
+        self.clock.now += 60
+        entry = mine.get_entry("key")
+        self.assertEqual(entry.value, "new")
+        self.assertIsNone(mine.get("key"))
+
+    def test_memory_tier_is_bounded(self):
+        """The in-memory tier holds at most memory_entries entries."""
+        cache = self.make_cache(memory_entries=2)
+        for index in range(5):
+            cache.set(f"key-{index}", "text")
+        self.assertEqual(list(cache._memory), ["key-3", "key-4"])
+        self.assertEqual(cache.get("key-0"), "text")
+
+    def test_stats(self):
+        """Stats report both tiers and the hit counts."""
+        cache = self.make_cache(memory_entries=1)
+        cache.set("a", "text")
+        cache.set("b", "text")
+        cache.get("b")
+        cache.get("missing")
+        stats = cache.stats()
+        self.assertEqual((stats["memory_entries"], stats["disk_entries"]), (1, 2))
+        self.assertEqual(stats["disk_bytes"], 2 * (1 + len("text")))
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_concurrent_process_reads(self):
+        """Another process can read the cache while this one holds it open."""
+        self.make_cache().set("key", "shared")
+        code = (
+            "import sys; sys.path.insert(0, sys.argv[2]);"
+            "from src.python_ai_bot.cache import SQLiteCacheStore;"
+            "print(SQLiteCacheStore(sys.argv[1]).get('key').value)"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(
+            [sys.executable, "-c", code, self.path, root], capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip(), "shared")
+
+
+class TestClientCache(unittest.TestCase):
+    """Test case for caching in OpenAIClient.generate_text."""
+
+    def test_cached_completion_skips_api(self):
+        """Only the first identical request reaches the API, and errors are not cached."""
+        cache = ResponseCache()
+        client = OpenAIClient(api_key="sk-test", cache=cache)
+        with patch.object(client, "generate_chat", return_value="Error: upstream down") as generate_chat:
+            self.assertEqual(client.generate_text("hello"), "Error: upstream down")
+            generate_chat.return_value = "Hi there"
+            self.assertEqual(client.generate_text("hello"), "Hi there")
+            self.assertEqual(client.generate_text("hello"), "Hi there")
+        self.assertEqual(generate_chat.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests for the codec module."""
+
+import unittest
+
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot import codec
+from src.python_ai_bot.api import app
+
+
+class TestCodec(unittest.TestCase):
+    """Test case for the shared serialization layer."""
+
+    def test_json_roundtrip(self):
+        """JSON encodes to bytes and decodes back, whatever the backend."""
+        payload = {"text": "héllo", "items": [1, 2.5, None, True]}
+        self.assertIsInstance(codec.dumps(payload), bytes)
+        self.assertEqual(codec.loads(codec.dumps(payload)), payload)
+        self.assertEqual(codec.loads('{"a": 1}'), {"a": 1})
+
+    def test_decode_errors(self):
+        """Invalid bodies raise DecodeError, which is a ValueError."""
+        with self.assertRaises(codec.DecodeError):
+            codec.loads(b"{not json")
+        with self.assertRaises(ValueError):
+            codec.decode(b"\xff\xfe", codec.JSON_TYPE)
+
+    def test_negotiate_content_type(self):
+        """MessagePack is only chosen when named explicitly."""
+        self.assertEqual(codec.negotiate_content_type(""), codec.JSON_TYPE)
+        self.assertEqual(codec.negotiate_content_type("*/*"), codec.JSON_TYPE)
+        if codec.msgpack_available():
+            self.assertEqual(codec.negotiate_content_type("application/msgpack"), codec.MSGPACK_TYPE)
+
+    @unittest.skipUnless(codec.msgpack_available(), "msgspec or msgpack not installed")
+    def test_msgpack_roundtrip(self):
+        """MessagePack bodies decode by Content-Type."""
+        payload = {"prompt": "hi", "max_tokens": 5}
+        body = codec.encode(payload, codec.MSGPACK_TYPE)
+        self.assertEqual(codec.decode(body, "application/x-msgpack"), payload)
+
+
+@unittest.skipUnless(codec.msgpack_available(), "msgspec or msgpack not installed")
+class TestCodecMiddleware(unittest.TestCase):
+    """Test case for MessagePack content negotiation on the FastAPI app."""
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_msgpack_request_and_response(self):
+        """MessagePack requests are validated as usual and answered in MessagePack."""
+        response = self.client.post(
+            "/generate",
+            content=codec.encode({"prompt": "Test prompt"}, codec.MSGPACK_TYPE),
+            headers={"Content-Type": codec.MSGPACK_TYPE, "Accept": codec.MSGPACK_TYPE},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], codec.MSGPACK_TYPE)
+        self.assertIn("text", codec.decode(response.content, codec.MSGPACK_TYPE))
+
+    def test_invalid_msgpack(self):
+        """Corrupt MessagePack bodies are rejected with 400."""
+        response = self.client.post("/generate", content=b"\xc1", headers={"Content-Type": codec.MSGPACK_TYPE})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+"""Tests for the compression module and middleware."""
+
+import gzip
+import http.client
+import json
+import threading
+import unittest
+import zlib
+from http.server import HTTPServer
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from api.index import Handler as IndexHandler
+from src.python_ai_bot.compression import (
+    SUPPORTED_ENCODINGS,
+    CompressionError,
+    StreamCompressor,
+    UnsupportedEncodingError,
+    compress,
+    compress_for_client,
+    decompress,
+    negotiate_encoding,
+)
+from src.python_ai_bot.middleware import CompressionMiddleware
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+class TestCompression(unittest.TestCase):
+    """Test case for content-encoding helpers."""
+
+    def test_negotiate_encoding(self):
+        """The client's q-values win, server preference breaks ties."""
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertEqual(negotiate_encoding("gzip"), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0.5, deflate"), "gzip")
+        self.assertIsNone(negotiate_encoding("gzip;q=0"))
+        self.assertEqual(negotiate_encoding("*"), SUPPORTED_ENCODINGS[0])
+
+    def test_roundtrip(self):
+        """Every supported encoding decodes back to the original payload."""
+        data = json.dumps({"text": "hello world " * 500}).encode()
+        for encoding in SUPPORTED_ENCODINGS:
+            compressed = compress(data, encoding)
+            self.assertLess(len(compressed), len(data))
+            self.assertEqual(decompress(compressed, encoding), data)
+
+    def test_small_bodies_are_not_compressed(self):
+        """Bodies under the threshold are sent as is."""
+        self.assertEqual(compress_for_client(b"{}", "gzip"), (b"{}", None))
+
+    def test_stream_compressor_flushes_each_chunk(self):
+        """Each compressed chunk can be decoded as soon as it arrives."""
+        compressor = StreamCompressor("gzip")
+        decoder = zlib.decompressobj(31)
+        self.assertEqual(decoder.decompress(compressor.compress(b"first ")), b"first ")
+        self.assertEqual(decoder.decompress(compressor.compress(b"second")), b"second")
+        decoder.decompress(compressor.finish())
+        self.assertTrue(decoder.eof)
+
+    def test_decompress_limits(self):
+        """Oversized, corrupt and unknown bodies are rejected."""
+        bomb = gzip.compress(b"0" * 100000)
+        with self.assertRaises(CompressionError):
+            decompress(bomb, "gzip", max_size=1000)
+        with self.assertRaises(CompressionError):
+            decompress(b"not gzip", "gzip")
+        with self.assertRaises(UnsupportedEncodingError):
+            decompress(b"data", "compress")
+        self.assertEqual(decompress(b"data", ""), b"data")
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+    """Test case for the ASGI compression middleware."""
+
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware)
+
+        @app.post("/echo")
+        async def echo(request: Request):
+            body = await request.json()
+            return {"text": body["text"] * 500}
+
+        @app.get("/stream")
+        async def stream():
+            async def chunks():
+                for index in range(3):
+                    yield f"chunk {index}\n"
+            return StreamingResponse(chunks(), media_type="text/plain")
+
+        self.client = TestClient(app)
+
+    def test_compressed_request_and_response(self):
+        """Gzip request bodies are decoded and large responses compressed."""
+        body = gzip.compress(json.dumps({"text": "abc"}).encode())
+        response = self.client.post(
+            "/echo",
+            content=body,
+            headers={"Content-Encoding": "gzip", "Content-Type": "application/json", "Accept-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.json()["text"], "abc" * 500)
+
+    def test_streamed_response(self):
+        """Streamed responses are compressed chunk by chunk."""
+        response = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertNotIn("content-length", response.headers)
+        self.assertEqual(response.text, "chunk 0\nchunk 1\nchunk 2\n")
+
+    def test_unsupported_request_encoding(self):
+        """Unknown request encodings are rejected with 415."""
+        response = self.client.post("/echo", content=b"x", headers={"Content-Encoding": "compress"})
+        self.assertEqual(response.status_code, 415)
+
+
+class TestHandlerCompression(unittest.TestCase):
+    """Test case for compression in the serverless handler."""
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), IndexHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.settings = get_settings()
+        set_settings(load_settings({"API_SECRET_KEY": "test-key"}))
+
+    def tearDown(self):
+        set_settings(self.settings)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_gzip_request_and_response(self):
+        """The handler decodes gzip bodies and compresses large responses."""
+        # Compressible, without the long single-character run screening rejects
+        prompt = ("compress me " * 84)[:1000]
+        body = gzip.compress(json.dumps({"prompt": prompt}).encode())
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        connection.request(
+            "POST",
+            "/generate",
+            body=body,
+            headers={
+                "Content-Encoding": "gzip",
+                "Accept-Encoding": "gzip",
+                "Content-Type": "application/json",
+                "X-API-Key": "test-key",
+            },
+        )
+        response = connection.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        payload = json.loads(gzip.decompress(response.read()))
+        self.assertTrue(payload["text"].endswith(prompt))
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
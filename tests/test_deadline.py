@@ -0,0 +1,230 @@
+"""Tests for client deadlines and cancellation."""
+
+import socket
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.ai.openai_client import OpenAIClient
+from src.python_ai_bot.api import app
+from src.python_ai_bot.deadline import (
+    MAX_TIMEOUT,
+    ClientDisconnected,
+    Deadline,
+    DeadlineExceeded,
+    check_deadline,
+    deadline_scope,
+    get_deadline,
+    parse_timeout,
+    upstream_timeout,
+    watch_disconnect,
+)
+from src.python_ai_bot.degradation import DegradationPolicy, UpstreamHealth
+from src.python_ai_bot.main import main
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeStream:
+    """Stand-in for an SDK completion stream that records whether it was closed."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def chunk(content=None, usage=None):
+    delta = SimpleNamespace(content=content)
+    choices = [SimpleNamespace(delta=delta)] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class TestDeadline(unittest.TestCase):
+    """Test case for Deadline and the deadline scope."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_remaining_and_check(self):
+        """A deadline counts down and raises once it has passed."""
+        deadline = Deadline(2.0, clock=self.clock)
+        self.assertEqual(deadline.remaining(), 2.0)
+        self.assertEqual(deadline.timeout(30), 2.0)
+        self.clock.now += 1.5
+        self.assertEqual(deadline.timeout(0.25), 0.25)
+        deadline.check()
+        self.clock.now += 1
+        self.assertEqual(deadline.remaining(), 0.0)
+        self.assertRaises(DeadlineExceeded, deadline.check)
+
+    def test_no_limit(self):
+        """Without a timeout only cancellation stops the request."""
+        deadline = Deadline(clock=self.clock)
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.timeout(30), 30)
+        deadline.cancel()
+        self.assertTrue(deadline.cancelled)
+        self.assertRaises(ClientDisconnected, deadline.check)
+
+    def test_scope(self):
+        """The deadline is visible inside its scope only."""
+        self.assertIsNone(get_deadline())
+        self.assertEqual(upstream_timeout(30), 30)
+        check_deadline()
+        with deadline_scope(5.0) as deadline:
+            self.assertIs(get_deadline(), deadline)
+            self.assertLessEqual(upstream_timeout(30), 5.0)
+        self.assertIsNone(get_deadline())
+
+    def test_parse_timeout(self):
+        """The body field wins over the header, and values are validated and capped."""
+        self.assertIsNone(parse_timeout())
+        self.assertEqual(parse_timeout("2.5"), 2.5)
+        self.assertEqual(parse_timeout("2.5", 1500), 1.5)
+        self.assertEqual(parse_timeout(str(MAX_TIMEOUT * 2)), MAX_TIMEOUT)
+        for header, timeout_ms in (("soon", None), ("0", None), ("-1", None), (None, "100"), (None, True)):
+            with self.assertRaises(ValueError):
+                parse_timeout(header, timeout_ms)
+
+
+class TestWatchDisconnect(unittest.TestCase):
+    """Test case for detecting a closed client connection."""
+
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+
+    def tearDown(self):
+        self.server.close()
+        self.client.close()
+
+    def wait_cancelled(self, deadline, timeout=2.0):
+        end = time.monotonic() + timeout
+        while not deadline.cancelled and time.monotonic() < end:
+            time.sleep(0.01)
+        return deadline.cancelled
+
+    def test_disconnect(self):
+        """Closing the client end cancels the deadline."""
+        deadline = Deadline()
+        with watch_disconnect(self.server, deadline, interval=0.01):
+            self.client.close()
+            self.assertTrue(self.wait_cancelled(deadline))
+
+    def test_connected(self):
+        """A connected client, even one sending more data, does not cancel the deadline."""
+        deadline = Deadline()
+        with watch_disconnect(self.server, deadline, interval=0.01):
+            self.client.sendall(b"GET / HTTP/1.1\r\n")
+            self.assertFalse(self.wait_cancelled(deadline, timeout=0.1))
+        self.assertEqual(self.server.recv(16), b"GET / HTTP/1.1\r\n")
+
+
+class TestCancellation(unittest.TestCase):
+    """Test case for abandoning upstream calls."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_policy_ignores_aborts(self):
+        """Aborted calls do not count against upstream health."""
+        health = UpstreamHealth(min_samples=1, clock=self.clock)
+        policy = DegradationPolicy(health=health)
+
+        def fetch():
+            raise DeadlineExceeded("Request deadline exceeded")
+
+        for _ in range(5):
+            self.assertRaises(DeadlineExceeded, policy.call, fetch)
+        self.assertEqual(health.stats()["samples"], 0)
+        self.assertFalse(health.is_degraded())
+
+    def test_stream_stops_on_cancel(self):
+        """A cancelled request stops reading the stream and closes it."""
+        client = OpenAIClient(api_key="sk-test", usage_meter=MagicMock())
+        client.client = MagicMock()
+        stream = FakeStream([chunk("Hello"), chunk(" world"), chunk(usage={"prompt_tokens": 3})])
+        client.client.with_options.return_value = client.client
+        client.client.chat.completions.create.return_value = stream
+
+        with deadline_scope(5.0) as deadline:
+            self.assertEqual(client.generate_chat([{"role": "user", "content": "hi"}]), "Hello world")
+            client.usage_meter.record.assert_called_once()
+            self.assertTrue(stream.closed)
+
+            stream = FakeStream([chunk("Hello"), chunk(" world")])
+            client.client.chat.completions.create.return_value = stream
+            deadline.cancel()
+            self.assertTrue(client.generate_chat([{"role": "user", "content": "hi"}]).startswith("Error:"))
+        client.client.with_options.assert_any_call(max_retries=0)
+
+    def test_main_skips_mock_fallback(self):
+        """An expired request raises instead of returning a mock response."""
+        with patch("src.python_ai_bot.main.OpenAIClient") as client_class:
+            client_class.return_value.generate_text.return_value = "Error: Request deadline exceeded"
+            self.assertIn("mock", main(prompt="hi", use_mock_fallback=True))
+            with deadline_scope(0.001):
+                time.sleep(0.01)
+                self.assertRaises(DeadlineExceeded, main, prompt="hi", use_mock_fallback=True)
+
+
+class TestGenerateDeadline(unittest.TestCase):
+    """Test case for deadlines on /generate."""
+
+    def setUp(self):
+        self.client = TestClient(app)
+        # Rebuilt middleware comes with a fresh rate limiter
+        app.middleware_stack = None
+
+    def test_timeout_header(self):
+        """The deadline is in force while main runs."""
+        seen = []
+
+        def timed_main(**kwargs):
+            seen.append(get_deadline().remaining())
+            return "text"
+
+        with patch("src.python_ai_bot.api.main", side_effect=timed_main):
+            response = self.client.post("/generate", json={"prompt": "hi"}, headers={"X-Request-Timeout": "2"})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(seen[0], 2.0)
+
+    def test_deadline_exceeded(self):
+        """A request that runs out of time gets a 504."""
+
+        def slow_main(**kwargs):
+            time.sleep(0.05)
+            check_deadline()
+            return "late"
+
+        with patch("src.python_ai_bot.api.main", side_effect=slow_main):
+            response = self.client.post("/generate", json={"prompt": "hi", "timeout_ms": 10})
+        self.assertEqual(response.status_code, 504)
+
+    def test_invalid_timeout(self):
+        """An unparseable timeout is rejected."""
+        response = self.client.post("/generate", json={"prompt": "hi"}, headers={"X-Request-Timeout": "soon"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
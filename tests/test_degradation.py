@@ -0,0 +1,161 @@
+"""Tests for stale-while-revalidate degradation."""
+
+import threading
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.ai.openai_client import OpenAIClient
+from src.python_ai_bot.api import app
+from src.python_ai_bot.cache import ResponseCache
+from src.python_ai_bot.degradation import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_STALE,
+    DegradationPolicy,
+    UpstreamHealth,
+    UpstreamUnavailableError,
+    get_cache_status,
+    set_cache_status,
+)
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestUpstreamHealth(unittest.TestCase):
+    """Test case for the rolling health window."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.health = UpstreamHealth(latency_slo=2.0, error_threshold=0.5, window=60, min_samples=4, clock=self.clock)
+
+    def test_errors(self):
+        """Upstream is degraded once errors pass the threshold, and recovers as they age out."""
+        for ok in (True, False, False, False):
+            self.health.record(0.1, ok)
+        self.assertTrue(self.health.is_degraded())
+        self.clock.now += 61
+        self.assertFalse(self.health.is_degraded())
+
+    def test_latency(self):
+        """Upstream is degraded when the median latency is over the SLO."""
+        for latency in (0.5, 3.0, 3.0, 4.0):
+            self.health.record(latency, True)
+        self.assertTrue(self.health.is_degraded())
+
+    def test_stats(self):
+        """Stats report the circuit state and the window summary."""
+        self.assertEqual(self.health.stats()["circuit"], "closed")
+        for ok in (True, False, False, False):
+            self.health.record(1.0, ok)
+        stats = self.health.stats()
+        self.assertEqual(stats["circuit"], "open")
+        self.assertEqual(stats["samples"], 4)
+        self.assertEqual(stats["error_rate"], 0.75)
+        self.assertEqual(stats["median_latency"], 1.0)
+
+    def test_min_samples(self):
+        """A few failures are not enough to judge."""
+        for _ in range(3):
+            self.health.record(0.1, False)
+        self.assertFalse(self.health.is_degraded())
+
+
+class TestDegradationPolicy(unittest.TestCase):
+    """Test case for choosing between cache and upstream."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(ttl=60, clock=self.clock)
+        self.health = UpstreamHealth(min_samples=2)
+        self.policy = DegradationPolicy(health=self.health, stale_ttl=3600, clock=self.clock)
+
+    def fail(self):
+        raise RuntimeError("upstream down")
+
+    def degrade(self):
+        for _ in range(2):
+            self.health.record(0.1, False)
+
+    def test_hit_and_miss(self):
+        """Fresh entries are served from the cache, misses go upstream and are cached."""
+        self.assertEqual(self.policy.serve(self.cache, "key", lambda: "fresh"), ("fresh", CACHE_MISS))
+        self.assertEqual(self.policy.serve(self.cache, "key", self.fail), ("fresh", CACHE_HIT))
+
+    def test_stale_if_error(self):
+        """An expired entry is served when upstream fails."""
+        self.cache.set("key", "old")
+        self.clock.now += 120
+        self.assertEqual(self.policy.serve(self.cache, "key", self.fail), ("old", CACHE_STALE))
+        with self.assertRaises(RuntimeError):
+            self.policy.serve(self.cache, "other", self.fail)
+
+    def test_degraded_serves_stale_and_refreshes(self):
+        """While degraded, stale entries are served at once and refreshed in the background."""
+        self.cache.set("key", "old")
+        self.clock.now += 120
+        self.degrade()
+        refreshed = threading.Event()
+
+        def fetch():
+            refreshed.set()
+            return "new"
+
+        self.assertEqual(self.policy.serve(self.cache, "key", fetch), ("old", CACHE_STALE))
+        self.assertTrue(refreshed.wait(5))
+        self.policy._executor.shutdown(wait=True)
+        self.assertEqual(self.cache.get("key"), "new")
+
+    def test_degraded_fails_fast(self):
+        """While degraded, requests with nothing usable cached do not call upstream."""
+        self.degrade()
+        calls = []
+        with self.assertRaises(UpstreamUnavailableError):
+            self.policy.serve(self.cache, "key", lambda: calls.append(1) or "text")
+        self.cache.set("old", "too old")
+        self.clock.now += 60 + 3601
+        with self.assertRaises(UpstreamUnavailableError):
+            self.policy.serve(self.cache, "old", lambda: calls.append(1) or "text")
+        self.assertEqual(calls, [])
+
+    def test_client_reports_stale(self):
+        """OpenAIClient serves stale text and records the cache status."""
+        client = OpenAIClient(api_key="sk-test", cache=self.cache, degradation=self.policy)
+        with patch.object(client, "generate_chat", return_value="first"):
+            self.assertEqual(client.generate_text("hello"), "first")
+        self.assertEqual(get_cache_status(), CACHE_MISS)
+        self.clock.now += 120
+        with patch.object(client, "generate_chat", return_value="Error: timeout"):
+            self.assertEqual(client.generate_text("hello"), "first")
+            self.assertEqual(get_cache_status(), CACHE_STALE)
+            self.assertEqual(client.generate_text("bye"), "Error: timeout")
+
+
+class TestStaleHeaders(unittest.TestCase):
+    """Test case for the cache headers on /generate."""
+
+    def test_stale_headers(self):
+        """Stale completions carry X-Cache: STALE and a Warning header."""
+
+        def stale_main(**kwargs):
+            set_cache_status(CACHE_STALE)
+            return "old text"
+
+        with patch("src.python_ai_bot.api.main", side_effect=stale_main):
+            response = TestClient(app).post("/generate", json={"prompt": "hello"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["x-cache"], "STALE")
+        self.assertIn("110", response.headers["warning"])
+
+
+if __name__ == "__main__":
+    unittest.main()
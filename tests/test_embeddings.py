@@ -0,0 +1,166 @@
+"""Tests for batched embeddings."""
+
+import array
+import base64
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.ai.openai_client import EmbeddingError, OpenAIClient
+from src.python_ai_bot.api import app
+from src.python_ai_bot.embeddings import EmbeddingBatcher, encode_vector
+
+
+def fake_vector(text):
+    return array.array("f", [float(len(text)), 0.5])
+
+
+class FakeEmbed:
+    """Upstream stand-in that records the batches it is called with."""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def __call__(self, texts, model=None, dimensions=None, tenant=None):
+        self.calls.append((list(texts), list(tenant)))
+        if self.error:
+            raise self.error
+        return [fake_vector(text) for text in texts]
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    """Test case for collecting concurrent texts into batches."""
+
+    def embed_concurrently(self, batcher, texts):
+        results = [None] * len(texts)
+        start = threading.Barrier(len(texts))
+
+        def run(i):
+            start.wait()
+            try:
+                results[i] = batcher.embed(texts[i], tenant=f"tenant-{i}")
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_batches_concurrent_texts(self):
+        """Concurrent texts share upstream calls and each gets its own vector."""
+        upstream = FakeEmbed()
+        batcher = EmbeddingBatcher(upstream, max_batch_size=4, max_wait=0.2)
+        texts = ["a", "bb", "ccc", "dddd", "eeeee", "ffffff", "g", "hh"]
+        results = self.embed_concurrently(batcher, texts)
+        for text, vector in zip(texts, results):
+            self.assertEqual(vector[0], len(text))
+        self.assertEqual(sum(len(batch) for batch, _ in upstream.calls), 8)
+        self.assertLess(len(upstream.calls), 8)
+        self.assertTrue(all(len(batch) <= 4 for batch, _ in upstream.calls))
+        self.assertEqual(batcher.stats()["texts"], 8)
+
+    def test_full_batch_closes_window(self):
+        """A full batch is sent without waiting out the window."""
+        upstream = FakeEmbed()
+        batcher = EmbeddingBatcher(upstream, max_batch_size=1, max_wait=60)
+        self.assertEqual(batcher.embed("abc")[0], 3)
+        self.assertEqual(upstream.calls, [(["abc"], [None])])
+
+    def test_duplicates(self):
+        """Identical texts in a batch are sent once."""
+        upstream = FakeEmbed()
+        batcher = EmbeddingBatcher(upstream, max_batch_size=3, max_wait=1)
+        results = self.embed_concurrently(batcher, ["same", "same", "same"])
+        self.assertEqual(len(upstream.calls), 1)
+        self.assertEqual(upstream.calls[0][0], ["same"])
+        self.assertTrue(all(vector[0] == 4 for vector in results))
+
+    def test_errors_reach_every_caller(self):
+        """An upstream failure is raised to every caller in the batch."""
+        batcher = EmbeddingBatcher(FakeEmbed(error=EmbeddingError("down")), max_batch_size=2, max_wait=1)
+        results = self.embed_concurrently(batcher, ["a", "b"])
+        self.assertTrue(all(isinstance(result, EmbeddingError) for result in results))
+
+
+class TestEncoding(unittest.TestCase):
+    """Test case for vector encodings."""
+
+    def test_encodings(self):
+        """Vectors encode as floats, base64 or little-endian float32 bytes."""
+        vector = array.array("f", [1.0, -2.5])
+        self.assertEqual(encode_vector(vector), [1.0, -2.5])
+        raw = encode_vector(vector, "binary")
+        self.assertEqual(len(raw), 8)
+        self.assertEqual(base64.b64decode(encode_vector(vector, "base64")), raw)
+        self.assertRaises(ValueError, encode_vector, vector, "hex")
+
+
+class TestClientEmbed(unittest.TestCase):
+    """Test case for OpenAIClient.embed."""
+
+    def test_embed(self):
+        """Base64 vectors are decoded in order and usage is split between tenants."""
+        meter = MagicMock()
+        client = OpenAIClient(api_key="sk-test", usage_meter=meter)
+        client.client = MagicMock()
+        encoded = [base64.b64encode(array.array("f", [i, i]).tobytes()).decode() for i in (1.0, 2.0)]
+        client.client.embeddings.create.return_value = SimpleNamespace(
+            data=[SimpleNamespace(index=1, embedding=encoded[1]), SimpleNamespace(index=0, embedding=encoded[0])],
+            usage=SimpleNamespace(prompt_tokens=10),
+        )
+        vectors = client.embed(["abc", "abc"], tenant=["x", "y"])
+        self.assertEqual([vector.tolist() for vector in vectors], [[1.0, 1.0], [2.0, 2.0]])
+        self.assertEqual(client.client.embeddings.create.call_args.kwargs["encoding_format"], "base64")
+        recorded = {call.args[0]: call.kwargs["prompt_tokens"] for call in meter.record.call_args_list}
+        self.assertEqual(recorded, {"x": 5, "y": 5})
+
+    def test_not_initialized(self):
+        """Embedding without a client raises EmbeddingError."""
+        client = OpenAIClient(api_key="sk-test")
+        client.client = None
+        self.assertRaises(EmbeddingError, client.embed, ["a"])
+
+
+class TestEmbedEndpoint(unittest.TestCase):
+    """Test case for /embed."""
+
+    def setUp(self):
+        self.client = TestClient(app)
+        # Rebuilt middleware comes with a fresh rate limiter
+        app.middleware_stack = None
+        batcher = EmbeddingBatcher(FakeEmbed(), max_batch_size=1)
+        self.patcher = patch("src.python_ai_bot.api.get_embedding_batcher", return_value=batcher)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_float(self):
+        """The default encoding is a list of numbers."""
+        response = self.client.post("/embed", json={"text": "hello"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["embedding"], [5.0, 0.5])
+        self.assertEqual(response.json()["dimensions"], 2)
+
+    def test_binary(self):
+        """Binary encoding returns the raw float32 bytes."""
+        response = self.client.post("/embed", json={"text": "hello", "encoding": "binary"})
+        self.assertEqual(response.headers["content-type"], "application/octet-stream")
+        self.assertEqual(response.headers["x-embedding-dimensions"], "2")
+        self.assertEqual(array.array("f", response.content).tolist(), [5.0, 0.5])
+
+    def test_invalid(self):
+        """Unknown encodings and empty texts are rejected."""
+        self.assertEqual(self.client.post("/embed", json={"text": "a", "encoding": "hex"}).status_code, 400)
+        self.assertEqual(self.client.post("/embed", json={"text": ""}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""Tests for the keep-alive, thread-pooled HTTP server."""
+
+import http.client
+import json
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from api.index import Handler as IndexHandler
+from src.python_ai_bot.httpserver import PooledHTTPServer
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+release = threading.Event()
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """Answers with what it knows about the request and the connection."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/slow":
+            release.wait(5)
+        if self.path == "/remember":
+            self.remembered = True
+        body = json.dumps({
+            "port": self.client_address[1],
+            "remembered": getattr(self, "remembered", False),
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def is_closed(sock, timeout=2.0):
+    """Check whether the server has closed a raw socket."""
+    sock.settimeout(timeout)
+    try:
+        return sock.recv(1) == b""
+    except ConnectionError:
+        return True
+
+
+class TestPooledHTTPServer(unittest.TestCase):
+    """Test case for PooledHTTPServer."""
+
+    def start(self, handler_class=EchoHandler, **options):
+        server = PooledHTTPServer(("127.0.0.1", 0), handler_class, **options)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def get(self, connection, path="/"):
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return json.loads(response.read())
+
+    def test_keep_alive(self):
+        """Requests on one connection reuse it, and keep no state from earlier requests."""
+        server = self.start()
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        first = self.get(connection, "/remember")
+        second = self.get(connection)
+        self.assertEqual(first["port"], second["port"])
+        self.assertEqual((first["remembered"], second["remembered"]), (True, False))
+        # Requests after the first are counted once their response has gone out
+        deadline = time.monotonic() + 2
+        while server.requests < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual((server.connections, server.requests), (1, 2))
+        connection.close()
+
+    def test_slow_request_does_not_block_others(self):
+        """A request waiting on a slow call leaves the other workers free."""
+        release.clear()
+        self.addCleanup(release.set)
+        server = self.start(max_workers=2)
+        slow = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        slow.request("GET", "/slow")
+        time.sleep(0.1)
+        fast = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        for _ in range(3):
+            self.get(fast)
+        release.set()
+        self.assertEqual(slow.getresponse().status, 200)
+
+    def test_idle_timeout(self):
+        """A connection idle for longer than idle_timeout is closed."""
+        server = self.start(idle_timeout=0.2)
+        with socket.create_connection(("127.0.0.1", server.server_port)) as sock:
+            sock.sendall(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n")
+            sock.settimeout(2)
+            response = http.client.HTTPResponse(sock)
+            response.begin()
+            response.read()
+            self.assertEqual(response.status, 200)
+            start = time.monotonic()
+            self.assertTrue(is_closed(sock))
+            self.assertLess(time.monotonic() - start, 1.5)
+        deadline = time.monotonic() + 2
+        while server.connections and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(server.connections, 0)
+
+    def test_pipelined(self):
+        """Requests sent back to back are all answered, in order."""
+        server = self.start()
+        with socket.create_connection(("127.0.0.1", server.server_port)) as sock:
+            sock.sendall(b"GET /a HTTP/1.1\r\nHost: x\r\n\r\n" * 3 + b"GET /b HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+            data = b""
+            sock.settimeout(5)
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        self.assertEqual(data.count(b"200 OK"), 4)
+
+    def test_connection_limit(self):
+        """Connections past max_connections are answered with 503."""
+        server = self.start(max_connections=1)
+        first = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        self.get(first)
+        second = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        second.request("GET", "/")
+        self.assertEqual(second.getresponse().status, 503)
+        first.close()
+
+
+class TestIndexHandlerKeepAlive(unittest.TestCase):
+    """Test case for serving the index handler over persistent connections."""
+
+    def setUp(self):
+        settings = get_settings()
+        set_settings(load_settings({"API_SECRET_KEY": "test-key"}))
+        self.addCleanup(set_settings, settings)
+        self.server = PooledHTTPServer(("127.0.0.1", 0), IndexHandler)
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_responses_keep_connection(self):
+        """Every response has a Content-Length, so the connection survives it."""
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port, timeout=5)
+        for method, path in (("OPTIONS", "/generate"), ("GET", "/health"), ("GET", "/missing")):
+            connection.request(method, path, headers={"X-API-Key": "test-key"})
+            response = connection.getresponse()
+            response.read()
+            self.assertIsNotNone(response.getheader("Content-Length"))
+            self.assertFalse(response.will_close)
+        self.assertEqual(self.server.connections, 1)
+        connection.close()
+
+    def test_unread_body_closes_connection(self):
+        """A request rejected before its body was read does not leave the body for the next one."""
+        with socket.create_connection(("127.0.0.1", self.server.server_port)) as sock:
+            body = b'{"prompt": "GET /health HTTP/1.1"}'
+            sock.sendall(b"POST /generate HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            sock.settimeout(5)
+            response = http.client.HTTPResponse(sock)
+            response.begin()
+            response.read()
+            self.assertEqual(response.status, 401)
+            self.assertTrue(is_closed(sock))
+
+
+if __name__ == "__main__":
+    unittest.main()
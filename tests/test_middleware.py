@@ -0,0 +1,104 @@
+"""Tests for the early rejection middleware."""
+
+import time
+import unittest
+
+import jwt
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.middleware import EarlyRejectMiddleware, verified_tenant
+from src.python_ai_bot.ratelimit import RateLimiter
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+class TestEarlyRejectMiddleware(unittest.TestCase):
+    """Test case for header-only rejection in front of the app."""
+
+    def setUp(self):
+        self.previous = get_settings()
+        set_settings(load_settings({
+            "API_SECRET_KEY": "test-key",
+            "JWT_SECRET": "jwt-secret",
+            "API_KEY_TENANTS": "acme:acme-key",
+            "MAX_BODY_SIZE": "100",
+        }))
+        self.bodies_read = 0
+
+        app = FastAPI()
+        app.add_middleware(EarlyRejectMiddleware, rate_limiter=RateLimiter(limit=5, window=60))
+
+        @app.post("/echo")
+        async def echo(request: Request):
+            self.bodies_read += 1
+            body = await request.body()
+            payload = getattr(request.state, "jwt_payload", None)
+            return {"size": len(body), "sub": payload["sub"] if payload else None}
+
+        @app.get("/health")
+        async def health():
+            return {"status": "ok"}
+
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        set_settings(self.previous)
+
+    def test_api_key(self):
+        """Requests need the right API key, and are rejected before the body is read."""
+        self.assertEqual(self.client.post("/echo", content=b"{}").status_code, 401)
+        self.assertEqual(self.client.post("/echo", content=b"{}", headers={"X-API-Key": "wrong"}).status_code, 401)
+        self.assertEqual(self.bodies_read, 0)
+        response = self.client.post("/echo", content=b"{}", headers={"X-API-Key": "test-key"})
+        self.assertEqual(response.json(), {"size": 2, "sub": None})
+        self.assertEqual(self.client.post("/echo", content=b"{}", headers={"X-API-Key": "acme-key"}).status_code, 200)
+
+    def test_verified_tenant(self):
+        """Tenants come from a verified JWT subject or a tenant's API key, never from plain headers."""
+        settings = get_settings()
+        self.assertEqual(verified_tenant(settings, "", {"sub": "alice"}), "alice")
+        self.assertEqual(verified_tenant(settings, "", {"user_id": "bob"}), "bob")
+        self.assertEqual(verified_tenant(settings, "acme-key", None), "acme")
+        self.assertIsNone(verified_tenant(settings, "test-key", None))
+        self.assertIsNone(verified_tenant(settings, "wrong", {}))
+        # With only tenant keys configured the API is closed to everyone else
+        set_settings(load_settings({"API_KEY_TENANTS": "acme:acme-key"}))
+        self.assertEqual(self.client.post("/echo", content=b"{}").status_code, 401)
+
+    def test_jwt(self):
+        """A valid bearer token is accepted and its claims passed to the route."""
+        token = jwt.encode({"sub": "alice", "exp": int(time.time()) + 60}, "jwt-secret", algorithm="HS256")
+        response = self.client.post("/echo", content=b"{}", headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.json()["sub"], "alice")
+
+        expired = jwt.encode({"sub": "alice", "exp": int(time.time()) - 60}, "jwt-secret", algorithm="HS256")
+        response = self.client.post("/echo", content=b"{}", headers={"Authorization": f"Bearer {expired}"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_body_size(self):
+        """Oversized bodies are rejected from Content-Length or as they stream in."""
+        headers = {"X-API-Key": "test-key"}
+        response = self.client.post("/echo", content=b"x" * 101, headers=headers)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.bodies_read, 0)
+
+        def chunks():
+            for _ in range(5):
+                yield b"x" * 50
+
+        response = self.client.post("/echo", content=chunks(), headers=headers)
+        self.assertEqual(response.status_code, 413)
+
+    def test_rate_limit(self):
+        """Clients over the limit get 429 with Retry-After, exempt paths are not counted."""
+        for _ in range(10):
+            self.assertEqual(self.client.get("/health").status_code, 200)
+        statuses = [self.client.post("/echo", content=b"{}").status_code for _ in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+        response = self.client.post("/echo", content=b"{}", headers={"X-API-Key": "test-key"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("retry-after", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""End-to-end tests for Batch API support against a local stand-in server."""
+
+import email.parser
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.python_ai_bot.ai.openai_client import BatchError, OpenAIClient
+from src.python_ai_bot.usage import UsageMeter
+
+
+class StandInState:
+    """Files and batches held by the stand-in server."""
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self.polls = 0
+        self.fail_batches = False
+
+
+def make_handler(state):
+    class StandInHandler(BaseHTTPRequestHandler):
+        """Minimal /v1/files and /v1/batches implementation."""
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path == "/v1/files":
+                message = email.parser.BytesParser().parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+                )
+                fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                          for part in message.get_payload()}
+                file_id = f"file-{len(state.files)}"
+                state.files[file_id] = fields["file"]
+                self.send_json({"id": file_id, "object": "file", "bytes": len(fields["file"]),
+                                "created_at": 0, "filename": "batch_requests.jsonl",
+                                "purpose": fields["purpose"].decode(), "status": "processed"})
+            elif self.path == "/v1/batches":
+                request = json.loads(body)
+                batch_id = f"batch-{len(state.batches)}"
+                state.batches[batch_id] = request["input_file_id"]
+                self.send_json(self.batch(batch_id, "validating"))
+            else:
+                self.send_json({"error": {"message": "not found"}}, status=404)
+
+        def do_GET(self):
+            if self.path.startswith("/v1/batches/"):
+                batch_id = self.path.rsplit("/", 1)[1]
+                state.polls += 1
+                if state.polls < 3:
+                    self.send_json(self.batch(batch_id, "in_progress"))
+                elif state.fail_batches:
+                    self.send_json(self.batch(batch_id, "failed"))
+                else:
+                    self.complete(batch_id)
+                    self.send_json(self.batch(batch_id, "completed", f"{batch_id}-out", f"{batch_id}-err"))
+            elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+                content = state.files[self.path.split("/")[3]]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+            else:
+                self.send_json({"error": {"message": "not found"}}, status=404)
+
+        def batch(self, batch_id, status, output_file_id=None, error_file_id=None):
+            return {"id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h", "created_at": 0, "input_file_id": state.batches[batch_id],
+                    "status": status, "output_file_id": output_file_id, "error_file_id": error_file_id}
+
+        def complete(self, batch_id):
+            output, errors = [], []
+            for line in state.files[state.batches[batch_id]].splitlines():
+                request = json.loads(line)
+                prompt = request["body"]["messages"][-1]["content"]
+                if prompt == "fail":
+                    errors.append({"custom_id": request["custom_id"], "response": {"status_code": 400, "body": {
+                        "error": {"message": "bad request"}}}, "error": None})
+                    continue
+                output.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": {
+                    "choices": [{"message": {"role": "assistant", "content": f"echo {prompt}"}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+                }}, "error": None})
+            state.files[f"{batch_id}-out"] = "".join(json.dumps(item) + "\n" for item in output).encode()
+            state.files[f"{batch_id}-err"] = "".join(json.dumps(item) + "\n" for item in errors).encode()
+
+    return StandInHandler
+
+
+class TestOpenAIBatch(unittest.TestCase):
+    """Test case for submitting, polling and collecting a batch."""
+
+    def setUp(self):
+        self.state = StandInState()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.state))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.meter = UsageMeter(flush_interval=0)
+        self.client = OpenAIClient(
+            api_key="sk-test",
+            usage_meter=self.meter,
+            base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+        )
+        self.sleeps = []
+
+    def tearDown(self):
+        self.meter.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_run_batch(self):
+        """Prompts round-trip to results keyed by the caller's ids, with usage recorded."""
+        items = [("a", "hello"), ("b", "fail"), ("c", "world")]
+        results = dict(self.client.run_batch(items, tenant="acme", poll_interval=1, sleep=self.sleeps.append))
+
+        self.assertEqual(results, {"a": "echo hello", "b": "Error: bad request", "c": "echo world"})
+        self.assertEqual(self.sleeps, [1, 2])
+        request_lines = [json.loads(line) for line in self.state.files["file-0"].splitlines()]
+        self.assertEqual(request_lines[0]["url"], "/v1/chat/completions")
+        self.assertEqual(request_lines[0]["body"]["messages"][0]["role"], "system")
+        self.assertEqual(self.meter.usage("acme")["day"]["prompt_tokens"], 20)
+
+    def test_failed_batch(self):
+        """A batch that ends in a failed state raises BatchError."""
+        self.state.fail_batches = True
+        with self.assertRaises(BatchError):
+            list(self.client.run_batch([("a", "hello")], poll_interval=1, sleep=self.sleeps.append))
+
+    def test_timeout(self):
+        """Polling stops once the timeout would be exceeded."""
+        batch_id = self.client.submit_batch([("a", "hello")])
+        with self.assertRaises(BatchError):
+            self.client.wait_for_batch(batch_id, poll_interval=10, timeout=5, sleep=self.sleeps.append)
+
+    def test_empty_batch(self):
+        """Submitting nothing is rejected before anything is uploaded."""
+        with self.assertRaises(BatchError):
+            self.client.submit_batch([])
+        self.assertEqual(self.state.files, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Tests for the pre-fork supervisor."""
+
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_SCRIPT = """
+import functools, os, sys
+from http.server import BaseHTTPRequestHandler
+from src.python_ai_bot.prefork import Supervisor, serve_handler
+
+class PidHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = str(os.getpid()).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+port, workers, max_requests = (int(arg) for arg in sys.argv[1:])
+Supervisor(
+    functools.partial(serve_handler, handler_class=PidHandler),
+    host="127.0.0.1", port=port, workers=workers, max_requests=max_requests, graceful_timeout=5,
+).run()
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+class TestSupervisor(unittest.TestCase):
+    """Test case for worker supervision, recycling and reloads."""
+
+    def start(self, workers=1, max_requests=0):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", SERVER_SCRIPT, str(self.port), str(workers), str(max_requests)], cwd=ROOT
+        )
+        self.addCleanup(self.stop)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                return self.get_pid()
+            except OSError:
+                time.sleep(0.05)
+        self.fail("server did not start")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def get_pid(self):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            connection.request("GET", "/")
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            return int(response.read())
+        finally:
+            connection.close()
+
+    def wait_for_new_pid(self, old_pids, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            pid = self.get_pid()
+            if pid not in old_pids:
+                return pid
+            time.sleep(0.05)
+        self.fail("no new worker answered")
+
+    def test_recycles_workers(self):
+        """Workers are replaced after max_requests without failing a request."""
+        pids = [self.start(max_requests=2)] + [self.get_pid() for _ in range(7)]
+        self.assertEqual(len(set(pids)), 4)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_restarts_crashed_worker(self):
+        """A killed worker is replaced."""
+        pid = self.start(workers=2)
+        os.kill(pid, signal.SIGKILL)
+        self.wait_for_new_pid({pid})
+
+    def test_rolling_reload(self):
+        """SIGHUP replaces the workers while every request keeps succeeding."""
+        pid = self.start()
+        self.process.send_signal(signal.SIGHUP)
+        self.wait_for_new_pid({pid})
+        with self.assertRaises(ProcessLookupError):
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                os.kill(pid, 0)
+                time.sleep(0.05)
+
+    def test_graceful_stop(self):
+        """SIGTERM stops the workers and the supervisor."""
+        self.start(workers=2)
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(timeout=10), 0)
+        with self.assertRaises(OSError):
+            self.get_pid()
+
+    def test_master_skips_application(self):
+        """Importing the supervisor loads neither the settings nor the profiler."""
+        script = "import sys, src.python_ai_bot.prefork; print(sorted(m for m in sys.modules if m.startswith('src.')))"
+        output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertNotIn("settings", output.stdout)
+        self.assertNotIn("profiling", output.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+"""Tests for request and continuous profiling."""
+
+import asyncio
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import HTTPServer
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from api.index import Handler as IndexHandler
+from src.python_ai_bot.api import app
+from src.python_ai_bot.profiling import ContinuousProfiler, Sampler, collapsed, profile_request, speedscope
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+def spin_profiled_work(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def spin_other_work(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+async def marked_request(sampler):
+    sampler.attach(marker=sys._getframe())
+    await asyncio.sleep(0.01)
+    sampler.sample()
+
+
+async def other_request(sampler):
+    await asyncio.sleep(0)
+    sampler.sample()
+
+
+def slow_job_lookup(job_id):
+    time.sleep(0.2)
+    return None
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        settings = get_settings()
+        set_settings(load_settings({"API_SECRET_KEY": "test-key", "ADMIN_API_KEY": "admin-key"}))
+        self.addCleanup(set_settings, settings)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = patch.dict(os.environ, {"PROFILE_DIR": self.directory})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_thread(self, target):
+        stop = threading.Event()
+        thread = threading.Thread(target=target, args=(stop,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        return thread
+
+    def read_profile(self, filename):
+        with open(os.path.join(self.directory, filename)) as f:
+            return f.read()
+
+
+class TestSampler(ProfilingTestCase):
+    """Test case for the sampler and its output formats."""
+
+    def test_attached_threads_only(self):
+        """A request profile counts the threads attached to it and no others."""
+        profiled = self.start_thread(spin_profiled_work)
+        self.start_thread(spin_other_work)
+        sampler = Sampler(0.001, all_threads=False)
+        sampler.attach(profiled.ident)
+        for _ in range(20):
+            sampler.sample()
+        text = collapsed(sampler.take())
+        self.assertIn("spin_profiled_work (test_profiling.py:", text)
+        self.assertNotIn("spin_other_work", text)
+        self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in text.splitlines()), 20)
+
+    def test_speedscope(self):
+        """Speedscope output references its frames by index, outermost first."""
+        profiled = self.start_thread(spin_profiled_work)
+        sampler = Sampler(0.001, all_threads=False)
+        sampler.attach(profiled.ident)
+        for _ in range(10):
+            sampler.sample()
+        document = speedscope(sampler.take(), "test", 0.001)
+        frames = document["shared"]["frames"]
+        profile = document["profiles"][0]
+        self.assertEqual(profile["type"], "sampled")
+        self.assertAlmostEqual(profile["endValue"], 0.01)
+        for sample in profile["samples"]:
+            names = [frames[i]["name"] for i in sample]
+            self.assertIn("spin_profiled_work", names)
+            self.assertEqual(names[0], "Thread._bootstrap")
+
+    def test_profile_request(self):
+        """A request profile samples the thread that opened it and is written when it closes."""
+        self.start_thread(spin_other_work)
+        with profile_request("GET /test", "collapsed", interval=0.002) as profile:
+            profile.sampler.sample()
+        text = self.read_profile(profile.filename)
+        self.assertIn("test_profile_request (test_profiling.py:", text)
+        self.assertNotIn("spin_other_work", text)
+
+    def test_event_loop_marker(self):
+        """On an event loop thread only stacks running through the marker frame are counted."""
+        sampler = Sampler(0.002, all_threads=False)
+
+        async def serve():
+            await asyncio.gather(marked_request(sampler), other_request(sampler))
+
+        asyncio.run(serve())
+        text = collapsed(sampler.take())
+        self.assertEqual(sampler.samples, 2)
+        self.assertIn("marked_request", text)
+        self.assertNotIn("other_request", text)
+
+
+class TestContinuousProfiler(ProfilingTestCase):
+    """Test case for the process-wide profiler."""
+
+    def test_toggle(self):
+        """Profiles are written while it runs, and no sampling thread is left once it stops."""
+        profiler = ContinuousProfiler(interval=0.005, flush_interval=0.1, directory=self.directory)
+        self.assertTrue(profiler.toggle())
+        time.sleep(0.5)
+        self.assertFalse(profiler.toggle())
+        self.assertGreaterEqual(len(profiler.files), 2)
+        self.assertIn("test_toggle (test_profiling.py:", self.read_profile(profiler.files[0]))
+        self.assertFalse(any(thread.name.startswith("profiler") for thread in threading.enumerate()))
+
+
+class TestProfilingEndpoints(ProfilingTestCase):
+    """Test case for profiling requests to both server stacks."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = TestClient(app)
+        # Rebuilt middleware comes with a fresh rate limiter
+        app.middleware_stack = None
+        self.profiler = ContinuousProfiler(directory=self.directory)
+        patcher = patch("src.python_ai_bot.profiling._profiler", self.profiler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.profiler.stop)
+
+    def test_fastapi_request(self):
+        """An admin's profiled request covers its threadpool work; anyone else's is not profiled."""
+        queue = MagicMock()
+        queue.get.side_effect = slow_job_lookup
+        with patch("src.python_ai_bot.api.get_job_queue", return_value=queue):
+            response = self.client.get(
+                "/jobs/missing?profile=speedscope", headers={"X-API-Key": "test-key", "X-Admin-Key": "admin-key"}
+            )
+            self.assertEqual(response.status_code, 404)
+            filename = response.headers["X-Profile-File"]
+            self.assertTrue(filename.endswith(".speedscope.json"))
+            document = json.loads(self.read_profile(filename))
+            names = {frame["name"] for frame in document["shared"]["frames"]}
+            self.assertIn("slow_job_lookup", names)
+
+            response = self.client.get(
+                "/jobs/missing", headers={"X-API-Key": "test-key", "X-Profile": "1", "X-Admin-Key": "wrong"}
+            )
+            self.assertNotIn("X-Profile-File", response.headers)
+        self.assertEqual(os.listdir(self.directory), [filename])
+
+    def test_fastapi_admin_endpoint(self):
+        """Continuous profiling is switched by admins only."""
+        headers = {"X-API-Key": "test-key"}
+        response = self.client.post("/admin/profiling", json={"enabled": True}, headers=headers)
+        self.assertEqual(response.status_code, 403)
+        headers["X-Admin-Key"] = "admin-key"
+        response = self.client.post("/admin/profiling", json={"enabled": True}, headers=headers)
+        self.assertTrue(response.json()["enabled"])
+        self.assertTrue(self.client.get("/admin/profiling", headers=headers).json()["enabled"])
+        response = self.client.post("/admin/profiling", json={"enabled": False}, headers=headers)
+        self.assertFalse(response.json()["enabled"])
+
+    def test_index_handler(self):
+        """The serverless handler profiles admin requests and switches continuous profiling."""
+        server = HTTPServer(("127.0.0.1", 0), IndexHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        def request(method, path, body=None, **headers):
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+            connection.request(method, path, body=body, headers=dict(headers, **{"X-API-Key": "test-key"}))
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            connection.close()
+            return response, payload
+
+        response, _ = request("GET", "/usage", **{"X-Profile": "collapsed", "X-Admin-Key": "admin-key"})
+        self.assertEqual(response.status, 200)
+        # The profile is written once the response has gone out
+        path = os.path.join(self.directory, response.getheader("X-Profile-File"))
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(path))
+        response, _ = request("GET", "/usage?profile=1")
+        self.assertIsNone(response.getheader("X-Profile-File"))
+
+        response, _ = request("POST", "/admin/profiling", b'{"enabled": true}')
+        self.assertEqual(response.status, 403)
+        response, status = request("POST", "/admin/profiling", b'{"enabled": true}', **{"X-Admin-Key": "admin-key"})
+        self.assertTrue(status["enabled"])
+        response, status = request("POST", "/admin/profiling", b'{"enabled": "no"}', **{"X-Admin-Key": "admin-key"})
+        self.assertEqual(response.status, 400)
+        response, status = request("POST", "/admin/profiling", b'{"enabled": false}', **{"X-Admin-Key": "admin-key"})
+        self.assertFalse(status["enabled"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Tests for the prompts module."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from src.python_ai_bot.prompts import PromptRegistry, PromptTemplate
+
+
+class TestPrompts(unittest.TestCase):
+    """Test case for prompt templates."""
+
+    def test_render(self):
+        """Templates render the prompt and extra fields after a shared system message."""
+        template = PromptTemplate("qa", 1, "Answer from the context.", "Context: {context}\nQuestion: {prompt}")
+        first = template.render("Why?", context="Because.")
+        second = template.render("How?", context="Like this.")
+
+        self.assertEqual(first[1]["content"], "Context: Because.\nQuestion: Why?")
+        self.assertIs(first[0], second[0])
+        self.assertEqual(template.fields, frozenset({"context", "prompt"}))
+
+    def test_braces_in_prompt_are_literal(self):
+        """User input is inserted as-is, never interpreted as a template."""
+        template = PromptTemplate("default", 1, "System.")
+        self.assertEqual(template.render_user("{context}"), "{context}")
+
+    def test_versions(self):
+        """The latest version is used unless a version is named."""
+        registry = PromptRegistry([
+            {"name": "qa", "version": 1, "system": "v1"},
+            {"name": "qa", "version": 2, "system": "v2"},
+        ])
+        self.assertEqual(registry.get("qa").system, "v2")
+        self.assertEqual(registry.get("qa@1").system, "v1")
+        self.assertIn("qa@2", registry)
+        self.assertNotIn("qa@3", registry)
+        with self.assertRaises(KeyError):
+            registry.get("missing")
+
+    def test_load_file(self):
+        """Templates can be loaded from a JSON file."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "templates.json")
+            with open(path, "w") as f:
+                json.dump([{"name": "terse", "version": 1, "system": "Be terse.", "user": "{prompt}"}], f)
+            registry = PromptRegistry()
+            registry.load_file(path)
+        self.assertEqual(registry.names(), ["terse@1"])
+
+    def test_only_prompt_placeholder(self):
+        """Templates that a request could not render are refused when they are loaded."""
+        registry = PromptRegistry()
+        template = PromptTemplate("json", 1, "Reply in JSON.", '{{"question": "{prompt}"}}')
+        registry.register(template)
+        self.assertEqual(registry.get("json").render_user("Why?"), '{"question": "Why?"}')
+
+        for user in ('{"question": "{prompt}"}', "Context: {context}\nQuestion: {prompt}", "No prompt", "{} {prompt}"):
+            with self.assertRaises(ValueError):
+                registry.register(PromptTemplate("bad", 1, "System.", user))
+        self.assertNotIn("bad", registry)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "templates.json")
+            with open(path, "w") as f:
+                json.dump([
+                    {"name": "good", "version": 1, "system": "Fine.", "user": "{prompt}"},
+                    {"name": "bad", "version": 1, "system": "Broken.", "user": "{prompt} {extra}"},
+                ], f)
+            self.assertRaises(ValueError, registry.load_file, path)
+        self.assertNotIn("good", registry)
+
+
+if __name__ == "__main__":
+    unittest.main()
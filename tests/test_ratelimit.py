@@ -0,0 +1,53 @@
+"""Tests for the rate limiter."""
+
+import unittest
+
+from src.python_ai_bot.ratelimit import RateLimiter
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test case for the sliding-window rate limiter."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(limit=3, window=60, clock=self.clock)
+
+    def test_limit_per_client(self):
+        """Each client gets its own allowance."""
+        for _ in range(3):
+            self.assertFalse(self.limiter.is_rate_limited("1.1.1.1"))
+        self.assertTrue(self.limiter.is_rate_limited("1.1.1.1"))
+        self.assertFalse(self.limiter.is_rate_limited("2.2.2.2"))
+
+    def test_window_slides(self):
+        """Requests become available again as old ones leave the window."""
+        for _ in range(3):
+            self.limiter.is_rate_limited("1.1.1.1")
+            self.clock.now += 10
+        self.assertTrue(self.limiter.is_rate_limited("1.1.1.1"))
+        self.assertEqual(self.limiter.retry_after("1.1.1.1"), 30)
+        self.clock.now += 30
+        self.assertFalse(self.limiter.is_rate_limited("1.1.1.1"))
+
+    def test_flood_uses_bounded_memory(self):
+        """Rejected requests are not recorded and idle clients are pruned."""
+        for _ in range(1000):
+            self.limiter.is_rate_limited("1.1.1.1")
+        self.assertEqual(len(self.limiter.records["1.1.1.1"]), 3)
+        self.clock.now += 61
+        self.limiter.is_rate_limited("2.2.2.2")
+        self.assertNotIn("1.1.1.1", self.limiter.records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+"""Tests for the local vector index and retrieval."""
+
+import array
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.api import app
+from src.python_ai_bot.retrieval import Retriever, VectorIndex, build_prompt, chunk_text
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+def random_rows(n, dimensions=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dimensions)).astype(np.float32)
+
+
+class FakeClient:
+    """Embeds texts as bag-of-letters vectors."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts, model=None, dimensions=None, tenant=None):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            counts = [0.0] * 26
+            for letter in text.lower():
+                if "a" <= letter <= "z":
+                    counts[ord(letter) - ord("a")] += 1
+            vectors.append(array.array("f", counts))
+        return vectors
+
+
+class TestChunking(unittest.TestCase):
+    """Test case for splitting documents into chunks."""
+
+    def test_chunks_overlap(self):
+        """Chunks stay under the size and repeat the end of the previous chunk."""
+        text = " ".join(f"word{i}" for i in range(200))
+        chunks = chunk_text(text, chunk_size=100, overlap=30)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertIn(chunk.split()[0], previous.split())
+        self.assertEqual(chunks[-1].split()[-1], "word199")
+
+    def test_long_word(self):
+        """A word longer than a chunk gets a chunk of its own."""
+        self.assertEqual(chunk_text("a " + "x" * 50 + " b", chunk_size=10, overlap=0), ["a", "x" * 50, "b"])
+        self.assertEqual(chunk_text("   "), [])
+
+
+class TestVectorIndex(unittest.TestCase):
+    """Test case for the memory-mapped index."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_search_and_reopen(self):
+        """Search finds the nearest rows, and appended rows survive a reopen."""
+        rows = random_rows(100)
+        index = VectorIndex(self.directory)
+        index.add(rows[:60], [f"chunk {i}" for i in range(60)], "doc-a")
+        index.add(rows[60:], [f"chunk {i}" for i in range(60, 100)], "doc-b")
+        hits = index.search(rows[70], k=3)
+        self.assertEqual(hits[0][0], 70)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertEqual(index.chunks([70])[70]["document"], "doc-b")
+        self.assertTrue(index.has_document("doc-a"))
+        index.close()
+
+        index = VectorIndex(self.directory)
+        self.assertEqual(index.count, 100)
+        self.assertEqual(index.dimensions, 16)
+        self.assertEqual(index.search(rows[5], k=1)[0][0], 5)
+        self.assertRaises(ValueError, index.add, random_rows(1, dimensions=8), ["x"], "doc-c")
+        index.close()
+        self.assertRaises(ValueError, VectorIndex, self.directory, dimensions=8)
+
+    def test_drops_uncommitted_vectors(self):
+        """Vectors appended without their chunks are dropped on open."""
+        index = VectorIndex(self.directory)
+        index.add(random_rows(10), [str(i) for i in range(10)], "doc")
+        index.close()
+        with open(os.path.join(self.directory, "vectors.f32"), "ab") as f:
+            f.write(random_rows(3).tobytes())
+        index = VectorIndex(self.directory)
+        self.assertEqual(index.count, 10)
+        self.assertEqual(os.path.getsize(index.vectors_path), 10 * 16 * 4)
+        index.close()
+
+    def test_shared_directory(self):
+        """Indexes opened on one directory by separate processes append after each other's rows."""
+        rows = random_rows(30)
+        first, second = VectorIndex(self.directory), VectorIndex(self.directory)
+        first.add(rows[:10], [str(i) for i in range(10)], "doc-a")
+        self.assertEqual(second.add(rows[10:20], [str(i) for i in range(10, 20)], "doc-b"), list(range(10, 20)))
+        first.add(rows[20:], [str(i) for i in range(20, 30)], "doc-c")
+        for index in (first, second):
+            self.assertEqual(index.search(rows[25], k=1)[0][0], 25)
+            self.assertEqual(index.search(rows[15], k=1)[0][0], 15)
+            self.assertEqual(index.count, 30)
+        first.close()
+        second.close()
+
+    def test_tenants(self):
+        """A tenant's searches only return its own chunks, and document ids are per tenant."""
+        rows = random_rows(20)
+        index = VectorIndex(self.directory)
+        index.add(rows[:10], [str(i) for i in range(10)], "doc", tenant="acme")
+        index.add(rows[10:], [str(i) for i in range(10, 20)], "doc", tenant="other")
+        self.assertEqual({i for i, _ in index.search(rows[3], k=20, tenant="other")}, set(range(10, 20)))
+        self.assertEqual(index.search(rows[3], k=1, tenant="acme")[0][0], 3)
+        self.assertEqual(index.search(rows[3], k=1, tenant="nobody"), [])
+        self.assertEqual(len(index.search(rows[3], k=20)), 20)
+        self.assertTrue(index.has_document("doc", tenant="acme"))
+        self.assertFalse(index.has_document("doc"))
+        index.close()
+
+    def test_ivf(self):
+        """An IVF index finds the same neighbours as exact search, including appended rows."""
+        centers = random_rows(8, seed=1) * 5
+        labels = np.random.default_rng(2).integers(0, 8, 2000)
+        rows = centers[labels] + random_rows(2000, seed=3)
+        index = VectorIndex(self.directory, nprobe=3)
+        index.add(rows[:1500], [str(i) for i in range(1500)], "doc")
+        index.train_ivf(8)
+        index.add(rows[1500:], [str(i) for i in range(1500, 2000)], "doc")
+
+        recall = []
+        for query in rows[::50]:
+            exact = {i for i, _ in index.search(query, k=10, exact=True)}
+            approximate = {i for i, _ in index.search(query, k=10)}
+            recall.append(len(exact & approximate) / 10)
+        self.assertGreater(np.mean(recall), 0.9)
+        self.assertEqual(index.search(rows[1900], k=1)[0][0], 1900)
+        index.close()
+
+        index = VectorIndex(self.directory, nprobe=3)
+        self.assertIsNotNone(index.centroids)
+        self.assertEqual(index.search(rows[1900], k=1)[0][0], 1900)
+        index.close()
+
+
+class TestRetriever(unittest.TestCase):
+    """Test case for ingesting documents and retrieving context."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = FakeClient()
+        self.retriever = Retriever(VectorIndex(self.directory), self.client, chunk_size=40, overlap=0)
+
+    def tearDown(self):
+        self.retriever.index.close()
+        shutil.rmtree(self.directory)
+
+    def test_ingest_and_retrieve(self):
+        """The chunk closest to the question is retrieved first."""
+        self.assertEqual(self.retriever.ingest("zoo", "zebras buzz lazily. apples and bananas are fruit."), 2)
+        self.assertRaises(ValueError, self.retriever.ingest, "zoo", "again")
+        chunks = self.retriever.retrieve("lazy zebra", k=1)
+        self.assertEqual(chunks[0]["document"], "zoo")
+        self.assertIn("zebras", chunks[0]["text"])
+        prompt = build_prompt("lazy zebra?", chunks)
+        self.assertIn("[1] (zoo) zebras", prompt)
+        self.assertTrue(prompt.endswith("Question: lazy zebra?"))
+
+
+class TestAskEndpoint(unittest.TestCase):
+    """Test case for /ask and /documents."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        retriever = Retriever(VectorIndex(self.directory), FakeClient(), chunk_size=40, overlap=0)
+        self.patcher = patch("src.python_ai_bot.api.get_retriever", return_value=retriever)
+        self.patcher.start()
+        self.retriever = retriever
+        self.client = TestClient(app)
+        # Rebuilt middleware comes with a fresh rate limiter
+        app.middleware_stack = None
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.retriever.index.close()
+        shutil.rmtree(self.directory)
+
+    def test_ask(self):
+        """Retrieved context is sent with the ask template and returned as sources."""
+        response = self.client.post("/documents", json={"id": "zoo", "text": "zebras buzz lazily."})
+        self.assertEqual(response.json(), {"id": "zoo", "chunks": 1})
+        self.assertEqual(self.client.post("/documents", json={"id": "zoo", "text": "again"}).status_code, 409)
+
+        with patch("src.python_ai_bot.api.main", return_value="Zebras buzz [1].") as main:
+            response = self.client.post("/ask", json={"question": "what do zebras do?"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["text"], "Zebras buzz [1].")
+        self.assertEqual(response.json()["sources"][0]["document"], "zoo")
+        kwargs = main.call_args.kwargs
+        self.assertEqual(kwargs["template"], "ask")
+        self.assertIn("zebras buzz lazily.", kwargs["prompt"])
+
+    def test_tenants(self):
+        """Documents added by one tenant are never context for another's questions."""
+        settings = get_settings()
+        set_settings(load_settings({"API_KEY_TENANTS": "acme:acme-key,other:other-key"}))
+        self.addCleanup(set_settings, settings)
+        acme, other = {"X-API-Key": "acme-key"}, {"X-API-Key": "other-key"}
+        self.client.post("/documents", json={"id": "zoo", "text": "zebras buzz lazily."}, headers=acme)
+        response = self.client.post("/documents", json={"id": "zoo", "text": "apples are fruit."}, headers=other)
+        self.assertEqual(response.status_code, 200)
+
+        with patch("src.python_ai_bot.api.main", return_value="I do not know.") as main:
+            response = self.client.post("/ask", json={"question": "what do zebras do?"}, headers=other)
+        self.assertEqual([source["document"] for source in response.json()["sources"]], ["zoo"])
+        self.assertIn("apples are fruit.", main.call_args.kwargs["prompt"])
+        self.assertNotIn("zebras buzz", main.call_args.kwargs["prompt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""Tests for JWT revocation."""
+
+import http.client
+import json
+import threading
+import time
+import unittest
+from http.server import HTTPServer
+from unittest.mock import MagicMock, patch
+
+import jwt
+from fastapi.testclient import TestClient
+
+from api.auth import Handler as AuthHandler
+from api.index import Handler as IndexHandler
+from src.python_ai_bot.api import app
+from src.python_ai_bot.revocation import BloomFilter, RedisRevocationStore, RevocationList, SQLiteRevocationStore
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Test case for the Bloom filter."""
+
+    def test_membership(self):
+        """Added items are always found, and others rarely are."""
+        bloom = BloomFilter(10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(f"revoked-{i}")
+        self.assertTrue(all(f"revoked-{i}" in bloom for i in range(10000)))
+        false_positives = sum(f"valid-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestRevocationList(unittest.TestCase):
+    """Test case for the filtered revocation list."""
+
+    def setUp(self):
+        self.wall = FakeClock(now=time.time())
+        self.store = SQLiteRevocationStore(":memory:", clock=self.wall)
+        self.clock = FakeClock()
+
+    def make_list(self, **options):
+        return RevocationList(self.store, refresh_interval=5.0, clock=self.clock, **options)
+
+    def test_store_only_on_filter_hit(self):
+        """Unrevoked tokens are answered from the filter; revoked ones are confirmed by the store."""
+        revocations = self.make_list()
+        revocations.revoke("bad", self.wall.now + 60)
+        with patch.object(self.store, "contains", wraps=self.store.contains) as contains:
+            self.assertFalse(any(revocations.is_revoked(f"good-{i}") for i in range(1000)))
+            self.assertLess(contains.call_count, 5)
+            self.assertTrue(revocations.is_revoked("bad"))
+
+    def test_incremental_refresh(self):
+        """Revocations made by another instance apply after the refresh interval."""
+        mine, theirs = self.make_list(), self.make_list()
+        theirs.revoke("a", self.wall.now + 60)
+        self.assertFalse(mine.is_revoked("a"))
+        self.clock.now += 5
+        self.assertTrue(mine.is_revoked("a"))
+
+        with patch.object(self.store, "changes", wraps=self.store.changes) as changes:
+            theirs.revoke("b", self.wall.now + 60)
+            self.clock.now += 5
+            self.assertTrue(mine.is_revoked("b"))
+            self.assertEqual(changes.call_args[0][0], 1)
+
+    def test_expiry_and_growth(self):
+        """Revocations lapse with their tokens, and the filter grows past its capacity."""
+        revocations = self.make_list(capacity=4)
+        for i in range(10):
+            revocations.revoke(f"jti-{i}", self.wall.now + 60)
+        self.clock.now += 5
+        revocations.refresh()
+        self.assertGreaterEqual(revocations.filter.capacity, 10)
+        self.assertTrue(all(revocations.is_revoked(f"jti-{i}") for i in range(10)))
+
+        self.wall.now += 61
+        self.assertFalse(revocations.is_revoked("jti-0"))
+
+    def test_store_failure_fails_closed(self):
+        """A filter hit that cannot be confirmed counts as revoked."""
+        revocations = self.make_list()
+        revocations.revoke("bad", self.wall.now + 60)
+        with patch.object(self.store, "contains", side_effect=RuntimeError("down")):
+            self.assertTrue(revocations.is_revoked("bad"))
+            self.assertFalse(revocations.is_revoked("good"))
+
+    def test_redis_log_trimmed(self):
+        """The Redis log drops entries older than the longest token lifetime as it grows."""
+        store = RedisRevocationStore("redis://localhost:6379", clock=self.wall, max_lifetime=3600)
+        store.redis = MagicMock()
+        store.add("bad", self.wall.now + 60)
+        pipe = store.redis.pipeline.return_value
+        self.assertEqual(pipe.xadd.call_args[1]["minid"], int((self.wall.now - 3600) * 1000))
+        pipe.execute.assert_called_once()
+
+
+class TestRevocationEndpoints(unittest.TestCase):
+    """Test case for revoking issued tokens through the auth handler."""
+
+    def setUp(self):
+        settings = get_settings()
+        set_settings(load_settings({"API_SECRET_KEY": "test-key", "JWT_SECRET": "jwt-secret"}))
+        self.addCleanup(set_settings, settings)
+        patcher = patch(
+            "src.python_ai_bot.revocation._revocation_list",
+            RevocationList(SQLiteRevocationStore(":memory:")),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ports = {}
+        for name, handler in (("auth", AuthHandler), ("index", IndexHandler)):
+            server = HTTPServer(("127.0.0.1", 0), handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            self.ports[name] = server.server_port
+
+    def request(self, server, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.ports[server], timeout=5)
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        connection.close()
+        return response.status, json.loads(data) if data else None
+
+    def test_revoke(self):
+        """A revoked token is refused by the handler and the FastAPI app, other tokens are not."""
+        key = {"X-API-Key": "test-key", "Content-Type": "application/json"}
+        _, issued = self.request("auth", "POST", "/api/auth", {"user_id": "alice"}, key)
+        _, other = self.request("auth", "POST", "/api/auth", {"user_id": "bob"}, key)
+        claims = jwt.decode(issued["token"], "jwt-secret", algorithms=["HS256"])
+        self.assertEqual(len(claims["jti"]), 32)
+
+        def usage_status(token):
+            status, _ = self.request("index", "GET", "/usage", headers={"Authorization": f"Bearer {token}"})
+            return status
+
+        client = TestClient(app)
+        # Rebuilt middleware comes with a fresh rate limiter
+        app.middleware_stack = None
+        self.assertEqual(usage_status(issued["token"]), 200)
+
+        status, body = self.request("auth", "POST", "/api/auth/revoke", {"token": issued["token"]}, key)
+        self.assertEqual((status, body), (200, {"jti": claims["jti"], "revoked": True}))
+        self.assertEqual(usage_status(issued["token"]), 401)
+        self.assertEqual(usage_status(other["token"]), 200)
+        self.assertEqual(client.get("/usage", headers={"Authorization": f"Bearer {issued['token']}"}).status_code, 401)
+
+        status, _ = self.request("auth", "POST", "/api/auth/revoke", {"token": "garbage"}, key)
+        self.assertEqual(status, 400)
+
+    def test_lifetime_capped(self):
+        """Tokens outliving the revocation log are issued with the longest lifetime instead."""
+        key = {"X-API-Key": "test-key", "Content-Type": "application/json"}
+        with patch.dict("os.environ", {"REVOCATION_MAX_TOKEN_LIFETIME": "600"}):
+            _, issued = self.request("auth", "POST", "/api/auth", {"user_id": "alice", "expires_in": 10 ** 9}, key)
+        claims = jwt.decode(issued["token"], "jwt-secret", algorithms=["HS256"])
+        self.assertLessEqual(claims["exp"] - claims["iat"], 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for the sessions module."""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.api import app
+from src.python_ai_bot.deadline import get_deadline
+from src.python_ai_bot.sessions import InMemorySessionStore, Session, SessionManager
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+
+
+class TestSessions(unittest.TestCase):
+    """Test case for conversation sessions."""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.store = InMemorySessionStore(max_sessions=2)
+        self.manager = SessionManager(self.store, self.client, token_budget=60)
+
+    def test_encode_roundtrip(self):
+        """Sessions survive the compact storage format."""
+        session = Session("abc", system="Be brief.", summary="Earlier.", turns=[("user", "Hi"), ("assistant", "Hello")])
+        decoded = Session.decode("abc", session.encode())
+        self.assertEqual(decoded.system, "Be brief.")
+        self.assertEqual(decoded.summary, "Earlier.")
+        self.assertEqual(decoded.turns, [("user", "Hi"), ("assistant", "Hello")])
+        self.assertIn('["u","Hi"]', session.encode())
+
+    def test_send_stores_turns(self):
+        """Replies are appended to the stored history and sent upstream next time."""
+        self.client.generate_chat.return_value = "Hello there"
+        session = self.manager.create()
+        self.manager.send(session, "Hi")
+
+        stored = self.manager.get(session.id)
+        self.assertEqual(stored.turns, [("user", "Hi"), ("assistant", "Hello there")])
+
+        self.manager.send(stored, "And again")
+        messages = self.client.generate_chat.call_args[0][0]
+        self.assertEqual([m["role"] for m in messages], ["system", "user", "assistant", "user"])
+
+    def test_failed_turn_is_not_stored(self):
+        """Upstream errors leave the stored session unchanged."""
+        self.client.generate_chat.return_value = "Error: upstream down"
+        session = self.manager.create()
+        self.assertEqual(self.manager.send(session, "Hi"), "Error: upstream down")
+        self.assertEqual(self.manager.get(session.id).turns, [])
+
+    def test_compaction_keeps_history_within_budget(self):
+        """Old turns are folded into the summary once the budget is exceeded."""
+        self.client.generate_chat.side_effect = lambda messages, **kwargs: (
+            "SUMMARY" if messages[0]["content"].startswith("Summarize") else "x" * 80
+        )
+        session = self.manager.create()
+        for index in range(4):
+            self.manager.send(session, f"question {index}")
+
+        stored = self.manager.get(session.id)
+        self.assertEqual(stored.summary, "SUMMARY")
+        self.assertEqual(len(stored.turns), 2)
+        self.assertEqual(stored.turns[0], ("user", "question 3"))
+
+    def test_lru_eviction(self):
+        """The in-memory store evicts the least recently used session."""
+        first = self.manager.create()
+        second = self.manager.create()
+        self.manager.get(first.id)
+        self.manager.create()
+        self.assertIsNotNone(self.manager.get(first.id))
+        self.assertIsNone(self.manager.get(second.id))
+
+    def test_concurrent_messages(self):
+        """Messages sent to one session at the same time all end up in its history."""
+
+        def reply(messages, **kwargs):
+            time.sleep(0.05)
+            return f"reply to {messages[-1]['content']}"
+
+        self.client.generate_chat.side_effect = reply
+        session = self.manager.create()
+        threads = [
+            threading.Thread(target=self.manager.send, args=(self.manager.get(session.id), f"message {i}"))
+            for i in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        turns = self.manager.get(session.id).turns
+        self.assertEqual(len(turns), 6)
+        questions = sorted(content for role, content in turns if role == "user")
+        self.assertEqual(questions, ["message 0", "message 1", "message 2"])
+
+    def test_owner(self):
+        """A session is only found for the tenant that created it."""
+        session = self.manager.create(tenant="acme")
+        self.assertEqual(Session.decode(session.id, session.encode()).tenant, "acme")
+        self.assertIsNotNone(self.manager.get(session.id, tenant="acme"))
+        self.assertIsNone(self.manager.get(session.id, tenant="other"))
+
+
+class TestSessionEndpoints(unittest.TestCase):
+    """Test case for the sessions API."""
+
+    def setUp(self):
+        settings = get_settings()
+        set_settings(load_settings({"API_KEY_TENANTS": "acme:acme-key,other:other-key"}))
+        self.addCleanup(set_settings, settings)
+        self.client = MagicMock()
+        self.manager = SessionManager(InMemorySessionStore(), self.client)
+        patcher = patch("src.python_ai_bot.api.get_session_manager", return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.http = TestClient(app, headers={"X-API-Key": "acme-key"})
+        # Rebuilt middleware comes with a fresh rate limiter
+        app.middleware_stack = None
+
+    def test_messages(self):
+        """Replies run under the request deadline, for the owning tenant only."""
+        deadlines = []
+
+        def reply(messages, **kwargs):
+            deadlines.append(get_deadline())
+            return "Hello"
+
+        self.client.generate_chat.side_effect = reply
+        session_id = self.http.post("/sessions", json={}).json()["session_id"]
+        response = self.http.post(f"/sessions/{session_id}/messages", json={"content": "Hi", "timeout_ms": 5000})
+        self.assertEqual(response.json()["text"], "Hello")
+        self.assertIsNotNone(deadlines[0].remaining())
+        response = self.http.post(
+            f"/sessions/{session_id}/messages", json={"content": "Hi"}, headers={"X-API-Key": "other-key"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_deadline(self):
+        """A reply that outlives its deadline fails with 504 and is not stored."""
+
+        def reply(messages, **kwargs):
+            time.sleep(0.1)
+            return "Error: Request deadline exceeded"
+
+        self.client.generate_chat.side_effect = reply
+        session_id = self.http.post("/sessions", json={}).json()["session_id"]
+        response = self.http.post(f"/sessions/{session_id}/messages", json={"content": "Hi", "timeout_ms": 50})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(self.manager.get(session_id).turns, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests for the settings module."""
+
+import dataclasses
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.python_ai_bot.settings import (
+    get_settings,
+    load_settings,
+    parse_settings_file,
+    reload_settings,
+    set_settings,
+)
+
+
+class TestSettings(unittest.TestCase):
+    """Test case for the settings snapshot."""
+
+    def setUp(self):
+        self.previous = get_settings()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "settings.env")
+
+    def tearDown(self):
+        set_settings(self.previous)
+        self.tmpdir.cleanup()
+
+    def write_settings(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+
+    def test_cors_headers_allow_all(self):
+        """Without ALLOWED_ORIGINS every origin gets a wildcard."""
+        settings = load_settings({})
+        self.assertTrue(settings.allow_all_origins)
+        headers = dict(settings.cors_headers("https://example.com"))
+        self.assertEqual(headers["Access-Control-Allow-Origin"], "*")
+        self.assertEqual(headers["Access-Control-Allow-Methods"], "GET, POST, OPTIONS")
+
+    def test_cors_headers_with_allowed_origins(self):
+        """Listed origins are echoed back, others get the first listed origin."""
+        settings = load_settings({"ALLOWED_ORIGINS": "https://a.example, https://b.example"})
+        self.assertEqual(dict(settings.cors_headers("https://b.example"))["Access-Control-Allow-Origin"], "https://b.example")
+        self.assertEqual(dict(settings.cors_headers("https://evil.example"))["Access-Control-Allow-Origin"], "https://a.example")
+        self.assertEqual(dict(settings.cors_headers(""))["Access-Control-Allow-Origin"], "*")
+        # The same tuple is returned on every request
+        self.assertIs(settings.cors_headers("https://b.example"), settings.cors_headers("https://b.example"))
+
+    def test_settings_are_immutable(self):
+        """A snapshot cannot be modified after it is built."""
+        settings = load_settings({"API_SECRET_KEY": "secret"})
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            settings.api_secret_key = "other"
+        self.assertNotIn("secret", repr(settings))
+
+    def test_settings_file_overrides_environment(self):
+        """Values from SETTINGS_FILE take precedence over the environment."""
+        self.write_settings("# comment\n\nAPI_SECRET_KEY=from-file\nJWT_SECRET = jwt\n")
+        self.assertEqual(parse_settings_file(self.path), {"API_SECRET_KEY": "from-file", "JWT_SECRET": "jwt"})
+        settings = load_settings({"API_SECRET_KEY": "from-env", "OPENAI_API_KEY": "sk", "SETTINGS_FILE": self.path})
+        self.assertEqual(settings.api_secret_key, "from-file")
+        self.assertEqual(settings.jwt_secret, "jwt")
+        self.assertEqual(settings.openai_api_key, "sk")
+        self.assertEqual(settings.source, self.path)
+
+    def test_reload_swaps_snapshot(self):
+        """Reloading replaces the snapshot, and a failed reload keeps the old one."""
+        self.write_settings("API_SECRET_KEY=first\n")
+        with patch.dict(os.environ, {"SETTINGS_FILE": self.path}):
+            self.assertTrue(reload_settings())
+            first = get_settings()
+            self.assertEqual(first.api_secret_key, "first")
+
+            self.write_settings("API_SECRET_KEY=second\n")
+            self.assertEqual(first.api_secret_key, "first")
+            self.assertTrue(reload_settings())
+            self.assertEqual(get_settings().api_secret_key, "second")
+
+            os.remove(self.path)
+            self.assertFalse(reload_settings())
+            self.assertEqual(get_settings().api_secret_key, "second")
+
+
+if __name__ == "__main__":
+    unittest.main()
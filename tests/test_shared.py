@@ -0,0 +1,155 @@
+"""Tests for the shared-memory table and the state kept in it."""
+
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.python_ai_bot import shared
+from src.python_ai_bot.cache import ResponseCache
+from src.python_ai_bot.ratelimit import RateLimiter, SharedRateLimiter, make_rate_limiter
+from src.python_ai_bot.shared import SharedTable
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def increment(path, times):
+    table = SharedTable(path, slots=64, slot_size=64)
+    for _ in range(times):
+        table.update("counter", lambda raw: str(int(raw or b"0") + 1).encode(), ttl=60)
+    table.close()
+
+
+class TestSharedTable(unittest.TestCase):
+    """Test case for the mmap'd table."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "test.table")
+        self.clock = FakeClock()
+        self.tables = []
+
+    def tearDown(self):
+        for table in self.tables:
+            table.close()
+        self.tmpdir.cleanup()
+
+    def open(self, **kwargs):
+        options = dict(slots=64, slot_size=64, stripes=8, clock=self.clock)
+        options.update(kwargs)
+        table = SharedTable(self.path, **options)
+        self.tables.append(table)
+        return table
+
+    def test_set_get_expire(self):
+        """Values are visible to every opener of the file until they expire."""
+        first, second = self.open(), self.open()
+        self.assertTrue(first.set("key", b"value", ttl=10))
+        self.assertEqual(second.get("key"), b"value")
+        second.delete("key")
+        self.assertIsNone(first.get("key"))
+        first.set("key", b"value", ttl=10)
+        self.clock.now += 10
+        self.assertIsNone(second.get("key"))
+
+    def test_value_too_large(self):
+        """Values that do not fit in a slot are refused."""
+        table = self.open()
+        self.assertFalse(table.set("key", b"x" * (table.max_value_size + 1), ttl=10))
+        self.assertIsNone(table.get("key"))
+
+    def test_evicts_soonest_to_expire(self):
+        """A full stripe evicts the entry closest to expiry."""
+        table = self.open(slots=4, stripes=1, probes=4)
+        for index in range(4):
+            table.set(f"key-{index}", b"v", ttl=10 + index)
+        table.set("new", b"v", ttl=100)
+        self.assertIsNone(table.get("key-0"))
+        self.assertEqual(table.get("key-3"), b"v")
+        self.assertEqual(table.get("new"), b"v")
+
+    def test_layout_mismatch(self):
+        """Reopening a file with a different layout fails instead of corrupting it."""
+        self.open()
+        with self.assertRaises(ValueError):
+            self.open(slot_size=128)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_atomic_updates_across_processes(self):
+        """Concurrent increments from several processes are not lost."""
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=increment, args=(self.path, 200)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(SharedTable(self.path, slots=64, slot_size=64).get("counter"), b"800")
+
+
+class TestSharedState(unittest.TestCase):
+    """Test case for rate limits and cache entries shared between workers."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "test.table")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_one_limit_across_workers(self):
+        """Limiters in different workers enforce one combined limit."""
+        self.clock.now = 60 * 16667  # the start of a window
+        workers = [
+            SharedRateLimiter(SharedTable(self.path, slots=64, slot_size=64, clock=self.clock),
+                              limit=4, window=60, clock=self.clock)
+            for _ in range(2)
+        ]
+        results = [workers[index % 2].is_rate_limited("1.2.3.4") for index in range(6)]
+        self.assertEqual(results, [False] * 4 + [True] * 2)
+        self.assertFalse(workers[0].is_rate_limited("5.6.7.8"))
+        self.assertGreaterEqual(workers[1].retry_after("1.2.3.4"), 1)
+        self.assertEqual(workers[1].retry_after("5.6.7.8"), 0)
+
+        # The previous window's requests slide out gradually
+        self.clock.now += 60
+        self.assertTrue(workers[0].is_rate_limited("1.2.3.4"))
+        self.clock.now += 30
+        self.assertFalse(workers[0].is_rate_limited("1.2.3.4"))
+        self.clock.now += 120
+        self.assertEqual(workers[0].retry_after("1.2.3.4"), 0)
+
+    def test_make_rate_limiter(self):
+        """Limiters are shared only when SHARED_STATE_DIR is set."""
+        with patch.dict(os.environ, {"SHARED_STATE_DIR": ""}), patch.dict(shared._shared_tables, clear=True):
+            self.assertIsInstance(make_rate_limiter(), RateLimiter)
+        with patch.dict(os.environ, {"SHARED_STATE_DIR": self.tmpdir.name}), \
+                patch.dict(shared._shared_tables, clear=True):
+            limiter = make_rate_limiter(limit=3, window=10)
+            self.assertIsInstance(limiter, SharedRateLimiter)
+            self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "ratelimit.table")))
+
+    def test_cache_entries_shared(self):
+        """A completion cached by one worker is found by another without a disk tier."""
+        caches = [
+            ResponseCache(ttl=60, shared=SharedTable(self.path, slots=64, slot_size=256, clock=self.clock),
+                          clock=self.clock)
+            for _ in range(2)
+        ]
+        caches[0].set("key", "cached text")
+        caches[0].set("large", "x" * 1000)
+        self.assertEqual(caches[1].get("key"), "cached text")
+        self.assertIsNone(caches[1].get("large"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""Tests for tool registration and parallel tool execution."""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from src.python_ai_bot.ai.openai_client import OpenAIClient
+from src.python_ai_bot.ai.tools import ToolError, ToolRegistry
+from src.python_ai_bot.deadline import deadline_scope, get_deadline
+
+
+def tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def completion(content=None, tool_calls=None):
+    message = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class TestToolRegistry(unittest.TestCase):
+    """Test case for registering tools and running their calls."""
+
+    def setUp(self):
+        self.registry = ToolRegistry(max_workers=8)
+        self.calls = []
+
+        @self.registry.register(parameters={
+            "type": "object",
+            "properties": {"city": {"type": "string"}},
+            "required": ["city"],
+        })
+        def weather(city):
+            """Get the weather in a city.
+
+            Longer description that is not sent.
+            """
+            self.calls.append(city)
+            time.sleep(0.2)
+            return {"city": city, "forecast": "sunny"}
+
+        @self.registry.register(name="add", timeout=1.0)
+        async def add_numbers(a, b):
+            await asyncio.sleep(0.2)
+            return a + b
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_schemas(self):
+        """Tools are described with their name, docstring summary and parameters."""
+        self.assertEqual(len(self.registry), 2)
+        self.assertIn("add", self.registry)
+        schema = self.registry.schemas()[0]
+        self.assertEqual(schema["type"], "function")
+        self.assertEqual(schema["function"]["name"], "weather")
+        self.assertEqual(schema["function"]["description"], "Get the weather in a city.")
+        self.assertEqual(schema["function"]["parameters"]["required"], ["city"])
+        self.assertEqual(self.registry.get("add").parameters, {"type": "object", "properties": {}})
+
+    def test_parallel(self):
+        """Blocking and async calls in one turn run concurrently and keep their order."""
+        calls = [tool_call(f"call_{i}", "weather", {"city": f"city {i}"}) for i in range(4)]
+        calls.append(tool_call("call_add", "add", {"a": 2, "b": 3}))
+        start = time.perf_counter()
+        messages = self.registry.run(calls)
+        elapsed = time.perf_counter() - start
+        # Five 0.2s calls back to back would take a second
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual([m["tool_call_id"] for m in messages], [c.id for c in calls])
+        self.assertEqual(json.loads(messages[2]["content"]), {"city": "city 2", "forecast": "sunny"})
+        self.assertEqual(messages[4], {"role": "tool", "tool_call_id": "call_add", "content": "5"})
+
+    def test_identical_calls_run_once(self):
+        """The same call twice in a turn runs once and answers both."""
+        calls = [tool_call("a", "weather", {"city": "Oslo"}), tool_call("b", "weather", {"city": "Oslo"})]
+        messages = self.registry.run(calls)
+        self.assertEqual(self.calls, ["Oslo"])
+        self.assertEqual(messages[0]["content"], messages[1]["content"])
+
+    def test_errors_reported_to_model(self):
+        """Unknown tools, bad arguments and failures become error content, not exceptions."""
+
+        @self.registry.register
+        def broken():
+            raise RuntimeError("boom")
+
+        messages = self.registry.run([
+            tool_call("1", "missing", {}),
+            tool_call("2", "weather", {}),
+            {"id": "3", "function": {"name": "weather", "arguments": "{not json"}},
+            tool_call("4", "broken", {}),
+            tool_call("5", "add", {"a": 1}),
+        ])
+        contents = [m["content"] for m in messages]
+        self.assertEqual(contents[0], "Error: Unknown tool: missing")
+        self.assertEqual(contents[1], "Error: Missing arguments for tool weather: city")
+        self.assertTrue(contents[2].startswith("Error: Invalid arguments for tool weather"))
+        self.assertEqual(contents[3], "Error: Tool broken failed: boom")
+        self.assertTrue(contents[4].startswith("Error: Tool add failed"))
+
+    def test_timeout(self):
+        """A call running past its timeout is abandoned."""
+        release = threading.Event()
+        self.registry.register(lambda: release.wait(5), name="hang", timeout=0.05)
+        start = time.perf_counter()
+        with self.assertRaises(ToolError):
+            asyncio.run(self.registry.call("hang", {}))
+        release.set()
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_deadline_bounds_timeout(self):
+        """The request deadline shortens tool timeouts and reaches blocking tools."""
+        seen = []
+
+        def slow():
+            seen.append(get_deadline())
+            time.sleep(0.5)
+
+        self.registry.register(slow, timeout=10)
+        with deadline_scope(0.05) as deadline:
+            messages = self.registry.run([tool_call("1", "slow", {})])
+        self.assertIn("timed out", messages[0]["content"])
+        self.assertIs(seen[0], deadline)
+
+    def test_cache(self):
+        """Results of tools with a cache TTL are reused for the same arguments."""
+        count = []
+
+        @self.registry.register(cache_ttl=60)
+        def lookup(key):
+            count.append(key)
+            return f"value of {key}"
+
+        for _ in range(3):
+            self.assertEqual(asyncio.run(self.registry.call("lookup", {"key": "x"})), "value of x")
+        asyncio.run(self.registry.call("lookup", '{"key": "y"}'))
+        self.assertEqual(count, ["x", "y"])
+
+
+class TestGenerateWithTools(unittest.TestCase):
+    """Test case for the tool-calling loop in OpenAIClient."""
+
+    def setUp(self):
+        self.registry = ToolRegistry()
+        self.registry.register(lambda city: f"{city}: 20C", name="weather")
+        self.client = OpenAIClient(api_key="sk-test")
+        self.client.client = MagicMock()
+        self.create = self.client.client.chat.completions.create
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_loop(self):
+        """Tool calls are run and their results sent back until the model answers."""
+        self.create.side_effect = [
+            completion(tool_calls=[tool_call("c1", "weather", {"city": "Oslo"}), tool_call("c2", "weather", {"city": "Rome"})]),
+            completion(content=" Oslo is 20C and so is Rome. "),
+        ]
+        text = self.client.generate_with_tools([{"role": "user", "content": "Weather?"}], self.registry)
+        self.assertEqual(text, "Oslo is 20C and so is Rome.")
+        self.assertEqual(self.create.call_count, 2)
+        second = self.create.call_args_list[1].kwargs
+        self.assertEqual(second["tools"], self.registry.schemas())
+        roles = [m["role"] for m in second["messages"]]
+        self.assertEqual(roles, ["user", "assistant", "tool", "tool"])
+        self.assertEqual(second["messages"][3], {"role": "tool", "tool_call_id": "c2", "content": "Rome: 20C"})
+
+    def test_max_rounds(self):
+        """A model that keeps calling tools is cut off."""
+        self.create.return_value = completion(tool_calls=[tool_call("c", "weather", {"city": "Oslo"})])
+        text = self.client.generate_with_tools([{"role": "user", "content": "hi"}], self.registry, max_rounds=2)
+        self.assertTrue(text.startswith("Error:"))
+        self.assertEqual(self.create.call_count, 2)
+
+    def test_api_error(self):
+        """API failures are returned as an error message."""
+        self.create.side_effect = RuntimeError("upstream down")
+        text = self.client.generate_with_tools([{"role": "user", "content": "hi"}], self.registry)
+        self.assertEqual(text, "Error: upstream down")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Tests for the usage metering module."""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from src.python_ai_bot.usage import SQLiteUsageStore, UsageMeter
+
+# 2026-10-18 12:00:00 UTC
+NOW = 1792324800.0
+
+
+class TestUsageMeter(unittest.TestCase):
+    """Test case for the usage meter."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "usage.db")
+        self.store = SQLiteUsageStore(self.db_path)
+        self.meters = []
+
+    def tearDown(self):
+        for meter in self.meters:
+            meter.close()
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def make_meter(self, **kwargs):
+        meter = UsageMeter(store=self.store, flush_interval=3600, clock=lambda: NOW, **kwargs)
+        self.meters.append(meter)
+        return meter
+
+    def test_usage_includes_unflushed_counters(self):
+        """Recorded usage is visible before any flush."""
+        meter = self.make_meter()
+        meter.record("acme", prompt_tokens=10, completion_tokens=5)
+        meter.record("acme", prompt_tokens=3, completion_tokens=2)
+
+        usage = meter.usage("acme")
+        self.assertEqual(usage["day"]["requests"], 2)
+        self.assertEqual(usage["day"]["prompt_tokens"], 13)
+        self.assertEqual(usage["month"]["completion_tokens"], 7)
+        self.assertEqual(usage["day"]["period"], "2026-10-18")
+
+    def test_flush_persists_totals_once(self):
+        """Flushing writes deltas only, and a new meter starts from the stored totals."""
+        meter = self.make_meter()
+        meter.record("acme", prompt_tokens=10, completion_tokens=5)
+        meter.flush()
+        meter.record("acme", prompt_tokens=1, completion_tokens=1)
+        meter.flush()
+        meter.flush()
+
+        self.assertEqual(meter.usage("acme")["day"]["prompt_tokens"], 11)
+        restarted = self.make_meter()
+        self.assertEqual(restarted.usage("acme")["month"]["completion_tokens"], 6)
+        self.assertEqual(restarted.usage("acme")["month"]["requests"], 2)
+
+    def test_counters_from_several_threads(self):
+        """Each thread records into its own shard and all of them are counted."""
+        meter = self.make_meter()
+
+        def worker():
+            for _ in range(100):
+                meter.record("acme", prompt_tokens=1, completion_tokens=1)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(meter.usage("acme")["day"]["requests"], 400)
+        meter.flush()
+        self.assertEqual(self.store.load_since("2026-10-01")["acme"]["2026-10-18"], (400, 400, 400, 0))
+
+    def test_quota(self):
+        """Tenants are rejected once their daily quota is reached."""
+        meter = self.make_meter(daily_quota=20)
+        self.assertEqual(meter.check_quota("acme"), (True, None))
+
+        meter.record("acme", prompt_tokens=15, completion_tokens=5)
+        is_allowed, message = meter.check_quota("acme")
+        self.assertFalse(is_allowed)
+        self.assertIn("day", message)
+        self.assertTrue(meter.check_quota("other")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
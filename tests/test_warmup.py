@@ -0,0 +1,102 @@
+"""Tests for startup warm-up and the readiness probe."""
+
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from src.python_ai_bot.api import app
+from src.python_ai_bot.pool import make_http_client, pool_stats
+from src.python_ai_bot.settings import get_settings, load_settings, set_settings
+from src.python_ai_bot.warmup import preconnect, warm_up
+
+
+def make_handler(peers):
+    class UpstreamHandler(BaseHTTPRequestHandler):
+        """Keep-alive stand-in that answers every request with 401."""
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            peers.append(self.client_address)
+            body = b'{"error": {"message": "missing key"}}'
+            self.send_response(401)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return UpstreamHandler
+
+
+class TestWarmUp(unittest.TestCase):
+    """Test case for pre-opening upstream connections."""
+
+    def setUp(self):
+        self.settings = get_settings()
+        set_settings(load_settings({"OPENAI_API_KEY": "sk-test"}))
+        self.peers = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.peers))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self.client = make_http_client()
+
+    def tearDown(self):
+        set_settings(self.settings)
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_stay_idle_in_pool(self):
+        """Each warm-up request opens its own connection, left idle for reuse."""
+        report = warm_up(http_client=self.client, base_url=self.base_url, connections=3)
+        self.assertEqual(report["connections"], 3)
+        self.assertIn("prompt_templates", report["steps"])
+        self.assertEqual(len(set(self.peers)), 3)
+        self.assertEqual(pool_stats(self.client), {"idle": 3, "active": 0})
+
+        # The next request reuses a warm connection
+        self.client.get(f"{self.base_url}/models")
+        self.assertEqual(len(set(self.peers)), 3)
+
+    def test_no_api_key(self):
+        """Without an API key nothing is opened upstream."""
+        set_settings(load_settings({}))
+        report = warm_up(http_client=self.client, base_url=self.base_url, connections=3)
+        self.assertEqual(report["connections"], 0)
+        self.assertEqual(self.peers, [])
+
+    def test_unreachable_upstream(self):
+        """Connection failures are reported, not raised."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.assertEqual(preconnect(self.client, f"http://127.0.0.1:{port}/v1", connections=2, timeout=2), 0)
+
+
+class TestReadyEndpoint(unittest.TestCase):
+    """Test case for the /ready probe."""
+
+    def test_ready(self):
+        """/ready answers 503 until warm, then 200, with pool, cache and circuit state."""
+        client = TestClient(app)
+        with patch("src.python_ai_bot.warmup.is_ready", return_value=False):
+            self.assertEqual(client.get("/ready").status_code, 503)
+        with patch("src.python_ai_bot.warmup.is_ready", return_value=True):
+            response = client.get("/ready")
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertTrue(payload["ready"])
+        self.assertEqual(set(payload["pool"]), {"idle", "active"})
+        self.assertEqual(payload["upstream"]["circuit"], "closed")
+        self.assertIn("cache", payload)
+
+
+if __name__ == "__main__":
+    unittest.main()